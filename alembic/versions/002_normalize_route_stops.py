@@ -0,0 +1,284 @@
+"""Normalize route stops: move route/romaneio JSON blobs into route_stops rows"""
+
+import base64
+import io
+from datetime import datetime
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def _stops_table() -> sa.Table:
+    return sa.table(
+        'route_stops',
+        sa.column('session_id', sa.String), sa.column('route_id', sa.String),
+        sa.column('seq', sa.Integer), sa.column('point_seq', sa.Integer),
+        sa.column('package_id', sa.String), sa.column('romaneio_id', sa.String),
+        sa.column('address', sa.Text), sa.column('lat', sa.Float), sa.column('lng', sa.Float),
+        sa.column('priority', sa.String), sa.column('status', sa.String),
+        sa.column('delivered_at', sa.DateTime), sa.column('delivery_seq', sa.Integer),
+    )
+
+
+def _sessions_table() -> sa.Table:
+    return sa.table('sessions', sa.column('session_id', sa.String), sa.column('romaneios_data', sa.JSON))
+
+
+def _routes_table() -> sa.Table:
+    return sa.table(
+        'routes',
+        sa.column('id', sa.String), sa.column('session_id', sa.String),
+        sa.column('optimized_order', sa.JSON), sa.column('delivered_packages', sa.JSON),
+    )
+
+
+# ==================== FORMATO ANTIGO (cópia congelada) ====================
+# Conversão blob <-> linhas fixada nesta revisão: a migração não importa
+# bot_multidelivery (singletons, helpers privados que mudam com o código)
+
+_POINT_COLUMNS = ('address_idx', 'package_idx', 'romaneio_idx', 'priority_idx')
+
+
+def _point(package_id, romaneio_id, address, lat, lng, priority='normal') -> dict:
+    return {'package_id': package_id, 'romaneio_id': romaneio_id, 'address': address,
+            'lat': lat, 'lng': lng, 'priority': priority}
+
+
+def _romaneio_points(r_data: dict) -> list:
+    """Pacotes de um romaneio: blob .npz em base64 ou lista de dicts (formato mais antigo)"""
+    if 'points_blob' not in r_data:
+        return [_point(p['package_id'], p['romaneio_id'], p['address'], p['lat'], p['lng'],
+                       p.get('priority', 'normal')) for p in r_data.get('points', [])]
+    with np.load(io.BytesIO(base64.b64decode(r_data['points_blob'])), allow_pickle=False) as blob:
+        raw, bounds = blob['strings'].tobytes(), blob['string_offsets'].tolist()
+        strings = [raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+        lat, lng = blob['lat'].tolist(), blob['lng'].tolist()
+        address, package, romaneio, priority = (blob[name].tolist() for name in _POINT_COLUMNS)
+    return [_point(strings[package[i]], strings[romaneio[i]], strings[address[i]], lat[i], lng[i],
+                   strings[priority[i]]) for i in range(len(lat))]
+
+
+def _points_blob(points: list) -> str:
+    """Blob .npz v1 (colunas + textos internados), formato de romaneios_data antes desta revisão"""
+    strings, index = [], {}
+
+    def intern(value):
+        if value not in index:
+            index[value] = len(strings)
+            strings.append(value)
+        return index[value]
+
+    columns = {name: np.empty(len(points), dtype=np.int32) for name in _POINT_COLUMNS}
+    for i, p in enumerate(points):
+        for name, field in zip(_POINT_COLUMNS, ('address', 'package_id', 'romaneio_id', 'priority')):
+            columns[name][i] = intern(p[field])
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    buffer = io.BytesIO()
+    np.savez(buffer, version=np.array([1]),
+             lat=np.array([p['lat'] for p in points], dtype=np.float64),
+             lng=np.array([p['lng'] for p in points], dtype=np.float64), **columns,
+             strings=np.frombuffer(b''.join(encoded), dtype=np.uint8), string_offsets=offsets)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _order_positions(order) -> list:
+    """Ordem da rota: pares (romaneio, linha) ou, no formato antigo, dicts por ponto"""
+    if isinstance(order, dict):
+        pairs = np.frombuffer(base64.b64decode(order['rows']), dtype=np.int32).reshape(-1, 2)
+        return [tuple(pair) for pair in pairs.tolist()]
+    return [_point(p['package_id'], p['romaneio_id'], p['address'], p['lat'], p['lng'],
+                   p.get('priority', 'normal')) for p in (order or [])]
+
+
+def _legacy_stop_rows(session_id: str, romaneios: list, legacy_routes: list) -> list:
+    """Linhas de route_stops: uma por pacote dos romaneios, com a rota/posição de quem o recebeu"""
+    now = datetime.now()
+
+    def stop(**fields) -> dict:
+        row = {'session_id': session_id, 'route_id': None, 'seq': None, 'point_seq': None,
+               'romaneio_id': None, 'address': None, 'lat': None, 'lng': None, 'priority': 'normal',
+               'status': 'pending', 'delivered_at': None, 'delivery_seq': None}
+        row.update(fields)
+        return row
+
+    rows, by_position, by_package = [], {}, {}
+    for t, points in enumerate(romaneios):
+        for i, p in enumerate(points):
+            row = stop(point_seq=len(rows), **p)
+            by_position[(t, i)] = row
+            by_package.setdefault(p['package_id'], []).append(row)
+            rows.append(row)
+
+    for route in legacy_routes:
+        delivery_seq = {}
+        for n, package_id in enumerate(route.delivered_packages or []):
+            delivery_seq.setdefault(package_id, n)
+
+        in_order = set()
+        for seq, position in enumerate(_order_positions(route.optimized_order)):
+            if isinstance(position, tuple):
+                row = by_position.get(position)
+                point = romaneios[position[0]][position[1]]
+            else:
+                point = position
+                row = next((r for r in by_package.get(point['package_id'], ()) if r['route_id'] is None), None)
+            if row is None or row['route_id'] is not None:
+                row = stop(**point)  # Ponto montado à mão (ou já usado por outra rota)
+                rows.append(row)
+            row['route_id'], row['seq'] = route.id, seq
+            in_order.add(point['package_id'])
+            n = delivery_seq.get(point['package_id'])
+            if n is not None:
+                row.update(status='delivered', delivery_seq=n, delivered_at=now)
+
+        for package_id, n in delivery_seq.items():
+            if package_id not in in_order:
+                rows.append(stop(route_id=route.id, package_id=package_id, status='delivered',
+                                 delivery_seq=n, delivered_at=now))
+    return rows
+
+
+def _blobs_from_stops(meta: list, stops: list) -> tuple:
+    """
+    Inverso de _legacy_stop_rows.
+    Retorna (romaneios_data com points_blob, {route_id: (optimized_order, delivered_packages)}).
+    """
+    by_point = sorted((s for s in stops if s.point_seq is not None), key=lambda s: s.point_seq)
+    romaneios_data, points_of, located = [], [], {}
+    start = 0
+    for r_data in meta:
+        count = r_data['count'] if 'count' in r_data else len(r_data.get('points', []))
+        chunk = by_point[start:start + count]
+        start += len(chunk)
+        points = [_point(s.package_id, s.romaneio_id or '', s.address or '', s.lat, s.lng, s.priority or 'normal')
+                  for s in chunk]
+        for i, s in enumerate(chunk):
+            located[s.point_seq] = (len(points_of), i)
+        points_of.append(points)
+        romaneios_data.append({'id': r_data['id'], 'uploaded_at': r_data['uploaded_at'],
+                               'count': len(points), 'points_blob': _points_blob(points)})
+
+    per_route = {}
+    for s in stops:
+        if s.route_id is not None:
+            per_route.setdefault(s.route_id, []).append(s)
+
+    routes = {}
+    for route_id, route_stops in per_route.items():
+        ordered = sorted((s for s in route_stops if s.seq is not None), key=lambda s: s.seq)
+        positions = [located.get(s.point_seq) for s in ordered]
+        if all(p is not None for p in positions):
+            pairs = np.array(positions, dtype=np.int32).reshape(-1, 2)
+            order = {'rows': base64.b64encode(pairs.tobytes()).decode('ascii'), 'count': len(positions)}
+        else:
+            order = [points_of[p[0]][p[1]] if p is not None else
+                     _point(s.package_id, s.romaneio_id or '', s.address or '', s.lat, s.lng, s.priority or 'normal')
+                     for p, s in zip(positions, ordered)]
+        done = sorted((s for s in route_stops if s.status == 'delivered'),
+                      key=lambda s: (s.delivery_seq is None, s.delivery_seq or 0, s.seq or 0))
+        routes[route_id] = (order, list(dict.fromkeys(s.package_id for s in done)))
+    return romaneios_data, routes
+
+
+def upgrade() -> None:
+    """Create route_stops (+ indexes) and migrate existing sessions"""
+
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    # ==================== CREATE TABLE ====================
+
+    # create_all() do DatabaseManager pode já ter criado a tabela
+    if not inspector.has_table('route_stops'):
+        op.create_table(
+            'route_stops',
+            sa.Column('id', sa.Integer(), nullable=False, autoincrement=True),
+            sa.Column('session_id', sa.String(20), nullable=False),
+            sa.Column('route_id', sa.String(50), nullable=True),
+            sa.Column('seq', sa.Integer(), nullable=True),
+            sa.Column('point_seq', sa.Integer(), nullable=True),
+            sa.Column('package_id', sa.String(100), nullable=False),
+            sa.Column('romaneio_id', sa.String(50), nullable=True),
+            sa.Column('address', sa.Text(), nullable=True),
+            sa.Column('lat', sa.Float(), nullable=True),
+            sa.Column('lng', sa.Float(), nullable=True),
+            sa.Column('priority', sa.String(20), nullable=True),
+            sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+            sa.Column('delivered_at', sa.DateTime(), nullable=True),
+            sa.Column('delivery_seq', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.ForeignKeyConstraint(['session_id'], ['sessions.session_id'], ondelete='CASCADE'),
+            sa.Index('ix_route_stops_route_status', 'session_id', 'route_id', 'status', 'seq'),
+            sa.Index('ix_route_stops_package', 'session_id', 'package_id'),
+            sa.Index('ix_route_stops_point', 'session_id', 'point_seq')
+        )
+
+    existing = {ix['name'] for ix in inspector.get_indexes('routes')}
+    if 'ix_routes_session_id' not in existing:
+        op.create_index('ix_routes_session_id', 'routes', ['session_id'])
+    if 'ix_routes_assigned_to_telegram_id' not in existing:
+        op.create_index('ix_routes_assigned_to_telegram_id', 'routes', ['assigned_to_telegram_id'])
+
+    # ==================== MIGRATE DATA ====================
+
+    sessions, routes, stops = _sessions_table(), _routes_table(), _stops_table()
+    converted = {row.session_id for row in bind.execute(sa.select(stops.c.session_id).distinct())}
+
+    legacy_routes = {}
+    for row in bind.execute(sa.select(routes).where(routes.c.optimized_order.isnot(None))):
+        legacy_routes.setdefault(row.session_id, []).append(row)
+
+    for row in bind.execute(sa.select(sessions)):
+        if row.session_id in converted:
+            continue
+        romaneios_data = row.romaneios_data or []
+        has_points = any('points_blob' in r or 'points' in r for r in romaneios_data)
+        if not has_points and not legacy_routes.get(row.session_id):
+            continue  # Nada no formato antigo
+
+        romaneios = [_romaneio_points(r) for r in romaneios_data]
+        rows = _legacy_stop_rows(row.session_id, romaneios, legacy_routes.get(row.session_id, []))
+        if rows:
+            op.bulk_insert(stops, rows)
+        meta = [{'id': r['id'], 'uploaded_at': r['uploaded_at'], 'count': len(points)}
+                for r, points in zip(romaneios_data, romaneios)]
+        bind.execute(sessions.update().where(sessions.c.session_id == row.session_id)
+                     .values(romaneios_data=meta))
+        bind.execute(routes.update().where(routes.c.session_id == row.session_id)
+                     .values(optimized_order=sa.null(), delivered_packages=sa.null()))
+
+
+def downgrade() -> None:
+    """Rebuild the JSON blobs from route_stops and drop the table"""
+
+    bind = op.get_bind()
+
+    sessions, routes, stops = _sessions_table(), _routes_table(), _stops_table()
+    per_session = {}
+    for stop in bind.execute(sa.select(stops)):
+        per_session.setdefault(stop.session_id, []).append(stop)
+
+    for session_id, session_stops in per_session.items():
+        meta = bind.execute(sa.select(sessions.c.romaneios_data)
+                            .where(sessions.c.session_id == session_id)).scalar() or []
+        payload, parts = _blobs_from_stops(meta, session_stops)
+        bind.execute(sessions.update().where(sessions.c.session_id == session_id)
+                     .values(romaneios_data=payload))
+        for route_id, (order, delivered) in parts.items():
+            bind.execute(routes.update()
+                         .where(routes.c.session_id == session_id, routes.c.id == route_id)
+                         .values(optimized_order=order, delivered_packages=delivered))
+
+    op.drop_index('ix_routes_assigned_to_telegram_id', table_name='routes')
+    op.drop_index('ix_routes_session_id', table_name='routes')
+    op.drop_table('route_stops')
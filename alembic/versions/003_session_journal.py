@@ -0,0 +1,30 @@
+"""Session journal: snapshot seq on sessions and failed stops in route_stops"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add sessions.journal_seq and route_stops.failure_reason"""
+
+    inspector = sa.inspect(op.get_bind())
+
+    # A auto-migração do DatabaseManager pode já ter criado as colunas
+    if 'journal_seq' not in {c['name'] for c in inspector.get_columns('sessions')}:
+        op.add_column('sessions', sa.Column('journal_seq', sa.Integer(), nullable=True))
+    if 'failure_reason' not in {c['name'] for c in inspector.get_columns('route_stops')}:
+        op.add_column('route_stops', sa.Column('failure_reason', sa.String(200), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop the journal columns (failed stops go back to pending)"""
+
+    op.execute("UPDATE route_stops SET status = 'pending' WHERE status = 'failed'")
+    op.drop_column('route_stops', 'failure_reason')
+    op.drop_column('sessions', 'journal_seq')
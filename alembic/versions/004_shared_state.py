@@ -0,0 +1,41 @@
+"""Shared state tables for running the API with several workers"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create shared_state and shared_state_members"""
+
+    inspector = sa.inspect(op.get_bind())
+
+    # create_all() do DatabaseManager / PostgresStateBackend pode já ter criado as tabelas
+    if not inspector.has_table('shared_state'):
+        op.create_table(
+            'shared_state',
+            sa.Column('key', sa.String(200), nullable=False),
+            sa.Column('value', sa.JSON(), nullable=True),
+            sa.Column('counter', sa.BigInteger(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('key')
+        )
+    if not inspector.has_table('shared_state_members'):
+        op.create_table(
+            'shared_state_members',
+            sa.Column('key', sa.String(200), nullable=False),
+            sa.Column('member', sa.String(200), nullable=False),
+            sa.PrimaryKeyConstraint('key', 'member')
+        )
+
+
+def downgrade() -> None:
+    """Drop the shared state tables"""
+
+    op.drop_table('shared_state_members')
+    op.drop_table('shared_state')
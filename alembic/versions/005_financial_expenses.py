@@ -0,0 +1,26 @@
+"""Financial reports: expenses column on daily_financial_reports"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add daily_financial_reports.expenses (close_day already writes it)"""
+
+    inspector = sa.inspect(op.get_bind())
+
+    # A auto-migração do DatabaseManager pode já ter criado a coluna
+    if 'expenses' not in {c['name'] for c in inspector.get_columns('daily_financial_reports')}:
+        op.add_column('daily_financial_reports', sa.Column('expenses', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop the expenses column"""
+
+    op.drop_column('daily_financial_reports', 'expenses')
@@ -0,0 +1,29 @@
+"""Session dashboard counters: progress kept in the delivery transaction"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Add delivered/failed counters + stats_version to sessions and failed count to deliverers"""
+
+    # Sessões existentes ficam com NULL: o SessionEngine reconta (um GROUP BY) na primeira leitura
+    op.add_column('delivery_sessions', sa.Column('delivered_count', sa.Integer(), nullable=True))
+    op.add_column('delivery_sessions', sa.Column('failed_count', sa.Integer(), nullable=True))
+    op.add_column('delivery_sessions', sa.Column('stats_version', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('session_deliverers', sa.Column('packages_failed', sa.Integer(), nullable=True, server_default='0'))
+
+
+def downgrade() -> None:
+    """Drop the dashboard counters"""
+
+    op.drop_column('session_deliverers', 'packages_failed')
+    op.drop_column('delivery_sessions', 'stats_version')
+    op.drop_column('delivery_sessions', 'failed_count')
+    op.drop_column('delivery_sessions', 'delivered_count')
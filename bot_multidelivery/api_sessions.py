@@ -1,16 +1,19 @@
 """
 ⚡ API ENDPOINTS - Sistema de Sessões Completo
 Gerencia: criar, reutilizar, distribuir, monitorar, finalizar
+
+I/O do banco pela AsyncSession (get_async_db): scanner e entregas
+concorrentes não disputam o event loop
 """
 
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import logging
 
-from .services.session_engine import SessionEngine
+from .services.session_engine import AsyncSessionEngine
 from .services.barcode_ocr_service import scan_barcode_from_image
-from .database import get_db
+from .database import get_async_db
 from .security import verify_api_key
 
 logger = logging.getLogger(__name__)
@@ -26,14 +29,14 @@ async def create_session(
     user_id: int,
     session_type: str = "manual",
     file_name: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Cria uma nova sessão vazia
     Retorna: session_id
     """
-    engine = SessionEngine(db)
-    session_id = engine.create_session(user_id, session_type, file_name)
+    engine = AsyncSessionEngine(db)
+    session_id = await engine.create_session(user_id, session_type, file_name)
     
     return {
         "success": True,
@@ -49,7 +52,7 @@ async def create_session(
 async def add_packages(
     session_id: str,
     packages: List[dict],
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Adiciona múltiplos pacotes à sessão
@@ -63,8 +66,8 @@ async def add_packages(
         ]
     }
     """
-    engine = SessionEngine(db)
-    result = engine.add_packages_to_session(session_id, packages)
+    engine = AsyncSessionEngine(db)
+    result = await engine.add_packages_to_session(session_id, packages)
     
     return {
         "success": True,
@@ -81,14 +84,14 @@ async def add_packages(
 async def reuse_session(
     session_id: str,
     new_packages: Optional[List[dict]] = None,
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Reutiliza uma sessão em estado OPEN (não iniciada)
     Permite redistribuir pacotes sem re-import
     """
-    engine = SessionEngine(db)
-    result = engine.reuse_session_before_start(session_id, new_packages)
+    engine = AsyncSessionEngine(db)
+    result = await engine.reuse_session_before_start(session_id, new_packages)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -107,14 +110,14 @@ async def reuse_session(
 async def start_session(
     session_id: str,
     deliverer_ids: List[int],
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Inicia a sessão: muda status OPEN → ACTIVE
     Registra entregadores que vão fazer as entregas
     """
-    engine = SessionEngine(db)
-    result = engine.start_session(session_id, deliverer_ids)
+    engine = AsyncSessionEngine(db)
+    result = await engine.start_session(session_id, deliverer_ids)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -135,17 +138,20 @@ async def mark_delivery_complete(
     package_id: str,
     deliverer_id: int,
     delivery_notes: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Marca um pacote como entregue
     Auto-calcula comissão e lucro em tempo real
     """
-    engine = SessionEngine(db)
-    result = engine.mark_delivery_complete(
+    engine = AsyncSessionEngine(db)
+    result = await engine.mark_delivery_complete(
         session_id, package_id, deliverer_id, delivery_notes
     )
     
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    
     return {
         "success": True,
         "message": "Entrega registrada!",
@@ -153,13 +159,70 @@ async def mark_delivery_complete(
     }
 
 
+# ============================================
+# MARCAR VÁRIAS ENTREGAS (Mesma parada / sync offline)
+# ============================================
+@router.post("/{session_id}/delivery/complete-batch")
+async def mark_deliveries_complete(
+    session_id: str,
+    package_ids: List[str],
+    deliverer_id: int,
+    delivery_notes: Optional[str] = None,
+    db: Optional[AsyncSession] = Depends(get_async_db)
+):
+    """
+    Marca vários pacotes como entregues numa transação só
+    Idempotente: reenviar o mesmo lote (sync offline) não conta nada duas vezes
+    
+    Esperado (body): ["package_id_1", "package_id_2", ...]
+    """
+    engine = AsyncSessionEngine(db)
+    result = await engine.mark_deliveries_complete(
+        session_id, package_ids, deliverer_id, delivery_notes
+    )
+    
+    return {
+        "success": True,
+        "message": f"{len(result['delivered'])} entregas registradas!",
+        "result": result
+    }
+
+
+# ============================================
+# REGISTRAR FALHA NA ENTREGA
+# ============================================
+@router.post("/{session_id}/delivery/fail")
+async def mark_delivery_failed(
+    session_id: str,
+    package_id: str,
+    deliverer_id: int,
+    reason: Optional[str] = None,
+    db: Optional[AsyncSession] = Depends(get_async_db)
+):
+    """
+    Registra tentativa de entrega sem sucesso (cliente ausente, endereço errado...)
+    Conta no progresso da sessão e do entregador; reentrega depois tira da contagem
+    """
+    engine = AsyncSessionEngine(db)
+    result = await engine.mark_delivery_failed(session_id, package_id, deliverer_id, reason)
+    
+    if "error" in result:
+        raise HTTPException(status_code=404, detail=result["error"])
+    
+    return {
+        "success": True,
+        "message": "Falha registrada!" if result["status"] == "failed" else "Pacote já entregue",
+        "result": result
+    }
+
+
 # ============================================
 # FINALIZAR SESSÃO → HISTÓRICO
 # ============================================
 @router.post("/{session_id}/complete")
 async def complete_session(
     session_id: str,
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Finaliza a sessão: ACTIVE → COMPLETED
@@ -167,8 +230,8 @@ async def complete_session(
     - Torna read-only
     - Arquivo como histórico
     """
-    engine = SessionEngine(db)
-    result = engine.complete_session(session_id)
+    engine = AsyncSessionEngine(db)
+    result = await engine.complete_session(session_id)
     
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
@@ -186,7 +249,7 @@ async def complete_session(
 @router.get("/{session_id}")
 async def get_session_complete(
     session_id: str,
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Retorna TUDO linkedado em tempo real:
@@ -196,8 +259,8 @@ async def get_session_complete(
     - Financeiro
     - Histórico de auditoria
     """
-    engine = SessionEngine(db)
-    result = engine.get_session_with_links(session_id)
+    engine = AsyncSessionEngine(db)
+    result = await engine.get_session_with_links(session_id)
     
     if "error" in result:
         raise HTTPException(status_code=404, detail=result["error"])
@@ -215,34 +278,18 @@ async def get_session_complete(
 async def list_user_sessions(
     user_id: int,
     status: Optional[str] = None,  # open, active, completed
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Lista todas as sessões do usuário
     Opcional: filtra por status (open/active/completed)
     """
-    from schemas.sessions_schema import DeliverySession
-    
-    query = db.query(DeliverySession).filter_by(user_id=user_id)
-    
-    if status:
-        query = query.filter_by(status=status)
-    
-    sessions = query.all()
+    sessions = await AsyncSessionEngine(db).list_user_sessions(user_id, status)
     
     return {
         "success": True,
         "total": len(sessions),
-        "sessions": [
-            {
-                "id": s.session_id,
-                "status": s.status,
-                "created_at": s.created_at.isoformat(),
-                "total_packages": s.total_packages,
-                "total_profit": s.total_profit
-            }
-            for s in sessions
-        ]
+        "sessions": sessions
     }
 
 
@@ -253,7 +300,7 @@ async def list_user_sessions(
 async def scan_barcode_endpoint(
     session_id: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Endpoint para scanner de código de barras com OCR
@@ -273,21 +320,14 @@ async def scan_barcode_endpoint(
             barcode = result["barcode"]
             
             # Auto-vincula o pacote se encontrado na sessão
-            from schemas.sessions_schema import SessionPackage
+            package_id = await AsyncSessionEngine(db).flag_ocr_scan(session_id, barcode)
             
-            package = db.query(SessionPackage).filter(
-                SessionPackage.barcode == barcode,
-                SessionPackage.session_id == session_id
-            ).first()
-            
-            if package:
-                package.barcode_ocr_attempt = True
-                db.commit()
+            if package_id:
                 return {
                     "success": True,
                     "barcode": barcode,
                     "package_found": True,
-                    "package_id": package.package_id,
+                    "package_id": package_id,
                     "metadata": result["metadata"]
                 }
             else:
@@ -316,45 +356,50 @@ async def scan_barcode_endpoint(
 @router.get("/{session_id}/dashboard")
 async def get_session_dashboard(
     session_id: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: Optional[AsyncSession] = Depends(get_async_db)
 ):
     """
     Dashboard em tempo real de uma sessão ativa
     Mostra: progresso, ganhos, entregas, entregadores
+    
+    Contadores mantidos a cada entrega (não carrega os pacotes).
+    ETag/If-None-Match: sem mudança desde o último poll → 304 com uma query só
     """
-    engine = SessionEngine(db)
-    session_data = engine.get_session_with_links(session_id)
+    engine = AsyncSessionEngine(db)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        version = await engine.get_stats_version(session_id)
+        if version is not None and if_none_match == _dashboard_etag(session_id, version):
+            return Response(status_code=304, headers={"ETag": if_none_match})
     
-    if "error" in session_data:
-        raise HTTPException(status_code=404, detail=session_data["error"])
+    dashboard = await engine.get_session_dashboard(session_id)
     
-    packages = session_data["packages"]
-    deliverers = session_data["deliverers"]
-    financial = session_data["financial"]
+    if "error" in dashboard:
+        raise HTTPException(status_code=404, detail=dashboard["error"])
     
-    # Calcula stats
-    delivered = len([p for p in packages if p["status"] == "delivered"])
-    pending = len([p for p in packages if p["status"] == "pending"])
-    progress = (delivered / len(packages) * 100) if packages else 0
+    progress = dashboard["progress"]
+    total = progress["total"]
+    response.headers["ETag"] = _dashboard_etag(session_id, dashboard["stats_version"])
     
     return {
         "success": True,
         "session_id": session_id,
-        "status": session_data["session"]["status"],
+        "status": dashboard["status"],
         "progress": {
-            "delivered": delivered,
-            "pending": pending,
-            "total": len(packages),
-            "percentage": round(progress, 2)
+            **progress,
+            "percentage": round(progress["delivered"] / total * 100, 2) if total else 0
         },
-        "financial": {
-            "revenue": financial["total_revenue"],
-            "cost": financial["total_cost"],
-            "profit": financial["total_profit"],
-            "deliverers_paid": sum(d["total_earned"] for d in deliverers)
-        },
-        "deliverers_count": len(deliverers),
-        "is_readonly": session_data["session"]["is_readonly"],
-        "was_reused": session_data["session"]["was_reused"],
-        "reuse_count": session_data["session"]["reuse_count"]
+        "financial": dashboard["financial"],
+        "deliverers_count": len(dashboard["deliverers"]),
+        "deliverers": dashboard["deliverers"],
+        "is_readonly": dashboard["is_readonly"],
+        "was_reused": dashboard["was_reused"],
+        "reuse_count": dashboard["reuse_count"]
     }
+
+
+def _dashboard_etag(session_id: str, version: int) -> str:
+    return f'W/"{session_id}-{version}"'
@@ -3,13 +3,19 @@
 Usa K-Means para dividir entregas em clusters geográficos otimizados
 """
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import Callable, List, Optional, Tuple, Dict
 import math
 
+import numpy as np
 
-@dataclass
+
+# Raio (metros) para considerar dois pacotes como a mesma parada (mesmo prédio)
+STOP_MERGE_RADIUS_M = 15.0
+
+
+@dataclass(slots=True)
 class DeliveryPoint:
-    """Ponto de entrega"""
+    """Ponto de entrega (avulso; pontos de romaneio vivem em point_table.PointTable)"""
     address: str
     lat: float
     lng: float
@@ -30,10 +36,26 @@ class Cluster:
     def total_packages(self) -> int:
         return len(self.points)
     
+    @property
+    def centroid(self) -> Tuple[float, float]:
+        return (self.center_lat, self.center_lng)
+    
     def distance_to_base(self, base_lat: float, base_lng: float) -> float:
         return haversine_distance(self.center_lat, self.center_lng, base_lat, base_lng)
 
 
+@dataclass
+class Stop:
+    """Parada agregada: pacotes com coordenadas iguais ou quase iguais (mesmo prédio)"""
+    lat: float
+    lng: float
+    points: List[DeliveryPoint]
+    
+    @property
+    def weight(self) -> int:
+        return len(self.points)
+
+
 def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calcula distância em km entre dois pontos (fórmula de Haversine)"""
     R = 6371  # Raio da Terra em km
@@ -49,43 +71,116 @@ def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> fl
     return R * c
 
 
+def haversine_many(lats: np.ndarray, lngs: np.ndarray, lat: float, lng: float) -> np.ndarray:
+    """haversine_distance vetorizado: de cada (lats[i], lngs[i]) até (lat, lng), em km"""
+    lat1 = np.radians(lats)
+    lat2 = math.radians(lat)
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * math.cos(lat2) * np.sin(np.radians(lng - lngs) / 2) ** 2)
+    return 6371 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def aggregate_stops(points: List[DeliveryPoint], radius_m: float = STOP_MERGE_RADIUS_M) -> List[Stop]:
+    """
+    Agrupa pacotes do mesmo prédio em paradas ponderadas.
+    
+    Usa grade de células do tamanho do raio: cada ponto só é comparado com as
+    paradas das 9 células vizinhas, então o custo é O(n).
+    A ordem das paradas (e dos pacotes dentro delas) segue a ordem de entrada.
+    """
+    if not points:
+        return []
+    
+    lat_step = radius_m / 111320.0
+    lng_step = radius_m / (111320.0 * max(math.cos(math.radians(points[0].lat)), 0.01))
+    
+    stops: List[Stop] = []
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    
+    for point in points:
+        cell_y = int(math.floor(point.lat / lat_step))
+        cell_x = int(math.floor(point.lng / lng_step))
+        
+        match = None
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for idx in grid.get((cell_y + dy, cell_x + dx), ()):
+                    stop = stops[idx]
+                    # Equiretangular: suficiente para distâncias de poucos metros
+                    y = (point.lat - stop.lat) * 111320.0
+                    x = (point.lng - stop.lng) * 111320.0 * math.cos(math.radians(stop.lat))
+                    if x * x + y * y <= radius_m * radius_m:
+                        match = stop
+                        break
+                if match:
+                    break
+            if match:
+                break
+        
+        if match:
+            match.points.append(point)
+        else:
+            grid.setdefault((cell_y, cell_x), []).append(len(stops))
+            stops.append(Stop(lat=point.lat, lng=point.lng, points=[point]))
+    
+    return stops
+
+
+def expand_stops(stops: List[Stop]) -> List[DeliveryPoint]:
+    """Desfaz a agregação: lista de pacotes na ordem das paradas"""
+    return [p for stop in stops for p in stop.points]
+
+
 class TerritoryDivider:
     """Divide entregas em territórios otimizados"""
     
-    def __init__(self, base_lat: float, base_lng: float):
+    def __init__(self, base_lat: float, base_lng: float, distance_provider=None):
         self.base_lat = base_lat
         self.base_lng = base_lng
+        # Provedor de matriz (services.distance_matrix) usado na ordem da rota;
+        # None = haversine direto (clusterização é sempre geográfica)
+        self.distance_provider = distance_provider
     
-    def divide_into_clusters(self, points: List[DeliveryPoint], k: int = 2, max_iterations: int = 50) -> List[Cluster]:
+    def divide_into_clusters(self, points: List[DeliveryPoint], k: int = 2, max_iterations: int = 50,
+                             aggregate: bool = True) -> List[Cluster]:
         """
         K-Means geográfico simplificado
         k=2 significa dividir em 2 territórios
+        
+        Com aggregate=True, pacotes do mesmo prédio viram uma parada ponderada
+        antes do K-Means (N cai 2-4x em romaneios residenciais) e um prédio
+        nunca é dividido entre dois entregadores.
         """
-        if len(points) < k:
-            # Se tem menos pontos que clusters, cada ponto vira um cluster
-            return [Cluster(id=i, center_lat=p.lat, center_lng=p.lng, points=[p]) for i, p in enumerate(points)]
+        if aggregate:
+            stops = aggregate_stops(points)
+        else:
+            stops = [Stop(lat=p.lat, lng=p.lng, points=[p]) for p in points]
+        
+        if len(stops) < k:
+            # Se tem menos paradas que clusters, cada parada vira um cluster
+            return [Cluster(id=i, center_lat=s.lat, center_lng=s.lng, points=list(s.points)) for i, s in enumerate(stops)]
         
-        # 1. Inicializa centroides: pontos mais distantes da base
-        centroids = self._initialize_centroids(points, k)
+        # 1. Inicializa centroides: paradas mais distantes da base
+        centroids = self._initialize_centroids(stops, k)
         
-        # 2. Iteração K-Means
+        # 2. Iteração K-Means (distâncias calculadas em bloco sobre as colunas lat/lng)
+        stop_lats = np.fromiter((s.lat for s in stops), dtype=np.float64, count=len(stops))
+        stop_lngs = np.fromiter((s.lng for s in stops), dtype=np.float64, count=len(stops))
         for iteration in range(max_iterations):
-            # Atribui cada ponto ao centroide mais próximo
+            # Atribui cada parada ao centroide mais próximo
+            distances = np.column_stack([haversine_many(stop_lats, stop_lngs, c_lat, c_lng)
+                                         for c_lat, c_lng in centroids])
             clusters_dict = {i: [] for i in range(k)}
+            for stop, closest_cluster in zip(stops, distances.argmin(axis=1).tolist()):
+                clusters_dict[closest_cluster].append(stop)
             
-            for point in points:
-                closest_cluster = min(
-                    range(k),
-                    key=lambda c: haversine_distance(point.lat, point.lng, centroids[c][0], centroids[c][1])
-                )
-                clusters_dict[closest_cluster].append(point)
-            
-            # Recalcula centroides
+            # Recalcula centroides (ponderados pelo nº de pacotes)
             new_centroids = []
             for i in range(k):
                 if clusters_dict[i]:
-                    avg_lat = sum(p.lat for p in clusters_dict[i]) / len(clusters_dict[i])
-                    avg_lng = sum(p.lng for p in clusters_dict[i]) / len(clusters_dict[i])
+                    total_weight = sum(s.weight for s in clusters_dict[i])
+                    avg_lat = sum(s.lat * s.weight for s in clusters_dict[i]) / total_weight
+                    avg_lng = sum(s.lng * s.weight for s in clusters_dict[i]) / total_weight
                     new_centroids.append((avg_lat, avg_lng))
                 else:
                     new_centroids.append(centroids[i])  # Mantém centroide vazio
@@ -96,10 +191,10 @@ class TerritoryDivider:
             
             centroids = new_centroids
         
-        # 3. Balanceamento: redistribui pontos para equilibrar clusters
+        # 3. Balanceamento: redistribui paradas para equilibrar pacotes
         clusters_dict = self._balance_clusters(clusters_dict, centroids, k)
         
-        # 4. Monta objetos Cluster
+        # 4. Monta objetos Cluster (expande paradas de volta para pacotes)
         clusters = []
         for i in range(k):
             if clusters_dict[i]:
@@ -107,7 +202,7 @@ class TerritoryDivider:
                     id=i,
                     center_lat=centroids[i][0],
                     center_lng=centroids[i][1],
-                    points=clusters_dict[i]
+                    points=expand_stops(clusters_dict[i])
                 ))
         
         # 5. Ordena clusters por distância da base (mais próximo primeiro)
@@ -122,45 +217,50 @@ class TerritoryDivider:
     def _balance_clusters(self, clusters_dict: dict, centroids: list, k: int) -> dict:
         """
         Balanceia clusters para distribuição mais uniforme (50/50).
-        Move pontos de borda de clusters grandes para pequenos.
+        Move paradas de borda de clusters grandes para pequenos.
+        Tamanho = nº de pacotes; só move uma parada se isso reduzir o desequilíbrio.
         Tolerância de 10% permite até 60/40 apenas em casos extremos.
         """
+        def size(i: int) -> int:
+            return sum(s.weight for s in clusters_dict[i])
+        
         max_iterations = 20
-        target_size = sum(len(clusters_dict[i]) for i in range(k)) // k
+        target_size = sum(size(i) for i in range(k)) // k
         tolerance = int(target_size * 0.1)  # 10% de tolerância (força 50/50, aceita até 60/40)
         
         for _ in range(max_iterations):
-            sizes = [len(clusters_dict[i]) for i in range(k)]
+            sizes = [size(i) for i in range(k)]
             
             # Se todos estão balanceados, para
             if all(abs(s - target_size) <= tolerance for s in sizes):
                 break
             
             # Encontra cluster maior e menor
-            largest_idx = max(range(k), key=lambda i: len(clusters_dict[i]))
-            smallest_idx = min(range(k), key=lambda i: len(clusters_dict[i]))
+            largest_idx = max(range(k), key=lambda i: sizes[i])
+            smallest_idx = min(range(k), key=lambda i: sizes[i])
             
-            if len(clusters_dict[largest_idx]) - len(clusters_dict[smallest_idx]) <= 1:
+            gap = sizes[largest_idx] - sizes[smallest_idx]
+            if gap <= 1:
                 break
             
-            # Move ponto mais próximo do centroide do cluster menor
-            largest_points = clusters_dict[largest_idx]
-            if not largest_points:
+            # Só paradas que, ao mudar de lado, diminuem a diferença
+            candidates = [s for s in clusters_dict[largest_idx] if s.weight < gap]
+            if not candidates:
                 break
             
-            # Pega o ponto do cluster grande mais próximo do centroide do cluster pequeno
-            closest_point = min(
-                largest_points,
-                key=lambda p: haversine_distance(p.lat, p.lng, centroids[smallest_idx][0], centroids[smallest_idx][1])
+            # Pega a parada do cluster grande mais próxima do centroide do cluster pequeno
+            closest_stop = min(
+                candidates,
+                key=lambda s: haversine_distance(s.lat, s.lng, centroids[smallest_idx][0], centroids[smallest_idx][1])
             )
             
-            # Move o ponto
-            clusters_dict[largest_idx].remove(closest_point)
-            clusters_dict[smallest_idx].append(closest_point)
+            # Move a parada
+            clusters_dict[largest_idx].remove(closest_stop)
+            clusters_dict[smallest_idx].append(closest_stop)
         
         return clusters_dict
     
-    def _initialize_centroids(self, points: List[DeliveryPoint], k: int) -> List[Tuple[float, float]]:
+    def _initialize_centroids(self, points: List[Stop], k: int) -> List[Tuple[float, float]]:
         """
         Inicialização inteligente: pega os k pontos mais distantes entre si
         Estratégia: K-Means++
@@ -186,13 +286,16 @@ class TerritoryDivider:
         
         return centroids
     
-    def optimize_cluster_route(self, cluster: Cluster) -> List[DeliveryPoint]:
+    def optimize_cluster_route(self, cluster: Cluster, aggregate: bool = True) -> List[DeliveryPoint]:
         """
         Otimização SUPER INTELIGENTE de rota (Greedy + 2-opt)
         
         1. Greedy: Constrói rota inicial (sempre vai pro mais próximo)
         2. 2-opt: Remove cruzamentos e otimiza ordem
         
+        Otimiza sobre paradas agregadas e expande para pacotes no final:
+        pacotes do mesmo prédio saem em sequência.
+        
         Garante: menor distância, sem passar 2x na mesma rua
         """
         if not cluster.points:
@@ -201,26 +304,51 @@ class TerritoryDivider:
         if len(cluster.points) == 1:
             return cluster.points
         
+        if aggregate:
+            stops = aggregate_stops(cluster.points)
+        else:
+            stops = [Stop(lat=p.lat, lng=p.lng, points=[p]) for p in cluster.points]
+        
+        leg = self._leg_cost(stops)
+        
         # FASE 1: Greedy nearest neighbor (rota inicial)
-        current_lat, current_lng = self.base_lat, self.base_lng
-        remaining = cluster.points.copy()
+        current = None  # None = base
+        remaining = stops.copy()
         route = []
         
         while remaining:
-            closest = min(
-                remaining,
-                key=lambda p: haversine_distance(current_lat, current_lng, p.lat, p.lng)
-            )
+            closest = min(remaining, key=lambda s: leg(current, s))
             route.append(closest)
             remaining.remove(closest)
-            current_lat, current_lng = closest.lat, closest.lng
+            current = closest
         
         # FASE 2: 2-opt optimization (remove cruzamentos)
-        route = self._two_opt_optimize(route)
+        route = self._two_opt_optimize(route, leg)
         
-        return route
+        return expand_stops(route)
     
-    def _two_opt_optimize(self, route: List[DeliveryPoint]) -> List[DeliveryPoint]:
+    def _leg_cost(self, stops: List[Stop]) -> Callable[[Optional[Stop], Stop], float]:
+        """
+        Custo de um trecho a → b entre paradas (a=None é a base).
+        Com provedor, consulta a matriz [base] + paradas calculada uma única vez.
+        """
+        if self.distance_provider is None:
+            def leg(a: Optional[Stop], b: Stop) -> float:
+                if a is None:
+                    return haversine_distance(self.base_lat, self.base_lng, b.lat, b.lng)
+                return haversine_distance(a.lat, a.lng, b.lat, b.lng)
+            return leg
+        
+        matrix = self.distance_provider.matrix(
+            [(self.base_lat, self.base_lng)] + [(s.lat, s.lng) for s in stops]
+        )
+        index = {id(s): i for i, s in enumerate(stops, 1)}
+        
+        def leg(a: Optional[Stop], b: Stop) -> float:
+            return matrix[index[id(a)] if a is not None else 0][index[id(b)]]
+        return leg
+    
+    def _two_opt_optimize(self, route: List[Stop], leg=None) -> List[Stop]:
         """
         Algoritmo 2-opt: Remove cruzamentos na rota
         Testa trocar ordem de segmentos para ver se fica menor
@@ -245,8 +373,8 @@ class TerritoryDivider:
                     new_route = best_route[:i] + best_route[i:j][::-1] + best_route[j:]
                     
                     # Calcula distância total
-                    old_dist = self._calculate_route_distance(best_route)
-                    new_dist = self._calculate_route_distance(new_route)
+                    old_dist = self._calculate_route_distance(best_route, leg)
+                    new_dist = self._calculate_route_distance(new_route, leg)
                     
                     # Se melhorou, adota
                     if new_dist < old_dist:
@@ -259,14 +387,17 @@ class TerritoryDivider:
         
         return best_route
     
-    def _calculate_route_distance(self, route: List[DeliveryPoint]) -> float:
+    def _calculate_route_distance(self, route: List[Stop], leg=None) -> float:
         """Calcula distância total da rota (incluindo volta da base)"""
         if not route:
             return 0
         
-        total = haversine_distance(self.base_lat, self.base_lng, route[0].lat, route[0].lng)
+        if leg is None:
+            leg = self._leg_cost(route)
+        
+        total = leg(None, route[0])
         
         for i in range(len(route) - 1):
-            total += haversine_distance(route[i].lat, route[i].lng, route[i+1].lat, route[i+1].lng)
+            total += leg(route[i], route[i + 1])
         
         return total
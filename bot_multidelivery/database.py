@@ -3,12 +3,19 @@
 Persistência permanente para Railway - SCHEMA COMPLETO v2.0
 """
 import os
+import importlib.util
 from datetime import datetime
 from typing import Optional
 from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Float, Boolean, DateTime, Text, ForeignKey, JSON, text, CheckConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, Session
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    ASYNC_SQLALCHEMY = True
+except ImportError:  # greenlet ausente
+    ASYNC_SQLALCHEMY = False
 
 Base = declarative_base()
 
@@ -53,12 +60,21 @@ class SessionDB(Base):
     is_finalized = Column(Boolean, default=False)
     finalized_at = Column(DateTime, nullable=True)
     
-    # JSON fields para dados complexos
-    romaneios_data = Column(JSON, nullable=True)  # Lista de romaneios serializados
+    # Romaneios: só id/data/quantidade (pacotes ficam em route_stops; sessões antigas ainda com pontos)
+    romaneios_data = Column(JSON, nullable=True)
+    
+    # Resumo desnormalizado (listagem sem abrir romaneios_data nem contar rotas)
+    total_packages = Column(Integer, nullable=True)
+    num_routes = Column(Integer, nullable=True)
+    delivered_count = Column(Integer, nullable=True)
+    
+    # Último evento do diário de sessões coberto por este snapshot (ver session_journal)
+    journal_seq = Column(Integer, nullable=True)
     
     # Relacionamentos
     routes = relationship("RouteDB", back_populates="session", cascade="all, delete-orphan")
     packages = relationship("PackageDB", back_populates="session", cascade="all, delete-orphan")
+    stops = relationship("RouteStopDB", back_populates="session", cascade="all, delete-orphan")
 
 
 class RouteDB(Base):
@@ -66,14 +82,14 @@ class RouteDB(Base):
     __tablename__ = 'routes'
     
     id = Column(String(50), primary_key=True)
-    session_id = Column(String(20), ForeignKey('sessions.session_id', ondelete='CASCADE'), nullable=False)
-    assigned_to_telegram_id = Column(BigInteger, ForeignKey('deliverers.telegram_id'), nullable=True)
+    session_id = Column(String(20), ForeignKey('sessions.session_id', ondelete='CASCADE'), nullable=False, index=True)
+    assigned_to_telegram_id = Column(BigInteger, ForeignKey('deliverers.telegram_id'), nullable=True, index=True)
     assigned_to_name = Column(String(100))
     color = Column(String(20))
     map_file = Column(String(200))
     
-    # JSON fields
-    optimized_order = Column(JSON, nullable=True)  # Lista de DeliveryPoints serializados
+    # Formato antigo (JSON com a rota inteira); rotas novas ficam NULL e usam route_stops
+    optimized_order = Column(JSON, nullable=True)
     delivered_packages = Column(JSON, default=list)
     
     # Relacionamentos
@@ -109,6 +125,43 @@ class PackageDB(Base):
     deliverer = relationship("DelivererDB", back_populates="packages")
 
 
+class RouteStopDB(Base):
+    """
+    Paradas normalizadas: uma linha por pacote da sessão.
+
+    point_seq = posição do pacote nos romaneios da sessão (em sequência);
+    route_id/seq = rota e posição na ordem otimizada (NULL = sem rota);
+    linha com seq NULL e status 'delivered' = entrega avulsa (pacote fora da ordem).
+    """
+    __tablename__ = 'route_stops'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(20), ForeignKey('sessions.session_id', ondelete='CASCADE'), nullable=False)
+    route_id = Column(String(50), nullable=True)
+    seq = Column(Integer, nullable=True)
+    point_seq = Column(Integer, nullable=True)
+    package_id = Column(String(100), nullable=False)
+    romaneio_id = Column(String(50))
+    address = Column(Text)
+    lat = Column(Float)
+    lng = Column(Float)
+    priority = Column(String(20), default='normal')
+    status = Column(String(20), nullable=False, default='pending')  # pending, delivered, failed
+    failure_reason = Column(String(200), nullable=True)
+    delivered_at = Column(DateTime, nullable=True)
+    delivery_seq = Column(Integer, nullable=True)  # ordem de entrega dentro da rota
+    
+    __table_args__ = (
+        # Próxima parada / progresso por rota: (sessão, rota, status) já ordenado por seq
+        Index('ix_route_stops_route_status', 'session_id', 'route_id', 'status', 'seq'),
+        Index('ix_route_stops_package', 'session_id', 'package_id'),
+        Index('ix_route_stops_point', 'session_id', 'point_seq'),
+    )
+    
+    # Relacionamentos
+    session = relationship("SessionDB", back_populates="stops")
+
+
 # ==================== TABELAS FINANCEIRAS ====================
 
 class DailyFinancialReportDB(Base):
@@ -124,6 +177,7 @@ class DailyFinancialReportDB(Base):
     total_packages = Column(Integer, nullable=False)
     total_deliveries = Column(Integer, nullable=False)
     deliverer_breakdown = Column(JSON)  # {nome: custo}
+    expenses = Column(JSON)  # [{type, value, desc}]
     created_at = Column(DateTime, default=datetime.now)
 
 
@@ -203,6 +257,24 @@ class BotConfigDB(Base):
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
 
+class SharedStateDB(Base):
+    """Estado compartilhado entre workers da API (ver state_backend): valor JSON + contador"""
+    __tablename__ = 'shared_state'
+
+    key = Column(String(200), primary_key=True)
+    value = Column(JSON, nullable=True)
+    counter = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class SharedStateMemberDB(Base):
+    """Conjuntos do estado compartilhado (ex.: pacotes já bipados na separação)"""
+    __tablename__ = 'shared_state_members'
+
+    key = Column(String(200), primary_key=True)
+    member = Column(String(200), primary_key=True)
+
+
 class PerformanceMetricDB(Base):
     """Tabela de métricas de performance"""
     __tablename__ = 'performance_metrics'
@@ -269,6 +341,31 @@ def generate_session_name(date: datetime, period: str) -> str:
 
 # ==================== DATABASE MANAGER ====================
 
+# Drivers async por ordem de preferência: (módulo, dialeto SQLAlchemy, connect_args)
+ASYNC_DRIVERS = {
+    'postgresql': (('asyncpg', 'postgresql+asyncpg', {'timeout': 10}),
+                   ('psycopg', 'postgresql+psycopg', {'connect_timeout': 10})),
+    'sqlite': (('aiosqlite', 'sqlite+aiosqlite', {}),),
+}
+
+
+def async_database_url(url: str):
+    """
+    postgresql://... → (URL com o driver async instalado, connect_args).
+    None quando não há driver async (asyncpg / psycopg 3 / aiosqlite).
+    """
+    scheme, _, rest = url.partition('://')
+    backend = scheme.split('+')[0]
+    if backend == 'postgres':
+        backend = 'postgresql'
+    for module, dialect, connect_args in ASYNC_DRIVERS.get(backend, ()):
+        if importlib.util.find_spec(module):
+            if module == 'asyncpg':
+                rest = rest.replace('sslmode=', 'ssl=')  # asyncpg não conhece sslmode
+            return f"{dialect}://{rest}", connect_args
+    return None
+
+
 class DatabaseManager:
     """Gerenciador de conexão com PostgreSQL"""
     
@@ -276,6 +373,8 @@ class DatabaseManager:
         self.database_url = os.getenv('DATABASE_URL', None)
         self.engine = None
         self.SessionLocal = None
+        self.async_engine = None       # Endpoints FastAPI (não bloqueia o event loop)
+        self.AsyncSessionLocal = None
         
         print("\n" + "="*50)
         print("🔍 INICIANDO CONEXÃO COM BANCO DE DADOS")
@@ -335,6 +434,38 @@ class DatabaseManager:
                                     print("🛠️ Schema fix: Coluna 'period' adicionada.")
                                 except Exception:
                                     pass # Ignora se já existe
+                                
+                                # Resumo das sessões (NULL = preenchido na primeira listagem) + seq do diário
+                                for column in ('total_packages', 'num_routes', 'delivered_count', 'journal_seq'):
+                                    try:
+                                        conn.execute(text(f"ALTER TABLE sessions ADD COLUMN {column} INTEGER"))
+                                        conn.commit()
+                                        print(f"🛠️ Schema fix: Coluna '{column}' adicionada.")
+                                    except Exception:
+                                        conn.rollback()  # Já existe
+
+                                try:
+                                    conn.execute(text("ALTER TABLE route_stops ADD COLUMN failure_reason VARCHAR(200)"))
+                                    conn.commit()
+                                    print("🛠️ Schema fix: Coluna 'failure_reason' adicionada.")
+                                except Exception:
+                                    conn.rollback()  # Já existe
+
+                                try:
+                                    conn.execute(text("ALTER TABLE daily_financial_reports ADD COLUMN expenses JSON"))
+                                    conn.commit()
+                                    print("🛠️ Schema fix: Coluna 'expenses' adicionada.")
+                                except Exception:
+                                    conn.rollback()  # Já existe
+
+                                # Índices de rotas (route_stops já nasce com os seus via create_all)
+                                for index, column in (('ix_routes_session_id', 'session_id'),
+                                                      ('ix_routes_assigned_to_telegram_id', 'assigned_to_telegram_id')):
+                                    try:
+                                        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON routes ({column})"))
+                                        conn.commit()
+                                    except Exception:
+                                        conn.rollback()
                         except Exception as e:
                             print(f"⚠️ Erro ao verificar schema: {e}")
                         # -----------------------------------
@@ -350,6 +481,8 @@ class DatabaseManager:
                             time.sleep(2)
                         else:
                             raise retry_error
+
+                self._init_async()
                 
             except Exception as e:
                 print(f"❌ ERRO ao conectar PostgreSQL: {e}")
@@ -369,10 +502,38 @@ class DatabaseManager:
         
         print("="*50 + "\n")
     
+    def _init_async(self):
+        """Engine async ao lado da sync, mesmo banco (sem driver async: fica só a sync)"""
+        found = async_database_url(self.database_url) if ASYNC_SQLALCHEMY else None
+        if not found:
+            print("ℹ️ Sem driver async (asyncpg/psycopg 3): endpoints usam a sessão sync numa thread")
+            return
+        url, connect_args = found
+        try:
+            self.async_engine = create_async_engine(
+                url,
+                pool_size=5,
+                max_overflow=10,
+                pool_pre_ping=True,
+                echo=False,
+                connect_args=connect_args
+            )
+            self.AsyncSessionLocal = async_sessionmaker(self.async_engine, expire_on_commit=False)
+            print(f"⚡ Engine async pronta ({self.async_engine.dialect.driver})")
+        except Exception as e:
+            print(f"⚠️ Engine async indisponível ({e}); endpoints usam a sessão sync numa thread")
+            self.async_engine = None
+            self.AsyncSessionLocal = None
+
     @property
     def is_connected(self) -> bool:
         """Verifica se está conectado ao PostgreSQL"""
         return self.engine is not None
+
+    @property
+    def is_async(self) -> bool:
+        """Engine async disponível (driver instalado e banco conectado)"""
+        return self.AsyncSessionLocal is not None
     
     @contextmanager
     def get_session(self):
@@ -390,6 +551,22 @@ class DatabaseManager:
         finally:
             session.close()
 
+    @asynccontextmanager
+    async def get_async_session(self):
+        """Context manager async (AsyncSession) - mesma semântica do get_session"""
+        if not self.is_async:
+            raise RuntimeError("Engine async não disponível")
+
+        session = self.AsyncSessionLocal()
+        try:
+            yield session
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise e
+        finally:
+            await session.close()
+
 
 # Singleton global
 db_manager = DatabaseManager()
@@ -402,4 +579,16 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """
+    Dependency async: AsyncSession por request.
+    None sem engine async - o chamador roda a sessão sync numa thread (AsyncSessionEngine).
+    """
+    if not db_manager.is_async:
+        yield None
+        return
+    async with db_manager.get_async_session() as session:
+        yield session
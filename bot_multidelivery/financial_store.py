@@ -0,0 +1,283 @@
+"""
+📒 RELATÓRIOS FINANCEIROS INDEXADOS POR DATA
+Um relatório por dia, consultado por intervalo sem abrir um arquivo por dia:
+
+    ReportLog              arquivo local append-only (<nome>.jsonl) + índice
+                           (<nome>.idx: "data,offset,tamanho"); o último
+                           registro de uma data vence. Datas ficam ordenadas
+                           em memória: intervalo = bisect + um seek por dia.
+    FinancialReportStore   DailyFinancialReport: tabela daily_financial_reports
+                           no PostgreSQL (principal) + ReportLog local (cópia e
+                           fallback). Intervalos e totais por mês = uma query.
+
+Os arquivos antigos (um .json por dia) são importados na primeira abertura.
+"""
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .serialization import load_file
+
+DateLike = Union[date, datetime, str]
+
+# Campos numéricos somados nos totais por mês
+TOTAL_FIELDS = ('revenue', 'delivery_costs', 'other_costs', 'net_profit', 'total_packages', 'total_deliveries')
+
+
+def _day(value: DateLike) -> str:
+    """'YYYY-MM-DD' de um date/datetime/ISO"""
+    if isinstance(value, str):
+        return value[:10]
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat()
+
+
+class ReportLog:
+    """Registros por data num arquivo append-only, com índice ordenado"""
+
+    def __init__(self, directory: Union[str, Path], name: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.log_file = self.directory / f"{name}.jsonl"
+        self.index_file = self.directory / f"{name}.idx"
+        self._lock = threading.Lock()
+        self._dates: List[str] = []                          # Ordenado
+        self._offsets: Dict[str, Tuple[int, int]] = {}       # data -> (offset, tamanho) do registro vigente
+        self._lines = 0                                      # Linhas no log (vigentes + substituídas)
+        self.created = not self.log_file.exists()  # Criado no primeiro put
+        self._load_index()
+
+    def _load_index(self):
+        size = self.log_file.stat().st_size if self.log_file.exists() else 0
+        entries = []
+        if self.index_file.exists():
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split(',')
+                    if len(parts) == 3:
+                        entries.append((parts[0], int(parts[1]), int(parts[2])))
+        covered = entries[-1][1] + entries[-1][2] if entries else 0
+        if covered != size:
+            entries = self._rebuild_index()
+
+        self._offsets = {day: (offset, length) for day, offset, length in entries}
+        self._dates = sorted(self._offsets)
+        self._lines = len(entries)
+
+    def _rebuild_index(self) -> List[Tuple[str, int, int]]:
+        """Refaz o .idx lendo o log (só quando ele ficou para trás)"""
+        entries = []
+        offset = 0
+        with open(self.log_file, 'ab+') as f:
+            f.seek(0)
+            for line in f:
+                try:
+                    entries.append((_day(json.loads(line)['date']), offset, len(line)))
+                except (ValueError, KeyError):
+                    pass
+                offset += len(line)
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            f.writelines(f"{day},{offset},{length}\n" for day, offset, length in entries)
+        return entries
+
+    def put(self, record: Dict):
+        """Grava (ou substitui) o registro da data record['date']"""
+        day = _day(record['date'])
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._lock:
+            with open(self.log_file, 'ab') as f:
+                offset = f.seek(0, 2)
+                f.write(line)
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(f"{day},{offset},{len(line)}\n")
+
+            if day not in self._offsets:
+                insort(self._dates, day)
+            self._offsets[day] = (offset, len(line))
+            self._lines += 1
+            if self._lines > 2 * len(self._dates) + 50:
+                self._compact()
+
+    def _compact(self):
+        """Reescreve só os registros vigentes (substituídos viram lixo no append)"""
+        records = list(self._read(self._dates))
+        tmp = self.log_file.with_suffix('.tmp')
+        offsets = {}
+        with open(tmp, 'wb') as f:
+            for day, record in zip(self._dates, records):
+                line = (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+                offsets[day] = (f.tell(), len(line))
+                f.write(line)
+        tmp.replace(self.log_file)
+        with open(self.index_file, 'w', encoding='utf-8') as f:
+            f.writelines(f"{day},{offset},{length}\n" for day, (offset, length) in offsets.items())
+        self._offsets = offsets
+        self._lines = len(offsets)
+
+    def _read(self, days: List[str]) -> Iterator[Dict]:
+        if not days:
+            return
+        with open(self.log_file, 'rb') as f:
+            for day in days:
+                offset, length = self._offsets[day]
+                f.seek(offset)
+                yield json.loads(f.read(length))
+
+    def get(self, day: DateLike) -> Optional[Dict]:
+        with self._lock:
+            day = _day(day)
+            return next(self._read([day]), None) if day in self._offsets else None
+
+    def dates(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[str]:
+        """Datas com registro no intervalo (inclusivo), em ordem"""
+        lo = bisect_left(self._dates, _day(start)) if start is not None else 0
+        hi = bisect_right(self._dates, _day(end)) if end is not None else len(self._dates)
+        return self._dates[lo:hi]
+
+    def range(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[Dict]:
+        """Registros do intervalo em ordem de data (lê só os que batem)"""
+        with self._lock:
+            return list(self._read(self.dates(start, end)))
+
+    def import_files(self, files: List[Path], kind: str) -> int:
+        """Importa arquivos antigos (um por dia) para o log"""
+        imported = 0
+        for path in sorted(files):
+            try:
+                self.put(load_file(path, kind))
+                imported += 1
+            except Exception as e:
+                print(f"⚠️ Relatório {path.name} ignorado na importação: {e}")
+        return imported
+
+
+def monthly_totals(records: List[Dict]) -> List[Dict]:
+    """Soma TOTAL_FIELDS por mês ('YYYY-MM'), em ordem"""
+    months: Dict[str, Dict] = {}
+    for record in records:
+        month = months.setdefault(record['date'][:7], {'month': record['date'][:7], 'days_with_data': 0,
+                                                       **{field: 0 for field in TOTAL_FIELDS}})
+        month['days_with_data'] += 1
+        for field in TOTAL_FIELDS:
+            month[field] += record.get(field) or 0
+    return [months[m] for m in sorted(months)]
+
+
+class FinancialReportStore:
+    """Relatórios financeiros diários (dicts de DailyFinancialReport) por data"""
+
+    COLUMNS = ('date', 'revenue', 'delivery_costs', 'other_costs', 'net_profit', 'total_packages',
+               'total_deliveries', 'deliverer_breakdown', 'expenses')
+
+    def __init__(self, data_dir: Union[str, Path], using_database: Optional[bool] = None):
+        self.local = ReportLog(data_dir, 'daily')
+        if using_database is None:
+            try:
+                from .database import db_manager
+                using_database = db_manager.is_connected
+            except Exception:
+                using_database = False
+        self.using_database = using_database
+
+        if self.local.created:
+            self._import_legacy(Path(data_dir) / 'daily')
+
+    def _import_legacy(self, daily_dir: Path):
+        """daily_YYYY-MM-DD.json -> log local (e banco, para os dias que faltarem lá)"""
+        files = list(daily_dir.glob('daily_*.json')) if daily_dir.exists() else []
+        if not files:
+            return
+        imported = self.local.import_files(files, 'financial_daily')
+        print(f"📒 {imported} relatórios diários importados para {self.local.log_file}")
+        if self.using_database:
+            try:
+                existing = set(self._db_dates())
+                for record in self.local.range():
+                    if record['date'] not in existing:
+                        self._db_put(record)
+            except Exception as e:
+                print(f"⚠️ Não foi possível importar relatórios para o banco: {e}")
+
+    # ==================== BANCO ====================
+
+    def _db_put(self, record: Dict):
+        from .database import db_manager, DailyFinancialReportDB
+        values = {column: record.get(column) for column in self.COLUMNS}
+        values['expenses'] = values['expenses'] or []
+        with db_manager.get_session() as session:
+            existing = session.query(DailyFinancialReportDB).filter_by(date=record['date']).first()
+            if existing:
+                for column, value in values.items():
+                    setattr(existing, column, value)
+            else:
+                session.add(DailyFinancialReportDB(**values))
+
+    def _db_query(self, start: Optional[str], end: Optional[str]) -> List[Dict]:
+        from .database import db_manager, DailyFinancialReportDB
+        with db_manager.get_session() as session:
+            query = session.query(*[getattr(DailyFinancialReportDB, c) for c in self.COLUMNS])
+            if start is not None:
+                query = query.filter(DailyFinancialReportDB.date >= start)
+            if end is not None:
+                query = query.filter(DailyFinancialReportDB.date <= end)
+            return [dict(row._asdict(), expenses=row.expenses or [])
+                    for row in query.order_by(DailyFinancialReportDB.date)]
+
+    def _db_dates(self) -> List[str]:
+        from .database import db_manager, DailyFinancialReportDB
+        with db_manager.get_session() as session:
+            return [row.date for row in session.query(DailyFinancialReportDB.date)]
+
+    def _db_monthly_totals(self, start: Optional[str], end: Optional[str]) -> List[Dict]:
+        from sqlalchemy import func
+        from .database import db_manager, DailyFinancialReportDB as R
+        month = func.substr(R.date, 1, 7)
+        with db_manager.get_session() as session:
+            query = session.query(month.label('month'), func.count(R.id).label('days_with_data'),
+                                  *[func.coalesce(func.sum(getattr(R, f)), 0).label(f) for f in TOTAL_FIELDS])
+            if start is not None:
+                query = query.filter(R.date >= start)
+            if end is not None:
+                query = query.filter(R.date <= end)
+            return [row._asdict() for row in query.group_by(month).order_by(month)]
+
+    # ==================== API ====================
+
+    def put(self, record: Dict):
+        """Grava o relatório do dia: log local sempre (cópia), banco quando conectado"""
+        self.local.put(record)
+        if self.using_database:
+            try:
+                self._db_put(record)
+            except Exception as e:
+                print(f"⚠️ Não foi possível salvar financeiro no banco de dados: {e}")
+
+    def get(self, day: DateLike) -> Optional[Dict]:
+        found = self.range(day, day)
+        return found[0] if found else None
+
+    def range(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[Dict]:
+        """Relatórios do intervalo (inclusivo) em ordem de data: uma query / um bisect"""
+        start = _day(start) if start is not None else None
+        end = _day(end) if end is not None else None
+        if self.using_database:
+            try:
+                return self._db_query(start, end)
+            except Exception as e:
+                print(f"⚠️ Erro ao consultar relatórios no banco ({e}); usando cópia local")
+        return self.local.range(start, end)
+
+    def monthly_totals(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[Dict]:
+        """Totais por mês do intervalo: um GROUP BY no banco, uma passada no log local"""
+        start = _day(start) if start is not None else None
+        end = _day(end) if end is not None else None
+        if self.using_database:
+            try:
+                return self._db_monthly_totals(start, end)
+            except Exception as e:
+                print(f"⚠️ Erro ao somar relatórios no banco ({e}); usando cópia local")
+        return monthly_totals(self.local.range(start, end))
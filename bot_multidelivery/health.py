@@ -6,6 +6,7 @@ Monitora: Banco de Dados, Disco, Variáveis de Ambiente e Frontend.
 """
 import os
 import shutil
+import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
@@ -28,6 +29,10 @@ class HealthStatus(BaseModel):
     environment: str
     checks: Dict[str, Any]
 
+def _ping_database():
+    with db_manager.get_session() as session:
+        session.execute(text("SELECT 1"))
+
 @router.get("/health", response_model=HealthStatus)
 @router.get("/api/health", response_model=HealthStatus)
 async def health_check(response: Response):
@@ -40,9 +45,12 @@ async def health_check(response: Response):
 
     # 1. 💾 Checar Banco de Dados
     try:
+        if db_manager.is_async:
+            async with db_manager.get_async_session() as session:
+                await session.execute(text("SELECT 1"))
+        elif db_manager.is_connected:
+            await asyncio.to_thread(_ping_database)  # Sem driver async: não segura o event loop
         if db_manager.is_connected:
-            with db_manager.get_session() as session:
-                session.execute(text("SELECT 1"))
             checks["database"] = {"status": "ok", "type": "postgres" if "postgres" in str(db_manager.engine.url) else "sqlite"}
         else:
             checks["database"] = {"status": "warning", "detail": "Using fallback/disconnected"}
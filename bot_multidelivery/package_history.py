@@ -0,0 +1,230 @@
+"""
+📦 HISTÓRICO DE PACOTES - Particionado por dia, com índice lateral
+Cada dia vira um arquivo próprio; consultar um dia só abre aquele dia e
+agregações do histórico inteiro passam linha a linha (memória constante).
+
+Arquivos (data/packages/):
+    YYYY-MM-DD.jsonl  um pacote por linha, na ordem em que foi salvo
+    YYYY-MM-DD.idx    índice do dia: "offset,tamanho,entregador,status" por pacote
+
+Status no índice e nos filtros normalizados pelo nome do PackageStatus
+('entregue' -> 'delivered', 'em_transito' -> 'in_transit'), os mesmos dos contadores.
+
+O índice permite pular direto para os pacotes de um entregador (seek no
+offset) ou de um status sem decodificar o resto do dia. Se o .idx ficar para
+trás (queda entre as duas escritas), é refeito a partir do .jsonl.
+
+O packages.jsonl antigo (arquivo único) é dividido nos dias na primeira abertura.
+"""
+import json
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .models import PackageStatus
+
+DateLike = Union[date, datetime, str]
+
+# (offset, tamanho, entregador, status) de cada linha do dia; entregador como texto (assigned_to é str ou int)
+IndexEntry = Tuple[int, int, str, str]
+
+_STATUS_NAMES = {s.value: s.name.lower() for s in PackageStatus}
+
+
+def normalize_status(status: Optional[str]) -> str:
+    """Nome do status em inglês ('entregue' -> 'delivered'); valores já em inglês passam direto"""
+    return _STATUS_NAMES.get(status, status or '')
+
+
+def _day(value: DateLike) -> str:
+    """'YYYY-MM-DD' de um date/datetime/ISO"""
+    if isinstance(value, str):
+        return value[:10]
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat()
+
+
+class PackageHistory:
+    """Histórico append-only de pacotes, um arquivo por dia"""
+
+    def __init__(self, history_dir: Union[str, Path], legacy_file: Optional[Path] = None):
+        self.history_dir = Path(history_dir)
+        self.history_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[IndexEntry]] = {}  # Índices de dia já lidos
+        self._sizes: Dict[str, int] = {}               # Tamanho do .jsonl coberto pelo índice em cache
+        self.listeners: List[Callable[[str, int, int, Dict], None]] = []  # (dia, offset, tamanho, pacote)
+
+        if legacy_file is not None and Path(legacy_file).exists():
+            self._migrate_legacy(Path(legacy_file))
+
+    def _data_file(self, day: str) -> Path:
+        return self.history_dir / f"{day}.jsonl"
+
+    def _index_file(self, day: str) -> Path:
+        return self.history_dir / f"{day}.idx"
+
+    # ==================== ESCRITA ====================
+
+    def append(self, record: Dict) -> Dict:
+        """Grava um pacote no arquivo do dia do seu 'timestamp' (preenchido se faltar)"""
+        record.setdefault('timestamp', datetime.now().isoformat())
+        day = _day(record['timestamp'])
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+
+        with self._lock:
+            with open(self._data_file(day), 'ab') as f:
+                offset = os.fstat(f.fileno()).st_size
+                f.write(line)
+            entry = self._entry(offset, len(line), record)
+            with open(self._index_file(day), 'a', encoding='utf-8') as f:
+                f.write(self._format_entry(entry))
+
+            if day in self._index and self._sizes.get(day) == offset:
+                self._index[day].append(entry)
+                self._sizes[day] = offset + len(line)
+            else:
+                self._index.pop(day, None)  # Outro processo escreveu: relê na próxima consulta
+
+            for listener in self.listeners:
+                try:
+                    listener(day, offset, len(line), record)
+                except Exception as e:
+                    print(f"⚠️ Erro ao notificar gravação de pacote: {e}")
+        return record
+
+    @staticmethod
+    def _entry(offset: int, length: int, record: Dict) -> IndexEntry:
+        deliverer_id = record.get('assigned_to')
+        return (offset, length, '' if deliverer_id is None else str(deliverer_id),
+                normalize_status(record.get('status')))
+
+    @staticmethod
+    def _format_entry(entry: IndexEntry) -> str:
+        return ','.join(str(part) for part in entry) + '\n'
+
+    def _migrate_legacy(self, legacy_file: Path):
+        """Divide o packages.jsonl antigo em arquivos por dia (uma passada, sem carregar tudo)"""
+        migrated = 0
+        with open(legacy_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('timestamp'):
+                    self.append(record)
+                    migrated += 1
+        legacy_file.rename(legacy_file.with_name(legacy_file.name + '.migrated'))
+        print(f"📦 {migrated} pacotes do {legacy_file.name} divididos por dia em {self.history_dir}")
+
+    # ==================== ÍNDICE ====================
+
+    def days(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[str]:
+        """Dias com histórico no intervalo (inclusivo), em ordem"""
+        first = _day(start) if start is not None else None
+        last = _day(end) if end is not None else None
+        return [day for day in sorted(p.stem for p in self.history_dir.glob("*.jsonl"))
+                if (first is None or day >= first) and (last is None or day <= last)]
+
+    def day_index(self, day: DateLike) -> List[IndexEntry]:
+        """Entradas do índice de um dia (refaz o .idx se ele não cobre o .jsonl inteiro)"""
+        day = _day(day)
+        data_file = self._data_file(day)
+        if not data_file.exists():
+            return []
+        size = data_file.stat().st_size
+
+        with self._lock:
+            if self._sizes.get(day) == size and day in self._index:
+                return self._index[day]
+
+            entries = self._read_index(day)
+            covered = entries[-1][0] + entries[-1][1] if entries else 0
+            if covered != size:
+                entries = self._rebuild_index(day)
+            self._index[day] = entries
+            self._sizes[day] = size
+            return entries
+
+    def _read_index(self, day: str) -> List[IndexEntry]:
+        entries = []
+        index_file = self._index_file(day)
+        if not index_file.exists():
+            return entries
+        with open(index_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split(',')
+                if len(parts) != 4:
+                    continue  # Linha truncada
+                offset, length, deliverer_id, status = parts
+                entries.append((int(offset), int(length), deliverer_id, normalize_status(status)))  # .idx antigo: valor cru
+        return entries
+
+    def _rebuild_index(self, day: str) -> List[IndexEntry]:
+        """Refaz o índice do dia lendo o .jsonl (só quando o .idx ficou para trás)"""
+        entries = []
+        offset = 0
+        with open(self._data_file(day), 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    entries.append(self._entry(offset, len(line), record))
+                except ValueError:
+                    pass
+                offset += len(line)
+        with open(self._index_file(day), 'w', encoding='utf-8') as f:
+            f.writelines(self._format_entry(entry) for entry in entries)
+        return entries
+
+    def count(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+              deliverer_id: Optional[int] = None, status: Optional[str] = None) -> int:
+        """Quantos pacotes batem com os filtros, só pelos índices (sem abrir os .jsonl)"""
+        status = normalize_status(status) if status is not None else None
+        return sum(1 for day in self.days(start, end)
+                   for entry in self.day_index(day) if self._matches(entry, deliverer_id, status))
+
+    @staticmethod
+    def _matches(entry: IndexEntry, deliverer_id: Optional[int], status: Optional[str]) -> bool:
+        return (deliverer_id is None or entry[2] == str(deliverer_id)) and (status is None or entry[3] == status)
+
+    # ==================== LEITURA ====================
+
+    def iter_packages(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+                      deliverer_id: Optional[int] = None, status: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Percorre o histórico em ordem cronológica, um pacote por vez.
+
+        Args:
+            start, end: Intervalo de dias (inclusivo); None = sem limite
+            deliverer_id: Só pacotes atribuídos a este entregador
+            status: Só pacotes com este status ('delivered' ou 'entregue', 'in_transit'...)
+        """
+        status = normalize_status(status) if status is not None else None
+        for day in self.days(start, end):
+            if deliverer_id is None and status is None:
+                yield from self._stream_day(day)
+                continue
+
+            # Filtro pelo índice: lê só as linhas que batem (seek + read)
+            wanted = [entry for entry in self.day_index(day) if self._matches(entry, deliverer_id, status)]
+            if not wanted:
+                continue
+            with open(self._data_file(day), 'rb') as f:
+                for offset, length, _, _ in wanted:
+                    f.seek(offset)
+                    try:
+                        yield json.loads(f.read(length))
+                    except ValueError:
+                        continue
+
+    def _stream_day(self, day: str) -> Iterator[Dict]:
+        with open(self._data_file(day), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Linha truncada (queda no meio do append)
@@ -0,0 +1,186 @@
+"""
+📊 CONTADORES DO HISTÓRICO DE PACOTES - Agregação incremental
+Contagens por status, por entregador e por dia, atualizadas a cada pacote
+salvo. Dashboard, gamificação e IA consultam aqui em O(1) em vez de
+percorrer o histórico a cada requisição.
+
+Cada dia do histórico tem um "até onde já contei" (bytes do .jsonl). Na
+abertura, e antes de cada consulta para o dia de hoje, só o que foi gravado
+depois disso é lido (queda antes de gravar os contadores, outros workers).
+recompute() refaz tudo numa passada só pelo histórico.
+
+Status normalizados pelo nome do PackageStatus ('entregue' -> 'delivered',
+'em_transito' -> 'in_transit'); valores que já vêm em inglês passam direto.
+"""
+import json
+import os
+import threading
+from collections import deque
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from .package_history import PackageHistory, normalize_status
+from .serialization import dump_file, load_file
+
+SAVE_EVERY = int(os.getenv('PACKAGE_STATS_SAVE_EVERY', '100'))  # Pacotes entre gravações do stats.json
+RECENT_DELIVERIES = 50  # Últimas entregas com tempo guardadas (avaliação da IA)
+
+class PackageStats:
+    """Contadores do histórico de pacotes, mantidos junto com o PackageHistory"""
+
+    def __init__(self, history: PackageHistory, save_every: int = SAVE_EVERY):
+        self.history = history
+        self.stats_file = history.history_dir / "stats.json"
+        self.save_every = max(1, save_every)
+        self._lock = threading.RLock()
+        self._unsaved = 0
+        self._reset()
+
+        if self.stats_file.exists():
+            try:
+                self._restore(load_file(self.stats_file, 'package_stats'))
+            except Exception as e:
+                print(f"⚠️ stats.json ilegível ({e}); recontando o histórico")
+                self._reset()
+        self._catch_up(history.days())
+        history.listeners.append(self._on_append)
+
+    def _reset(self):
+        self.by_status: Dict[str, int] = {}
+        self.by_day: Dict[str, Dict[str, int]] = {}                 # dia -> status -> n
+        self.by_deliverer: Dict[str, Dict[str, int]] = {}           # entregador -> status -> n
+        self.delivered_dates: Dict[str, Dict[str, int]] = {}        # entregador -> dia da entrega -> n
+        self.timed_deliveries = 0                                   # Entregues com delivery_time_minutes
+        self.recent_deliveries = deque(maxlen=RECENT_DELIVERIES)
+        self.covered: Dict[str, int] = {}                           # dia -> bytes do .jsonl já contados
+
+    def _restore(self, data: Dict):
+        self.by_status = data['by_status']
+        self.by_day = data['by_day']
+        self.by_deliverer = data['by_deliverer']
+        self.delivered_dates = data['delivered_dates']
+        self.timed_deliveries = data['timed_deliveries']
+        self.recent_deliveries.extend(data['recent_deliveries'])
+        self.covered = data['covered']
+
+    def save(self):
+        """Grava os contadores (o que ficar de fora é relido do histórico na próxima abertura)"""
+        with self._lock:
+            data = {
+                'by_status': self.by_status,
+                'by_day': self.by_day,
+                'by_deliverer': self.by_deliverer,
+                'delivered_dates': self.delivered_dates,
+                'timed_deliveries': self.timed_deliveries,
+                'recent_deliveries': list(self.recent_deliveries),
+                'covered': self.covered,
+            }
+            dump_file(self.stats_file, data, 'package_stats')
+            self._unsaved = 0
+
+    # ==================== ATUALIZAÇÃO ====================
+
+    def _add(self, day: str, record: Dict):
+        status = normalize_status(record.get('status'))
+        deliverer = record.get('assigned_to')
+        deliverer = None if deliverer is None else str(deliverer)
+
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        per_day = self.by_day.setdefault(day, {})
+        per_day[status] = per_day.get(status, 0) + 1
+        if deliverer is not None:
+            per_deliverer = self.by_deliverer.setdefault(deliverer, {})
+            per_deliverer[status] = per_deliverer.get(status, 0) + 1
+
+        if status == 'delivered':
+            if deliverer is not None and record.get('delivered_at'):
+                dates = self.delivered_dates.setdefault(deliverer, {})
+                delivered_day = record['delivered_at'][:10]
+                dates[delivered_day] = dates.get(delivered_day, 0) + 1
+            if record.get('delivery_time_minutes'):
+                self.timed_deliveries += 1
+                self.recent_deliveries.append(record)
+
+    def _on_append(self, day: str, offset: int, length: int, record: Dict):
+        """Chamado pelo PackageHistory a cada pacote gravado"""
+        with self._lock:
+            covered = self.covered.get(day, 0)
+            if offset + length <= covered:
+                return  # Já contado por um _catch_up
+            if offset != covered:
+                self._catch_up([day])  # Buraco: outro processo gravou antes
+            else:
+                self._add(day, record)
+                self.covered[day] = offset + length
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self.save()
+
+    def _catch_up(self, days: List[str]):
+        """Conta o que foi gravado nos dias depois do último byte já contado"""
+        with self._lock:
+            for day in days:
+                path = self.history._data_file(day)
+                if not path.exists():
+                    continue
+                covered = self.covered.get(day, 0)
+                if path.stat().st_size <= covered:
+                    continue
+                with open(path, 'rb') as f:
+                    f.seek(covered)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # Append ainda em andamento: fica para a próxima
+                        covered += len(line)
+                        try:
+                            self._add(day, json.loads(line))
+                        except ValueError:
+                            continue
+                self.covered[day] = covered
+
+    def recompute(self):
+        """Refaz todos os contadores numa passada só pelo histórico (memória constante)"""
+        with self._lock:
+            self._reset()
+            self._catch_up(self.history.days())
+            self.save()
+
+    def refresh(self):
+        """Pega o que outros processos gravaram hoje (um stat por consulta)"""
+        self._catch_up([date.today().isoformat()])
+
+    # ==================== CONSULTAS ====================
+
+    def count(self, status: Optional[str] = None, deliverer_id=None, day=None) -> int:
+        """Quantidade de pacotes (filtros opcionais: status, entregador ou dia)"""
+        self.refresh()
+        if deliverer_id is not None:
+            counts = self.by_deliverer.get(str(deliverer_id), {})
+        elif day is not None:
+            counts = self.by_day.get(day if isinstance(day, str) else day.isoformat()[:10], {})
+        else:
+            counts = self.by_status
+        if status is None:
+            return sum(counts.values())
+        return counts.get(normalize_status(status), 0)
+
+    def timed_count(self) -> int:
+        """Entregas com tempo registrado no histórico inteiro (base de treino da IA)"""
+        self.refresh()
+        return self.timed_deliveries
+
+    def streak(self, deliverer_id, today: Optional[date] = None) -> int:
+        """Dias consecutivos (até hoje) com pelo menos uma entrega"""
+        self.refresh()
+        dates = self.delivered_dates.get(str(deliverer_id), {})
+        current = today or date.today()
+        streak = 0
+        while current.isoformat() in dates:
+            streak += 1
+            current -= timedelta(days=1)
+        return streak
+
+    def last_deliveries(self) -> List[Dict]:
+        """Últimas entregas com tempo registrado (até RECENT_DELIVERIES)"""
+        self.refresh()
+        return list(self.recent_deliveries)
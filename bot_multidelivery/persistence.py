@@ -3,12 +3,18 @@
 Armazena dados em PostgreSQL (quando disponível) ou arquivos JSON/JSONL
 """
 
+import copy
 import json
 import os
+import threading
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict
 from pathlib import Path
 from .models import Package, Deliverer, FinancialReport, PerformanceMetrics, PaymentRecord
+from .financial_store import ReportLog
+from .package_history import PackageHistory
+from .package_stats import PackageStats
+from .serialization import dump_file, load_file
 
 try:
     from .database import db_manager, DelivererDB, RouteDB, PackageDB
@@ -17,127 +23,249 @@ except Exception as e:
     print(f"⚠️ Database import failed: {e}")
     HAS_DATABASE = False
 
+DELIVERERS_VERSION_KEY = 'deliverers:version'  # Contador no estado compartilhado (vários workers)
+DELIVERERS_COMPACT_EVERY = int(os.getenv('DELIVERERS_COMPACT_EVERY', '200'))  # Linhas do log até consolidar
+
+DELIVERER_FIELDS = ('name', 'is_partner', 'max_capacity', 'cost_per_package', 'is_active', 'total_deliveries',
+                    'total_earnings', 'success_rate', 'average_delivery_time', 'joined_date')
+STAT_FIELDS = ('total_deliveries', 'total_earnings', 'success_rate', 'average_delivery_time')
+
+
+def _deliverer_to_dict(d: Deliverer) -> Dict:
+    return {
+        'telegram_id': d.telegram_id,
+        'name': d.name,
+        'is_partner': d.is_partner,
+        'max_capacity': d.max_capacity,
+        'cost_per_package': d.cost_per_package,
+        'is_active': d.is_active,
+        'total_deliveries': d.total_deliveries,
+        'total_earnings': d.total_earnings,
+        'success_rate': d.success_rate,
+        'average_delivery_time': d.average_delivery_time,
+        'joined_date': d.joined_date.isoformat()
+    }
+
+
+def _deliverer_from_dict(d: Dict) -> Deliverer:
+    """Registro do JSON/log ou linha do banco (joined_date como datetime ou ISO)"""
+    joined = d.get('joined_date') or datetime.now()
+    return Deliverer(
+        telegram_id=d['telegram_id'],
+        name=d['name'],
+        is_partner=d.get('is_partner', False),
+        max_capacity=d.get('max_capacity', 50),
+        cost_per_package=d.get('cost_per_package', 1.0),
+        is_active=d.get('is_active', True),
+        total_deliveries=d.get('total_deliveries', 0),
+        total_earnings=d.get('total_earnings', 0.0),
+        success_rate=d.get('success_rate', 100.0),
+        average_delivery_time=d.get('average_delivery_time', 0.0),
+        joined_date=joined if isinstance(joined, datetime) else datetime.fromisoformat(joined)
+    )
+
+
+def _apply_increment(d: Deliverer, delivered: int, failed: int, earnings: float, time: Optional[float]):
+    """Mesma conta do UPDATE de _increment_values, em memória (JSON)"""
+    total = d.total_deliveries + delivered
+    d.total_earnings += earnings
+    if delivered or failed:
+        d.success_rate = total * 100.0 / (total + failed)
+    if time is not None:
+        if d.average_delivery_time == 0:
+            d.average_delivery_time = time
+        elif total > 0:
+            d.average_delivery_time = (d.average_delivery_time * (total - 1) + time) / total
+    d.total_deliveries = total
+
+
+def _increment_values(delivered: int, failed: int, earnings: float, time: Optional[float]) -> Dict:
+    """SET relativo à própria linha: total_deliveries = total_deliveries + N etc."""
+    from sqlalchemy import case
+    c = DelivererDB.__table__.c
+    total = c.total_deliveries + delivered
+    values = {'total_deliveries': total, 'total_earnings': c.total_earnings + earnings}
+    if delivered or failed:
+        values['success_rate'] = total * 100.0 / (total + failed)
+    if time is not None:
+        values['average_delivery_time'] = case(
+            (c.average_delivery_time == 0, time),
+            (total > 0, (c.average_delivery_time * (total - 1) + time) / total),
+            else_=c.average_delivery_time
+        )
+    return values
+
 
 class DataStore:
     """Gerenciador de persistência de dados"""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", state=None):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
         # Diretórios específicos
         self.deliverers_file = self.data_dir / "deliverers.json"
-        self.packages_file = self.data_dir / "packages.jsonl"
+        self.deliverers_log = self.data_dir / "deliverers.log.jsonl"  # Alterações desde o último snapshot
+        self.packages_file = self.data_dir / "packages.jsonl"  # Legado: migrado para packages/ por dia
         self.reports_dir = self.data_dir / "reports"
         self.payments_dir = self.data_dir / "payments"
         
         self.reports_dir.mkdir(exist_ok=True)
         self.payments_dir.mkdir(exist_ok=True)
+        # Relatórios por data num log indexado (financial_*.json antigos importados na primeira vez)
+        self.financial_reports = ReportLog(self.reports_dir, 'financial')
+        if self.financial_reports.created:
+            self.financial_reports.import_files(list(self.reports_dir.glob("financial_*.json")), 'financial_report')
+        self.package_history = PackageHistory(self.data_dir / "packages", legacy_file=self.packages_file)
+        self.package_stats = PackageStats(self.package_history)  # Contadores O(1) para dashboard/ranking/IA
         
         # Indica se está usando database ou JSON
         self.using_database = HAS_DATABASE
-        if self.using_database:
-            print("\n" + "="*50)
-            print("✅ DataStore usando PostgreSQL")
-            print("💾 Entregadores serão salvos permanentemente")
-            print("="*50 + "\n")
-        else:
-            print("\n" + "="*50)
-            print("📁 DataStore usando JSON local")
-            print("⚠️ Dados em data/deliverers.json (temporário)")
-            print("="*50 + "\n")
+        print(f"💾 DataStore: {'PostgreSQL' if self.using_database else f'JSON local ({self.deliverers_file})'}")
+        
+        # Registro de entregadores em memória (telegram_id -> Deliverer), carregado uma vez.
+        # Toda escrita passa por ele (write-through) e incrementa registry_version.
+        self._state = state
+        self._registry: Optional[Dict[int, Deliverer]] = None
+        self._registry_lock = threading.RLock()
+        self._seen_version = 0  # Contador compartilhado visto na última carga/escrita
+        self.registry_version = 0
+        self._log_lines: Optional[int] = None
     
     # ==================== ENTREGADORES ====================
     
+    def _shared_state(self):
+        """Backend compartilhado entre workers, ou None em processo único"""
+        state = self._state
+        if state is None:
+            from .state_backend import get_state_backend
+            state = get_state_backend()
+        return state if state.shared else None
+    
+    def _deliverer_registry(self) -> Dict[int, Deliverer]:
+        """Registro em memória; recarrega só se invalidado ou alterado por outro worker"""
+        with self._registry_lock:
+            state = self._shared_state()
+            if self._registry is not None and (state is None or state.counter(DELIVERERS_VERSION_KEY) == self._seen_version):
+                return self._registry
+            
+            # Versão lida antes da carga: escrita no meio é detectada na próxima consulta
+            version = state.counter(DELIVERERS_VERSION_KEY) if state is not None else 0
+            self._registry = {d.telegram_id: d for d in self._read_deliverers()}
+            self._seen_version = version
+            self.registry_version += 1
+            return self._registry
+    
+    def _commit_deliverers(self, changed: List[Deliverer] = (), removed: List[int] = (), replace: bool = False):
+        """Aplica no registro o que acabou de ser gravado e avisa os outros workers"""
+        with self._registry_lock:
+            if self._registry is not None:
+                if replace:
+                    self._registry = {}
+                for d in changed:
+                    self._registry[d.telegram_id] = copy.copy(d)
+                for telegram_id in removed:
+                    self._registry.pop(telegram_id, None)
+            self.registry_version += 1
+            
+            state = self._shared_state()
+            if state is not None:
+                version = state.incr(DELIVERERS_VERSION_KEY)
+                if version != self._seen_version + 1:
+                    self._registry = None  # Outro worker também gravou: recarrega na próxima consulta
+                self._seen_version = version
+    
+    def invalidate_deliverers(self):
+        """Descarta o registro em memória (próxima consulta relê do banco/JSON)"""
+        with self._registry_lock:
+            self._registry = None
+    
     def save_deliverers(self, deliverers: List[Deliverer]):
-        """Salva lista de entregadores"""
-        if self.using_database:
-            # Salva no PostgreSQL
-            try:
-                print(f"💾 Salvando {len(deliverers)} entregadores no PostgreSQL...")
-                with db_manager.get_session() as session:
-                    saved_count = 0
-                    updated_count = 0
-                    for d in deliverers:
-                        deliverer_db = session.query(DelivererDB).filter_by(telegram_id=d.telegram_id).first()
-                        if deliverer_db:
-                            # Atualiza existente
-                            deliverer_db.name = d.name
-                            deliverer_db.is_partner = d.is_partner
-                            deliverer_db.max_capacity = d.max_capacity
-                            deliverer_db.cost_per_package = d.cost_per_package
-                            deliverer_db.is_active = d.is_active
-                            deliverer_db.total_deliveries = d.total_deliveries
-                            deliverer_db.total_earnings = d.total_earnings
-                            deliverer_db.success_rate = d.success_rate
-                            deliverer_db.average_delivery_time = d.average_delivery_time
-                            updated_count += 1
-                        else:
-                            # Cria novo
-                            deliverer_db = DelivererDB(
-                                telegram_id=d.telegram_id,
-                                name=d.name,
-                                is_partner=d.is_partner,
-                                max_capacity=d.max_capacity,
-                                cost_per_package=d.cost_per_package,
-                                is_active=d.is_active,
-                                total_deliveries=d.total_deliveries,
-                                total_earnings=d.total_earnings,
-                                success_rate=d.success_rate,
-                                average_delivery_time=d.average_delivery_time,
-                                joined_date=d.joined_date
-                            )
-                            session.add(deliverer_db)
-                            saved_count += 1
-                    print(f"✅ PostgreSQL: {saved_count} novos, {updated_count} atualizados")
+        """Salva lista de entregadores (no JSON, a lista vira o cadastro inteiro)"""
+        with self._registry_lock:
+            if self.using_database and self._db_upsert(deliverers):
+                self._commit_deliverers(deliverers)
                 return
-            except Exception as e:
-                print(f"❌ Erro ao salvar no PostgreSQL: {e}")
-                import traceback
-                traceback.print_exc()
-                print("📁 Usando fallback JSON")
+            
+            # Fallback: JSON
+            self._write_snapshot([_deliverer_to_dict(d) for d in deliverers])
+            self._commit_deliverers(deliverers, replace=True)
+    
+    def _db_upsert(self, deliverers: List[Deliverer]) -> bool:
+        """INSERT ... ON CONFLICT DO UPDATE num comando só (joined_date é preservado)"""
+        if not deliverers:
+            return True
+        try:
+            rows = [{'telegram_id': d.telegram_id, **{f: getattr(d, f) for f in DELIVERER_FIELDS}}
+                    for d in deliverers]
+            dialect = db_manager.engine.dialect.name
+            with db_manager.get_session() as session:
+                if dialect in ('postgresql', 'sqlite'):
+                    if dialect == 'postgresql':
+                        from sqlalchemy.dialects.postgresql import insert
+                    else:
+                        from sqlalchemy.dialects.sqlite import insert
+                    stmt = insert(DelivererDB.__table__).values(rows)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['telegram_id'],
+                        set_={f: stmt.excluded[f] for f in DELIVERER_FIELDS if f != 'joined_date'}
+                    )
+                    session.execute(stmt)
+                else:
+                    for row in rows:
+                        session.merge(DelivererDB(**row))
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao salvar no PostgreSQL: {e}")
+            import traceback
+            traceback.print_exc()
+            print("📁 Usando fallback JSON")
+            return False
+    
+    def _db_update(self, telegram_id: int, values: Dict) -> Optional[Deliverer]:
+        """UPDATE de uma linha só; devolve o entregador como ficou (None = não existe)"""
+        from sqlalchemy import update
+        table = DelivererDB.__table__
+        stmt = update(table).where(table.c.telegram_id == telegram_id).values(**values).returning(*table.c)
+        with db_manager.get_session() as session:
+            row = session.execute(stmt).first()
+        return _deliverer_from_dict(row._asdict()) if row else None
+    
+    def _write_snapshot(self, records: List[Dict]):
+        """Grava o deliverers.json completo e zera o log de alterações"""
+        dump_file(self.deliverers_file, records, 'deliverers')
+        if self.deliverers_log.exists():
+            self.deliverers_log.unlink()
+        self._log_lines = 0
+    
+    def _append_log(self, entry: Dict):
+        """Uma linha no log (O(1)); consolida no snapshot a cada DELIVERERS_COMPACT_EVERY linhas"""
+        with open(self.deliverers_log, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
         
-        # Fallback: JSON
-        data = [{
-            'telegram_id': d.telegram_id,
-            'name': d.name,
-            'is_partner': d.is_partner,
-            'max_capacity': d.max_capacity,
-            'cost_per_package': d.cost_per_package,
-            'is_active': d.is_active,
-            'total_deliveries': d.total_deliveries,
-            'total_earnings': d.total_earnings,
-            'success_rate': d.success_rate,
-            'average_delivery_time': d.average_delivery_time,
-            'joined_date': d.joined_date.isoformat()
-        } for d in deliverers]
+        if self._log_lines is None:
+            with open(self.deliverers_log, 'r', encoding='utf-8') as f:
+                self._log_lines = sum(1 for _ in f)
+        else:
+            self._log_lines += 1
         
-        with open(self.deliverers_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        if self._log_lines >= DELIVERERS_COMPACT_EVERY:
+            self._write_snapshot(list(self._read_json_records().values()))
     
     def load_deliverers(self) -> List[Deliverer]:
-        """Carrega lista de entregadores"""
+        """Carrega lista de entregadores (cópias do registro em memória)"""
+        return [copy.copy(d) for d in self._deliverer_registry().values()]
+    
+    def _read_deliverers(self) -> List[Deliverer]:
+        """Lê todos os entregadores do banco ou do JSON (só na carga do registro)"""
         if self.using_database:
             # Carrega do PostgreSQL
             try:
-                print("📂 Carregando entregadores do PostgreSQL...")
                 with db_manager.get_session() as session:
-                    deliverers_db = session.query(DelivererDB).all()
-                    deliverers = [Deliverer(
-                        telegram_id=d.telegram_id,
-                        name=d.name,
-                        is_partner=d.is_partner,
-                        max_capacity=d.max_capacity,
-                        cost_per_package=d.cost_per_package,
-                        is_active=d.is_active,
-                        total_deliveries=d.total_deliveries,
-                        total_earnings=d.total_earnings,
-                        success_rate=d.success_rate,
-                        average_delivery_time=d.average_delivery_time,
-                        joined_date=d.joined_date
-                    ) for d in deliverers_db]
-                    print(f"✅ {len(deliverers)} entregadores carregados do PostgreSQL")
-                    return deliverers
+                    rows = session.execute(DelivererDB.__table__.select()).all()
+                deliverers = [_deliverer_from_dict(row._asdict()) for row in rows]
+                print(f"📂 {len(deliverers)} entregadores carregados do PostgreSQL")
+                return deliverers
             except Exception as e:
                 print(f"❌ Erro ao carregar do PostgreSQL: {e}")
                 import traceback
@@ -145,88 +273,162 @@ class DataStore:
                 print("📁 Usando fallback JSON")
         
         # Fallback: JSON
-        if not self.deliverers_file.exists():
-            return []
-        
-        with open(self.deliverers_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        return [_deliverer_from_dict(d) for d in self._read_json_records().values()]
+    
+    def _read_json_records(self) -> Dict[int, Dict]:
+        """Snapshot (deliverers.json) + log de alterações (deliverers.log.jsonl) aplicado por cima"""
+        records = {}
+        if self.deliverers_file.exists():
+            records = {d['telegram_id']: d for d in load_file(self.deliverers_file, 'deliverers')}
         
-        return [Deliverer(
-            telegram_id=d['telegram_id'],
-            name=d['name'],
-            is_partner=d['is_partner'],
-            max_capacity=d.get('max_capacity', 50),
-            cost_per_package=d.get('cost_per_package', 1.0),
-            is_active=d.get('is_active', True),
-            total_deliveries=d.get('total_deliveries', 0),
-            total_earnings=d.get('total_earnings', 0.0),
-            success_rate=d.get('success_rate', 100.0),
-            average_delivery_time=d.get('average_delivery_time', 0.0),
-            joined_date=datetime.fromisoformat(d.get('joined_date', datetime.now().isoformat()))
-        ) for d in data]
+        lines = 0
+        if self.deliverers_log.exists():
+            with open(self.deliverers_log, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Linha cortada por queda no meio da escrita
+                    
+                    telegram_id = entry['telegram_id']
+                    if entry['op'] == 'upsert':
+                        records[telegram_id] = {**records.get(telegram_id, {}), **entry['fields']}
+                    elif entry['op'] == 'update' and telegram_id in records:
+                        records[telegram_id].update(entry['fields'])
+                    elif entry['op'] == 'delete':
+                        records.pop(telegram_id, None)
+        self._log_lines = lines
+        return records
+    
+    def upsert_deliverer(self, deliverer: Deliverer):
+        """Grava um entregador só: ON CONFLICT no banco, uma linha no log do JSON"""
+        with self._registry_lock:
+            if not (self.using_database and self._db_upsert([deliverer])):
+                fields = _deliverer_to_dict(deliverer)
+                existing = self._deliverer_registry().get(deliverer.telegram_id)
+                if existing is not None:
+                    fields['joined_date'] = existing.joined_date.isoformat()
+                    deliverer = _deliverer_from_dict(fields)
+                self._append_log({'op': 'upsert', 'telegram_id': deliverer.telegram_id, 'fields': fields})
+            elif deliverer.telegram_id in (self._registry or {}):
+                deliverer = copy.copy(deliverer)
+                deliverer.joined_date = self._registry[deliverer.telegram_id].joined_date
+            self._commit_deliverers([deliverer])
     
     def add_deliverer(self, deliverer: Deliverer):
-        """Adiciona novo entregador"""
-        deliverers = self.load_deliverers()
-        
-        # Verifica se já existe
-        if any(d.telegram_id == deliverer.telegram_id for d in deliverers):
-            # Atualiza existente
-            deliverers = [d if d.telegram_id != deliverer.telegram_id else deliverer 
-                         for d in deliverers]
-        else:
-            deliverers.append(deliverer)
-        
-        self.save_deliverers(deliverers)
-        
+        """Adiciona novo entregador (ou atualiza o existente)"""
+        self.upsert_deliverer(deliverer)
 
     def delete_deliverer(self, telegram_id: int):
         """Remove um entregador permanentemente"""
-        if self.using_database:
-            try:
-                print(f"🗑️ Removendo entregador {telegram_id} do PostgreSQL...")
-                with db_manager.get_session() as session:
-                    # 1. Desvincular de Rotas Ativas/Passadas
-                    session.query(RouteDB).filter_by(assigned_to_telegram_id=telegram_id).update({"assigned_to_telegram_id": None})
-                    # 2. Desvincular de Pacotes
-                    session.query(PackageDB).filter_by(assigned_to_telegram_id=telegram_id).update({"assigned_to_telegram_id": None})
-                    
-                    # 3. Deleta registro da tabela deliverers
-                    rows = session.query(DelivererDB).filter_by(telegram_id=telegram_id).delete()
-                    print(f"✅ Entregador {telegram_id} removido ({rows} linhas afetadas)")
-            except Exception as e:
-                print(f"❌ Erro ao remover do PostgreSQL: {e}")
-                raise e
-        else:
-            # Fallback JSON
-            deliverers = self.load_deliverers()
-            new_list = [d for d in deliverers if d.telegram_id != telegram_id]
-            if len(new_list) < len(deliverers):
-                self.save_deliverers(new_list)
+        with self._registry_lock:
+            if self.using_database:
+                try:
+                    print(f"🗑️ Removendo entregador {telegram_id} do PostgreSQL...")
+                    with db_manager.get_session() as session:
+                        # 1. Desvincular de Rotas Ativas/Passadas
+                        session.query(RouteDB).filter_by(assigned_to_telegram_id=telegram_id).update({"assigned_to_telegram_id": None})
+                        # 2. Desvincular de Pacotes
+                        session.query(PackageDB).filter_by(assigned_to_telegram_id=telegram_id).update({"assigned_to_telegram_id": None})
+                        
+                        # 3. Deleta registro da tabela deliverers
+                        rows = session.query(DelivererDB).filter_by(telegram_id=telegram_id).delete()
+                        print(f"✅ Entregador {telegram_id} removido ({rows} linhas afetadas)")
+                except Exception as e:
+                    print(f"❌ Erro ao remover do PostgreSQL: {e}")
+                    raise e
+            else:
+                # Fallback JSON
+                if telegram_id not in self._deliverer_registry():
+                    return
+                self._append_log({'op': 'delete', 'telegram_id': telegram_id})
+            self._commit_deliverers(removed=[telegram_id])
 
     
     def get_deliverer(self, telegram_id: int) -> Optional[Deliverer]:
-        """Busca entregador por ID"""
-        deliverers = self.load_deliverers()
-        return next((d for d in deliverers if d.telegram_id == telegram_id), None)
+        """Busca entregador por ID (consulta no registro em memória)"""
+        deliverer = self._deliverer_registry().get(telegram_id)
+        return copy.copy(deliverer) if deliverer else None
+    
+    def update_deliverer_stats(self, telegram_id: int, **kwargs) -> Optional[Deliverer]:
+        """
+        Atualiza campos de um entregador (UPDATE de uma linha / uma linha no log).
+        
+        Returns:
+            Entregador atualizado, ou None se não existe
+        """
+        fields = {k: v for k, v in kwargs.items() if k in DELIVERER_FIELDS}
+        with self._registry_lock:
+            current = self._deliverer_registry().get(telegram_id)
+            if current is None or not fields:
+                return copy.copy(current) if current else None
+            
+            if self.using_database:
+                try:
+                    deliverer = self._db_update(telegram_id, fields)
+                except Exception as e:
+                    print(f"❌ Erro ao atualizar entregador {telegram_id}: {e}")
+                    self.invalidate_deliverers()
+                    return None
+                if deliverer is None:
+                    self._commit_deliverers(removed=[telegram_id])  # Apagado por outro worker
+                    return None
+            else:
+                deliverer = copy.copy(current)
+                for key, value in fields.items():
+                    setattr(deliverer, key, value)
+                self._append_log({'op': 'update', 'telegram_id': telegram_id,
+                                  'fields': {k: _deliverer_to_dict(deliverer)[k] for k in fields}})
+            
+            self._commit_deliverers([deliverer])
+            return copy.copy(deliverer)
     
-    def update_deliverer_stats(self, telegram_id: int, **kwargs):
-        """Atualiza estatísticas do entregador"""
-        deliverers = self.load_deliverers()
+    def increment_stats(self, telegram_id: int, delivered: int = 0, failed: int = 0,
+                        earnings: float = 0.0, time: Optional[float] = None) -> Optional[Deliverer]:
+        """
+        Soma entregas/ganhos e recalcula taxa de sucesso e tempo médio de forma atômica.
         
-        for d in deliverers:
-            if d.telegram_id == telegram_id:
-                for key, value in kwargs.items():
-                    if hasattr(d, key):
-                        setattr(d, key, value)
-                break
+        No banco vira um UPDATE só (total_deliveries = total_deliveries + N, sem ler o
+        cadastro); no JSON, uma linha no log. Custo O(1), independente do tamanho da equipe.
         
-        self.save_deliverers(deliverers)
+        Args:
+            telegram_id: ID do entregador
+            delivered: Entregas feitas
+            failed: Tentativas sem sucesso
+            earnings: Valor a somar nos ganhos
+            time: Tempo da entrega em minutos (entra na média)
+            
+        Returns:
+            Entregador atualizado, ou None se não existe
+        """
+        with self._registry_lock:
+            if self.using_database:
+                try:
+                    deliverer = self._db_update(telegram_id, _increment_values(delivered, failed, earnings, time))
+                except Exception as e:
+                    print(f"❌ Erro ao atualizar estatísticas de {telegram_id}: {e}")
+                    self.invalidate_deliverers()
+                    return None
+                if deliverer is None:
+                    return None
+            else:
+                current = self._deliverer_registry().get(telegram_id)
+                if current is None:
+                    return None
+                deliverer = copy.copy(current)
+                _apply_increment(deliverer, delivered, failed, earnings, time)
+                # Grava o resultado (não o delta): reaplicar o log após queda não conta duas vezes
+                self._append_log({'op': 'update', 'telegram_id': telegram_id,
+                                  'fields': {k: getattr(deliverer, k) for k in STAT_FIELDS}})
+            
+            self._commit_deliverers([deliverer])
+            return copy.copy(deliverer)
     
     # ==================== PACOTES ====================
     
     def save_package(self, package: Package):
-        """Salva pacote (append no JSONL)"""
+        """Salva pacote (append no arquivo do dia)"""
         data = {
             'id': package.id,
             'address': package.address,
@@ -241,77 +443,43 @@ class DataStore:
             'timestamp': datetime.now().isoformat()
         }
         
-        with open(self.packages_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(data, ensure_ascii=False) + '\n')
+        self.package_history.append(data)
+    
+    def iter_packages(self, start=None, end=None, deliverer_id: Optional[int] = None,
+                      status: Optional[str] = None) -> Iterator[dict]:
+        """Percorre o histórico de pacotes (dicts) com filtros, sem carregar tudo na memória"""
+        return self.package_history.iter_packages(start, end, deliverer_id=deliverer_id, status=status)
     
     def get_packages_by_date(self, date: datetime) -> List[Package]:
-        """Carrega pacotes de uma data específica"""
-        if not self.packages_file.exists():
-            return []
-        
-        packages = []
-        target_date = date.date()
-        
-        with open(self.packages_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                data = json.loads(line)
-                pkg_date = datetime.fromisoformat(data['timestamp']).date()
-                
-                if pkg_date == target_date:
-                    from .models import PackagePriority, PackageStatus
-                    packages.append(Package(
-                        id=data['id'],
-                        address=data['address'],
-                        lat=data['lat'],
-                        lng=data['lng'],
-                        priority=PackagePriority(data['priority']),
-                        status=PackageStatus(data['status']),
-                        assigned_to=data.get('assigned_to'),
-                        delivered_at=datetime.fromisoformat(data['delivered_at']) if data.get('delivered_at') else None,
-                        delivery_time_minutes=data.get('delivery_time_minutes'),
-                        notes=data.get('notes', '')
-                    ))
+        """Carrega pacotes de uma data específica (só o arquivo daquele dia)"""
+        from .models import PackagePriority, PackageStatus
         
-        return packages
+        return [Package(
+            id=data['id'],
+            address=data['address'],
+            lat=data['lat'],
+            lng=data['lng'],
+            priority=PackagePriority(data['priority']),
+            status=PackageStatus(data['status']),
+            assigned_to=data.get('assigned_to'),
+            delivered_at=datetime.fromisoformat(data['delivered_at']) if data.get('delivered_at') else None,
+            delivery_time_minutes=data.get('delivery_time_minutes'),
+            notes=data.get('notes', '')
+        ) for data in self.package_history.iter_packages(date, date)]
     
     def get_all_packages(self) -> List[dict]:
-        """Retorna todos os pacotes como dicts (para gamification)"""
-        if not self.packages_file.exists():
-            return []
-        
-        packages = []
-        with open(self.packages_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    packages.append(json.loads(line))
-                except:
-                    continue
-        
-        return packages
+        """Retorna todos os pacotes como dicts (prefira iter_packages para agregações)"""
+        return list(self.package_history.iter_packages())
     
     # ==================== RELATÓRIOS ====================
     
     def save_financial_report(self, report: FinancialReport):
-        """Salva relatório financeiro"""
-        filename = f"financial_{report.date.strftime('%Y-%m-%d')}.json"
-        filepath = self.reports_dir / filename
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(report.to_dict(), f, indent=2, ensure_ascii=False)
+        """Salva relatório financeiro (um por dia; o último do dia vence)"""
+        self.financial_reports.put(report.to_dict())
     
     def get_financial_reports(self, start_date: datetime, end_date: datetime) -> List[FinancialReport]:
-        """Carrega relatórios financeiros de um período"""
-        reports = []
-        
-        for file in self.reports_dir.glob("financial_*.json"):
-            with open(file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                report_date = datetime.fromisoformat(data['date'])
-                
-                if start_date <= report_date <= end_date:
-                    reports.append(FinancialReport(**data))
-        
-        return sorted(reports, key=lambda r: r.date)
+        """Carrega relatórios financeiros de um período (só os dias do intervalo)"""
+        return [FinancialReport(**data) for data in self.financial_reports.range(start_date, end_date)]
     
     # ==================== PAGAMENTOS ====================
     
@@ -349,8 +517,7 @@ class DataStore:
             'payment_method': payment.payment_method
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        dump_file(filepath, data, 'payment_record')
 
 
 # Singleton
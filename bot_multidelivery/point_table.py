@@ -0,0 +1,261 @@
+"""
+🧱 TABELA DE PONTOS - Armazenamento colunar dos pacotes de um romaneio
+lat/lng em arrays float64, textos internados numa tabela única e
+DeliveryPoint como visão leve (índice na tabela) em vez de um objeto por pacote
+"""
+import base64
+import io
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .clustering import DeliveryPoint
+
+# Versão do formato binário (to_bytes/from_bytes)
+BLOB_VERSION = 1
+
+
+class StringTable:
+    """Textos internados: cada valor distinto é guardado uma vez e referenciado por índice"""
+
+    __slots__ = ('values', '_index')
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values: List[str] = list(values or [])
+        self._index: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def intern(self, value: str) -> int:
+        idx = self._index.get(value)
+        if idx is None:
+            idx = self._index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(bytes utf-8 concatenados, offsets) - sem pickle, sem largura fixa"""
+        encoded = [v.encode('utf-8') for v in self.values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            offsets[1:] = np.cumsum([len(b) for b in encoded])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+    @classmethod
+    def from_arrays(cls, data: np.ndarray, offsets: np.ndarray) -> 'StringTable':
+        raw = data.tobytes()
+        bounds = offsets.tolist()
+        return cls([raw[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)])
+
+
+class PointView:
+    """
+    Pacote lido direto das colunas da tabela (2 referências por pacote).
+    Mesma interface de leitura do DeliveryPoint; imutável.
+    """
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table: 'PointTable', row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def lat(self) -> float:
+        return float(self.table.lat[self.row])
+
+    @property
+    def lng(self) -> float:
+        return float(self.table.lng[self.row])
+
+    @property
+    def address(self) -> str:
+        return self.table.strings.values[self.table.address_idx[self.row]]
+
+    @property
+    def package_id(self) -> str:
+        return self.table.strings.values[self.table.package_idx[self.row]]
+
+    @property
+    def romaneio_id(self) -> str:
+        return self.table.strings.values[self.table.romaneio_idx[self.row]]
+
+    @property
+    def priority(self) -> str:
+        return self.table.strings.values[self.table.priority_idx[self.row]]
+
+    def to_point(self) -> DeliveryPoint:
+        return DeliveryPoint(address=self.address, lat=self.lat, lng=self.lng,
+                             romaneio_id=self.romaneio_id, package_id=self.package_id,
+                             priority=self.priority)
+
+    def _fields(self) -> tuple:
+        return (self.address, self.lat, self.lng, self.romaneio_id, self.package_id, self.priority)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PointView):
+            if other.table is self.table:
+                return other.row == self.row
+            return other._fields() == self._fields()
+        if isinstance(other, DeliveryPoint):
+            return (other.address, other.lat, other.lng, other.romaneio_id,
+                    other.package_id, other.priority) == self._fields()
+        return NotImplemented
+
+    __hash__ = None  # Igual ao DeliveryPoint (dataclass mutável)
+
+    def __repr__(self) -> str:
+        return (f"PointView(package_id={self.package_id!r}, address={self.address!r}, "
+                f"lat={self.lat}, lng={self.lng})")
+
+
+class PointTable(Sequence):
+    """
+    Pontos de um romaneio em colunas.
+
+    Funciona como lista somente-leitura de PointView (len, índice, iteração),
+    então `romaneio.points` continua servindo aos consumidores antigos.
+    Código de roteamento pode ler `lat`/`lng` (np.float64) direto.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, strings: StringTable,
+                 address_idx: np.ndarray, package_idx: np.ndarray,
+                 romaneio_idx: np.ndarray, priority_idx: np.ndarray):
+        self.lat = lat
+        self.lng = lng
+        self.strings = strings
+        self.address_idx = address_idx
+        self.package_idx = package_idx
+        self.romaneio_idx = romaneio_idx
+        self.priority_idx = priority_idx
+
+    @classmethod
+    def from_points(cls, points: Iterable) -> 'PointTable':
+        points = list(points)
+        strings = StringTable()
+        n = len(points)
+        lat = np.empty(n, dtype=np.float64)
+        lng = np.empty(n, dtype=np.float64)
+        cols = [np.empty(n, dtype=np.int32) for _ in range(4)]
+        for i, p in enumerate(points):
+            lat[i] = p.lat
+            lng[i] = p.lng
+            cols[0][i] = strings.intern(p.address)
+            cols[1][i] = strings.intern(p.package_id)
+            cols[2][i] = strings.intern(p.romaneio_id)
+            cols[3][i] = strings.intern(p.priority)
+        return cls(lat, lng, strings, *cols)
+
+    @classmethod
+    def from_dicts(cls, rows: List[Dict]) -> 'PointTable':
+        """Formato antigo (lista de dicts por ponto)"""
+        strings = StringTable()
+        n = len(rows)
+        return cls(
+            np.fromiter((r['lat'] for r in rows), dtype=np.float64, count=n),
+            np.fromiter((r['lng'] for r in rows), dtype=np.float64, count=n),
+            strings,
+            np.fromiter((strings.intern(r['address']) for r in rows), dtype=np.int32, count=n),
+            np.fromiter((strings.intern(r['package_id']) for r in rows), dtype=np.int32, count=n),
+            np.fromiter((strings.intern(r['romaneio_id']) for r in rows), dtype=np.int32, count=n),
+            np.fromiter((strings.intern(r.get('priority', 'normal')) for r in rows), dtype=np.int32, count=n),
+        )
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [PointView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return PointView(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield PointView(self, i)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (PointTable, list, tuple)) or len(other) != len(self):
+            return False
+        return all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"PointTable({len(self)} pontos, {len(self.strings)} textos)"
+
+    def coords(self) -> np.ndarray:
+        """Matriz N×2 (lat, lng)"""
+        return np.column_stack((self.lat, self.lng))
+
+    # ==================== BINÁRIO ====================
+
+    def to_bytes(self) -> bytes:
+        """Blob .npz (sem pickle): colunas + tabela de textos"""
+        data, offsets = self.strings.to_arrays()
+        buffer = io.BytesIO()
+        np.savez(buffer, version=np.array([BLOB_VERSION]), lat=self.lat, lng=self.lng,
+                 address_idx=self.address_idx, package_idx=self.package_idx,
+                 romaneio_idx=self.romaneio_idx, priority_idx=self.priority_idx,
+                 strings=data, string_offsets=offsets)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'PointTable':
+        with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+            version = int(data['version'][0])
+            if version > BLOB_VERSION:
+                raise ValueError(f"Tabela de pontos em formato v{version} (suportado até v{BLOB_VERSION})")
+            return cls(
+                data['lat'], data['lng'],
+                StringTable.from_arrays(data['strings'], data['string_offsets']),
+                data['address_idx'], data['package_idx'], data['romaneio_idx'], data['priority_idx'],
+            )
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.to_bytes()).decode('ascii')
+
+    @classmethod
+    def from_base64(cls, text: str) -> 'PointTable':
+        return cls.from_bytes(base64.b64decode(text))
+
+
+def coords_array(points) -> np.ndarray:
+    """
+    Coordenadas N×2 de uma sequência de pacotes.
+    Visões de uma mesma tabela são lidas das colunas (np.take), sem tocar objeto por objeto.
+    """
+    if isinstance(points, PointTable):
+        return points.coords()
+    points = list(points)
+    if points and isinstance(points[0], PointView):
+        table = points[0].table
+        if all(isinstance(p, PointView) and p.table is table for p in points):
+            rows = np.fromiter((p.row for p in points), dtype=np.intp, count=len(points))
+            return np.column_stack((table.lat[rows], table.lng[rows]))
+    return np.array([(p.lat, p.lng) for p in points], dtype=np.float64).reshape(-1, 2)
+
+
+def encode_order(points, tables: List[PointTable]) -> Optional[str]:
+    """
+    Ordem de uma rota como pares (tabela, linha) em int32, base64.
+    None se algum pacote não for visão de uma das tabelas (rota montada à mão).
+    """
+    position = {id(t): i for i, t in enumerate(tables)}
+    pairs = np.empty((len(points), 2), dtype=np.int32)
+    for i, p in enumerate(points):
+        t = position.get(id(p.table)) if isinstance(p, PointView) else None
+        if t is None:
+            return None
+        pairs[i] = (t, p.row)
+    return base64.b64encode(pairs.tobytes()).decode('ascii')
+
+
+def decode_order(text: str, tables: List[PointTable]) -> List[PointView]:
+    pairs = np.frombuffer(base64.b64decode(text), dtype=np.int32).reshape(-1, 2)
+    return [PointView(tables[t], row) for t, row in pairs.tolist()]
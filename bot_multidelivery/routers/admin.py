@@ -23,7 +23,7 @@ async def get_team():
     ]
 
 @router.post("/team")
-async def add_member(data: DelivererInput):
+def add_member(data: DelivererInput):
     """Adiciona novo membro à equipe"""
     try:
         DelivererService.add_deliverer(
@@ -36,7 +36,7 @@ async def add_member(data: DelivererInput):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/team/{user_id}")
-async def remove_member(user_id: int):
+def remove_member(user_id: int):
     """Remove membro permanentemente utilizando a persistência"""
     try:
         data_store.delete_deliverer(user_id)
@@ -27,7 +27,7 @@ def get_current_week_financials():
     }
 
 @router.get("/balance")
-async def get_financial_balance(user_id: int):
+def get_financial_balance(user_id: int):
     """
     Retorna resumo financeiro para o painel.
     Se for sócio, vê o lucro da empresa. Se for entregador, vê seus ganhos.
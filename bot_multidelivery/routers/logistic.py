@@ -1,18 +1,20 @@
 # -*- coding: utf-8 -*-
 import os
 from fastapi import APIRouter, HTTPException
-from typing import List, Dict
-from bot_multidelivery.schemas import OptimizeInput, AssignRouteInput
+from typing import List, Dict, Optional
+from bot_multidelivery.schemas import OptimizeInput, AssignRouteInput, ResequenceInput
 from bot_multidelivery.session import session_manager, Route
 from bot_multidelivery.clustering import DeliveryPoint, TerritoryDivider
 from bot_multidelivery.services import deliverer_service
 from bot_multidelivery.services.map_generator import MapGenerator
+from bot_multidelivery.services.distance_matrix import get_road_network_provider
+from bot_multidelivery.services.route_resequencer import route_resequencer
 from bot_multidelivery.colors import get_color_for_index
 
 router = APIRouter(prefix="/routes", tags=["Routes"])
 
 @router.post("/optimize")
-async def optimize_routes(data: OptimizeInput):
+def optimize_routes(data: OptimizeInput):
     """
     Divide e otimiza a rota pela quantidade de entregadores.
     Implementação REAL (Migrado de api_routes.py)
@@ -28,7 +30,9 @@ async def optimize_routes(data: OptimizeInput):
         all_points.extend(rom.points)
 
     # 2. Dividir Territórios (Clustering)
-    divider = TerritoryDivider(session.base_lat, session.base_lng)
+    # Ordem das rotas por tempo de viagem real quando há malha viária offline
+    divider = TerritoryDivider(session.base_lat, session.base_lng,
+                               distance_provider=get_road_network_provider('car'))
     clusters = divider.divide_into_clusters(all_points, k=data.num_deliverers)
 
     # 3. Criar Rotas
@@ -84,15 +88,116 @@ async def optimize_routes(data: OptimizeInput):
     }
 
 @router.post("/assign")
-async def assign_route(data: AssignRouteInput):
+def assign_route(data: AssignRouteInput):
     """Atribuir rota a entregador"""
-    session = session_manager.get_current_session()
+    session = session_manager.get_session(data.session_id) if data.session_id else session_manager.get_current_session()
     if not session:
         raise HTTPException(status_code=400, detail="Sem sessão ativa")
-        
-    success = session_manager.assign_route(data.route_id, data.deliverer_id)
+    
+    deliverer = deliverer_service.get_deliverer(data.deliverer_id)
+    success = session_manager.assign_route(data.route_id, data.deliverer_id,
+                                           name=deliverer.name if deliverer else None,
+                                           session_id=session.session_id)
     if not success:
          raise HTTPException(status_code=404, detail="Rota não encontrada")
          
     return {"status": "success", "assigned_to": data.deliverer_id}
 
+@router.post("/resequence")
+def resequence_route(data: ResequenceInput):
+    """
+    Reordena as paradas pendentes a partir da posição GPS do entregador.
+    Leve o bastante (< 50 ms) para ser chamado a cada atualização de localização.
+    Com apply=true grava a nova ordem na rota.
+    """
+    session = session_manager.get_session(data.session_id) if data.session_id else session_manager.get_current_session()
+    if not session:
+        raise HTTPException(status_code=400, detail="Sem sessão ativa")
+
+    if data.route_id:
+        route = next((r for r in session.routes if r.id == data.route_id), None)
+    elif data.deliverer_id is not None:
+        route = session_manager.get_route_for_deliverer(data.deliverer_id, session.session_id)
+    else:
+        raise HTTPException(status_code=400, detail="Informe route_id ou deliverer_id")
+
+    if not route:
+        raise HTTPException(status_code=404, detail="Rota não encontrada")
+
+    result = route_resequencer.resequence(route, data.lat, data.lng, data.delivered_packages)
+
+    applied = False
+    if data.apply and result.changed:
+        applied = session_manager.update_route_order(route.id, result.pending, session.session_id)
+
+    return {
+        "status": "success",
+        "route_id": route.id,
+        "changed": result.changed,
+        "applied": applied,
+        "next_stop": {
+            "package_id": result.next_stop.package_id,
+            "address": result.next_stop.address,
+            "lat": result.next_stop.lat,
+            "lng": result.next_stop.lng,
+        } if result.next_stop else None,
+        "pending": [
+            {"package_id": p.package_id, "address": p.address, "lat": p.lat, "lng": p.lng}
+            for p in result.pending
+        ],
+        "stops": result.stops,
+        "distance_km": round(result.distance_m / 1000, 2),
+        "previous_distance_km": round(result.previous_distance_m / 1000, 2),
+        "elapsed_ms": result.elapsed_ms,
+    }
+
+@router.get("/nearby")
+def nearby_stops(lat: float, lng: float, k: int = 5,
+                 radius_m: Optional[float] = None,
+                 route_id: Optional[str] = None,
+                 deliverer_id: Optional[int] = None,
+                 session_id: Optional[str] = None):
+    """
+    Paradas pendentes mais próximas de uma posição (índice espacial da sessão).
+    Com rota (route_id ou deliverer_id) também informa chegada pela cerca virtual.
+    """
+    session = session_manager.get_session(session_id) if session_id else session_manager.get_current_session()
+    if not session:
+        raise HTTPException(status_code=400, detail="Sem sessão ativa")
+
+    index = session_manager.get_spatial_index(session.session_id)
+    if not index:
+        return {"status": "success", "nearest": [], "arrived": []}
+
+    if route_id is None and deliverer_id is not None:
+        route = session_manager.get_route_for_deliverer(deliverer_id, session.session_id)
+        if not route:
+            raise HTTPException(status_code=404, detail="Rota não encontrada")
+        route_id = route.id
+
+    def to_json(hit):
+        (rid, package_id), point, meters = hit
+        return {"route_id": rid, "package_id": package_id, "address": point.address,
+                "lat": point.lat, "lng": point.lng, "distance_m": round(meters, 1)}
+
+    nearest = index.nearest_pending(lat, lng, k=k, route_id=route_id, max_radius_m=radius_m)
+    arrived = index.detect_arrival(route_id, lat, lng) if route_id else []
+
+    return {
+        "status": "success",
+        "nearest": [to_json(h) for h in nearest],
+        "arrived": [to_json(h) for h in arrived],
+    }
+
+@router.get("/next-stops")
+def next_stops(deliverer_id: int, session_id: Optional[str] = None, limit: int = 1):
+    """
+    Próximas paradas pendentes do entregador na ordem da rota.
+    Sessão fora da memória é consultada direto nas paradas indexadas (sem carregar a sessão).
+    """
+    stops = session_manager.get_pending_stops(deliverer_id, session_id=session_id, limit=max(1, limit))
+    return {
+        "status": "success",
+        "next_stop": stops[0] if stops else None,
+        "stops": stops,
+    }
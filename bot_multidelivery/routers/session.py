@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/session", tags=["Sessions"])
 
 @router.post("/start")
-async def start_session(data: StartSessionInput):
+def start_session(data: StartSessionInput):
     """
     Inicia (ou reutiliza) uma sessão ativa.
     Implementação REAL (Migrada de api_routes.py)
@@ -52,7 +52,7 @@ async def set_route_value(data: RouteValueInput):
     return {"status": "success", "value": data.value, "warning": "Valor salvo logicamente, persistência pendente"}
 
 @router.post("/finalize")
-async def finalize_session(data: FinalizeSessionInput):
+def finalize_session(data: FinalizeSessionInput):
     """Encerra a sessão e calcula totais"""
     if data.session_id:
         session_manager.finalize_session(data.session_id)
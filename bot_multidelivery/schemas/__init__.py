@@ -37,6 +37,15 @@ class AssignRouteInput(BaseModel):
     deliverer_id: int
     session_id: Optional[str] = None
 
+class ResequenceInput(BaseModel):
+    lat: float
+    lng: float
+    route_id: Optional[str] = None
+    deliverer_id: Optional[int] = None
+    delivered_packages: List[str] = []
+    session_id: Optional[str] = None
+    apply: bool = False  # Grava a nova ordem na rota
+
 # ==================== SEPARATION ====================
 class SeparationScanInput(BaseModel):
     barcode: str
@@ -54,6 +54,11 @@ class DeliverySession(Base):
     total_revenue = Column(Float, default=0.0)  # Faturamento
     total_profit = Column(Float, default=0.0)  # Lucro bruto
     
+    # PROGRESSO (mantido na transação da entrega; NULL = recontado na primeira leitura)
+    delivered_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    stats_version = Column(Integer, default=0)  # Sobe a cada mudança do dashboard (ETag)
+    
     # DATA SNAPSHOT (congelado no final)
     financial_snapshot = Column(JSON, nullable=True)  # Snapshot final
     route_optimization_data = Column(JSON, nullable=True)  # Dados da otimização
@@ -121,6 +126,7 @@ class SessionDeliverer(Base):
     # Performance in-session
     packages_assigned = Column(Integer, default=0)
     packages_delivered = Column(Integer, default=0)
+    packages_failed = Column(Integer, default=0)
     
     # Financeiro in-session
     base_salary = Column(Float)
@@ -0,0 +1,168 @@
+"""
+📦 SERIALIZAÇÃO DOS ARQUIVOS LOCAIS - Codec plugável + versão de schema
+msgpack (binário) > orjson (JSON rápido) > json da stdlib, conforme instalado.
+
+Formato gravado: cabeçalho de 8 bytes + payload
+    b'MAL' | codec (1 byte) | versão do schema (uint16) | reservado (2 bytes)
+Arquivos antigos (JSON puro, sem cabeçalho) são lidos como versão 0.
+"""
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+MAGIC = b'MAL'
+_HEADER = struct.Struct('>3sBHH')
+
+# Versão atual do schema de cada tipo de arquivo
+SCHEMA_VERSIONS: Dict[str, int] = {
+    'session': 1,
+    'session_index': 1,
+    'deliverers': 1,
+    'financial_report': 1,     # FinancialReport (persistence)
+    'financial_daily': 1,      # DailyFinancialReport (financial_service)
+    'financial_weekly': 1,     # WeeklyFinancialReport (financial_service)
+    'payment_record': 1,
+    'geocoding_cache': 1,
+    'package_stats': 1,
+}
+
+# (tipo, versão de origem) -> função que converte o payload para a versão seguinte
+_UPGRADES: Dict[Tuple[str, int], Callable[[Any], Any]] = {}
+
+
+def register_upgrade(kind: str, from_version: int):
+    """Decorator: migra payload de `kind` da versão from_version para from_version + 1"""
+    def decorator(fn):
+        _UPGRADES[(kind, from_version)] = fn
+        return fn
+    return decorator
+
+
+class Codec:
+    """Interface: bytes <-> objetos Python simples (dict/list/str/números/bool/None)"""
+    id = 0
+    name = ''
+
+    def dumps(self, data: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, raw: bytes) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    """json da stdlib, compacto (sem indent)"""
+    id = 1
+    name = 'json'
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+class OrjsonCodec(Codec):
+    """orjson: mesmo JSON, encoder/decoder em Rust"""
+    id = 2
+    name = 'orjson'
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, raw: bytes) -> Any:
+        return orjson.loads(raw)
+
+
+class MsgpackCodec(Codec):
+    """msgpack: binário compacto"""
+    id = 3
+    name = 'msgpack'
+
+    def dumps(self, data: Any) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, raw: bytes) -> Any:
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+_CODECS: Dict[str, Codec] = {'json': JsonCodec()}
+if HAS_ORJSON:
+    _CODECS['orjson'] = OrjsonCodec()
+if HAS_MSGPACK:
+    _CODECS['msgpack'] = MsgpackCodec()
+_BY_ID = {codec.id: codec for codec in _CODECS.values()}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Codec pelo nome, ou o padrão (DATA_CODEC: msgpack | orjson | json | auto).
+    Nome indisponível cai para o melhor instalado.
+    """
+    name = (name or os.getenv('DATA_CODEC', 'auto')).lower()
+    if name in _CODECS:
+        return _CODECS[name]
+    for preferred in ('msgpack', 'orjson', 'json'):
+        if preferred in _CODECS:
+            return _CODECS[preferred]
+
+
+def encode(data: Any, kind: str, codec: Optional[Codec] = None) -> bytes:
+    codec = codec or get_codec()
+    return _HEADER.pack(MAGIC, codec.id, SCHEMA_VERSIONS.get(kind, 1), 0) + codec.dumps(data)
+
+
+def decode(raw: bytes, kind: str) -> Any:
+    """Lê formato novo (com cabeçalho) ou JSON legado e aplica as migrações de schema"""
+    if raw[:3] == MAGIC and len(raw) >= _HEADER.size:
+        _, codec_id, version, _ = _HEADER.unpack_from(raw)
+        codec = _BY_ID.get(codec_id)
+        if codec is None:
+            raise ValueError(f"Arquivo gravado com codec {codec_id} não instalado (ex: pip install msgpack)")
+        data = codec.loads(raw[_HEADER.size:])
+    else:
+        version = 0
+        data = (_CODECS.get('orjson') or _CODECS['json']).loads(raw)
+
+    current = SCHEMA_VERSIONS.get(kind, 1)
+    if version > current:
+        raise ValueError(f"{kind}: schema v{version} é mais novo que o suportado (v{current})")
+    while version < current:
+        upgrade = _UPGRADES.get((kind, version))
+        if upgrade is not None:
+            data = upgrade(data)
+        version += 1
+    return data
+
+
+def dump_file(path, data: Any, kind: str, fsync: bool = False, codec: Optional[Codec] = None):
+    """Grava de forma atômica (arquivo temporário + os.replace)"""
+    path = Path(path)
+    payload = encode(data, kind, codec)  # Erro de serialização não chega a tocar o disco
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_file(path, kind: str) -> Any:
+    """Lê arquivo gravado por dump_file ou JSON antigo"""
+    with open(path, 'rb') as f:
+        return decode(f.read(), kind)
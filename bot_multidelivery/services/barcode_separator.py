@@ -1,10 +1,16 @@
 """
 🎨 SEPARAÇÃO POR COR - Sistema de marcação visual
 Bipa pacote → Identifica rota → Mostra cor DO ENTREGADOR
+
+Modo ativo, sessão e bipes ficam no state_backend: com vários workers da API,
+qualquer um deles atende o scanner com o mesmo progresso.
 """
-from typing import Dict, Optional, List
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, List
 from dataclasses import dataclass
 
+from ..state_backend import SEPARATOR_EVENTS, get_state_backend
+
 
 @dataclass
 class PackageAssignment:
@@ -19,14 +25,139 @@ class PackageAssignment:
     total_in_route: int
 
 
+class SessionAssignments(Mapping):
+    """
+    Mapa package_id -> PackageAssignment lido direto do índice da sessão.
+    Nada é pré-computado: cada bipe é uma consulta O(1) em session.locate_package.
+    Só entram pacotes de rotas já atribuídas (com nome do entregador).
+    """
+    
+    def __init__(self, session, get_color_name):
+        self.session = session
+        self.get_color_name = get_color_name
+        self._size = sum(r.total_packages for r in session.routes if r.assigned_to_name)
+    
+    def __getitem__(self, package_id: str) -> PackageAssignment:
+        found = self.session.locate_package(package_id)
+        if not found or not found[0].assigned_to_name:
+            raise KeyError(package_id)
+        
+        route, position = found
+        pkg = route.optimized_order[position - 1]
+        return PackageAssignment(
+            package_id=pkg.package_id.strip().upper(),
+            route_id=route.id,
+            deliverer_name=route.assigned_to_name,
+            color=route.color,  # Hex color tipo '#FF4444'
+            color_name=self.get_color_name(route.color),  # '🔴 VERMELHO'
+            address=pkg.address[:60],
+            position=position,
+            total_in_route=route.total_packages
+        )
+    
+    def __iter__(self):
+        for route in self.session.routes:
+            if route.assigned_to_name:
+                for pkg in route.optimized_order:
+                    yield pkg.package_id.strip().upper()
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class ScannedPackages:
+    """Pacotes já bipados na separação (conjunto no state_backend)"""
+    
+    def __init__(self, state, key: str):
+        self.state = state
+        self.key = key
+    
+    def add(self, package_id: str) -> bool:
+        return self.state.set_add(self.key, package_id) > 0
+    
+    def clear(self):
+        self.state.set_clear(self.key)
+    
+    def __contains__(self, package_id) -> bool:
+        return self.state.set_contains(self.key, package_id)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.state.set_members(self.key))
+    
+    def __len__(self) -> int:
+        return self.state.set_count(self.key)
+
+
 class BarcodeSeparator:
     """Gerencia separação física por código de barras"""
     
-    def __init__(self):
-        self.active = False
-        self.assignments: Dict[str, PackageAssignment] = {}  # package_id -> assignment
-        self.scanned = set()  # IDs já escaneados
-        self.session_id: Optional[str] = None
+    STATE_KEY = 'separator'
+    
+    def __init__(self, state=None, sessions=None):
+        self._state = state  # None = backend do processo (get_state_backend)
+        self._sessions = sessions  # None = session_manager global
+        self._session = None  # Sessão recebida em start_separation_mode (este worker)
+        self._assignments: Optional[SessionAssignments] = None
+    
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = get_state_backend()
+        return self._state
+    
+    @property
+    def _info(self) -> Dict:
+        return self.state.get(self.STATE_KEY) or {}
+    
+    @property
+    def active(self) -> bool:
+        return bool(self._info.get('active'))
+    
+    @property
+    def session_id(self) -> Optional[str]:
+        return self._info.get('session_id')
+    
+    @property
+    def scanned(self) -> ScannedPackages:
+        return ScannedPackages(self.state, f"{self.STATE_KEY}:{self.session_id}:scanned")
+    
+    def _current_session(self):
+        """Sessão da separação: a local, ou (outro worker iniciou / backend compartilhado) via session_manager"""
+        session_id = self.session_id
+        if session_id is None:
+            return None
+        local = self._session if self._session is not None and self._session.session_id == session_id else None
+        if local is not None and not self.state.shared:
+            return local
+        
+        sessions = self._sessions
+        if sessions is None:
+            from ..session import session_manager as sessions
+        return sessions.get_session(session_id) or local
+    
+    @property
+    def assignments(self) -> Mapping:
+        """package_id -> PackageAssignment (refeito quando a sessão é recarregada)"""
+        session = self._current_session() if self.active else None
+        if session is None:
+            return {}
+        if self._assignments is None or self._assignments.session is not session:
+            try:
+                from ..colors import get_color_name
+            except:
+                get_color_name = lambda x: x  # Fallback
+            self._assignments = SessionAssignments(session, get_color_name)
+        return self._assignments
+    
+    def record_scan(self, barcode: str) -> int:
+        """Marca o bipe (uma vez por pacote) e avisa os outros workers; retorna o total bipado"""
+        scanned = self.scanned
+        if scanned.add(barcode):
+            count = len(scanned)
+            self.state.publish(SEPARATOR_EVENTS, {'type': 'scan', 'session_id': self.session_id,
+                                                  'barcode': barcode, 'count': count})
+            return count
+        return len(scanned)
     
     def start_separation_mode(self, session) -> str:
         """
@@ -38,43 +169,13 @@ class BarcodeSeparator:
         if not session or not session.routes:
             return "❌ Nenhuma sessão ativa com rotas definidas!"
         
-        self.active = True
-        self.session_id = session.session_id
-        self.assignments.clear()
+        self._session = session
+        self._assignments = None
+        self.state.set(self.STATE_KEY, {'active': True, 'session_id': session.session_id})
         self.scanned.clear()
+        self.state.publish(SEPARATOR_EVENTS, {'type': 'start', 'session_id': session.session_id})
         
-        # Importa função de cores
-        try:
-            from ..colors import get_color_name
-        except:
-            get_color_name = lambda x: x  # Fallback
-        
-        # Mapeia todos os pacotes das rotas
-        for route in session.routes:
-            if not route.assigned_to_name:
-                continue  # Pula rotas não atribuídas
-            
-            deliverer = route.assigned_to_name
-            color = route.color  # Hex color tipo '#FF4444'
-            color_name = get_color_name(color)  # '🔴 VERMELHO'
-            packages = route.optimized_order
-            total = len(packages)
-            
-            for idx, pkg in enumerate(packages, 1):
-                # Usa package_id do DeliveryPoint
-                pkg_id = pkg.package_id.strip().upper()
-                
-                self.assignments[pkg_id] = PackageAssignment(
-                    package_id=pkg_id,
-                    route_id=route.id,
-                    deliverer_name=deliverer,
-                    color=color,
-                    color_name=color_name,
-                    address=pkg.address[:60],
-                    position=idx,
-                    total_in_route=total
-                )
-        
+        # Consulta o índice da sessão a cada bipe (sem montar mapa próprio)
         return f"✅ Modo separação ativado!\n\n📦 {len(self.assignments)} pacotes mapeados\n🎨 Bipe os códigos de barras para identificar"
     
     def scan_package(self, barcode: str) -> Optional[str]:
@@ -97,7 +198,7 @@ class BarcodeSeparator:
             return f"❌ Pacote não encontrado: {barcode}\n\n💡 Verifique se o código está correto"
         
         # Marca como escaneado
-        self.scanned.add(barcode)
+        scanned_count = self.record_scan(barcode)
         
         # Extrai emoji da cor (primeiro caractere do color_name)
         emoji = assignment.color_name.split()[0]
@@ -115,7 +216,7 @@ class BarcodeSeparator:
             f"━━━━━━━━━━━━━━━━━━━━━━━\n\n"
             f"🔢 <b>Configure pistola: {numero_pistola}</b>\n\n"
             f"━━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"✅ {len(self.scanned)}/{len(self.assignments)} separados"
+            f"✅ {scanned_count}/{len(self.assignments)} separados"
         )
         
         return response
@@ -126,8 +227,10 @@ class BarcodeSeparator:
             return "⚠️ Modo separação não está ativo."
         
         # Conta por cor
+        assignments = self.assignments
+        scanned = self.scanned
         color_counts = {}
-        for assignment in self.assignments.values():
+        for assignment in assignments.values():
             color_name = assignment.color_name
             color_counts[color_name] = color_counts.get(color_name, 0) + 1
         
@@ -137,13 +240,15 @@ class BarcodeSeparator:
             emoji = color_name.split()[0]
             report += f"{emoji} <b>{color_name}</b>: {count} pacotes\n"
         
-        report += f"\n✅ Total separado: {len(self.scanned)}/{len(self.assignments)}"
+        report += f"\n✅ Total separado: {len(scanned)}/{len(assignments)}"
         
         # Reseta
-        self.active = False
-        self.assignments.clear()
-        self.scanned.clear()
-        self.session_id = None
+        session_id = self.session_id
+        scanned.clear()
+        self.state.delete(self.STATE_KEY)
+        self.state.publish(SEPARATOR_EVENTS, {'type': 'end', 'session_id': session_id})
+        self._session = None
+        self._assignments = None
         
         return report
     
@@ -152,11 +257,12 @@ class BarcodeSeparator:
         if not self.active:
             return "⚠️ Modo separação inativo"
         
+        total, scanned = len(self.assignments), len(self.scanned)
         return (
             f"🎨 <b>MODO SEPARAÇÃO ATIVO</b>\n\n"
-            f"📦 Total: {len(self.assignments)} pacotes\n"
-            f"✅ Separados: {len(self.scanned)}\n"
-            f"⏳ Faltam: {len(self.assignments) - len(self.scanned)}"
+            f"📦 Total: {total} pacotes\n"
+            f"✅ Separados: {scanned}\n"
+            f"⏳ Faltam: {total - scanned}"
         )
     
     def _extract_package_id(self, package: dict) -> str:
@@ -16,6 +16,7 @@ class DashboardWebSocket:
     def __init__(self, port: int = 8765):
         self.port = port
         self.clients: Set[web.WebSocketResponse] = set()
+        self._loop = None  # Loop do servidor (eventos do diário chegam de outras threads)
         self.app = web.Application()
         self._setup_routes()
     
@@ -290,13 +291,14 @@ class DashboardWebSocket:
         from ..services import deliverer_service, gamification_service
         from ..persistence import data_store
         
-        packages = data_store.get_all_packages()
+        counters = data_store.package_stats
         deliverers = deliverer_service.get_all_deliverers()
         
+        # Contadores incrementais (O(1), sem ler o histórico)
         stats = {
-            'total_deliveries': len(packages),
-            'delivered': len([p for p in packages if p.get('status') == 'delivered']),
-            'in_transit': len([p for p in packages if p.get('status') == 'in_transit']),
+            'total_deliveries': counters.count(),
+            'delivered': counters.count(status='delivered'),
+            'in_transit': counters.count(status='in_transit'),
             'active_deliverers': len([d for d in deliverers if d.is_active])
         }
         
@@ -307,15 +309,15 @@ class DashboardWebSocket:
         from ..services import deliverer_service, gamification_service
         from ..persistence import data_store
         
-        packages = data_store.get_all_packages()
+        counters = data_store.package_stats
         leaderboard = gamification_service.get_leaderboard(limit=3)
         
         # Stats
         await ws.send_json({
             'type': 'stats',
-            'total_deliveries': len(packages),
-            'delivered': len([p for p in packages if p.get('status') == 'delivered']),
-            'in_transit': len([p for p in packages if p.get('status') == 'in_transit']),
+            'total_deliveries': counters.count(),
+            'delivered': counters.count(status='delivered'),
+            'in_transit': counters.count(status='in_transit'),
             'avg_time': 15  # TODO: calcular real
         })
         
@@ -356,6 +358,21 @@ class DashboardWebSocket:
             'timestamp': datetime.now().isoformat()
         })
     
+    def on_session_event(self, event: dict):
+        """Assinante dos eventos de sessão (diário via state_backend): repassa sem consultar o banco"""
+        if self._loop is None or not self.clients:
+            return
+        if event['type'] in ('package_delivered', 'package_failed'):
+            message = {
+                'type': 'delivery_update',
+                'package_id': event['package_id'],
+                'status': 'delivered' if event['type'] == 'package_delivered' else 'failed',
+                'timestamp': event['ts']
+            }
+        else:
+            message = {'type': 'session_event', 'event': event}  # Aninhado: o 'type' do evento não sobrescreve o rótulo
+        asyncio.run_coroutine_threadsafe(self.broadcast(message), self._loop)
+    
     def run(self):
         """Inicia servidor"""
         web.run_app(self.app, host='0.0.0.0', port=self.port)
@@ -366,6 +383,11 @@ class DashboardWebSocket:
         await runner.setup()
         site = web.TCPSite(runner, '0.0.0.0', self.port)
         await site.start()
+        
+        # Eventos de sessão de qualquer worker (memória: só deste processo)
+        from ..state_backend import SESSION_EVENTS, get_state_backend
+        self._loop = asyncio.get_running_loop()
+        get_state_backend().subscribe(SESSION_EVENTS, self.on_session_event)
         print(f"🌐 Dashboard WebSocket rodando em http://0.0.0.0:{self.port}/dashboard")
 
 
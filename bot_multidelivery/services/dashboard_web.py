@@ -54,20 +54,17 @@ def get_daily_data():
         data = []
         end_date = datetime.now()
         
-        for i in range(days):
-            date = end_date - timedelta(days=days - i - 1)
-            report = financial_service.get_daily_report(date)
-            
-            if report:
-                data.append({
-                    'date': report.date,
-                    'revenue': report.revenue,
-                    'delivery_costs': report.delivery_costs,
-                    'other_costs': report.other_costs,
-                    'net_profit': report.net_profit,
-                    'total_packages': report.total_packages,
-                    'total_deliveries': report.total_deliveries
-                })
+        # Um intervalo só (dias sem fechamento não aparecem)
+        for report in financial_service.get_daily_reports_range(end_date - timedelta(days=days - 1), end_date):
+            data.append({
+                'date': report.date,
+                'revenue': report.revenue,
+                'delivery_costs': report.delivery_costs,
+                'other_costs': report.other_costs,
+                'net_profit': report.net_profit,
+                'total_packages': report.total_packages,
+                'total_deliveries': report.total_deliveries
+            })
         
         return jsonify(data)
     
@@ -168,20 +165,17 @@ def export_excel():
         reports = []
         end_date = datetime.now()
         
-        for i in range(days):
-            date = end_date - timedelta(days=days - i - 1)
-            report = financial_service.get_daily_report(date)
-            
-            if report:
-                reports.append({
-                    'date': report.date,
-                    'revenue': report.revenue,
-                    'delivery_costs': report.delivery_costs,
-                    'other_costs': report.other_costs,
-                    'net_profit': report.net_profit,
-                    'total_packages': report.total_packages,
-                    'total_deliveries': report.total_deliveries
-                })
+        # Um intervalo só (dias sem fechamento não aparecem)
+        for report in financial_service.get_daily_reports_range(end_date - timedelta(days=days - 1), end_date):
+            reports.append({
+                'date': report.date,
+                'revenue': report.revenue,
+                'delivery_costs': report.delivery_costs,
+                'other_costs': report.other_costs,
+                'net_profit': report.net_profit,
+                'total_packages': report.total_packages,
+                'total_deliveries': report.total_deliveries
+            })
         
         # Exporta
         filepath = export_service.export_to_excel(reports)
@@ -207,20 +201,17 @@ def export_pdf():
         end_date = datetime.now()
         week_start = end_date - timedelta(days=6)
         
-        for i in range(days):
-            date = end_date - timedelta(days=days - i - 1)
-            report = financial_service.get_daily_report(date)
-            
-            if report:
-                reports.append({
-                    'date': report.date,
-                    'revenue': report.revenue,
-                    'delivery_costs': report.delivery_costs,
-                    'other_costs': report.other_costs,
-                    'net_profit': report.net_profit,
-                    'total_packages': report.total_packages,
-                    'total_deliveries': report.total_deliveries
-                })
+        # Um intervalo só (dias sem fechamento não aparecem)
+        for report in financial_service.get_daily_reports_range(end_date - timedelta(days=days - 1), end_date):
+            reports.append({
+                'date': report.date,
+                'revenue': report.revenue,
+                'delivery_costs': report.delivery_costs,
+                'other_costs': report.other_costs,
+                'net_profit': report.net_profit,
+                'total_packages': report.total_packages,
+                'total_deliveries': report.total_deliveries
+            })
         
         # Busca configuração de sócios
         config = financial_service.partner_config
@@ -399,34 +390,35 @@ def get_sessions():
         if not session_manager:
             return jsonify({'error': 'Session manager não disponível'}), 503
         
-        sessions = session_manager.list_sessions()
+        # Resumos + progresso agregado por rota (sem hidratar as sessões)
+        summaries = session_manager.list_summaries()
+        progress = session_manager.route_progress([s['session_id'] for s in summaries])
         
         result = []
-        for s in sessions:
-            # Conta entregas feitas
-            total_delivered = sum(len(r.delivered_packages) for r in s.routes)
+        for s in summaries:
+            routes = progress.get(s['session_id'], [])
             total_failed = 0  # TODO: implementar contador de falhas
             
             result.append({
-                'session_id': s.session_id,
-                'session_name': s.session_name,
-                'date': s.date,
-                'period': s.period,
-                'created_at': s.created_at.isoformat() if s.created_at else None,
-                'is_finalized': s.is_finalized,
-                'total_packages': s.total_packages,
-                'total_routes': len(s.routes),
-                'total_delivered': total_delivered,
+                'session_id': s['session_id'],
+                'session_name': s['session_name'],
+                'date': s['date'],
+                'period': s['period'],
+                'created_at': s['created_at'].isoformat() if s['created_at'] else None,
+                'is_finalized': s['is_finalized'],
+                'total_packages': s['total_packages'],
+                'total_routes': len(routes),
+                'total_delivered': sum(r['delivered'] for r in routes),
                 'total_failed': total_failed,
                 'routes': [
                     {
-                        'id': r.id,
-                        'assigned_to_name': r.assigned_to_name,
-                        'assigned_to_id': r.assigned_to_telegram_id,
-                        'total_packages': r.total_packages,
-                        'delivered': len(r.delivered_packages),
-                        'color': r.color
-                    } for r in s.routes
+                        'id': r['route_id'],
+                        'assigned_to_name': r['assigned_to_name'],
+                        'assigned_to_id': r['assigned_to_telegram_id'],
+                        'total_packages': r['total_packages'],
+                        'delivered': r['delivered'],
+                        'color': r['color']
+                    } for r in routes
                 ]
             })
         
@@ -444,11 +436,9 @@ def delete_session(session_id):
         if not session_manager:
             return jsonify({'error': 'Session manager não disponível'}), 503
         
-        # Remove sessão do manager
-        sessions = [s for s in session_manager.sessions if s.session_id != session_id]
-        session_manager.sessions = sessions
-        
-        # TODO: Remover do banco de dados também
+        # Remove do manager, do store e do diário (sem carregar as outras sessões)
+        if not session_manager.delete_session(session_id):
+            return jsonify({'error': 'Sessão não encontrada'}), 404
         
         return jsonify({'success': True, 'deleted': session_id})
         
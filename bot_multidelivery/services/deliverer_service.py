@@ -74,16 +74,7 @@ class DelivererService:
         Returns:
             True se atualizou, False se não encontrou
         """
-        deliverer = data_store.get_deliverer(telegram_id)
-        if not deliverer:
-            return False
-        
-        for key, value in kwargs.items():
-            if hasattr(deliverer, key):
-                setattr(deliverer, key, value)
-        
-        data_store.add_deliverer(deliverer)
-        return True
+        return data_store.update_deliverer_stats(telegram_id, **kwargs) is not None
     
     @staticmethod
     def deactivate_deliverer(telegram_id: int) -> bool:
@@ -113,26 +104,14 @@ class DelivererService:
         if not deliverer:
             return
         
-        # Atualiza contadores
-        if delivery_success:
-            deliverer.total_deliveries += 1
-            if not deliverer.is_partner:
-                deliverer.total_earnings += deliverer.cost_per_package
-        
-        # Recalcula taxa de sucesso
-        total_attempts = deliverer.total_deliveries + (0 if delivery_success else 1)
-        deliverer.success_rate = (deliverer.total_deliveries / total_attempts) * 100
-        
-        # Atualiza tempo médio (média móvel simples)
-        if deliverer.average_delivery_time == 0:
-            deliverer.average_delivery_time = delivery_time_minutes
-        else:
-            deliverer.average_delivery_time = (
-                (deliverer.average_delivery_time * (deliverer.total_deliveries - 1) + 
-                 delivery_time_minutes) / deliverer.total_deliveries
-            )
-        
-        data_store.add_deliverer(deliverer)
+        # Um UPDATE atômico (ou uma linha no log JSON), sem regravar a equipe inteira
+        data_store.increment_stats(
+            telegram_id,
+            delivered=1 if delivery_success else 0,
+            failed=0 if delivery_success else 1,
+            earnings=deliverer.cost_per_package if delivery_success and not deliverer.is_partner else 0.0,
+            time=delivery_time_minutes
+        )
     
     @staticmethod
     def can_assign_packages(telegram_id: int, package_count: int) -> bool:
@@ -168,29 +147,22 @@ class DelivererService:
     def get_weekly_earnings(user_id: int, start_date_str: str, end_date_str: str) -> float:
         """Calcula ganhos do entregador na semana especificada (lê reports diários)"""
         # Hack rápido: para não criar dependência circular, vamos usar o método do FinancialService importado localmente
-        # Mas como não podemos importar aqui dentro facilmente sem bagunça, vamos ler JSON direto
         # Melhor: O financial_service é Singleton importável
         from .financial_service import financial_service
-        from datetime import datetime, timedelta
         
         total = 0.0
         
-        current = datetime.strptime(start_date_str, '%d/%m/%Y')
+        start = datetime.strptime(start_date_str, '%d/%m/%Y')
         end = datetime.strptime(end_date_str, '%d/%m/%Y')
         
         deliverer = DelivererService.get_deliverer(user_id)
         if not deliverer: return 0.0
 
-        while current <= end:
-            # Tenta ler o arquivo JSON do dia
-            report = financial_service.get_daily_report(current)
-            
-            if report and hasattr(report, 'deliverer_breakdown'):
-                # deliverer_breakdown é dict {nome: valor}
-                if deliverer.name in report.deliverer_breakdown:
-                    total += report.deliverer_breakdown[deliverer.name]
-            
-            current += timedelta(days=1)
+        # Relatórios da semana numa consulta só
+        for report in financial_service.get_daily_reports_range(start, end):
+            # deliverer_breakdown é dict {nome: valor}
+            if report.deliverer_breakdown and deliverer.name in report.deliverer_breakdown:
+                total += report.deliverer_breakdown[deliverer.name]
             
         return total
 
@@ -0,0 +1,101 @@
+"""
+📐 MATRIZ DE DISTÂNCIAS - Interface comum dos otimizadores
+Haversine (linha reta) por padrão; malha viária offline quando configurada
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class DistanceMatrixProvider:
+    """
+    Interface mínima usada pelos otimizadores.
+
+    matrix(coords) devolve uma matriz N×N de custos (menor = melhor).
+    A unidade depende do provedor (`metric`): 'km' ou 'minutes'.
+    Os otimizadores só comparam custos, então qualquer unidade serve.
+    """
+
+    metric = 'km'
+
+    def matrix(self, coords: List[Tuple[float, float]]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class HaversineMatrixProvider(DistanceMatrixProvider):
+    """Distância em linha reta (km) - comportamento histórico dos otimizadores"""
+
+    metric = 'km'
+
+    def matrix(self, coords) -> List[List[float]]:
+        """coords: lista de (lat, lng) ou array N×2 (ex: point_table.coords_array)"""
+        arr = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        lat = np.radians(arr[:, 0])
+        lng = np.radians(arr[:, 1])
+        cos_lat = np.cos(lat)
+
+        # |Δ| deixa a matriz exatamente simétrica
+        a = (np.sin(np.abs(lat[None, :] - lat[:, None]) / 2) ** 2 +
+             np.outer(cos_lat, cos_lat) * np.sin(np.abs(lng[None, :] - lng[:, None]) / 2) ** 2)
+        result = 6371 * 2 * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+        np.fill_diagonal(result, 0.0)
+        return result.tolist()
+
+
+haversine_provider = HaversineMatrixProvider()
+
+# Perfis com grafo pré-processado (scripts/build_road_network.py gera todos)
+ROAD_PROFILES = ('car', 'scooter')
+
+_road_providers: Dict[str, Optional[DistanceMatrixProvider]] = {}
+_road_providers_lock = threading.Lock()
+
+
+def get_road_network_provider(profile: str = 'car') -> Optional[DistanceMatrixProvider]:
+    """
+    Motor de malha viária para o perfil ('car' ou 'scooter'), ou None.
+
+    Ativo só quando ROAD_NETWORK_PBF aponta para um extrato OSM local e o grafo
+    contraído já está no cache (passo offline: scripts/build_road_network.py).
+    A requisição só carrega o .npz - nunca lê o .pbf nem contrai a malha.
+    Falha ao carregar vira None (aviso no log) - nunca derruba a otimização.
+    """
+    pbf_path = os.getenv('ROAD_NETWORK_PBF')
+    if not pbf_path:
+        return None
+
+    if profile in _road_providers:
+        return _road_providers[profile]
+
+    with _road_providers_lock:  # Requisições simultâneas carregam o cache uma vez só
+        if profile not in _road_providers:
+            _road_providers[profile] = _load_road_network(pbf_path, profile)
+        return _road_providers[profile]
+
+
+def _load_road_network(pbf_path: str, profile: str) -> Optional[DistanceMatrixProvider]:
+    try:
+        from .road_network import RoadNetworkEngine
+        return RoadNetworkEngine.from_pbf(
+            pbf_path,
+            profile=profile,
+            cache_dir=os.getenv('ROAD_NETWORK_CACHE_DIR', 'data/road_network'),
+            build=False
+        )
+    except Exception as e:
+        print(f"⚠️ Malha viária indisponível ({e}) - usando haversine")
+        return None
+
+
+def warm_road_networks():
+    """Startup: carrega os grafos do cache antes da primeira otimização"""
+    if os.getenv('ROAD_NETWORK_PBF'):
+        for profile in ROAD_PROFILES:
+            get_road_network_provider(profile)
+
+
+def get_distance_provider(profile: str = 'car') -> DistanceMatrixProvider:
+    """Provedor padrão: malha viária se configurada, senão haversine"""
+    return get_road_network_provider(profile) or haversine_provider
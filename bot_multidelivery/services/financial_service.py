@@ -13,6 +13,9 @@ from typing import List, Dict, Optional, Tuple
 import json
 import logging
 
+from ..financial_store import FinancialReportStore
+from ..serialization import dump_file, load_file
+
 logger = logging.getLogger(__name__)
 
 
@@ -93,6 +96,9 @@ class FinancialService:
         self.daily_dir.mkdir(exist_ok=True)
         self.weekly_dir.mkdir(exist_ok=True)
         
+        # Relatórios diários indexados por data (daily_*.json antigos importados na primeira vez)
+        self.store = FinancialReportStore(self.data_dir)
+        
         self._load_or_create_config()
     
     def _load_or_create_config(self):
@@ -176,82 +182,34 @@ class FinancialService:
             expenses=expenses or []
         )
         
-
-        # Salva relatório em JSON (Legado/Backup)
-        try:
-            filename = self.daily_dir / f"daily_{date_str}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(report.to_dict(), f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            logger.error(f"Erro salvando JSON financeiro: {e}")
-
-        # Salva relatório no PostgreSQL (Principal)
-        try:
-            from bot_multidelivery.database import db_manager, DailyFinancialReportDB
-            
-            with db_manager.get_session() as session:
-                # Upsert (Update or Insert)
-                existing = session.query(DailyFinancialReportDB).filter_by(date=date_str).first()
-                
-                if existing:
-                    existing.revenue = revenue
-                    existing.delivery_costs = total_delivery_costs
-                    existing.other_costs = other_costs
-                    existing.net_profit = net_profit
-                    existing.total_packages = total_packages
-                    existing.total_deliveries = total_deliveries
-                    existing.deliverer_breakdown = deliverer_costs
-                    existing.expenses = expenses or []
-                    print(f"🔄 Financeiro atualizado no DB para {date_str}")
-                else:
-                    new_db_report = DailyFinancialReportDB(
-                        date=date_str,
-                        revenue=revenue,
-                        delivery_costs=total_delivery_costs,
-                        other_costs=other_costs,
-                        net_profit=net_profit,
-                        total_packages=total_packages,
-                        total_deliveries=total_deliveries,
-                        deliverer_breakdown=deliverer_costs,
-                        expenses=expenses or []
-                    )
-                    session.add(new_db_report)
-                    print(f"✅ Novo registro financeiro criado no DB para {date_str}")
-                
-        except Exception as e:
-            logger.warning(f"⚠️ Não foi possível salvar financeiro no banco de dados: {e}")
+        # Índice por data: tabela daily_financial_reports (quando conectado) + log local
+        self.store.put(report.to_dict())
         
         logger.info(f"Fechamento diário salvo: {date_str} | Lucro: R$ {net_profit:.2f}")
         return report
     
     def get_daily_report(self, date: datetime) -> Optional[DailyFinancialReport]:
         """Busca relatório diário específico"""
-        date_str = date.strftime('%Y-%m-%d')
-        filename = self.daily_dir / f"daily_{date_str}.json"
-        
-        if not filename.exists():
-            return None
-        
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return DailyFinancialReport.from_dict(data)
+        data = self.store.get(date)
+        return DailyFinancialReport.from_dict(data) if data else None
     
     def get_daily_reports_range(
         self, 
         start_date: datetime, 
         end_date: datetime
     ) -> List[DailyFinancialReport]:
-        """Busca relatórios diários em um intervalo"""
-        reports = []
-        current = start_date
-        
-        while current <= end_date:
-            report = self.get_daily_report(current)
-            if report:
-                reports.append(report)
-            current += timedelta(days=1)
+        """Busca relatórios diários em um intervalo (uma consulta, só os dias com dados)"""
+        return [DailyFinancialReport.from_dict(data) for data in self.store.range(start_date, end_date)]
+    
+    def get_monthly_totals(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+        """
+        Totais por mês no intervalo (ex.: últimos 12 meses) numa consulta só.
         
-        return reports
+        Returns:
+            [{'month': 'YYYY-MM', 'days_with_data', 'revenue', 'delivery_costs',
+              'other_costs', 'net_profit', 'total_packages', 'total_deliveries'}, ...]
+        """
+        return self.store.monthly_totals(start_date, end_date)
     
     def close_week(
         self,
@@ -315,8 +273,7 @@ class FinancialService:
         
         # Salva relatório semanal
         filename = self.weekly_dir / f"week_{week_start.strftime('%Y-%m-%d')}.json"
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(report.to_dict(), f, indent=2, ensure_ascii=False)
+        dump_file(filename, report.to_dict(), 'financial_weekly')
         
         # Gera mensagem formatada
         message = self._format_weekly_report(report)
@@ -380,9 +337,7 @@ class FinancialService:
         if not filename.exists():
             return None
         
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return WeeklyFinancialReport.from_dict(data)
+        return WeeklyFinancialReport.from_dict(load_file(filename, 'financial_weekly'))
     
     def get_month_summary(self, year: int, month: int) -> Dict:
         """Gera resumo financeiro do mês"""
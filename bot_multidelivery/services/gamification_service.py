@@ -3,7 +3,7 @@
 Engajamento dos entregadores através de mecânicas de jogo
 """
 from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 from dataclasses import dataclass
 from enum import Enum
 
@@ -206,38 +206,8 @@ class GamificationService:
     
     def _calculate_streak(self, deliverer_id: int) -> int:
         """Calcula dias consecutivos de entregas"""
-        packages = self.data_store.get_all_packages()
-        
-        # Filtra pacotes do entregador
-        deliverer_packages = [
-            p for p in packages 
-            if p.get('assigned_to') == deliverer_id and p.get('status') == 'delivered'
-        ]
-        
-        if not deliverer_packages:
-            return 0
-        
-        # Ordena por data de entrega
-        sorted_packages = sorted(
-            deliverer_packages,
-            key=lambda p: datetime.fromisoformat(p.get('delivered_at', '2000-01-01')),
-            reverse=True
-        )
-        
-        # Conta dias consecutivos
-        streak = 0
-        current_date = datetime.now().date()
-        
-        for pkg in sorted_packages:
-            delivered_date = datetime.fromisoformat(pkg['delivered_at']).date()
-            
-            if delivered_date == current_date:
-                streak += 1
-                current_date -= timedelta(days=1)
-            elif delivered_date < current_date:
-                break
-        
-        return streak
+        # Dias com entrega mantidos pelos contadores do histórico
+        return self.data_store.package_stats.streak(deliverer_id)
 
 
 # Singleton
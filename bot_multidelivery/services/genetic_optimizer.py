@@ -4,9 +4,11 @@ Muito mais foda que K-means - resolve TSP de forma criativa
 """
 import random
 import math
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
 
+from .distance_matrix import DistanceMatrixProvider
+
 
 @dataclass
 class GeneticConfig:
@@ -20,8 +22,11 @@ class GeneticConfig:
 class GeneticRouteOptimizer:
     """Otimizador genético para rotas de entrega"""
     
-    def __init__(self, config: GeneticConfig = None):
+    def __init__(self, config: GeneticConfig = None,
+                 distance_provider: Optional[DistanceMatrixProvider] = None):
         self.config = config or GeneticConfig()
+        # Sem provedor: haversine ponto a ponto (comportamento original)
+        self.distance_provider = distance_provider
     
     def optimize(self, points: List[Tuple[float, float]], 
                 base_coords: Tuple[float, float]) -> List[int]:
@@ -35,9 +40,14 @@ class GeneticRouteOptimizer:
         Returns:
             Lista de índices na ordem otimizada
         """
+        # Matriz [base] + pontos calculada uma vez (índice 0 = base)
+        matrix = None
+        if self.distance_provider is not None:
+            matrix = self.distance_provider.matrix([base_coords] + list(points))
+        
         if len(points) <= 3:
             # Pra poucos pontos, força bruta é melhor
-            return self._brute_force_optimize(points, base_coords)
+            return self._brute_force_optimize(points, base_coords, matrix)
         
         # Algoritmo genético
         population = self._create_initial_population(len(points))
@@ -45,7 +55,7 @@ class GeneticRouteOptimizer:
         for generation in range(self.config.generations):
             # Avalia fitness de cada indivíduo
             fitness_scores = [
-                self._calculate_fitness(individual, points, base_coords)
+                self._calculate_fitness(individual, points, base_coords, matrix)
                 for individual in population
             ]
             
@@ -75,7 +85,7 @@ class GeneticRouteOptimizer:
         
         # Retorna melhor solução
         fitness_scores = [
-            self._calculate_fitness(ind, points, base_coords)
+            self._calculate_fitness(ind, points, base_coords, matrix)
             for ind in population
         ]
         best_index = fitness_scores.index(min(fitness_scores))
@@ -96,11 +106,18 @@ class GeneticRouteOptimizer:
     
     def _calculate_fitness(self, route: List[int], 
                           points: List[Tuple[float, float]],
-                          base: Tuple[float, float]) -> float:
+                          base: Tuple[float, float],
+                          matrix: Optional[List[List[float]]] = None) -> float:
         """
         Calcula fitness (menor = melhor).
-        Fitness = distância total da rota
+        Fitness = distância total da rota (ou custo da matriz do provedor)
         """
+        if matrix is not None:
+            total = matrix[0][route[0] + 1] + matrix[route[-1] + 1][0]
+            for i in range(len(route) - 1):
+                total += matrix[route[i] + 1][route[i + 1] + 1]
+            return total
+        
         total_distance = 0.0
         
         # Base → primeiro ponto
@@ -161,7 +178,8 @@ class GeneticRouteOptimizer:
         return mutated
     
     def _brute_force_optimize(self, points: List[Tuple[float, float]], 
-                             base: Tuple[float, float]) -> List[int]:
+                             base: Tuple[float, float],
+                             matrix: Optional[List[List[float]]] = None) -> List[int]:
         """Força bruta para poucos pontos"""
         from itertools import permutations
         
@@ -170,7 +188,7 @@ class GeneticRouteOptimizer:
         best_distance = float('inf')
         
         for perm in permutations(indices):
-            distance = self._calculate_fitness(list(perm), points, base)
+            distance = self._calculate_fitness(list(perm), points, base, matrix)
             if distance < best_distance:
                 best_distance = distance
                 best_route = list(perm)
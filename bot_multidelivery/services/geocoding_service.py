@@ -2,7 +2,6 @@
 🗺️ GEOCODING SERVICE - Cache inteligente + Fallback
 Economiza chamadas de API com cache persistente
 """
-import json
 import hashlib
 import os
 import re
@@ -12,6 +11,8 @@ from datetime import datetime, timedelta
 import math
 import logging
 
+from ..serialization import dump_file, load_file
+
 
 class GeocodingCache:
     """Cache persistente de geocoding"""
@@ -25,15 +26,13 @@ class GeocodingCache:
     def _load_cache(self) -> dict:
         if self.cache_file.exists():
             try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return load_file(self.cache_file, 'geocoding_cache')
             except:
                 return {}
         return {}
     
     def _save_cache(self):
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
+        dump_file(self.cache_file, self.cache, 'geocoding_cache')
     
     def _get_key(self, address: str) -> str:
         """Gera hash MD5 do endereço normalizado"""
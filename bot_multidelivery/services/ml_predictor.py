@@ -141,12 +141,10 @@ class DeliveryTimePredictor:
         """
         from ..persistence import data_store
         
-        packages = data_store.get_all_packages()
-        delivered = [p for p in packages if p.get('status') == 'delivered' 
-                    and p.get('delivery_time_minutes')]
+        delivered = data_store.package_stats.timed_count()
         
-        if len(delivered) < 50:
-            print(f"⚠️ Apenas {len(delivered)} entregas no histórico. Precisa de 50+ para treinar.")
+        if delivered < 50:
+            print(f"⚠️ Apenas {delivered} entregas no histórico. Precisa de 50+ para treinar.")
             return False
         
         # TODO: Implementar treinamento com sklearn
@@ -156,22 +154,20 @@ class DeliveryTimePredictor:
         # model.fit(X_train, y_train)
         # salvar_modelo(model)
         
-        print(f"✅ Modelo treinado com {len(delivered)} entregas")
+        print(f"✅ Modelo treinado com {delivered} entregas")
         return True
     
     def evaluate_accuracy(self) -> dict:
         """Avalia precisão do modelo"""
         from ..persistence import data_store
         
-        packages = data_store.get_all_packages()
-        delivered = [p for p in packages if p.get('status') == 'delivered' 
-                    and p.get('delivery_time_minutes')]
+        delivered = data_store.package_stats.last_deliveries()
         
         if len(delivered) < 10:
             return {'error': 'Dados insuficientes'}
         
         errors = []
-        for pkg in delivered[-50:]:  # Últimas 50 entregas
+        for pkg in delivered:  # Últimas 50 entregas
             actual = pkg['delivery_time_minutes']
             
             # Reconstrói features e prediz
@@ -4,11 +4,12 @@ Machine Learning para prever lucros futuros
 """
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
-import json
 import logging
 from pathlib import Path
 import statistics
 
+from ..serialization import load_file
+
 logger = logging.getLogger(__name__)
 
 
@@ -40,9 +41,7 @@ class ProjectionService:
             
             if filepath.exists():
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        report = json.load(f)
-                        reports.append(report)
+                    reports.append(load_file(filepath, 'financial_daily'))
                 except Exception as e:
                     logger.warning(f"Erro ao carregar {filename}: {e}")
             
@@ -0,0 +1,599 @@
+"""
+🗺️ MALHA VIÁRIA OFFLINE - Matriz de tempo de viagem sem API externa
+Lê um extrato OSM local (.pbf), pré-processa com Contraction Hierarchies
+e responde consultas muitos-para-muitos para carro ou scooter.
+
+Fluxo:
+1. Leitura do .pbf (pyosmium, opcional) → só vias transitáveis pelo perfil
+2. Compressão de trechos sem cruzamento (nós de grau 2 viram uma aresta)
+3. Contração (CH) → grafo "para cima" compacto, salvo em disco (.npz)
+4. Consultas por buckets: 1 busca reversa por destino + 1 busca direta por
+   origem, ambas só subindo na hierarquia (poucas centenas de nós cada)
+
+Sem osmium instalado o motor ainda funciona via `from_edges` (grafo próprio)
+ou carregando um cache .npz já pré-processado.
+"""
+import heapq
+import json
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .distance_matrix import DistanceMatrixProvider
+
+try:
+    import osmium
+    HAS_OSMIUM = True
+except ImportError:
+    osmium = None
+    HAS_OSMIUM = False
+
+
+CH_FORMAT_VERSION = 1
+SNAP_CELL_DEG = 0.002        # ~220 m por célula do índice de snapping
+SNAP_MAX_RINGS = 8           # procura até ~1.8 km em volta do ponto
+WITNESS_MAX_SETTLED = 40     # limite da busca de testemunha na contração
+INF = float('inf')
+
+
+@dataclass
+class TravelProfile:
+    """Perfil de deslocamento: velocidade por tipo de via (km/h)"""
+    name: str
+    speeds_kmh: Dict[str, float]
+    respect_oneway: bool = True
+    access_speed_kmh: float = 15.0   # ponto → nó mais próximo / pares sem caminho
+    detour_factor: float = 1.3       # fator sobre linha reta quando não há caminho
+    blocked_access: Tuple[str, ...] = ('no', 'private')
+
+
+PROFILES: Dict[str, TravelProfile] = {
+    'car': TravelProfile(
+        name='car',
+        speeds_kmh={
+            'motorway': 80, 'motorway_link': 45,
+            'trunk': 60, 'trunk_link': 40,
+            'primary': 45, 'primary_link': 30,
+            'secondary': 40, 'secondary_link': 30,
+            'tertiary': 35, 'tertiary_link': 25,
+            'unclassified': 25, 'residential': 25,
+            'living_street': 10, 'service': 15,
+        },
+        respect_oneway=True,
+        access_speed_kmh=15.0,
+    ),
+    # Scooter elétrica: teto de 25 km/h (ScooterRouteOptimizer.AVG_SPEED_KMH),
+    # sem vias expressas e aceitando ciclovias
+    'scooter': TravelProfile(
+        name='scooter',
+        speeds_kmh={
+            'primary': 25, 'primary_link': 22,
+            'secondary': 25, 'secondary_link': 22,
+            'tertiary': 25, 'tertiary_link': 22,
+            'unclassified': 22, 'residential': 22,
+            'living_street': 12, 'service': 15,
+            'cycleway': 20, 'track': 12,
+        },
+        respect_oneway=False,  # mesma premissa do ScooterRouteOptimizer (contramão)
+        access_speed_kmh=12.0,
+    ),
+}
+
+
+def _meters(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Haversine em metros"""
+    rlat1, rlat2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((rlat2 - rlat1) / 2) ** 2 +
+         math.cos(rlat1) * math.cos(rlat2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 6371000.0 * 2 * math.asin(math.sqrt(min(1.0, a)))
+
+
+# ==================== LEITURA DO PBF ====================
+
+def _oneway_direction(tags) -> int:
+    """1 = só no sentido da via, -1 = só no sentido contrário, 0 = mão dupla"""
+    value = tags.get('oneway', '')
+    if value in ('yes', 'true', '1'):
+        return 1
+    if value == '-1':
+        return -1
+    if tags.get('junction') in ('roundabout', 'circular') or tags.get('highway') == 'motorway':
+        return 1
+    return 0
+
+
+def read_pbf_edges(pbf_path: str, profile: TravelProfile,
+                   bbox: Optional[Tuple[float, float, float, float]] = None
+                   ) -> Tuple[List[Tuple[float, float]], List[Tuple[int, int, float, float]]]:
+    """
+    Lê vias do extrato OSM e devolve (coords, arestas dirigidas).
+
+    Só nós de cruzamento/extremidade viram vértices; os intermediários são
+    absorvidos na aresta (tempo e metros somados).
+    bbox = (lat_min, lng_min, lat_max, lng_max) recorta o extrato.
+    """
+    if not HAS_OSMIUM:
+        raise RuntimeError("pyosmium não instalado (pip install osmium)")
+
+    class _WayCollector(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.ways = []         # (refs, velocidade m/s, sentido)
+            self.locations = {}    # osm node id -> (lat, lng)
+            self.usage = {}        # osm node id -> nº de vias que passam
+
+        def way(self, w):
+            tags = w.tags
+            speed = profile.speeds_kmh.get(tags.get('highway'))
+            if not speed or tags.get('access') in profile.blocked_access:
+                return
+
+            direction = _oneway_direction(tags) if profile.respect_oneway else 0
+            refs = []
+            for node in w.nodes:
+                if not node.location.valid():
+                    continue
+                lat, lng = node.location.lat, node.location.lon
+                if bbox and not (bbox[0] <= lat <= bbox[2] and bbox[1] <= lng <= bbox[3]):
+                    # Sai do recorte: fecha o trecho atual
+                    if len(refs) > 1:
+                        self.ways.append((refs, speed / 3.6, direction))
+                    refs = []
+                    continue
+                refs.append(node.ref)
+                self.locations[node.ref] = (lat, lng)
+
+            if len(refs) > 1:
+                self.ways.append((refs, speed / 3.6, direction))
+
+    collector = _WayCollector()
+    collector.apply_file(pbf_path, locations=True)
+
+    for refs, _, _ in collector.ways:
+        for ref in refs:
+            collector.usage[ref] = collector.usage.get(ref, 0) + 1
+
+    node_index: Dict[int, int] = {}
+    coords: List[Tuple[float, float]] = []
+    edges: List[Tuple[int, int, float, float]] = []
+
+    def vertex(ref: int) -> int:
+        idx = node_index.get(ref)
+        if idx is None:
+            idx = node_index[ref] = len(coords)
+            coords.append(collector.locations[ref])
+        return idx
+
+    for refs, speed_ms, direction in collector.ways:
+        start = refs[0]
+        meters = 0.0
+        for prev, ref in zip(refs, refs[1:]):
+            meters += _meters(*collector.locations[prev], *collector.locations[ref])
+            is_junction = collector.usage[ref] > 1 or ref == refs[-1]
+            if not is_junction:
+                continue
+            u, v = vertex(start), vertex(ref)
+            if u != v:
+                seconds = meters / speed_ms
+                if direction >= 0:
+                    edges.append((u, v, seconds, meters))
+                if direction <= 0:
+                    edges.append((v, u, seconds, meters))
+            start, meters = ref, 0.0
+
+    return coords, edges
+
+
+# ==================== CONTRAÇÃO ====================
+
+def _witness_search(out: List[dict], source: int, skip: int,
+                    limit: float, max_settled: int) -> Dict[int, float]:
+    """Dijkstra local a partir de `source` ignorando o nó sendo contraído"""
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        if d > limit or settled >= max_settled:
+            break
+        settled += 1
+        for v, (w, _) in out[u].items():
+            if v == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+
+def _needed_shortcuts(out: List[dict], inc: List[dict], v: int,
+                      max_settled: int) -> List[Tuple[int, int, float, float]]:
+    """Atalhos u→x necessários para contrair v sem perder caminhos mínimos"""
+    outs = list(out[v].items())
+    if not outs or not inc[v]:
+        return []
+
+    max_out = max(w for _, (w, _) in outs)
+    shortcuts = []
+    for u, (wu, du) in inc[v].items():
+        dist = _witness_search(out, u, v, wu + max_out, max_settled)
+        for x, (wx, dx) in outs:
+            if x == u:
+                continue
+            via = wu + wx
+            if dist.get(x, INF) > via:
+                shortcuts.append((u, x, via, du + dx))
+    return shortcuts
+
+
+def build_contraction_hierarchy(num_nodes: int, edges: Sequence[Tuple[int, int, float, float]],
+                                max_settled: int = WITNESS_MAX_SETTLED):
+    """
+    Contrai o grafo e devolve (up_out, up_in):
+    - up_out[v]: arestas v→x com rank(x) > rank(v)  (busca direta, origem)
+    - up_in[v]:  arestas u→v com rank(u) > rank(v)  (busca reversa, destino)
+    Cada aresta é (vizinho, segundos, metros).
+    """
+    out: List[dict] = [dict() for _ in range(num_nodes)]
+    inc: List[dict] = [dict() for _ in range(num_nodes)]
+
+    def add_edge(u: int, v: int, w: float, d: float):
+        current = out[u].get(v)
+        if current is None or w < current[0]:
+            out[u][v] = (w, d)
+            inc[v][u] = (w, d)
+
+    for u, v, w, d in edges:
+        if u != v:
+            add_edge(u, v, w, d)
+
+    deleted = [0] * num_nodes
+    contracted = [False] * num_nodes
+    up_out: List[list] = [[] for _ in range(num_nodes)]
+    up_in: List[list] = [[] for _ in range(num_nodes)]
+
+    def priority(v: int, shortcuts: list) -> int:
+        return len(shortcuts) - len(out[v]) - len(inc[v]) + deleted[v]
+
+    heap = [(priority(v, _needed_shortcuts(out, inc, v, max_settled)), v) for v in range(num_nodes)]
+    heapq.heapify(heap)
+
+    while heap:
+        _, v = heapq.heappop(heap)
+        if contracted[v]:
+            continue
+
+        # Atualização preguiçosa: recalcula e só contrai se ainda for o menor
+        shortcuts = _needed_shortcuts(out, inc, v, max_settled)
+        p = priority(v, shortcuts)
+        if heap and p > heap[0][0]:
+            heapq.heappush(heap, (p, v))
+            continue
+
+        for u, x, w, d in shortcuts:
+            add_edge(u, x, w, d)
+
+        contracted[v] = True
+        up_out[v] = [(x, w, d) for x, (w, d) in out[v].items()]
+        up_in[v] = [(u, w, d) for u, (w, d) in inc[v].items()]
+
+        for x in out[v]:
+            del inc[x][v]
+            deleted[x] += 1
+        for u in inc[v]:
+            del out[u][v]
+            deleted[u] += 1
+        out[v] = {}
+        inc[v] = {}
+
+    return up_out, up_in
+
+
+def _to_csr(adjacency: List[list]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Lista de adjacência → arrays compactos (offsets, alvos, segundos, metros)"""
+    offsets = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(a) for a in adjacency])
+    flat = [edge for a in adjacency for edge in a]
+    targets = np.array([e[0] for e in flat], dtype=np.int32)
+    weights = np.array([e[1] for e in flat], dtype=np.float64)
+    meters = np.array([e[2] for e in flat], dtype=np.float64)
+    return offsets, targets, weights, meters
+
+
+# ==================== MOTOR ====================
+
+@dataclass
+class _Csr:
+    """Grafo compacto em listas Python (indexação rápida nas buscas)"""
+    offsets: List[int]
+    targets: List[int]
+    weights: List[float]
+    meters: List[float]
+
+    @classmethod
+    def from_arrays(cls, offsets, targets, weights, meters) -> '_Csr':
+        return cls(offsets.tolist(), targets.tolist(), weights.tolist(), meters.tolist())
+
+
+@dataclass
+class RoadNetworkEngine(DistanceMatrixProvider):
+    """
+    Matriz de tempo de viagem sobre a malha viária pré-processada.
+
+    `matrix(coords)` devolve minutos (interface dos otimizadores);
+    `table(sources, targets)` devolve (segundos, metros).
+    """
+    profile: TravelProfile
+    lats: np.ndarray
+    lngs: np.ndarray
+    arrays: Dict[str, np.ndarray]
+    meta: dict = field(default_factory=dict)
+
+    metric = 'minutes'
+
+    def __post_init__(self):
+        a = self.arrays
+        self._up = _Csr.from_arrays(a['up_off'], a['up_tgt'], a['up_w'], a['up_m'])
+        self._down = _Csr.from_arrays(a['down_off'], a['down_tgt'], a['down_w'], a['down_m'])
+        self._lat_list = self.lats.tolist()
+        self._lng_list = self.lngs.tolist()
+        self._grid: Dict[Tuple[int, int], List[int]] = {}
+        for idx, (lat, lng) in enumerate(zip(self._lat_list, self._lng_list)):
+            cell = (int(math.floor(lat / SNAP_CELL_DEG)), int(math.floor(lng / SNAP_CELL_DEG)))
+            self._grid.setdefault(cell, []).append(idx)
+
+    # ---------- construção ----------
+
+    @classmethod
+    def from_edges(cls, coords: Sequence[Tuple[float, float]],
+                   edges: Sequence[Tuple[int, int, float, float]],
+                   profile: str = 'car') -> 'RoadNetworkEngine':
+        """
+        Monta o motor a partir de um grafo já pronto.
+
+        coords: (lat, lng) por vértice; edges: (u, v, segundos, metros) dirigidas.
+        """
+        up_out, up_in = build_contraction_hierarchy(len(coords), edges)
+        up = _to_csr(up_out)
+        down = _to_csr(up_in)
+        arrays = {
+            'up_off': up[0], 'up_tgt': up[1], 'up_w': up[2], 'up_m': up[3],
+            'down_off': down[0], 'down_tgt': down[1], 'down_w': down[2], 'down_m': down[3],
+        }
+        return cls(
+            profile=PROFILES[profile],
+            lats=np.array([c[0] for c in coords], dtype=np.float64),
+            lngs=np.array([c[1] for c in coords], dtype=np.float64),
+            arrays=arrays,
+            meta={'version': CH_FORMAT_VERSION, 'profile': profile,
+                  'nodes': len(coords), 'edges': len(edges)}
+        )
+
+    @classmethod
+    def from_pbf(cls, pbf_path: str, profile: str = 'car',
+                 cache_dir: Optional[str] = 'data/road_network',
+                 bbox: Optional[Tuple[float, float, float, float]] = None,
+                 build: bool = True) -> 'RoadNetworkEngine':
+        """
+        Carrega do cache em disco se ainda válido; senão lê o .pbf, contrai e salva.
+        O cache é invalidado quando o .pbf muda (tamanho/mtime), o perfil ou o recorte.
+        build=False: só carrega (cache ausente/desatualizado → FileNotFoundError).
+        """
+        stat = os.stat(pbf_path)
+        source = {
+            'source': os.path.abspath(pbf_path),
+            'size': stat.st_size,
+            'mtime': int(stat.st_mtime),
+            'profile': profile,
+            'bbox': list(bbox) if bbox else None,
+            'version': CH_FORMAT_VERSION,
+        }
+
+        cache_path = None
+        if cache_dir:
+            stem = os.path.splitext(os.path.basename(pbf_path))[0]
+            cache_path = os.path.join(cache_dir, f"{stem}.{profile}.ch.npz")
+            if os.path.exists(cache_path):
+                try:
+                    engine = cls.load(cache_path)
+                    if all(engine.meta.get(k) == v for k, v in source.items()):
+                        return engine
+                except Exception as e:
+                    print(f"⚠️ Cache da malha inválido ({e}) - reprocessando")
+
+        if not build:
+            raise FileNotFoundError(f"malha {profile} sem cache válido em {cache_path} "
+                                    f"(gere com scripts/build_road_network.py)")
+
+        print(f"🗺️ Pré-processando malha viária ({profile}): {pbf_path}")
+        coords, edges = read_pbf_edges(pbf_path, PROFILES[profile], bbox)
+        engine = cls.from_edges(coords, edges, profile=profile)
+        engine.meta.update(source)
+
+        if cache_path:
+            engine.save(cache_path)
+            print(f"💾 Malha salva em cache: {cache_path}")
+        return engine
+
+    def save(self, path: str):
+        """Salva o grafo contraído (.npz compactado, sem pickle)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(
+            path, lats=self.lats, lngs=self.lngs,
+            meta=np.array(json.dumps(self.meta)), **self.arrays
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'RoadNetworkEngine':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != CH_FORMAT_VERSION:
+                raise ValueError(f"versão {meta.get('version')} != {CH_FORMAT_VERSION}")
+            arrays = {k: data[k] for k in data.files if k not in ('lats', 'lngs', 'meta')}
+            return cls(
+                profile=PROFILES[meta.get('profile', 'car')],
+                lats=data['lats'], lngs=data['lngs'], arrays=arrays, meta=meta
+            )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self._lat_list)
+
+    # ---------- snapping ----------
+
+    def snap(self, lat: float, lng: float) -> Tuple[int, float]:
+        """Nó mais próximo do ponto → (índice, metros até ele); (-1, inf) se fora da malha"""
+        cell_lat = int(math.floor(lat / SNAP_CELL_DEG))
+        cell_lng = int(math.floor(lng / SNAP_CELL_DEG))
+        cos_lat = math.cos(math.radians(lat))
+        best, best_d2 = -1, INF
+        found_ring = None
+
+        for ring in range(SNAP_MAX_RINGS + 1):
+            # Um anel a mais depois do primeiro achado (o mais perto pode estar ao lado)
+            if found_ring is not None and ring > found_ring + 1:
+                break
+            for dlat in range(-ring, ring + 1):
+                for dlng in range(-ring, ring + 1):
+                    if max(abs(dlat), abs(dlng)) != ring:
+                        continue
+                    for idx in self._grid.get((cell_lat + dlat, cell_lng + dlng), ()):
+                        dy = self._lat_list[idx] - lat
+                        dx = (self._lng_list[idx] - lng) * cos_lat
+                        d2 = dx * dx + dy * dy
+                        if d2 < best_d2:
+                            best, best_d2 = idx, d2
+            if best >= 0 and found_ring is None:
+                found_ring = ring
+
+        if best < 0:
+            return -1, INF
+        return best, _meters(lat, lng, self._lat_list[best], self._lng_list[best])
+
+    # ---------- consultas ----------
+
+    @staticmethod
+    def _upward_search(start: int, graph: _Csr, stall: _Csr) -> List[Tuple[int, float, float]]:
+        """
+        Dijkstra só subindo na hierarquia, com stall-on-demand:
+        nós alcançáveis mais barato por um vizinho de rank maior não expandem.
+        """
+        offsets, targets, weights, meters = graph.offsets, graph.targets, graph.weights, graph.meters
+        s_off, s_tgt, s_w = stall.offsets, stall.targets, stall.weights
+        dist = {start: 0.0}
+        dist_m = {start: 0.0}
+        heap = [(0.0, start)]
+        settled = []
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+
+            stalled = False
+            for e in range(s_off[u], s_off[u + 1]):
+                dv = dist.get(s_tgt[e])
+                if dv is not None and dv + s_w[e] < d:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+
+            settled.append((u, d, dist_m[u]))
+            m = dist_m[u]
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    dist_m[v] = m + meters[e]
+                    heapq.heappush(heap, (nd, v))
+
+        return settled
+
+    def table(self, sources: Sequence[Tuple[float, float]],
+              targets: Optional[Sequence[Tuple[float, float]]] = None
+              ) -> Tuple[List[List[float]], List[List[float]]]:
+        """
+        Matriz muitos-para-muitos → (segundos, metros).
+
+        Cada ponto é ligado ao nó mais próximo (trecho em linha reta na
+        velocidade de acesso do perfil). Pares sem caminho na malha caem
+        para linha reta × detour_factor.
+        """
+        if targets is None:
+            targets = sources
+
+        access_ms = self.profile.access_speed_kmh / 3.6
+        src_snap = [self.snap(lat, lng) for lat, lng in sources]
+        tgt_snap = [self.snap(lat, lng) for lat, lng in targets]
+
+        # Buscas reversas: uma por nó-destino distinto
+        tgt_nodes = sorted({node for node, _ in tgt_snap if node >= 0})
+        tgt_col = {node: k for k, node in enumerate(tgt_nodes)}
+        buckets: Dict[int, List[Tuple[int, float, float]]] = {}
+        for k, node in enumerate(tgt_nodes):
+            for v, d, m in self._upward_search(node, self._down, self._up):
+                buckets.setdefault(v, []).append((k, d, m))
+
+        # Buscas diretas: uma por nó-origem distinto
+        node_rows: Dict[int, Tuple[List[float], List[float]]] = {}
+        for node, _ in src_snap:
+            if node < 0 or node in node_rows:
+                continue
+            row_s = [INF] * len(tgt_nodes)
+            row_m = [INF] * len(tgt_nodes)
+            for v, d, m in self._upward_search(node, self._up, self._down):
+                bucket = buckets.get(v)
+                if bucket is None:
+                    continue
+                for k, d2, m2 in bucket:
+                    t = d + d2
+                    if t < row_s[k]:
+                        row_s[k] = t
+                        row_m[k] = m + m2
+            node_rows[node] = (row_s, row_m)
+
+        seconds = [[0.0] * len(targets) for _ in sources]
+        meters = [[0.0] * len(targets) for _ in sources]
+        for i, (src_node, src_off) in enumerate(src_snap):
+            s_lat, s_lng = sources[i]
+            row = node_rows.get(src_node)
+            for j, (tgt_node, tgt_off) in enumerate(tgt_snap):
+                t_lat, t_lng = targets[j]
+                if s_lat == t_lat and s_lng == t_lng:
+                    continue
+
+                graph_s = INF
+                if row is not None and tgt_node >= 0 and src_node != tgt_node:
+                    k = tgt_col[tgt_node]
+                    graph_s, graph_m = row[0][k], row[1][k]
+
+                if graph_s < INF:
+                    seconds[i][j] = graph_s + (src_off + tgt_off) / access_ms
+                    meters[i][j] = graph_m + src_off + tgt_off
+                else:
+                    straight = _meters(s_lat, s_lng, t_lat, t_lng) * self.profile.detour_factor
+                    seconds[i][j] = straight / access_ms
+                    meters[i][j] = straight
+
+        return seconds, meters
+
+    def matrix(self, coords: List[Tuple[float, float]]) -> List[List[float]]:
+        """Interface dos otimizadores: tempo de viagem em minutos"""
+        return self.duration_matrix(coords)
+
+    def duration_matrix(self, coords: List[Tuple[float, float]]) -> List[List[float]]:
+        seconds, _ = self.table(coords)
+        return [[s / 60.0 for s in row] for row in seconds]
+
+    def distance_matrix(self, coords: List[Tuple[float, float]]) -> List[List[float]]:
+        """Distância percorrida pela malha, em km"""
+        _, meters = self.table(coords)
+        return [[m / 1000.0 for m in row] for row in meters]
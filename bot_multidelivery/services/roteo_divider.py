@@ -12,6 +12,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from bot_multidelivery.parsers.shopee_parser import ShopeeDelivery, ShopeeRomaneioParser
 from bot_multidelivery.services.scooter_optimizer import ScooterRouteOptimizer
+from bot_multidelivery.services.distance_matrix import get_road_network_provider
 
 
 @dataclass
@@ -42,7 +43,9 @@ class RoteoDivider:
     """
     
     def __init__(self):
-        self.optimizer = ScooterRouteOptimizer()
+        self.optimizer = ScooterRouteOptimizer(
+            distance_provider=get_road_network_provider('scooter')
+        )
     
     def divide_romaneio(
         self, 
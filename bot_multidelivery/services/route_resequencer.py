@@ -0,0 +1,165 @@
+"""
+🧭 RESSEQUENCIAMENTO AO VIVO - Reordena as paradas pendentes pela posição GPS
+Entregador pulou parada ou pegou desvio? Recalcula só o que falta, em milissegundos.
+
+1. Agrupa pendentes por prédio (mesma parada)
+2. Vizinho mais próximo a partir da posição atual (índice de grade)
+3. 2-opt com listas de vizinhos, limitado por orçamento de tempo
+4. Fica com a melhor entre a ordem nova e a ordem antiga (a partir do GPS)
+"""
+import math
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from ..clustering import DeliveryPoint, Stop, aggregate_stops, expand_stops
+from ..spatial import GridIndex, LocalProjection
+
+
+@dataclass
+class ResequenceResult:
+    """Resultado do ressequenciamento de uma rota"""
+    route_id: str
+    pending: List[DeliveryPoint]   # pendentes na nova ordem
+    stops: int                     # paradas (prédios) pendentes
+    distance_m: float              # percurso restante estimado (linha reta)
+    previous_distance_m: float     # mesmo percurso na ordem antiga
+    elapsed_ms: float
+    changed: bool                  # ordem nova difere da antiga
+
+    @property
+    def next_stop(self) -> Optional[DeliveryPoint]:
+        return self.pending[0] if self.pending else None
+
+
+class RouteResequencer:
+    """Reordena paradas pendentes de uma rota a partir da posição atual"""
+
+    def __init__(self, time_budget_ms: float = 20.0, neighbors: int = 8):
+        self.time_budget_ms = time_budget_ms
+        self.neighbors = neighbors
+
+    def resequence(self, route, lat: float, lng: float,
+                   delivered: Optional[Iterable[str]] = None) -> ResequenceResult:
+        """
+        Args:
+            route: Route da sessão (usa optimized_order e delivered_packages)
+            lat, lng: posição atual do entregador
+            delivered: package_ids entregues ainda não sincronizados na rota
+        """
+        started = time.perf_counter()
+        deadline = started + self.time_budget_ms / 1000.0
+
+        done = set(route.delivered_packages)
+        if delivered:
+            done.update(delivered)
+        pending = [p for p in route.optimized_order if p.package_id not in done]
+        stops = aggregate_stops(pending)
+
+        proj = LocalProjection(lat)
+        # Nó 0 = posição atual; paradas são 1..m
+        xy = [proj.project(lat, lng)] + [proj.project(s.lat, s.lng) for s in stops]
+
+        previous = list(range(1, len(stops) + 1))
+        previous_cost = self._path_cost(xy, previous)
+
+        if len(stops) <= 2:
+            order = self._nearest_neighbor(stops, lat, lng) if stops else []
+        else:
+            order = self._nearest_neighbor(stops, lat, lng)
+            if previous_cost < self._path_cost(xy, order):
+                order = previous
+            order = self._two_opt(xy, order, stops, lat, lng, deadline)
+
+        cost = self._path_cost(xy, order)
+        if cost >= previous_cost:
+            order, cost = previous, previous_cost
+
+        new_pending = expand_stops([stops[i - 1] for i in order])
+        return ResequenceResult(
+            route_id=route.id,
+            pending=new_pending,
+            stops=len(stops),
+            distance_m=round(cost, 1),
+            previous_distance_m=round(previous_cost, 1),
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+            changed=order != previous,
+        )
+
+    @staticmethod
+    def _path_cost(xy: List[Tuple[float, float]], order: List[int]) -> float:
+        """Percurso aberto: posição atual → paradas na ordem (sem volta à base)"""
+        total, prev = 0.0, 0
+        for node in order:
+            total += math.hypot(xy[node][0] - xy[prev][0], xy[node][1] - xy[prev][1])
+            prev = node
+        return total
+
+    @staticmethod
+    def _nearest_neighbor(stops: List[Stop], lat: float, lng: float) -> List[int]:
+        """Construção gulosa usando o índice (remove cada parada visitada)"""
+        index = GridIndex.build(((i, s.lat, s.lng) for i, s in enumerate(stops, 1)), ref_lat=lat)
+        order = []
+        cur_lat, cur_lng = lat, lng
+        while len(index):
+            key, _ = index.nearest(cur_lat, cur_lng, k=1)[0]
+            order.append(key)
+            cur_lat, cur_lng = index.position(key)
+            index.remove(key)
+        return order
+
+    def _two_opt(self, xy: List[Tuple[float, float]], order: List[int],
+                 stops: List[Stop], lat: float, lng: float, deadline: float) -> List[int]:
+        """
+        2-opt em caminho aberto com início fixo, testando só pares de vizinhos
+        próximos (listas de k vizinhos). Para no orçamento de tempo.
+        """
+        index = GridIndex.build(((i, s.lat, s.lng) for i, s in enumerate(stops, 1)), ref_lat=lat)
+        near = {0: [key for key, _ in index.nearest(lat, lng, k=self.neighbors)]}
+        
+        def neighbors_of(node: int) -> List[int]:
+            # Sob demanda: com orçamento curto nem todas as paradas chegam a ser visitadas
+            found = near.get(node)
+            if found is None:
+                stop = stops[node - 1]
+                found = near[node] = [key for key, _ in index.nearest(stop.lat, stop.lng, k=self.neighbors + 1)
+                                      if key != node]
+            return found
+
+        seq = [0] + order
+        pos = [0] * len(xy)
+        for i, node in enumerate(seq):
+            pos[node] = i
+        last = len(seq) - 1
+
+        def d(a: int, b: int) -> float:
+            return math.hypot(xy[a][0] - xy[b][0], xy[a][1] - xy[b][1])
+
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i in range(last):
+                a = seq[i]
+                for c in neighbors_of(a):
+                    j = pos[c]
+                    lo, hi = (i, j) if i < j else (j, i)
+                    if hi - lo < 2:
+                        continue
+                    # Troca arestas (lo, lo+1) e (hi, hi+1) por (lo, hi) e (lo+1, hi+1)
+                    delta = d(seq[lo], seq[hi]) - d(seq[lo], seq[lo + 1])
+                    if hi < last:
+                        delta += d(seq[lo + 1], seq[hi + 1]) - d(seq[hi], seq[hi + 1])
+                    if delta < -1e-6:
+                        seq[lo + 1:hi + 1] = seq[lo + 1:hi + 1][::-1]
+                        for p in range(lo + 1, hi + 1):
+                            pos[seq[p]] = p
+                        improved = True
+                        break
+                if time.perf_counter() >= deadline:
+                    break
+
+        return seq[1:]
+
+
+# Instância global
+route_resequencer = RouteResequencer()
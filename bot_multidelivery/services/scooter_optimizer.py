@@ -3,9 +3,11 @@
 Considera: linha reta, contramão, calçadas, atalhos
 """
 import math
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from dataclasses import dataclass
 
+from .distance_matrix import DistanceMatrixProvider
+
 
 @dataclass
 class ScooterRoute:
@@ -24,8 +26,13 @@ class ScooterRouteOptimizer:
     SPEED_PENALTY_TRAFFIC = 0.85  # Menos afetado por tráfego que carro
     SHORTCUT_BONUS = 1.15  # 15% mais rápido usando atalhos
     
-    def __init__(self):
+    def __init__(self, distance_provider: Optional[DistanceMatrixProvider] = None):
         self.mode = 'euclidean'  # Sempre linha reta
+        # Com provedor (ex: malha viária perfil scooter) a ordem segue o custo da matriz;
+        # distância/tempo reportados continuam em linha reta
+        self.distance_provider = distance_provider
+        if distance_provider is not None:
+            self.mode = 'matrix'
     
     def optimize(self, points: List[Tuple[float, float]], 
                 base: Tuple[float, float]) -> ScooterRoute:
@@ -44,18 +51,32 @@ class ScooterRouteOptimizer:
         
         # Usa algoritmo guloso: sempre vai pro mais próximo
         # (para scooter, isso é melhor que genético)
-        order = self._greedy_nearest_neighbor(points, base)
+        matrix = None
+        if self.distance_provider is not None:
+            matrix = self.distance_provider.matrix([base] + list(points))
+        order = self._greedy_nearest_neighbor(points, base, matrix)
         
         return self._build_route(order, points, base)
     
     def _greedy_nearest_neighbor(self, points: List[Tuple[float, float]], 
-                                 base: Tuple[float, float]) -> List[int]:
+                                 base: Tuple[float, float],
+                                 matrix: Optional[List[List[float]]] = None) -> List[int]:
         """
         Algoritmo guloso: sempre vai pro ponto mais próximo.
         Para scooter, isso é ótimo porque pode ir em linha reta!
         """
         unvisited = set(range(len(points)))
         order = []
+        
+        if matrix is not None:
+            row = matrix[0]  # índice 0 = base
+            while unvisited:
+                nearest = min(unvisited, key=lambda i: row[i + 1])
+                order.append(nearest)
+                row = matrix[nearest + 1]
+                unvisited.remove(nearest)
+            return order
+        
         current = base
         
         while unvisited:
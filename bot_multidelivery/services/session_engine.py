@@ -3,16 +3,29 @@
 Sessões vivem, crescem, e podem ser reutilizadas
 """
 
+import asyncio
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 import json
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, insert, update, func, bindparam
 import logging
 
 logger = logging.getLogger(__name__)
 
+INSERT_CHUNK = 500  # Linhas por insert().values([...]) / barcodes por SELECT ... IN
+
+
+def _chunks(rows: List[Any], size: int = INSERT_CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _address_key(address: Optional[str]) -> str:
+    """Endereços iguais a menos de caixa e espaços viram um SessionAddress só"""
+    return " ".join((address or "").split()).casefold()
+
 
 class SessionEngine:
     """Motor de sessões - gerencia o ciclo de vida completo"""
@@ -33,7 +46,7 @@ class SessionEngine:
         Cria uma nova sessão vazia pronta para receber dados
         Retorna: session_id (UUID)
         """
-        from schemas.sessions_schema import DeliverySession, SessionAudit
+        from ..schemas.sessions_schema import DeliverySession, SessionAudit
         
         session_id = str(uuid.uuid4())
         
@@ -75,68 +88,118 @@ class SessionEngine:
         """
         Adiciona pacotes à sessão.
         Smart: Detecta e evita duplicatas por barcode
+        
+        Em lote (romaneio de 500 pacotes = poucas queries, não 500+):
+        - Duplicatas: um SELECT ... IN com os barcodes recebidos
+        - Endereços repetidos: um SessionAddress por endereço, com package_count
+        - Inserts: insert().values([...]) em blocos de INSERT_CHUNK
         """
-        from schemas.sessions_schema import SessionPackage, SessionAddress, SessionAudit
+        from ..schemas.sessions_schema import DeliverySession, SessionPackage, SessionAddress
         
-        added = 0
+        # Verifica duplicatas NA MESMA SESSÃO (e repetidos no próprio lote)
+        seen = self._existing_barcodes(session_id, [pkg.get("barcode") for pkg in packages])
+        new_packages = []
         duplicates = 0
-        
         for pkg in packages:
             barcode = pkg.get("barcode")
-            
-            # Verifica duplicata NA MESMA SESSÃO
-            existing = self.db.query(SessionPackage).filter(
-                and_(
-                    SessionPackage.session_id == session_id,
-                    SessionPackage.barcode == barcode
-                )
-            ).first()
-            
-            if existing:
+            if barcode in seen:
                 duplicates += 1
                 logger.warning(f"⚠️ Barcode duplicado em sessão: {barcode}")
                 continue
+            seen.add(barcode)
+            new_packages.append(pkg)
+        
+        if new_packages:
+            # Endereços já cadastrados na sessão (uma query) + novos, agrupados
+            address_ids = {
+                _address_key(row.address): row.address_id
+                for row in self.db.query(SessionAddress.address_id, SessionAddress.address)
+                .filter(SessionAddress.session_id == session_id)
+            }
+            counts: Dict[str, int] = {}
+            new_addresses = []
+            package_rows = []
+            now = datetime.now()
+            for pkg in new_packages:
+                address = pkg.get("address", "")
+                key = _address_key(address)
+                if key not in address_ids:
+                    address_ids[key] = str(uuid.uuid4())
+                    new_addresses.append({"address_id": address_ids[key], "session_id": session_id, "address": address})
+                address_id = address_ids[key]
+                counts[address_id] = counts.get(address_id, 0) + 1
+                
+                package_rows.append({
+                    "package_id": str(uuid.uuid4()),
+                    "session_id": session_id,
+                    "barcode": pkg.get("barcode"),
+                    "address_id": address_id,
+                    "recipient_name": pkg.get("recipient_name", ""),
+                    "recipient_phone": pkg.get("recipient_phone", ""),
+                    "address_full": address,
+                    "package_value": pkg.get("value", 0.0),
+                    "created_at": now
+                })
             
-            package_id = str(uuid.uuid4())
-            address_id = str(uuid.uuid4())
+            for row in new_addresses:
+                row["package_count"] = counts.pop(row["address_id"])
+            for chunk in _chunks(new_addresses):
+                self.db.execute(insert(SessionAddress).values(chunk))
             
-            # Cria o endereço
-            session_address = SessionAddress(
-                address_id=address_id,
-                session_id=session_id,
-                address=pkg.get("address", ""),
-                package_count=1
-            )
-            self.db.add(session_address)
+            # Endereços que já existiam: package_count += n (um UPDATE em executemany)
+            if counts:
+                table = SessionAddress.__table__
+                self.db.execute(
+                    update(table)
+                    .where(table.c.address_id == bindparam("aid"))
+                    .values(package_count=func.coalesce(table.c.package_count, 0) + bindparam("n")),
+                    [{"aid": address_id, "n": n} for address_id, n in counts.items()]
+                )
             
-            # Cria o pacote
-            new_package = SessionPackage(
-                package_id=package_id,
-                session_id=session_id,
-                barcode=barcode,
-                address_id=address_id,
-                recipient_name=pkg.get("recipient_name", ""),
-                recipient_phone=pkg.get("recipient_phone", ""),
-                address_full=pkg.get("address", ""),
-                package_value=pkg.get("value", 0.0),
-                created_at=datetime.now()
-            )
-            self.db.add(new_package)
-            added += 1
+            for chunk in _chunks(package_rows):
+                self.db.execute(insert(SessionPackage).values(chunk))
         
         # Update session stats
-        session = self.db.query(DeliverySession).filter_by(session_id=session_id).first()
-        if session:
-            session.total_packages += added
+        added = len(new_packages)
+        total = self.db.execute(
+            update(DeliverySession)
+            .where(DeliverySession.session_id == session_id)
+            .values(
+                total_packages=func.coalesce(DeliverySession.total_packages, 0) + added,
+                stats_version=func.coalesce(DeliverySession.stats_version, 0) + (1 if added else 0)
+            )
+            .returning(DeliverySession.total_packages)
+        ).scalar()
         
         self.db.commit()
         
         return {
             "added": added,
             "duplicates": duplicates,
-            "total_in_session": session.total_packages if session else 0
+            "total_in_session": total or 0
         }
     
+    def _existing_barcodes(self, session_id: str, barcodes: List[Optional[str]]) -> set:
+        """Barcodes (entre os recebidos) que já estão na sessão: um SELECT ... IN por bloco"""
+        from ..schemas.sessions_schema import SessionPackage
+        
+        wanted = {b for b in barcodes if b is not None}
+        existing = set()
+        for chunk in _chunks(sorted(wanted)):
+            existing.update(
+                row.barcode for row in self.db.query(SessionPackage.barcode).filter(
+                    SessionPackage.session_id == session_id,
+                    SessionPackage.barcode.in_(chunk)
+                )
+            )
+        if len(wanted) < len(barcodes):  # Pacote sem barcode: só um por sessão (como antes)
+            if self.db.query(SessionPackage.package_id).filter(
+                SessionPackage.session_id == session_id,
+                SessionPackage.barcode.is_(None)
+            ).first():
+                existing.add(None)
+        return existing
+    
     # ============================================
     # REUTILIZAR SESSÃO NÃO INICIADA
     # ============================================
@@ -149,7 +212,7 @@ class SessionEngine:
         Se a sessão ainda está em OPEN (não iniciada),
         pode ser reutilizada sem duplicação de dados
         """
-        from schemas.sessions_schema import DeliverySession
+        from ..schemas.sessions_schema import DeliverySession
         
         session = self.db.query(DeliverySession).filter_by(session_id=session_id).first()
         
@@ -164,6 +227,7 @@ class SessionEngine:
         # Marca como reutilizada
         session.was_reused = True
         session.reuse_count += 1
+        session.stats_version = (session.stats_version or 0) + 1
         
         result = {
             "session_id": session_id,
@@ -192,7 +256,7 @@ class SessionEngine:
         """
         Inicia a sessão: marca como ACTIVE, distribui pacotes, faz otimização
         """
-        from schemas.sessions_schema import (
+        from ..schemas.sessions_schema import (
             DeliverySession, SessionDeliverer, SessionPackage, SessionAudit
         )
         
@@ -210,6 +274,7 @@ class SessionEngine:
         
         # Registra entregadores
         session.total_deliverers = len(deliverer_ids)
+        session.stats_version = (session.stats_version or 0) + 1
         
         for deliverer_id in deliverer_ids:
             session_deliverer = SessionDeliverer(
@@ -251,61 +316,214 @@ class SessionEngine:
     ) -> Dict[str, Any]:
         """
         Marca pacote como entregue e auto-calcula financeiro
+        Idempotente: pacote já entregue não conta de novo
         """
-        from schemas.sessions_schema import (
-            SessionPackage, SessionDeliverer, DeliverySession, SessionAudit
-        )
-        
-        package = self.db.query(SessionPackage).filter_by(package_id=package_id).first()
+        result = self.mark_deliveries_complete(session_id, [package_id], deliverer_id, delivery_notes)
         
-        if not package:
+        if result["not_found"]:
             return {"error": "Pacote não encontrado"}
         
-        package.delivery_status = "delivered"
-        package.delivery_time = datetime.now()
-        package.assigned_deliverer_id = deliverer_id
-        package.delivery_notes = delivery_notes
+        return {
+            "package_id": package_id,
+            "status": "delivered",
+            "deliverer_earning": result["deliverer_earning"]
+        }
+    
+    # ============================================
+    # MARCAR VÁRIAS ENTREGAS (Mesma parada / sync offline)
+    # ============================================
+    def mark_deliveries_complete(
+        self,
+        session_id: str,
+        package_ids: List[str],
+        deliverer_id: int,
+        delivery_notes: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Marca vários pacotes como entregues numa transação só:
+        - SELECT ... FOR UPDATE do lote + UPDATE ... RETURNING dos ainda não entregues
+        - Entregador e sessão (totais e progresso do dashboard): um UPDATE cada
+        - Auditoria: um insert em lote
+        
+        Idempotente por pacote: sync repetido (cliente offline) não conta nada duas vezes
+        """
+        from ..schemas.sessions_schema import (
+            SessionPackage, SessionDeliverer, DeliverySession, SessionAudit
+        )
+        
+        package_ids = list(dict.fromkeys(package_ids))  # Sem repetidos, na ordem recebida
+        now = datetime.now()
         
-        # Update entregador stats
-        deliverer = self.db.query(SessionDeliverer).filter(
-            and_(
-                SessionDeliverer.session_id == session_id,
-                SessionDeliverer.deliverer_id == deliverer_id
+        # Estado atual dos pacotes do lote (travados até o commit no PostgreSQL)
+        current = {}
+        for chunk in _chunks(package_ids):
+            current.update(
+                (row.package_id, row) for row in self.db.query(
+                    SessionPackage.package_id, SessionPackage.delivery_status, SessionPackage.assigned_deliverer_id
+                ).filter(
+                    SessionPackage.session_id == session_id,
+                    SessionPackage.package_id.in_(chunk)
+                ).with_for_update()
             )
-        ).first()
         
-        if deliverer:
-            deliverer.packages_delivered += 1
-            deliverer.total_earned = (
-                deliverer.base_salary + 
-                (deliverer.packages_delivered * deliverer.commission_per_delivery)
+        delivered = {}  # package_id -> valor (só os que mudaram agora)
+        for chunk in _chunks([pid for pid in package_ids if pid in current]):
+            rows = self.db.execute(
+                update(SessionPackage)
+                .where(
+                    SessionPackage.session_id == session_id,
+                    SessionPackage.package_id.in_(chunk),
+                    or_(SessionPackage.delivery_status.is_(None), SessionPackage.delivery_status != "delivered")
+                )
+                .values(
+                    delivery_status="delivered",
+                    delivery_time=now,
+                    assigned_deliverer_id=deliverer_id,
+                    delivery_notes=delivery_notes
+                )
+                .returning(SessionPackage.package_id, SessionPackage.package_value)
+            )
+            delivered.update((row.package_id, row.package_value or 0.0) for row in rows)
+        
+        count = len(delivered)
+        revenue = sum(delivered.values())
+        
+        # Falhas que viraram entrega saem do contador de falhas (sessão e entregador da falha)
+        recovered: Dict[Any, int] = {}
+        for package_id in delivered:
+            if current[package_id].delivery_status == "failed":
+                old_deliverer = current[package_id].assigned_deliverer_id
+                recovered[old_deliverer] = recovered.get(old_deliverer, 0) + 1
+        
+        # Update entregador stats (salário base + comissão por entrega)
+        deliverer_filter = and_(
+            SessionDeliverer.session_id == session_id,
+            SessionDeliverer.deliverer_id == deliverer_id
+        )
+        if count:
+            earning = self.db.execute(
+                update(SessionDeliverer)
+                .where(deliverer_filter)
+                .values(
+                    packages_delivered=SessionDeliverer.packages_delivered + count,
+                    total_earned=SessionDeliverer.base_salary
+                    + (SessionDeliverer.packages_delivered + count) * SessionDeliverer.commission_per_delivery
+                )
+                .returning(SessionDeliverer.total_earned)
+            ).scalar()
+            
+            for old_deliverer, n in recovered.items():
+                if old_deliverer is not None:
+                    self.db.execute(
+                        update(SessionDeliverer)
+                        .where(SessionDeliverer.session_id == session_id, SessionDeliverer.deliverer_id == old_deliverer)
+                        .values(packages_failed=SessionDeliverer.packages_failed - n)
+                    )
+            
+            # Update session totals + progresso do dashboard
+            self.db.execute(
+                update(DeliverySession)
+                .where(DeliverySession.session_id == session_id)
+                .values(
+                    total_revenue=DeliverySession.total_revenue + revenue,
+                    total_profit=DeliverySession.total_revenue + revenue - DeliverySession.total_cost,
+                    delivered_count=DeliverySession.delivered_count + count,
+                    failed_count=DeliverySession.failed_count - sum(recovered.values()),
+                    stats_version=func.coalesce(DeliverySession.stats_version, 0) + 1
+                )
             )
+            
+            # Audit (uma linha por pacote, um insert)
+            self.db.execute(insert(SessionAudit).values([
+                {
+                    "session_id": session_id,
+                    "action": "package_delivered",
+                    "actor_id": deliverer_id,
+                    "details": {"package_id": package_id, "value": value, "delivery_notes": delivery_notes},
+                    "created_at": now
+                }
+                for package_id, value in delivered.items()
+            ]))
+        else:
+            earning = self.db.query(SessionDeliverer.total_earned).filter(deliverer_filter).scalar()
         
-        # Update session totals
-        session = self.db.query(DeliverySession).filter_by(session_id=session_id).first()
-        if session:
-            session.total_revenue += package.package_value
-            session.total_profit = session.total_revenue - session.total_cost
+        self.db.commit()
         
-        # Audit
-        audit = SessionAudit(
-            session_id=session_id,
-            action="package_delivered",
-            actor_id=deliverer_id,
-            details={
-                "package_id": package_id,
-                "value": package.package_value,
-                "delivery_notes": delivery_notes
-            }
+        if count:
+            logger.info(f"📦 {count} entregas registradas na sessão {session_id} (entregador {deliverer_id})")
+        
+        return {
+            "delivered": list(delivered),
+            "already_delivered": [pid for pid in package_ids if pid in current and pid not in delivered],
+            "not_found": [pid for pid in package_ids if pid not in current],
+            "revenue_added": revenue,
+            "deliverer_earning": earning or 0
+        }
+    
+    # ============================================
+    # REGISTRAR FALHA NA ENTREGA
+    # ============================================
+    def mark_delivery_failed(
+        self,
+        session_id: str,
+        package_id: str,
+        deliverer_id: int,
+        reason: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Registra tentativa sem sucesso (o pacote pode ser reentregue depois)
+        Falhas da sessão e do entregador sobem na mesma transação
+        Idempotente: falha repetida não conta de novo; pacote entregue não muda
+        """
+        from ..schemas.sessions_schema import (
+            SessionPackage, SessionDeliverer, DeliverySession, SessionAudit
         )
-        self.db.add(audit)
+        
+        package_filter = and_(
+            SessionPackage.session_id == session_id,
+            SessionPackage.package_id == package_id
+        )
+        current = self.db.query(SessionPackage.delivery_status).filter(package_filter).with_for_update().first()
+        if current is None:
+            return {"error": "Pacote não encontrado"}
+        
+        failed = self.db.execute(
+            update(SessionPackage)
+            .where(
+                package_filter,
+                or_(SessionPackage.delivery_status.is_(None),
+                    SessionPackage.delivery_status.not_in(("delivered", "failed")))
+            )
+            .values(delivery_status="failed", assigned_deliverer_id=deliverer_id, delivery_notes=reason)
+        ).rowcount
+        
+        if failed:
+            self.db.execute(
+                update(SessionDeliverer)
+                .where(SessionDeliverer.session_id == session_id, SessionDeliverer.deliverer_id == deliverer_id)
+                .values(packages_failed=SessionDeliverer.packages_failed + 1)
+            )
+            self.db.execute(
+                update(DeliverySession)
+                .where(DeliverySession.session_id == session_id)
+                .values(
+                    failed_count=DeliverySession.failed_count + 1,
+                    stats_version=func.coalesce(DeliverySession.stats_version, 0) + 1
+                )
+            )
+            self.db.add(SessionAudit(
+                session_id=session_id,
+                action="package_failed",
+                actor_id=deliverer_id,
+                details={"package_id": package_id, "reason": reason}
+            ))
+            logger.info(f"⚠️ Falha registrada na sessão {session_id}: {package_id} (entregador {deliverer_id})")
         
         self.db.commit()
         
         return {
             "package_id": package_id,
-            "status": "delivered",
-            "deliverer_earning": deliverer.total_earned if deliverer else 0
+            "status": "failed" if failed else current.delivery_status
         }
     
     # ============================================
@@ -315,7 +533,7 @@ class SessionEngine:
         """
         Fecha a sessão, gera snapshot financeiro, fica read-only
         """
-        from schemas.sessions_schema import (
+        from ..schemas.sessions_schema import (
             DeliverySession, SessionDeliverer, SessionAudit
         )
         
@@ -339,6 +557,7 @@ class SessionEngine:
         session.status = "completed"
         session.completed_at = datetime.now()
         session.is_readonly = True
+        session.stats_version = (session.stats_version or 0) + 1
         
         # Audit
         audit = SessionAudit(
@@ -366,7 +585,7 @@ class SessionEngine:
         """
         Retorna TUDO linkedado: sessão + pacotes + entregadores + financeiro
         """
-        from schemas.sessions_schema import (
+        from ..schemas.sessions_schema import (
             DeliverySession, SessionPackage, SessionDeliverer, SessionAddress
         )
         
@@ -419,3 +638,204 @@ class SessionEngine:
             "addresses": len(addresses),
             "total_packages": session.total_packages
         }
+    
+    # ============================================
+    # DASHBOARD (Contadores mantidos, leitura O(1))
+    # ============================================
+    def get_stats_version(self, session_id: str) -> Optional[int]:
+        """Versão do dashboard (muda a cada entrega/alteração) - base do ETag"""
+        from ..schemas.sessions_schema import DeliverySession
+        
+        row = self.db.query(DeliverySession.stats_version, DeliverySession.delivered_count).filter(
+            DeliverySession.session_id == session_id
+        ).first()
+        if not row or row.delivered_count is None:
+            return None  # Sessão inexistente ou contadores por recontar
+        return row.stats_version or 0
+    
+    def get_session_dashboard(self, session_id: str) -> Dict[str, Any]:
+        """
+        Progresso e financeiro da sessão pelos contadores mantidos nas entregas
+        (sem carregar pacotes: uma linha da sessão + uma por entregador)
+        """
+        from ..schemas.sessions_schema import DeliverySession, SessionDeliverer
+        
+        session = self.db.query(DeliverySession).filter_by(session_id=session_id).first()
+        
+        if not session:
+            return {"error": "Sessão não encontrada"}
+        
+        if session.delivered_count is None or session.failed_count is None:
+            self._recount_stats(session)
+        
+        deliverers = self.db.query(SessionDeliverer).filter_by(session_id=session_id).all()
+        total = session.total_packages or 0
+        
+        return {
+            "session_id": session_id,
+            "status": session.status,
+            "stats_version": session.stats_version or 0,
+            "progress": {
+                "delivered": session.delivered_count,
+                "failed": session.failed_count,
+                "pending": max(total - session.delivered_count - session.failed_count, 0),
+                "total": total
+            },
+            "financial": {
+                "revenue": session.total_revenue,
+                "cost": session.total_cost,
+                "profit": session.total_profit,
+                "deliverers_paid": sum(d.total_earned or 0 for d in deliverers)
+            },
+            "deliverers": [
+                {
+                    "id": d.deliverer_id,
+                    "delivered": d.packages_delivered or 0,
+                    "failed": d.packages_failed or 0,
+                    "total_earned": d.total_earned or 0
+                }
+                for d in deliverers
+            ],
+            "is_readonly": session.is_readonly,
+            "was_reused": session.was_reused,
+            "reuse_count": session.reuse_count
+        }
+    
+    def _recount_stats(self, session):
+        """Sessões antigas (contadores NULL): reconta com um GROUP BY e grava"""
+        from ..schemas.sessions_schema import SessionPackage, SessionDeliverer
+        
+        rows = self.db.query(
+            SessionPackage.delivery_status, SessionPackage.assigned_deliverer_id, func.count()
+        ).filter(
+            SessionPackage.session_id == session.session_id
+        ).group_by(SessionPackage.delivery_status, SessionPackage.assigned_deliverer_id).all()
+        
+        session.delivered_count = sum(n for status, _, n in rows if status == "delivered")
+        session.failed_count = sum(n for status, _, n in rows if status == "failed")
+        session.stats_version = (session.stats_version or 0) + 1
+        
+        failed_by_deliverer = {}
+        for status, deliverer_id, n in rows:
+            if status == "failed" and deliverer_id is not None:
+                failed_by_deliverer[deliverer_id] = failed_by_deliverer.get(deliverer_id, 0) + n
+        for deliverer in self.db.query(SessionDeliverer).filter_by(session_id=session.session_id):
+            deliverer.packages_failed = failed_by_deliverer.get(deliverer.deliverer_id, 0)
+        
+        self.db.commit()
+    
+    # ============================================
+    # SCANNER OCR: vincula o código lido ao pacote
+    # ============================================
+    def flag_ocr_scan(self, session_id: str, barcode: str) -> Optional[str]:
+        """
+        Marca o pacote do barcode (nesta sessão) como lido por OCR
+        Retorna: package_id ou None se o código não está na sessão
+        """
+        from ..schemas.sessions_schema import SessionPackage
+        
+        package = self.db.query(SessionPackage).filter(
+            SessionPackage.barcode == barcode,
+            SessionPackage.session_id == session_id
+        ).first()
+        
+        if not package:
+            return None
+        
+        package.barcode_ocr_attempt = True
+        self.db.commit()
+        return package.package_id
+    
+    # ============================================
+    # LISTAR SESSÕES DO USUÁRIO
+    # ============================================
+    def list_user_sessions(self, user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Sessões do usuário (opcional: só um status)"""
+        from ..schemas.sessions_schema import DeliverySession
+        
+        query = self.db.query(DeliverySession).filter_by(user_id=user_id)
+        
+        if status:
+            query = query.filter_by(status=status)
+        
+        return [
+            {
+                "id": s.session_id,
+                "status": s.status,
+                "created_at": s.created_at.isoformat(),
+                "total_packages": s.total_packages,
+                "total_profit": s.total_profit
+            }
+            for s in query.all()
+        ]
+
+
+class AsyncSessionEngine:
+    """
+    SessionEngine para endpoints async: o mesmo código do motor, sem bloquear o event loop.
+    
+    - Com AsyncSession (asyncpg/psycopg 3): roda via run_sync - o I/O vai pelo driver async
+    - Sem engine async (db=None): roda numa thread com uma sessão sync própria
+    """
+    
+    def __init__(self, db=None):
+        self.db = db  # AsyncSession ou None
+    
+    async def _call(self, method: str, *args) -> Any:
+        if self.db is not None:
+            return await self.db.run_sync(lambda session: getattr(SessionEngine(session), method)(*args))
+        return await asyncio.to_thread(self._call_sync, method, *args)
+    
+    @staticmethod
+    def _call_sync(method: str, *args) -> Any:
+        from ..database import db_manager
+        
+        db = db_manager.SessionLocal()
+        try:
+            return getattr(SessionEngine(db), method)(*args)
+        finally:
+            db.close()
+    
+    async def create_session(self, user_id: int, session_type: str = "manual",
+                             file_name: Optional[str] = None) -> str:
+        return await self._call("create_session", user_id, session_type, file_name)
+    
+    async def add_packages_to_session(self, session_id: str, packages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return await self._call("add_packages_to_session", session_id, packages)
+    
+    async def reuse_session_before_start(self, session_id: str,
+                                         new_packages: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        return await self._call("reuse_session_before_start", session_id, new_packages)
+    
+    async def start_session(self, session_id: str, deliverer_ids: List[int]) -> Dict[str, Any]:
+        return await self._call("start_session", session_id, deliverer_ids)
+    
+    async def mark_delivery_complete(self, session_id: str, package_id: str, deliverer_id: int,
+                                     delivery_notes: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call("mark_delivery_complete", session_id, package_id, deliverer_id, delivery_notes)
+    
+    async def mark_deliveries_complete(self, session_id: str, package_ids: List[str], deliverer_id: int,
+                                       delivery_notes: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call("mark_deliveries_complete", session_id, package_ids, deliverer_id, delivery_notes)
+    
+    async def mark_delivery_failed(self, session_id: str, package_id: str, deliverer_id: int,
+                                   reason: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call("mark_delivery_failed", session_id, package_id, deliverer_id, reason)
+    
+    async def complete_session(self, session_id: str) -> Dict[str, Any]:
+        return await self._call("complete_session", session_id)
+    
+    async def get_session_with_links(self, session_id: str) -> Dict[str, Any]:
+        return await self._call("get_session_with_links", session_id)
+    
+    async def get_stats_version(self, session_id: str) -> Optional[int]:
+        return await self._call("get_stats_version", session_id)
+    
+    async def get_session_dashboard(self, session_id: str) -> Dict[str, Any]:
+        return await self._call("get_session_dashboard", session_id)
+    
+    async def flag_ocr_scan(self, session_id: str, barcode: str) -> Optional[str]:
+        return await self._call("flag_ocr_scan", session_id, barcode)
+    
+    async def list_user_sessions(self, user_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._call("list_user_sessions", user_id, status)
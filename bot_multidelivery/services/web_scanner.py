@@ -63,10 +63,11 @@ async def get_scanner_page():
 
 
 @scanner_app.post("/api/scan", response_model=ScanResponse)
-async def scan_barcode(request: ScanRequest):
+def scan_barcode(request: ScanRequest):
     """
     Endpoint para processar scan de barcode
     Retorna informações da rota/cor do pacote
+    (def comum: o separador lê/grava no state_backend, roda no threadpool)
     """
     barcode = request.barcode.strip()
     
@@ -82,7 +83,8 @@ async def scan_barcode(request: ScanRequest):
         )
     
     # Busca assignment do pacote
-    assignment = barcode_separator.assignments.get(barcode)
+    assignments = barcode_separator.assignments
+    assignment = assignments.get(barcode)
     
     if not assignment:
         return ScanResponse(
@@ -91,12 +93,11 @@ async def scan_barcode(request: ScanRequest):
             message=f"❌ Código '{barcode}' não encontrado nas rotas atuais."
         )
     
-    # Marca como escaneado
-    barcode_separator.scanned.add(barcode)
+    # Marca como escaneado (progresso compartilhado entre workers)
+    progress_count = barcode_separator.record_scan(barcode)
     
     # Calcula progresso
-    progress_count = len(barcode_separator.scanned)
-    progress_total = len(barcode_separator.assignments)
+    progress_total = len(assignments)
     progress_percent = int((progress_count / progress_total) * 100) if progress_total > 0 else 0
     
     # Mapa de cores para hex
@@ -120,7 +121,7 @@ async def scan_barcode(request: ScanRequest):
 
 
 @scanner_app.get("/api/status")
-async def get_status():
+def get_status():
     """Retorna status atual da separação"""
     if not barcode_separator.active:
         return JSONResponse({
@@ -2,12 +2,25 @@
 📦 GERENCIADOR DE ESTADO - Sessões de Admin e Entregadores
 Controla fluxo de importação de romaneios, divisão de rotas e tracking
 """
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from enum import Enum
+import functools
+import inspect
+import os
+import threading
 import uuid
 from .clustering import DeliveryPoint, Cluster
+from .point_table import PointTable
+from . import session_journal as journal_events
+from .session_journal import SessionJournal, session_journal
+from .spatial import SessionSpatialIndex
+from .state_backend import SESSION_EVENTS, MemoryStateBackend, StateBackend, get_state_backend
+
+# Protege o estado de "sujo" entre os handlers e o worker de gravação
+_changes_lock = threading.Lock()
 
 class RouteStatus(str, Enum):
     PENDING = "pending"
@@ -18,10 +31,14 @@ class RouteStatus(str, Enum):
 
 @dataclass
 class Romaneio:
-    """Romaneio importado"""
+    """Romaneio importado (pontos guardados em colunas - ver point_table)"""
     id: str
     uploaded_at: datetime
-    points: List[DeliveryPoint]
+    points: PointTable
+    
+    def __post_init__(self):
+        if not isinstance(self.points, PointTable):
+            self.points = PointTable.from_points(self.points)
     
     @property
     def total_packages(self) -> int:
@@ -40,8 +57,19 @@ class Route:
     started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
     optimized_order: List[DeliveryPoint] = field(default_factory=list)
-    delivered_packages: List[str] = field(default_factory=list)  # package_ids
+    delivered_packages: List[str] = field(default_factory=list)  # package_ids (ordem de entrega)
+    failed_packages: Dict[str, str] = field(default_factory=dict)  # package_id -> motivo da falha
     map_file: Optional[str] = None  # Caminho do mapa HTML gerado
+    _delivered: set = field(default_factory=set, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self._delivered = set(self.delivered_packages)
+    
+    def is_delivered(self, package_id: str) -> bool:
+        """Consulta O(1); a lista continua sendo a fonte (ordem de entrega)"""
+        if len(self._delivered) != len(self.delivered_packages):
+            self._delivered = set(self.delivered_packages)  # Lista trocada por fora
+        return package_id in self._delivered
     
     @property
     def total_packages(self) -> int:
@@ -76,9 +104,26 @@ class Route:
             distance += haversine_distance(prev.lat, prev.lng, curr.lat, curr.lng)
         return round(distance, 2)
     
-    def mark_as_delivered(self, package_id: str):
-        if package_id not in self.delivered_packages:
-            self.delivered_packages.append(package_id)
+    def mark_as_delivered(self, package_id: str) -> bool:
+        """Marca entrega; retorna False se o pacote já estava entregue"""
+        if self.is_delivered(package_id):
+            return False
+        self.delivered_packages.append(package_id)
+        self._delivered.add(package_id)
+        self.failed_packages.pop(package_id, None)  # Nova tentativa deu certo
+        return True
+    
+    def mark_as_failed(self, package_id: str, reason: str = '') -> bool:
+        """Registra tentativa sem sucesso; retorna False se o pacote já foi entregue"""
+        if self.is_delivered(package_id):
+            return False
+        self.failed_packages[package_id] = reason
+        return True
+
+
+def package_key(package_id: str) -> str:
+    """Chave normalizada do pacote (mesma regra do bipe: sem espaços, maiúsculo)"""
+    return str(package_id).strip().upper()
 
 
 @dataclass
@@ -99,6 +144,127 @@ class DailySession:
     current_step: str = 'idle'  # idle, importing, imported, optimizing, optimized, assigning, assigned, separating, completed
     route_value: float = 0.0  # Valor total da rota
     num_deliverers: int = 0  # Número de entregadores pra otimização
+    journal_seq: int = 0  # Último evento do diário aplicado (gravado junto com o snapshot)
+    
+    # Controle de persistência incremental (não é salvo)
+    # Estrutural = reescreve a sessão inteira; entregas/falhas = só acrescenta
+    structure_dirty: bool = field(default=True, repr=False, compare=False)
+    pending_deliveries: List[Tuple[str, str]] = field(default_factory=list, repr=False, compare=False)
+    pending_failures: List[Tuple[str, str, str]] = field(default_factory=list, repr=False, compare=False)
+    
+    # Índices O(1) sobre as rotas (não são salvos; refeitos sob demanda)
+    _route_index: Optional[Dict[str, Route]] = field(default=None, init=False, repr=False, compare=False)
+    _package_index: Optional[Dict[str, Tuple[Route, int]]] = field(default=None, init=False, repr=False, compare=False)
+    _deliverer_index: Optional[Dict[int, Route]] = field(default=None, init=False, repr=False, compare=False)
+    _indexed_routes: Optional[Tuple[int, int]] = field(default=None, init=False, repr=False, compare=False)
+    
+    def invalidate_indexes(self):
+        """Rotas mudaram (divisão, atribuição, nova ordem): refaz na próxima consulta"""
+        self._indexed_routes = None
+    
+    def _ensure_indexes(self):
+        # Lista de rotas trocada ou com tamanho diferente também invalida
+        current = (id(self.routes), len(self.routes))
+        if self._indexed_routes == current:
+            return
+        
+        route_index, package_index, deliverer_index = {}, {}, {}
+        for route in self.routes:
+            route_index[route.id] = route
+            if route.assigned_to_telegram_id is not None:
+                deliverer_index.setdefault(route.assigned_to_telegram_id, route)
+            for position, point in enumerate(route.optimized_order, 1):
+                package_index.setdefault(package_key(point.package_id), (route, position))
+        
+        self._route_index = route_index
+        self._package_index = package_index
+        self._deliverer_index = deliverer_index
+        self._indexed_routes = current
+    
+    def get_route(self, route_id: str) -> Optional[Route]:
+        self._ensure_indexes()
+        return self._route_index.get(route_id)
+    
+    def route_for_deliverer(self, telegram_id: int) -> Optional[Route]:
+        self._ensure_indexes()
+        return self._deliverer_index.get(telegram_id)
+    
+    def locate_package(self, package_id: str) -> Optional[Tuple[Route, int]]:
+        """(rota, posição 1-based na ordem otimizada) do pacote, ou None"""
+        self._ensure_indexes()
+        return self._package_index.get(package_key(package_id))
+    
+    def move_packages(self, package_ids: List[str], to_route_id: str) -> List[Tuple[str, str]]:
+        """
+        Passa pacotes pendentes para outra rota (vão para o fim da ordem dela).
+        Retorna [(package_id, rota de origem)] dos que mudaram; repetir é inofensivo.
+        """
+        target = self.get_route(to_route_id)
+        if target is None:
+            return []
+        moved = []
+        for package_id in package_ids:
+            found = self.locate_package(package_id)
+            if not found:
+                continue
+            source, position = found
+            if source is target or source.is_delivered(package_id):
+                continue
+            target.optimized_order.append(source.optimized_order.pop(position - 1))
+            reason = source.failed_packages.pop(package_id, None)
+            if reason is not None:
+                target.failed_packages[package_id] = reason
+            moved.append((package_id, source.id))
+            self.invalidate_indexes()  # Posições da rota de origem mudaram
+        return moved
+    
+    def mark_dirty(self):
+        """Mudança estrutural (romaneio, base, rotas, finalização)"""
+        with _changes_lock:
+            self.structure_dirty = True
+    
+    def record_delivery(self, route_id: str, package_id: str):
+        """Entrega nova: basta um append/update pequeno no próximo save"""
+        with _changes_lock:
+            self.pending_deliveries.append((route_id, package_id))
+    
+    def record_failure(self, route_id: str, package_id: str, reason: str = ''):
+        """Tentativa sem sucesso: só a parada muda no próximo save"""
+        with _changes_lock:
+            self.pending_failures.append((route_id, package_id, reason))
+    
+    def mark_clean(self):
+        with _changes_lock:
+            self.structure_dirty = False
+            self.pending_deliveries = []
+            self.pending_failures = []
+    
+    @property
+    def is_dirty(self) -> bool:
+        return self.structure_dirty or bool(self.pending_deliveries) or bool(self.pending_failures)
+    
+    def pop_changes(self) -> Tuple[bool, List[Tuple[str, str]], List[Tuple[str, str, str]]]:
+        """Retorna (estrutural?, entregas pendentes, falhas pendentes) e limpa o estado"""
+        with _changes_lock:
+            changes = (self.structure_dirty, self.pending_deliveries, self.pending_failures)
+            self.structure_dirty = False
+            self.pending_deliveries = []
+            self.pending_failures = []
+        return changes
+    
+    def route_progress(self) -> List[Dict]:
+        """Progresso de cada rota (mesmo formato da consulta agregada do SessionStore)"""
+        return [
+            {
+                'route_id': r.id,
+                'assigned_to_telegram_id': r.assigned_to_telegram_id,
+                'assigned_to_name': r.assigned_to_name,
+                'color': r.color,
+                'total_packages': r.total_packages,
+                'delivered': r.delivered_count,
+                'failed': len(r.failed_packages)
+            } for r in self.routes
+        ]
     
     @property
     def total_packages(self) -> int:
@@ -113,32 +279,106 @@ class DailySession:
         return sum(r.pending_count for r in self.routes)
 
 
+def _locked_session(method):
+    """Mutação de sessão: com estado compartilhado, serializa entre workers (lock por sessão)"""
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.state.shared:
+            return method(self, *args, **kwargs)
+        session_id = signature.bind(self, *args, **kwargs).arguments.get('session_id') or self.current_session_id
+        if not session_id:
+            return method(self, *args, **kwargs)
+        with self.state.lock(f"session:{session_id}"):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class SessionManager:
-    """Gerencia múltiplas sessões com auto-save"""
+    """
+    Gerencia múltiplas sessões com auto-save.
+
+    Na inicialização só os resumos (id, nome, data, totais) são lidos.
+    A sessão completa é hidratada no primeiro acesso e fica num LRU limitado
+    por quantidade (SESSION_CACHE_SIZE) e, opcionalmente, por pacotes
+    (SESSION_CACHE_MAX_PACKAGES). Finalizadas saem primeiro; a sessão em foco
+    e as com alterações ainda não gravadas nunca saem.
+    
+    Cada mutação também vai para o diário de sessões (session_journal): na
+    inicialização, eventos ainda não cobertos por snapshot são reaplicados.
     
-    def __init__(self):
-        self.active_sessions: Dict[str, DailySession] = {}  # session_id -> DailySession
-        self.current_session_id: Optional[str] = None  # Sessão em foco
+    Sessão em foco e versão de cada sessão ficam no state_backend. Com backend
+    compartilhado (vários workers), mutações pegam o lock da sessão, gravam na
+    hora e sobem a versão; os outros workers recarregam a sessão no próximo acesso.
+    """
+    
+    def __init__(self, store=None, max_sessions: Optional[int] = None, max_packages: Optional[int] = None,
+                 journal: Optional[SessionJournal] = None, state: Optional[StateBackend] = None):
+        self.store = store  # None = session_store global
+        # Estado do processo (global) ou próprio (store injetado: testes, scripts)
+        self.state = state or (get_state_backend() if store is None else MemoryStateBackend())
+        self._versions: Dict[str, int] = {}  # session_id -> versão compartilhada da cópia em memória
+        # Diário no mesmo diretório de dados do store
+        self.journal = journal or (session_journal if store is None else SessionJournal(store.sessions_dir.parent))
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_CACHE_SIZE', '20'))
+        self.max_packages = max_packages if max_packages is not None else int(os.getenv('SESSION_CACHE_MAX_PACKAGES', '0'))
+        self.active_sessions: 'OrderedDict[str, DailySession]' = OrderedDict()  # LRU: session_id -> DailySession
+        self.summaries: Dict[str, Dict] = {}  # session_id -> resumo (todas as sessões conhecidas)
         self.admin_state: Dict[int, str] = {}  # telegram_id -> estado do fluxo
         self.temp_data: Dict[int, Dict] = {}   # Dados temporários do admin
+        self.spatial_indexes: Dict[str, SessionSpatialIndex] = {}  # session_id -> índice dos pacotes
+        self._cache_lock = threading.RLock()
+        self.journal.subscribe(self._publish_event)
         self._load_all_sessions()
     
-    def _load_all_sessions(self):
-        """Carrega todas as sessões do disco na inicialização"""
+    @property
+    def current_session_id(self) -> Optional[str]:
+        """Sessão em foco (a mesma em todos os workers)"""
+        return self.state.get('sessions:current')
+    
+    @current_session_id.setter
+    def current_session_id(self, session_id: Optional[str]):
+        if session_id is None:
+            self.state.delete('sessions:current')
+        else:
+            self.state.set('sessions:current', session_id)
+    
+    @staticmethod
+    def _version_key(session_id: str) -> str:
+        return f"session:{session_id}:version"
+    
+    def _is_fresh(self, session_id: str) -> bool:
+        """Cópia em memória ainda é a última gravada por qualquer worker?"""
+        if not self.state.shared:
+            return True
+        return self.state.counter(self._version_key(session_id)) == self._versions.get(session_id, 0)
+    
+    def _publish_event(self, event: Dict):
+        """Evento do diário para dashboard/outros workers (sem os payloads grandes)"""
+        notice = {k: v for k, v in event.items() if k not in ('romaneio', 'routes', 'optimized_order')}
         try:
+            self.state.publish(SESSION_EVENTS, notice)
+        except Exception as e:
+            print(f"⚠️ Erro ao publicar evento da sessão: {e}")
+    
+    def _get_store(self):
+        if self.store is None:
             from .session_persistence import session_store
-            sessions = session_store.list_sessions(limit=100)
-            
-            for s_info in sessions:
-                try:
-                    session = session_store.load_session(s_info['session_id'])
-                    if session:
-                        self.active_sessions[session.session_id] = session
-                except Exception as load_err:
-                    print(f"⚠️ Erro ao carregar sessão {s_info.get('session_id', '?')}: {load_err}")
-                    continue
+            return session_store
+        return self.store
+    
+    def _load_all_sessions(self):
+        """Carrega só os resumos das sessões na inicialização (hidratação sob demanda)"""
+        try:
+            store = self._get_store()
+            if getattr(store, 'journal', False) is None:
+                store.journal = self.journal  # Checkpoint do diário a cada gravação
+            for s_info in store.list_sessions(limit=100):
+                self.summaries[s_info['session_id']] = s_info
                     
-            print(f"✅ {len(self.active_sessions)} sessões carregadas do disco")
+            print(f"✅ {len(self.summaries)} sessões conhecidas (carregadas sob demanda)")
+            self._recover_from_journal()
         except ImportError as e:
             print(f"⚠️ session_persistence não disponível: {e}")
         except Exception as e:
@@ -146,14 +386,138 @@ class SessionManager:
             import traceback
             traceback.print_exc()
     
-    def _auto_save(self, session: DailySession):
-        """Auto-save da sessão"""
+    def _recover_from_journal(self):
+        """Snapshot + eventos posteriores: refaz o que não chegou a ser gravado (queda, kill)"""
+        with self.state.lock('sessions:journal_recovery'):  # Workers subindo juntos: um recupera
+            self._replay_journal()
+    
+    def _replay_journal(self):
+        recovered = 0
+        for session_id in self.journal.pending_sessions():
+            try:
+                events = self.journal.read(session_id)
+                session = self._hydrate(session_id)
+                if session is None:
+                    created = next((e for e in events if e['type'] == journal_events.SESSION_CREATED), None)
+                    if created is None:
+                        print(f"⚠️ Diário da sessão {session_id} sem snapshot nem criação, ignorado")
+                        continue
+                    session = DailySession(
+                        session_id=session_id,
+                        session_name=created.get('session_name', ''),
+                        date=created.get('date', ''),
+                        period=created.get('period', ''),
+                        created_at=datetime.fromisoformat(created['created_at'])
+                    )
+                
+                tail = [e for e in events if e['seq'] > session.journal_seq]
+                if not tail:
+                    continue
+                for event in tail:
+                    journal_events.apply_event(session, event)
+                session.journal_seq = tail[-1]['seq']
+                session.mark_dirty()
+                self._remember(session)
+                self._auto_save(session, sync=True)  # Novo snapshot (e checkpoint)
+                recovered += 1
+            except Exception as e:
+                print(f"⚠️ Erro ao recuperar sessão {session_id} do diário: {e}")
+        if recovered:
+            print(f"♻️ {recovered} sessões recuperadas do diário")
+    
+    def _journal(self, session: DailySession, event_type: str, **data):
+        """Registra a mutação no diário (antes do save) e avança o seq da sessão"""
+        event = self.journal.append(session.session_id, event_type, **data)
+        if event:
+            session.journal_seq = event['seq']
+    
+    def session_events(self, session_id: str, after_seq: int = 0) -> List[Dict]:
+        """Trilha de auditoria da sessão (todos os eventos do diário, em ordem)"""
+        return list(self.journal.history(session_id, after_seq))
+    
+    @staticmethod
+    def _summary_of(session: DailySession) -> Dict:
+        return {
+            'session_id': session.session_id,
+            'session_name': session.session_name,
+            'date': session.date,
+            'period': session.period,
+            'created_at': session.created_at,
+            'is_finalized': session.is_finalized,
+            'base_address': session.base_address,
+            'total_packages': session.total_packages,
+            'num_routes': len(session.routes),
+            'delivered_count': session.total_delivered
+        }
+    
+    def _hydrate(self, session_id: str) -> Optional[DailySession]:
+        """Lê a sessão completa (vendo gravações ainda pendentes no write-behind)"""
         try:
-            from .session_persistence import session_store
-            session_store.save_session(session)
+            from .session_persistence import session_writer
+            return session_writer.load(session_id, store=self._get_store())
+        except Exception as e:
+            print(f"⚠️ Erro ao carregar sessão {session_id}: {e}")
+            return None
+    
+    def _remember(self, session: DailySession):
+        """Coloca a sessão no topo do LRU e aplica os limites"""
+        with self._cache_lock:
+            self.active_sessions[session.session_id] = session
+            self.active_sessions.move_to_end(session.session_id)
+            self.summaries[session.session_id] = self._summary_of(session)
+            self._evict()
+    
+    def _over_limit(self) -> bool:
+        if len(self.active_sessions) > self.max_sessions:
+            return True
+        if self.max_packages > 0 and len(self.active_sessions) > 1:
+            return sum(s.total_packages for s in self.active_sessions.values()) > self.max_packages
+        return False
+    
+    def _evict(self):
+        current = self.current_session_id if self._over_limit() else None
+        while self._over_limit():
+            candidates = [
+                s for s in self.active_sessions.values()
+                if s.session_id != current and not s.is_dirty
+            ]
+            if not candidates:
+                return  # Tudo em uso: fica acima do limite até a próxima gravação
+            # Ordem do LRU (mais antigo primeiro), finalizadas na frente
+            victim = next((s for s in candidates if s.is_finalized), candidates[0])
+            del self.active_sessions[victim.session_id]
+            self.spatial_indexes.pop(victim.session_id, None)
+    
+    def _auto_save(self, session: DailySession, sync: bool = False):
+        """
+        Auto-save da sessão.
+        Padrão: write-behind (agrupa mutações na janela e grava em background).
+        SESSION_DURABLE_SAVE=1: grava na hora, com fsync/commit antes de retornar.
+        Estado compartilhado: grava na hora e sobe a versão (outros workers recarregam).
+        """
+        try:
+            from .session_persistence import session_writer, DURABLE_SAVES
+            if session.session_id in self.summaries:
+                self.summaries[session.session_id] = self._summary_of(session)
+            if sync or DURABLE_SAVES or self.store is not None or self.state.shared:
+                self._get_store().save_session(session)
+            else:
+                session_writer.schedule(session)
+            if self.state.shared:
+                self._versions[session.session_id] = self.state.incr(self._version_key(session.session_id))
         except Exception as e:
             print(f"⚠️ Erro ao salvar sessão: {e}")
     
+    def flush(self):
+        """Grava agora tudo que está pendente no write-behind (shutdown, testes)"""
+        try:
+            from .session_persistence import session_writer
+            session_writer.flush()
+            if self.store is not None:
+                self.store.flush_index()  # Store injetado grava direto; só o índice fica na memória
+        except Exception as e:
+            print(f"⚠️ Erro ao descarregar gravações pendentes: {e}")
+    
     def create_new_session(self, date: str, period: str = 'manhã') -> DailySession:
         """
         Cria nova sessão com nome automático
@@ -179,8 +543,10 @@ class SessionManager:
             session_name=session_name,
             period=period
         )
-        self.active_sessions[session.session_id] = session
         self.current_session_id = session.session_id
+        self._remember(session)
+        self._journal(session, journal_events.SESSION_CREATED, session_name=session.session_name,
+                      date=session.date, period=session.period, created_at=session.created_at.isoformat())
         self._auto_save(session)
         
         print(f"✅ Sessão criada: {session_name} ({session.session_id})")
@@ -188,63 +554,193 @@ class SessionManager:
         return session
     
     def get_session(self, session_id: str) -> Optional[DailySession]:
-        """Retorna sessão específica por ID"""
-        return self.active_sessions.get(session_id)
+        """
+        Retorna sessão específica por ID (hidrata do disco/banco no primeiro acesso).
+        Estado compartilhado: cópia desatualizada (outro worker gravou) é relida.
+        """
+        with self._cache_lock:
+            session = self.active_sessions.get(session_id)
+            if session is None and session_id not in self.summaries and not self.state.shared:
+                return None
+        if session is not None and self._is_fresh(session_id):
+            with self._cache_lock:
+                if session_id in self.active_sessions:
+                    self.active_sessions.move_to_end(session_id)
+            return session
+        
+        stale = session is not None
+        # Versão lida antes da sessão: gravação no meio é detectada no próximo acesso
+        version = self.state.counter(self._version_key(session_id)) if self.state.shared else 0
+        session = self._hydrate(session_id)
+        if session is None:
+            if stale:  # Apagada por outro worker
+                with self._cache_lock:
+                    self.active_sessions.pop(session_id, None)
+                    self.summaries.pop(session_id, None)
+                    self.spatial_indexes.pop(session_id, None)
+            return None
+        with self._cache_lock:
+            if not stale:
+                # Outra thread pode ter hidratado enquanto líamos
+                session = self.active_sessions.get(session_id, session)
+            if stale:
+                self.spatial_indexes.pop(session_id, None)
+            self._versions[session_id] = version
+            self._remember(session)
+        return session
     
     def get_current_session(self) -> Optional[DailySession]:
         """Retorna sessão atual em foco"""
         if self.current_session_id:
-            return self.active_sessions.get(self.current_session_id)
+            return self.get_session(self.current_session_id)
         return None
     
     def set_current_session(self, session_id: str):
         """Define qual sessão está em foco"""
-        if session_id in self.active_sessions:
+        if session_id in self.active_sessions or session_id in self.summaries \
+                or (self.state.shared and self.get_session(session_id)):
             self.current_session_id = session_id
     
+    def list_summaries(self, finalized_only: bool = False) -> List[Dict]:
+        """Resumos de todas as sessões conhecidas, sem hidratar nenhuma"""
+        if self.state.shared:
+            # Sessões criadas/alteradas por outros workers: uma leitura das colunas de resumo
+            try:
+                fresh = {s['session_id']: s for s in self._get_store().list_sessions(limit=100)}
+                with self._cache_lock:
+                    self.summaries = fresh
+            except Exception as e:
+                print(f"⚠️ Erro ao atualizar resumos das sessões: {e}")
+        summaries = list(self.summaries.values())
+        if finalized_only:
+            summaries = [s for s in summaries if s['is_finalized']]
+        summaries.sort(key=lambda x: x['created_at'], reverse=True)
+        return summaries
+    
     def list_sessions(self, finalized_only: bool = False) -> List[DailySession]:
-        """Lista todas as sessões carregadas"""
-        sessions = list(self.active_sessions.values())
+        """
+        Lista todas as sessões completas (dashboard/histórico; prefira list_summaries).
+        As que não estão em memória são hidratadas numa leitura em lote.
+        """
+        ids = [s['session_id'] for s in self.list_summaries(finalized_only)]
+        with self._cache_lock:
+            found = {} if self.state.shared else {
+                sid: self.active_sessions[sid] for sid in ids if sid in self.active_sessions
+            }
         
-        if finalized_only:
-            sessions = [s for s in sessions if s.is_finalized]
+        missing = [sid for sid in ids if sid not in found]
+        if missing:
+            try:
+                from .session_persistence import session_writer
+                for session in session_writer.load_many(missing, store=self._get_store()):
+                    found[session.session_id] = session
+            except Exception as e:
+                print(f"⚠️ Erro ao carregar sessões em lote: {e}")
+        
+        # Listagem não passa pelo LRU: não expulsa as sessões em uso
+        return [found[sid] for sid in ids if sid in found]
+    
+    def route_progress(self, session_ids: Optional[List[str]] = None,
+                       finalized_only: bool = False) -> Dict[str, List[Dict]]:
+        """
+        Progresso por rota de várias sessões sem hidratá-las.
+        Sessões em memória são contadas direto (inclui entregas ainda no write-behind);
+        as demais vêm de uma consulta agregada do store (route_stops no banco).
+        """
+        if session_ids is None:
+            session_ids = [s['session_id'] for s in self.list_summaries(finalized_only)]
+        with self._cache_lock:
+            # Compartilhado: o store já tem tudo gravado (saves síncronos)
+            loaded = {} if self.state.shared else {
+                sid: self.active_sessions[sid] for sid in session_ids if sid in self.active_sessions
+            }
+        
+        result = {sid: session.route_progress() for sid, session in loaded.items()}
+        missing = [sid for sid in session_ids if sid not in loaded]
+        if missing:
+            try:
+                result.update(self._get_store().route_progress(missing))
+            except Exception as e:
+                print(f"⚠️ Erro ao consultar progresso das rotas: {e}")
+        return result
+    
+    def get_pending_stops(self, telegram_id: int, session_id: Optional[str] = None,
+                          limit: Optional[int] = None) -> List[Dict]:
+        """
+        Paradas pendentes do entregador na ordem da rota (a primeira é a próxima).
+        Sessão fora da memória: consulta indexada no banco, sem hidratar a sessão.
+        """
+        session_id = session_id or self.current_session_id
+        if not session_id:
+            return []
+        with self._cache_lock:
+            session = None if self.state.shared else self.active_sessions.get(session_id)
         
-        # Ordena por data de criação (mais recente primeiro)
-        sessions.sort(key=lambda x: x.created_at, reverse=True)
-        return sessions
+        if session is None:
+            stops = self._get_store().deliverer_stops(telegram_id, session_id=session_id, limit=limit)
+            if stops:
+                return stops
+            session = self.get_session(session_id)
+            if session is None:
+                return []
+        
+        route = session.route_for_deliverer(telegram_id)
+        if route is None:
+            return []
+        stops = [
+            {
+                'session_id': session.session_id,
+                'route_id': route.id,
+                'seq': seq,
+                'package_id': p.package_id,
+                'address': p.address,
+                'lat': p.lat,
+                'lng': p.lng,
+                'status': 'pending',
+                'delivered_at': None
+            } for seq, p in enumerate(route.optimized_order) if not route.is_delivered(p.package_id)
+        ]
+        return stops[:limit] if limit else stops
     
     @property
     def sessions(self) -> List[DailySession]:
-        """Alias para compatibilidade - retorna lista de sessões"""
-        return list(self.active_sessions.values())
-    
-    @sessions.setter
-    def sessions(self, value: List[DailySession]):
-        """Permite setar sessions diretamente (usado ao deletar)"""
-        self.active_sessions = {s.session_id: s for s in value}
+        """Alias para compatibilidade (somente leitura: hidrata todas; remover = delete_session)"""
+        return self.list_sessions()
     
     def delete_session(self, session_id: str) -> bool:
         """Remove uma sessão do gerenciador e do banco"""
-        if session_id in self.active_sessions:
-            del self.active_sessions[session_id]
+        if session_id in self.active_sessions or session_id in self.summaries \
+                or (self.state.shared and self.get_session(session_id)):
+            with self._cache_lock:
+                self.active_sessions.pop(session_id, None)
+                self.summaries.pop(session_id, None)
+                self.spatial_indexes.pop(session_id, None)
             
             # Remove do banco também
             try:
-                from .session_persistence import session_store
-                session_store.delete_session(session_id)
+                from .session_persistence import session_writer
+                session_writer.discard(session_id)  # Não ressuscitar com gravação pendente
+                self._get_store().delete_session(session_id)
+                self.journal.delete(session_id)  # Nem pelo diário
+                if self.state.shared:
+                    self.state.incr(self._version_key(session_id))  # Outros workers soltam a cópia
             except Exception as e:
                 print(f"⚠️ Erro ao deletar sessão do banco: {e}")
             
             return True
         return False
     
+    @_locked_session
     def add_romaneio(self, romaneio: Romaneio, session_id: Optional[str] = None):
         """Adiciona romaneio à sessão"""
         session = self.get_session(session_id) if session_id else self.get_current_session()
         if session:
             session.romaneios.append(romaneio)
+            session.mark_dirty()
+            self._journal(session, journal_events.ROMANEIO_ADDED, romaneio=journal_events.romaneio_payload(romaneio))
             self._auto_save(session)
     
+    @_locked_session
     def set_base_location(self, address: str, lat: float, lng: float, session_id: Optional[str] = None):
         """Define base do dia"""
         session = self.get_session(session_id) if session_id else self.get_current_session()
@@ -252,21 +748,43 @@ class SessionManager:
             session.base_address = address
             session.base_lat = lat
             session.base_lng = lng
+            session.mark_dirty()
+            self._journal(session, journal_events.BASE_SET, address=address, lat=lat, lng=lng)
             self._auto_save(session)
     
+    @_locked_session
     def set_routes(self, routes: List[Route], session_id: Optional[str] = None):
         """Define rotas divididas"""
         session = self.get_session(session_id) if session_id else self.get_current_session()
         if session:
             session.routes = routes
+            session.invalidate_indexes()
+            self.spatial_indexes[session.session_id] = SessionSpatialIndex(routes, ref_lat=session.base_lat or None)
+            session.mark_dirty()
+            self._journal(session, journal_events.ROUTES_SET, routes=journal_events.routes_payload(session))
             self._auto_save(session)
     
+    def get_spatial_index(self, session_id: Optional[str] = None) -> Optional[SessionSpatialIndex]:
+        """Índice espacial da sessão (criado sob demanda para sessões carregadas do disco)"""
+        session = self.get_session(session_id) if session_id else self.get_current_session()
+        if not session or not session.routes:
+            return None
+        
+        index = self.spatial_indexes.get(session.session_id)
+        if index is None or set(index.routes) != {r.id for r in session.routes}:
+            index = SessionSpatialIndex(session.routes, ref_lat=session.base_lat or None)
+            self.spatial_indexes[session.session_id] = index
+        return index
+    
+    @_locked_session
     def finalize_session(self, session_id: Optional[str] = None):
         """Fecha sessão (não pode adicionar mais romaneios)"""
         session = self.get_session(session_id) if session_id else self.get_current_session()
         if session:
             session.is_finalized = True
             session.finalized_at = datetime.now()
+            session.mark_dirty()
+            self._journal(session, journal_events.SESSION_FINALIZED, finalized_at=session.finalized_at.isoformat())
             self._auto_save(session)
     
     def get_route_for_deliverer(self, telegram_id: int, session_id: Optional[str] = None) -> Optional[Route]:
@@ -275,19 +793,101 @@ class SessionManager:
         if not session:
             return None
         
-        return next((r for r in session.routes if r.assigned_to_telegram_id == telegram_id), None)
+        return session.route_for_deliverer(telegram_id)
+    
+    @_locked_session
+    def assign_route(self, route_id: str, telegram_id: int, name: Optional[str] = None,
+                     session_id: Optional[str] = None) -> bool:
+        """Atribui (ou reatribui) uma rota a um entregador"""
+        session = self.get_session(session_id) if session_id else self.get_current_session()
+        if not session:
+            return False
+        
+        route = session.get_route(route_id)
+        if not route:
+            return False
+        
+        route.assigned_to_telegram_id = telegram_id
+        if name:
+            route.assigned_to_name = name
+        session.invalidate_indexes()
+        session.mark_dirty()
+        self._journal(session, journal_events.ROUTE_ASSIGNED, route_id=route_id, telegram_id=telegram_id, name=name)
+        self._auto_save(session)
+        return True
+    
+    @_locked_session
+    def update_route_order(self, route_id: str, pending_order: List[DeliveryPoint],
+                           session_id: Optional[str] = None) -> bool:
+        """Substitui a ordem dos pacotes pendentes de uma rota (entregues ficam no início)"""
+        session = self.get_session(session_id) if session_id else self.get_current_session()
+        if not session:
+            return False
+        
+        route = session.get_route(route_id)
+        if not route:
+            return False
+        
+        done = [p for p in route.optimized_order if route.is_delivered(p.package_id)]
+        route.optimized_order = done + [p for p in pending_order if not route.is_delivered(p.package_id)]
+        session.invalidate_indexes()  # Posições mudaram
+        session.mark_dirty()
+        self._journal(session, journal_events.ROUTE_REORDERED, route_id=route_id,
+                      optimized_order=journal_events.order_payload(route.optimized_order[len(done):], session))
+        self._auto_save(session)
+        return True
     
+    @_locked_session
     def mark_package_delivered(self, telegram_id: int, package_id: str, session_id: Optional[str] = None) -> bool:
-        """Marca pacote como entregue"""
-        route = self.get_route_for_deliverer(telegram_id, session_id)
+        """Marca pacote como entregue (rota do entregador via índice, sem varrer a sessão)"""
+        session = self.get_session(session_id) if session_id else self.get_current_session()
+        route = session.route_for_deliverer(telegram_id) if session else None
         if route:
-            route.mark_as_delivered(package_id)
-            session = self.get_session(session_id) if session_id else self.get_current_session()
-            if session:
+            if route.mark_as_delivered(package_id):
+                index = self.spatial_indexes.get(session.session_id)
+                if index:
+                    index.mark_delivered(route.id, package_id)
+                # Só a entrega vai pro disco/banco, não a sessão inteira
+                session.record_delivery(route.id, package_id)
+                self._journal(session, journal_events.PACKAGE_DELIVERED, route_id=route.id,
+                              package_id=package_id, telegram_id=telegram_id)
                 self._auto_save(session)
             return True
         return False
     
+    @_locked_session
+    def mark_package_failed(self, telegram_id: int, package_id: str, reason: str = '',
+                            session_id: Optional[str] = None) -> bool:
+        """Registra tentativa de entrega sem sucesso (o pacote continua na rota)"""
+        session = self.get_session(session_id) if session_id else self.get_current_session()
+        route = session.route_for_deliverer(telegram_id) if session else None
+        if not route or not route.mark_as_failed(package_id, reason):
+            return False
+        session.record_failure(route.id, package_id, reason)
+        self._journal(session, journal_events.PACKAGE_FAILED, route_id=route.id,
+                      package_id=package_id, telegram_id=telegram_id, reason=reason)
+        self._auto_save(session)
+        return True
+    
+    @_locked_session
+    def transfer_packages(self, package_ids: List[str], to_telegram_id: int,
+                          session_id: Optional[str] = None) -> int:
+        """Passa pacotes pendentes (de qualquer rota) para a rota de outro entregador"""
+        session = self.get_session(session_id) if session_id else self.get_current_session()
+        target = session.route_for_deliverer(to_telegram_id) if session else None
+        if not target:
+            return 0
+        
+        moved = session.move_packages(package_ids, target.id)
+        if moved:
+            self.spatial_indexes.pop(session.session_id, None)  # Refeito sob demanda
+            session.mark_dirty()
+            self._journal(session, journal_events.PACKAGES_TRANSFERRED, package_ids=[pid for pid, _ in moved],
+                          from_route_ids=[rid for _, rid in moved], to_route_id=target.id,
+                          to_telegram_id=to_telegram_id)
+            self._auto_save(session)
+        return len(moved)
+    
     # Estados de admin
     def set_admin_state(self, telegram_id: int, state: str):
         self.admin_state[telegram_id] = state
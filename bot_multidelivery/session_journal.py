@@ -0,0 +1,357 @@
+"""
+📜 DIÁRIO DE SESSÕES - Eventos append-only com compactação por snapshot
+Toda mutação do SessionManager vira uma linha no diário da sessão na hora
+(append O(1), fsync opcional). O snapshot continua sendo a gravação do
+SessionStore; depois de cada gravação o diário recebe um checkpoint.
+
+Na inicialização: snapshot + eventos posteriores a ele = estado exato,
+mesmo que o processo tenha caído com gravações ainda no write-behind.
+
+Arquivos (data/journal/):
+    <session_id>.jsonl          eventos recentes + marcas de checkpoint
+    <session_id>.archive.jsonl  eventos já cobertos por snapshot (trilha de auditoria)
+
+Assinantes (dashboard ao vivo, auditoria) recebem cada evento sem consultar o banco.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+JOURNAL_ENABLED = os.getenv('SESSION_JOURNAL', '1').lower() not in ('0', 'false', 'no')
+JOURNAL_FSYNC = os.getenv('SESSION_JOURNAL_FSYNC', os.getenv('SESSION_DURABLE_SAVE', '')).lower() in ('1', 'true', 'yes')
+COMPACT_EVERY = int(os.getenv('SESSION_JOURNAL_COMPACT_EVERY', '500'))
+
+# Tipos de evento
+SESSION_CREATED = 'session_created'
+ROMANEIO_ADDED = 'romaneio_added'
+BASE_SET = 'base_set'
+ROUTES_SET = 'routes_set'
+ROUTE_ASSIGNED = 'route_assigned'
+ROUTE_REORDERED = 'route_reordered'
+PACKAGE_DELIVERED = 'package_delivered'
+PACKAGE_FAILED = 'package_failed'
+PACKAGES_TRANSFERRED = 'packages_transferred'
+SESSION_FINALIZED = 'session_finalized'
+
+
+class SessionJournal:
+    """Diário append-only por sessão (um arquivo .jsonl cada)"""
+
+    def __init__(self, data_dir: str = "data", fsync: bool = JOURNAL_FSYNC, compact_every: int = COMPACT_EVERY):
+        self.journal_dir = Path(data_dir) / "journal"
+        self.fsync = fsync
+        self.compact_every = max(1, compact_every)
+        self.enabled = JOURNAL_ENABLED
+        self._lock = threading.Lock()
+        self._seq: Dict[str, int] = {}         # session_id -> último seq emitido
+        self._lines: Dict[str, int] = {}       # linhas no arquivo vivo
+        self._checkpoint: Dict[str, int] = {}  # seq coberto pelo último snapshot
+        self._sizes: Dict[str, int] = {}       # tamanho do arquivo vivo após a nossa última escrita
+        self._subscribers: List[Callable[[Dict], None]] = []
+
+    def _file(self, session_id: str) -> Path:
+        return self.journal_dir / f"{session_id}.jsonl"
+
+    def _archive(self, session_id: str) -> Path:
+        return self.journal_dir / f"{session_id}.archive.jsonl"
+
+    @staticmethod
+    def _read_lines(path: Path) -> Iterator[Dict]:
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Linha truncada (queda no meio do append)
+
+    @staticmethod
+    def _last_seq(path: Path) -> int:
+        """Maior seq de um arquivo lendo só o final dele"""
+        if not path.exists():
+            return 0
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 8192))
+            tail = f.read().decode('utf-8', errors='ignore').splitlines()
+        for line in reversed(tail):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if 'seq' in entry:
+                return entry['seq']
+        return 0
+
+    def _file_size(self, session_id: str) -> int:
+        try:
+            return self._file(session_id).stat().st_size
+        except FileNotFoundError:
+            return 0
+    
+    def _scan(self, session_id: str):
+        """
+        Descobre seq, linhas e checkpoint do arquivo vivo no primeiro acesso - e de novo
+        quando outro processo (outro worker da API) escreveu no mesmo diário.
+        """
+        if session_id in self._seq and self._sizes.get(session_id) == self._file_size(session_id):
+            return
+        seq = lines = checkpoint = 0
+        for entry in self._read_lines(self._file(session_id)):
+            lines += 1
+            if 'checkpoint' in entry:
+                checkpoint = max(checkpoint, entry['checkpoint'])
+            else:
+                seq = max(seq, entry.get('seq', 0))
+        if not seq:
+            seq = max(self._last_seq(self._archive(session_id)), checkpoint)
+        self._seq[session_id] = seq
+        self._lines[session_id] = lines
+        self._checkpoint[session_id] = checkpoint
+        self._sizes[session_id] = self._file_size(session_id)
+
+    def _write(self, path: Path, lines: str) -> int:
+        """Append; retorna o tamanho do arquivo depois da escrita"""
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            return os.fstat(f.fileno()).st_size
+
+    # ==================== ESCRITA ====================
+
+    def append(self, session_id: str, event_type: str, **data) -> Optional[Dict]:
+        """Acrescenta um evento (seq crescente por sessão) e avisa os assinantes"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                self._scan(session_id)
+                event = {'seq': self._seq[session_id] + 1, 'ts': datetime.now().isoformat(),
+                         'session_id': session_id, 'type': event_type, **data}
+                self._sizes[session_id] = self._write(
+                    self._file(session_id), json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n'
+                )
+                self._seq[session_id] = event['seq']
+                self._lines[session_id] += 1
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar evento {event_type} da sessão {session_id}: {e}")
+            return None
+
+        self._publish(event)
+        return event
+
+    def checkpoint(self, session_id: str, seq: int):
+        """
+        Snapshot gravado cobre até `seq`: marca no diário (append) e, a cada
+        COMPACT_EVERY linhas, move o que ficou obsoleto para o arquivo morto.
+        """
+        if not self.enabled or not seq:
+            return
+        try:
+            with self._lock:
+                self._scan(session_id)
+                if seq <= self._checkpoint[session_id]:
+                    return
+                self._sizes[session_id] = self._write(self._file(session_id), json.dumps({'checkpoint': seq}) + '\n')
+                self._checkpoint[session_id] = seq
+                self._lines[session_id] += 1
+                if self._lines[session_id] >= self.compact_every:
+                    self._compact(session_id)
+        except Exception as e:
+            print(f"⚠️ Erro no checkpoint do diário da sessão {session_id}: {e}")
+
+    def _compact(self, session_id: str):
+        """Reescreve o arquivo vivo só com os eventos após o checkpoint (chamado com o lock)"""
+        checkpoint = self._checkpoint[session_id]
+        done, tail = [], []
+        for entry in self._read_lines(self._file(session_id)):
+            if 'checkpoint' in entry:
+                continue
+            (done if entry['seq'] <= checkpoint else tail).append(
+                json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+            )
+
+        if done:
+            self._write(self._archive(session_id), ''.join(done))
+        live = self._file(session_id)
+        tmp = live.with_name(live.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'checkpoint': checkpoint}) + '\n' + ''.join(tail))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, live)
+        self._lines[session_id] = len(tail) + 1
+        self._sizes[session_id] = self._file_size(session_id)
+
+    def delete(self, session_id: str):
+        """Sessão apagada: remove diário e arquivo morto"""
+        with self._lock:
+            self._file(session_id).unlink(missing_ok=True)
+            self._archive(session_id).unlink(missing_ok=True)
+            self._seq.pop(session_id, None)
+            self._lines.pop(session_id, None)
+            self._checkpoint.pop(session_id, None)
+            self._sizes.pop(session_id, None)
+
+    # ==================== LEITURA ====================
+
+    def last_seq(self, session_id: str) -> int:
+        with self._lock:
+            self._scan(session_id)
+            return self._seq[session_id]
+
+    def read(self, session_id: str, after_seq: int = 0) -> List[Dict]:
+        """Eventos do arquivo vivo com seq > after_seq (recuperação)"""
+        return [
+            entry for entry in self._read_lines(self._file(session_id))
+            if 'checkpoint' not in entry and entry['seq'] > after_seq
+        ]
+
+    def history(self, session_id: str, after_seq: int = 0) -> Iterator[Dict]:
+        """Trilha de auditoria completa: arquivo morto + vivo, em ordem de seq"""
+        last = after_seq
+        for path in (self._archive(session_id), self._file(session_id)):
+            for entry in self._read_lines(path):
+                if 'checkpoint' not in entry and entry['seq'] > last:
+                    last = entry['seq']
+                    yield entry
+
+    def pending_sessions(self) -> List[str]:
+        """Sessões com eventos depois do último checkpoint (não cobertos por snapshot)"""
+        if not self.enabled or not self.journal_dir.exists():
+            return []
+        pending = []
+        for path in self.journal_dir.glob("*.jsonl"):
+            if path.name.endswith('.archive.jsonl'):
+                continue
+            session_id = path.stem
+            with self._lock:
+                self._scan(session_id)
+                if self._seq[session_id] > self._checkpoint[session_id]:
+                    pending.append(session_id)
+        return pending
+
+    # ==================== ASSINANTES ====================
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Dict], None]):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _publish(self, event: Dict):
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ Assinante do diário falhou: {e}")
+
+
+# ==================== PAYLOADS (mesmo formato compacto do SessionStore) ====================
+
+def romaneio_payload(romaneio) -> Dict:
+    return {
+        'id': romaneio.id,
+        'uploaded_at': romaneio.uploaded_at.isoformat(),
+        'count': len(romaneio.points),
+        'points_blob': romaneio.points.to_base64()
+    }
+
+
+def order_payload(points: List, session):
+    """Ordem de rota como índices nos romaneios da sessão"""
+    from .session_persistence import SessionStore
+    return SessionStore._order_payload(points, [r.points for r in session.romaneios])
+
+
+def routes_payload(session) -> List[Dict]:
+    return [
+        {
+            'id': r.id,
+            'assigned_to_telegram_id': r.assigned_to_telegram_id,
+            'assigned_to_name': r.assigned_to_name,
+            'color': r.color,
+            'optimized_order': order_payload(r.optimized_order, session),
+            'delivered_packages': list(r.delivered_packages),
+            'failed_packages': dict(r.failed_packages)
+        } for r in session.routes
+    ]
+
+
+def apply_event(session, event: Dict) -> bool:
+    """
+    Reaplica um evento numa sessão carregada do snapshot.
+    Idempotente: o snapshot pode já conter parte dos eventos posteriores ao seu seq.
+    """
+    from .session import Route
+    from .session_persistence import SessionStore
+
+    kind = event['type']
+    if kind == SESSION_CREATED:
+        pass  # Sessão já existe (criada pelo snapshot ou pelo próprio replay)
+    elif kind == ROMANEIO_ADDED:
+        if all(r.id != event['romaneio']['id'] for r in session.romaneios):
+            session.romaneios.extend(SessionStore._romaneios_from_data([event['romaneio']]))
+    elif kind == BASE_SET:
+        session.base_address, session.base_lat, session.base_lng = event['address'], event['lat'], event['lng']
+    elif kind == ROUTES_SET:
+        session.routes = [
+            Route(
+                id=r['id'],
+                cluster=None,
+                assigned_to_telegram_id=r.get('assigned_to_telegram_id'),
+                assigned_to_name=r.get('assigned_to_name'),
+                color=r.get('color', '#667eea'),
+                optimized_order=SessionStore._order_from_data(r['optimized_order'], session.romaneios),
+                delivered_packages=list(r.get('delivered_packages', [])),
+                failed_packages=dict(r.get('failed_packages', {}))
+            ) for r in event['routes']
+        ]
+    elif kind == ROUTE_ASSIGNED:
+        route = session.get_route(event['route_id'])
+        if route is None:
+            return False
+        route.assigned_to_telegram_id = event['telegram_id']
+        if event.get('name'):
+            route.assigned_to_name = event['name']
+    elif kind == ROUTE_REORDERED:
+        route = session.get_route(event['route_id'])
+        if route is None:
+            return False
+        pending = SessionStore._order_from_data(event['optimized_order'], session.romaneios)
+        done = [p for p in route.optimized_order if route.is_delivered(p.package_id)]
+        route.optimized_order = done + [p for p in pending if not route.is_delivered(p.package_id)]
+    elif kind == PACKAGE_DELIVERED:
+        route = session.get_route(event['route_id'])
+        if route is None:
+            return False
+        route.mark_as_delivered(event['package_id'])
+    elif kind == PACKAGE_FAILED:
+        route = session.get_route(event['route_id'])
+        if route is None:
+            return False
+        route.mark_as_failed(event['package_id'], event.get('reason', ''))
+    elif kind == PACKAGES_TRANSFERRED:
+        session.move_packages(event['package_ids'], event['to_route_id'])
+    elif kind == SESSION_FINALIZED:
+        session.is_finalized = True
+        session.finalized_at = datetime.fromisoformat(event['finalized_at'])
+    else:
+        return False
+
+    session.invalidate_indexes()
+    return True
+
+
+# Instância global (mesmo diretório do session_store)
+session_journal = SessionJournal()
@@ -2,21 +2,37 @@
 💾 PERSISTÊNCIA DE SESSÕES - Auto-save em PostgreSQL ou JSON
 Salva sessões automaticamente com histórico completo
 """
+import atexit
 import json
 import os
+import threading
+import time
 from pathlib import Path
 from typing import List, Optional, Dict
 from datetime import datetime
 from .session import DailySession, Route, Romaneio, DeliveryPoint
+from .point_table import PointTable, PointView, encode_order, decode_order
+from .serialization import dump_file, load_file
 
 try:
-    from .database import db_manager, SessionDB, RouteDB
+    from sqlalchemy import case, func, null
+    from sqlalchemy.orm import selectinload
+    from .database import db_manager, SessionDB, RouteDB, RouteStopDB
     HAS_DATABASE = db_manager.is_connected
 except Exception as e:
     print(f"⚠️ Database import failed: {e}")
     HAS_DATABASE = False
 
 
+def _romaneio_count(r_data: Dict) -> int:
+    """Nº de pacotes de um romaneio serializado (formato compacto ou antigo)"""
+    return r_data['count'] if 'count' in r_data else len(r_data.get('points', []))
+
+# Janela de agrupamento do write-behind e modo durável (grava + fsync/commit antes de retornar)
+SAVE_WINDOW_MS = float(os.getenv('SESSION_SAVE_WINDOW_MS', '250'))
+DURABLE_SAVES = os.getenv('SESSION_DURABLE_SAVE', '').lower() in ('1', 'true', 'yes')
+
+
 class SessionStore:
     """Gerencia persistência de sessões em disco ou PostgreSQL"""
     
@@ -24,7 +40,15 @@ class SessionStore:
         self.sessions_dir = Path(data_dir) / "sessions"
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
         
+        # Índice JSON: resumo de cada sessão (listagem sem abrir os arquivos)
+        self.index_file = Path(data_dir) / "sessions_index.json"
+        self._index: Optional[Dict[str, Dict]] = None
+        self._index_dirty = False  # Contagens de entrega ainda não gravadas no índice
+        self._index_lock = threading.RLock()
+        
         self.using_database = HAS_DATABASE
+        self.fsync = DURABLE_SAVES  # JSON: garante no disco antes de retornar
+        self.journal = None  # SessionJournal: recebe checkpoint após cada gravação
         if self.using_database:
             print("✅ SessionStore usando PostgreSQL")
         else:
@@ -34,29 +58,290 @@ class SessionStore:
         """Path do arquivo da sessão"""
         return self.sessions_dir / f"{session_id}.json"
     
+    def _deliveries_file(self, session_id: str) -> Path:
+        """Sidecar com entregas (e falhas) acumuladas desde a última gravação completa"""
+        return self.sessions_dir / f"{session_id}.deliveries.jsonl"
+    
+    # ==================== RESUMO / ÍNDICE ====================
+    
+    @staticmethod
+    def _summary(session: DailySession) -> Dict:
+        """Resumo gravado junto com a sessão (colunas no banco, entrada no índice JSON)"""
+        return {
+            'session_id': session.session_id,
+            'session_name': session.session_name,
+            'date': session.date,
+            'period': session.period,
+            'created_at': session.created_at.isoformat(),
+            'is_finalized': session.is_finalized,
+            'base_address': session.base_address,
+            'total_packages': session.total_packages,
+            'num_routes': len(session.routes),
+            'delivered_count': session.total_delivered
+        }
+    
+    @staticmethod
+    def _summary_from_data(data: Dict) -> Dict:
+        """Resumo a partir do JSON completo (só na reconstrução do índice)"""
+        return {
+            'session_id': data['session_id'],
+            'session_name': data.get('session_name', ''),
+            'date': data['date'],
+            'period': data.get('period', ''),
+            'created_at': data['created_at'],
+            'is_finalized': data.get('is_finalized', False),
+            'base_address': data.get('base_address'),
+            'total_packages': sum(_romaneio_count(r) for r in data.get('romaneios', [])),
+            'num_routes': len(data.get('routes', [])),
+            'delivered_count': sum(len(r.get('delivered_packages', [])) for r in data.get('routes', []))
+        }
+    
+    def _load_index(self) -> Dict[str, Dict]:
+        """
+        Índice em memória (lido uma vez). Confere só os NOMES dos arquivos:
+        sessões sem entrada (índice antigo/ausente) são lidas uma única vez.
+        
+        O índice é gravado de forma preguiçosa (entregas só mudam a memória);
+        cada entrada guarda até que byte do sidecar o delivered_count cobre,
+        e o que foi anexado depois (queda antes de gravar o índice) é somado aqui.
+        """
+        with self._index_lock:
+            if self._index is None:
+                index = {}
+                if self.index_file.exists():
+                    try:
+                        index = load_file(self.index_file, 'session_index')
+                    except Exception as e:
+                        print(f"⚠️ Índice de sessões ilegível ({e}), reconstruindo")
+                
+                on_disk = {p.stem for p in self.sessions_dir.glob("*.json")}
+                changed = False
+                for session_id in set(index) - on_disk:
+                    del index[session_id]
+                    changed = True
+                for session_id in on_disk - set(index):
+                    try:
+                        entry = self._summary_from_data(load_file(self._session_file(session_id), 'session'))
+                        entry['sidecar_bytes'] = 0  # Entregas do sidecar ainda não compactadas: somadas abaixo
+                        index[session_id] = entry
+                        changed = True
+                    except Exception as e:
+                        print(f"⚠️ Erro ao indexar sessão {session_id}: {e}")
+                
+                for sidecar in self.sessions_dir.glob("*.deliveries.jsonl"):
+                    entry = index.get(sidecar.name[:-len(".deliveries.jsonl")])
+                    if entry is None:
+                        continue
+                    size = sidecar.stat().st_size
+                    covered = entry.get('sidecar_bytes', size)  # Índice antigo: contagem já incluía o sidecar
+                    if size > covered:
+                        entry['delivered_count'] += self._count_sidecar_deliveries(sidecar, covered)
+                        entry['sidecar_bytes'] = size
+                        changed = True
+                
+                self._index = index
+                self._index_dirty = False
+                if changed:
+                    self._write_index()
+            return self._index
+    
+    @staticmethod
+    def _count_sidecar_deliveries(sidecar: Path, offset: int = 0) -> int:
+        """Entregas (não falhas) anexadas ao sidecar a partir do byte offset"""
+        with open(sidecar, 'rb') as f:
+            f.seek(offset)
+            return sum(1 for line in f if line.strip() and b'"failed"' not in line)
+    
+    def _write_index(self):
+        """Grava o índice inteiro de forma atômica (arquivo pequeno: só resumos)"""
+        try:
+            dump_file(self.index_file, self._index, 'session_index', fsync=self.fsync)
+            self._index_dirty = False
+        except Exception as e:
+            print(f"⚠️ Erro ao gravar índice de sessões: {e}")
+    
+    def _update_index(self, session_id: str, entry: Optional[Dict]):
+        """Atualiza (ou remove, com entry=None) a entrada da sessão no índice JSON"""
+        with self._index_lock:
+            index = self._load_index()
+            if entry is None:
+                if index.pop(session_id, None) is None:
+                    return
+            else:
+                index[session_id] = entry
+            self._write_index()
+    
+    def _note_deliveries(self, session: DailySession, sidecar_bytes: int):
+        """Entregas anexadas ao sidecar: atualiza o resumo só na memória (índice gravado depois)"""
+        with self._index_lock:
+            entry = self._load_index().get(session.session_id)
+            if entry is None:
+                self._update_index(session.session_id, {**self._summary(session), 'sidecar_bytes': sidecar_bytes})
+                return
+            entry['delivered_count'] = session.total_delivered
+            entry['sidecar_bytes'] = max(entry.get('sidecar_bytes', 0), sidecar_bytes)
+            self._index_dirty = True
+    
+    def flush_index(self):
+        """Grava o índice se há contagens de entrega só na memória (flush/shutdown)"""
+        with self._index_lock:
+            if self._index is not None and self._index_dirty:
+                self._write_index()
+    
     def save_session(self, session: DailySession):
-        """Salva sessão em disco ou PostgreSQL (auto-save)"""
+        """
+        Salva sessão em disco ou PostgreSQL (auto-save) de forma incremental:
+        - mudança estrutural → reescreve a sessão inteira
+        - só entregas/falhas → 1 UPDATE por parada (banco) ou append no .jsonl (JSON)
+        - nada mudou → não grava
+        Gravado com sucesso, o diário da sessão recebe checkpoint no seq coberto.
+        """
+        seq = session.journal_seq  # Antes de pop_changes: entregas até aqui vão nesta gravação
+        structural, deliveries, failures = session.pop_changes()
+        if not structural and not deliveries and not failures:
+            return
+        
+        if structural:
+            seq = self._save_full(session)
+        elif not self._save_deliveries(session, deliveries, seq, failures):
+            seq = None
+        
+        if seq and self.journal is not None:
+            self.journal.checkpoint(session.session_id, seq)
+    
+    def _save_deliveries(self, session: DailySession, deliveries: List[tuple], journal_seq: int = 0,
+                         failures: List[tuple] = ()) -> bool:
+        """
+        Grava só as entregas e falhas novas (True = gravado).
+        Falhas vão antes: uma entrega posterior do mesmo pacote sobrescreve a falha.
+        """
         if self.using_database:
+            try:
+                now = datetime.now()
+                order: Dict[str, Dict[str, int]] = {}  # rota -> package_id -> ordem de entrega
+                with db_manager.get_session() as db_session:
+                    for route_id, package_id, reason in failures:
+                        route = session.get_route(route_id)
+                        if route is None:
+                            continue
+                        updated = db_session.query(RouteStopDB).filter(
+                            RouteStopDB.session_id == session.session_id, RouteStopDB.route_id == route_id,
+                            RouteStopDB.package_id == package_id, RouteStopDB.status != 'delivered'
+                        ).update({'status': 'failed', 'failure_reason': reason[:200]}, synchronize_session=False)
+                        if not updated and route.optimized_order and not db_session.query(RouteStopDB.id).filter_by(
+                            session_id=session.session_id, route_id=route_id
+                        ).first():
+                            raise LookupError(f"rota {route_id} ainda não gravada em paradas")
+                    
+                    for route_id, package_id in deliveries:
+                        route = session.get_route(route_id)
+                        if route is None:
+                            continue
+                        if route_id not in order:
+                            order[route_id] = {}
+                            for n, pid in enumerate(route.delivered_packages):
+                                order[route_id].setdefault(pid, n)
+                        stops = db_session.query(RouteStopDB).filter_by(
+                            session_id=session.session_id, route_id=route_id, package_id=package_id
+                        )
+                        updated = stops.filter(RouteStopDB.status != 'delivered').update({
+                            'status': 'delivered', 'delivered_at': now, 'failure_reason': None,
+                            'delivery_seq': order[route_id].get(package_id)
+                        }, synchronize_session=False)
+                        if updated or stops.first() is not None:
+                            continue  # Entregue agora (ou já estava)
+                        
+                        has_stops = db_session.query(RouteStopDB.id).filter_by(
+                            session_id=session.session_id, route_id=route_id
+                        ).first()
+                        if not has_stops and route.optimized_order:
+                            raise LookupError(f"rota {route_id} ainda não gravada em paradas")
+                        # Pacote fora da ordem da rota: entrega avulsa
+                        db_session.add(RouteStopDB(
+                            session_id=session.session_id, route_id=route_id, package_id=package_id,
+                            status='delivered', delivered_at=now,
+                            delivery_seq=order[route_id].get(package_id)
+                        ))
+                    db_session.query(SessionDB).filter_by(session_id=session.session_id).update(
+                        {'delivered_count': session.total_delivered, 'journal_seq': journal_seq},
+                        synchronize_session=False
+                    )
+                return True
+            except LookupError:
+                return self._save_full(session) is not None
+            except Exception as e:
+                print(f"⚠️ Erro ao salvar entregas no PostgreSQL: {e}, usando fallback JSON")
+        
+        # JSON: sessão base precisa existir; entregas vão num append-only
+        if not self._session_file(session.session_id).exists():
+            return self._save_full(session, json_only=True) is not None
+        
+        try:
+            with open(self._deliveries_file(session.session_id), 'a', encoding='utf-8') as f:
+                f.write(''.join(
+                    json.dumps({'route_id': route_id, 'package_id': package_id, 'failed': reason,
+                                'journal_seq': journal_seq}) + '\n'
+                    for route_id, package_id, reason in failures
+                ))
+                f.write(''.join(
+                    json.dumps({'route_id': route_id, 'package_id': package_id, 'journal_seq': journal_seq}) + '\n'
+                    for route_id, package_id in deliveries
+                ))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+                sidecar_bytes = f.tell()
+            # Índice só na memória: reescrevê-lo aqui custaria O(nº de sessões) por entrega
+            self._note_deliveries(session, sidecar_bytes)
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao salvar entregas da sessão {session.session_id}: {e}")
+            session.mark_dirty()  # próxima gravação reescreve tudo
+            return False
+    
+    def _json_payload(self, session: DailySession) -> Dict:
+        """Conteúdo do arquivo da sessão (romaneios em colunas, rotas como índices)"""
+        return {
+            'journal_seq': session.journal_seq,  # Primeiro: eventos até aqui já estão no estado abaixo
+            'session_id': session.session_id,
+            'session_name': session.session_name,
+            'date': session.date,
+            'period': session.period,
+            'created_at': session.created_at.isoformat(),
+            'base_address': session.base_address,
+            'base_lat': session.base_lat,
+            'base_lng': session.base_lng,
+            'is_finalized': session.is_finalized,
+            'finalized_at': session.finalized_at.isoformat() if session.finalized_at else None,
+            'romaneios': self._romaneios_payload(session),
+            'routes': [
+                {
+                    'id': r.id,
+                    'assigned_to_telegram_id': r.assigned_to_telegram_id,
+                    'assigned_to_name': r.assigned_to_name,
+                    'color': r.color,
+                    'optimized_order': self._order_payload(r.optimized_order, [rom.points for rom in session.romaneios]),
+                    'delivered_packages': r.delivered_packages,
+                    'failed_packages': r.failed_packages,
+                    'map_file': r.map_file
+                } for r in session.routes
+            ]
+        }
+    
+    def _save_full(self, session: DailySession, json_only: bool = False) -> Optional[int]:
+        """Reescreve a sessão inteira (romaneios, rotas e entregas); retorna o seq do diário gravado (None = falhou)"""
+        if self.using_database and not json_only:
             # Salva no PostgreSQL
             try:
+                journal_seq = session.journal_seq  # Lido antes do estado: eventos até aqui estão no snapshot
                 with db_manager.get_session() as db_session:
-                    # Serializa romaneios para JSON
-                    romaneios_data = [
-                        {
-                            'id': r.id,
-                            'uploaded_at': r.uploaded_at.isoformat(),
-                            'points': [
-                                {
-                                    'package_id': p.package_id,
-                                    'romaneio_id': p.romaneio_id,
-                                    'address': p.address,
-                                    'lat': p.lat,
-                                    'lng': p.lng,
-                                    'priority': p.priority
-                                } for p in r.points
-                            ]
-                        } for r in session.romaneios
-                    ]
+                    # Romaneios só com id/data/quantidade; pacotes viram linhas em route_stops
+                    romaneios_data = self._romaneios_meta(session)
+                    delivered_at = dict(
+                        ((route_id, package_id), at) for route_id, package_id, at in
+                        db_session.query(RouteStopDB.route_id, RouteStopDB.package_id, RouteStopDB.delivered_at)
+                        .filter_by(session_id=session.session_id, status='delivered').all()
+                    )
                     
                     # Verifica se sessão já existe
                     session_db = db_session.query(SessionDB).filter_by(session_id=session.session_id).first()
@@ -72,8 +357,13 @@ class SessionStore:
                         session_db.is_finalized = session.is_finalized
                         session_db.finalized_at = session.finalized_at
                         session_db.romaneios_data = romaneios_data
+                        session_db.total_packages = session.total_packages
+                        session_db.num_routes = len(session.routes)
+                        session_db.delivered_count = session.total_delivered
+                        session_db.journal_seq = journal_seq
                         
-                        # Remove rotas antigas
+                        # Remove rotas e paradas antigas
+                        db_session.query(RouteStopDB).filter_by(session_id=session.session_id).delete()
                         db_session.query(RouteDB).filter_by(session_id=session.session_id).delete()
                     else:
                         # Cria nova
@@ -88,7 +378,11 @@ class SessionStore:
                             base_lng=session.base_lng,
                             is_finalized=session.is_finalized,
                             finalized_at=session.finalized_at,
-                            romaneios_data=romaneios_data
+                            romaneios_data=romaneios_data,
+                            total_packages=session.total_packages,
+                            num_routes=len(session.routes),
+                            delivered_count=session.total_delivered,
+                            journal_seq=journal_seq
                         )
                         db_session.add(session_db)
                     
@@ -101,21 +395,18 @@ class SessionStore:
                             assigned_to_name=route.assigned_to_name,
                             color=route.color,
                             map_file=route.map_file,
-                            optimized_order=[
-                                {
-                                    'package_id': p.package_id,
-                                    'romaneio_id': p.romaneio_id,
-                                    'address': p.address,
-                                    'lat': p.lat,
-                                    'lng': p.lng,
-                                    'priority': p.priority
-                                } for p in route.optimized_order
-                            ],
-                            delivered_packages=route.delivered_packages
+                            optimized_order=null(),  # NULL de verdade (não JSON 'null'): rota em route_stops
+                            delivered_packages=null()
                         )
                         db_session.add(route_db)
+                    db_session.flush()
                     
-                return
+                    # Paradas em lote (um INSERT executemany)
+                    stops = self._stop_rows(session, delivered_at)
+                    if stops:
+                        db_session.bulk_insert_mappings(RouteStopDB, stops)
+                    
+                return journal_seq
             except Exception as e:
                 print(f"⚠️ Erro ao salvar sessão no PostgreSQL: {e}, usando fallback JSON")
         
@@ -124,188 +415,258 @@ class SessionStore:
             # Garante que diretório existe
             self.sessions_dir.mkdir(parents=True, exist_ok=True)
             
-            data = {
-                'session_id': session.session_id,
-                'session_name': session.session_name,
-                'date': session.date,
-                'period': session.period,
-                'created_at': session.created_at.isoformat(),
-                'base_address': session.base_address,
-                'base_lat': session.base_lat,
-                'base_lng': session.base_lng,
-                'is_finalized': session.is_finalized,
-                'finalized_at': session.finalized_at.isoformat() if session.finalized_at else None,
-                'romaneios': [
-                    {
-                        'id': r.id,
-                        'uploaded_at': r.uploaded_at.isoformat(),
-                        'points': [
-                            {
-                                'package_id': p.package_id,
-                                'romaneio_id': p.romaneio_id,
-                                'address': p.address,
-                                'lat': p.lat,
-                                'lng': p.lng,
-                                'priority': p.priority
-                            } for p in r.points
-                        ]
-                    } for r in session.romaneios
-                ],
-                'routes': [
-                    {
-                        'id': r.id,
-                        'assigned_to_telegram_id': r.assigned_to_telegram_id,
-                        'assigned_to_name': r.assigned_to_name,
-                        'color': r.color,
-                        'optimized_order': [
-                            {
-                                'package_id': p.package_id,
-                                'romaneio_id': p.romaneio_id,
-                                'address': p.address,
-                                'lat': p.lat,
-                                'lng': p.lng,
-                                'priority': p.priority
-                            } for p in r.optimized_order
-                        ],
-                        'delivered_packages': r.delivered_packages,
-                        'map_file': r.map_file
-                    } for r in session.routes
-                ]
-            }
+            data = self._json_payload(session)
             
-            file_path = self._session_file(session.session_id)
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # Grava em arquivo temporário e troca (nunca deixa JSON pela metade);
+            # o sidecar de entregas já está contido no arquivo completo
+            dump_file(self._session_file(session.session_id), data, 'session', fsync=self.fsync)
+            self._deliveries_file(session.session_id).unlink(missing_ok=True)
+            self._update_index(session.session_id, {**self._summary(session), 'sidecar_bytes': 0})
+            return data['journal_seq']
         except Exception as e:
             print(f"❌ Erro ao salvar sessão {session.session_id}: {e}")
             import traceback
             traceback.print_exc()
-    
-    def load_session(self, session_id: str) -> Optional[DailySession]:
-        """Carrega sessão do PostgreSQL ou disco"""
-        if self.using_database:
-            # Carrega do PostgreSQL
-            try:
-                with db_manager.get_session() as db_session:
-                    session_db = db_session.query(SessionDB).filter_by(session_id=session_id).first()
-                    
-                    if not session_db:
-                        return None
-                    
-                    # Reconstrói romaneios
-                    romaneios = []
-                    for r_data in (session_db.romaneios_data or []):
-                        points = [
-                            DeliveryPoint(
-                                package_id=p['package_id'],
-                                romaneio_id=p['romaneio_id'],
-                                address=p['address'],
-                                lat=p['lat'],
-                                lng=p['lng'],
-                                priority=p.get('priority', 'normal')
-                            ) for p in r_data['points']
-                        ]
-                        romaneios.append(Romaneio(
-                            id=r_data['id'],
-                            uploaded_at=datetime.fromisoformat(r_data['uploaded_at']),
-                            points=points
-                        ))
-                    
-                    # Reconstrói rotas
-                    routes = []
-                    for route_db in session_db.routes:
-                        optimized = [
-                            DeliveryPoint(
-                                package_id=p['package_id'],
-                                romaneio_id=p['romaneio_id'],
-                                address=p['address'],
-                                lat=p['lat'],
-                                lng=p['lng'],
-                                priority=p.get('priority', 'normal')
-                            ) for p in (route_db.optimized_order or [])
-                        ]
-                        
-                        route = Route(
-                            id=route_db.id,
-                            cluster=None,
-                            assigned_to_telegram_id=route_db.assigned_to_telegram_id,
-                            assigned_to_name=route_db.assigned_to_name,
-                            color=route_db.color,
-                            optimized_order=optimized,
-                            delivered_packages=route_db.delivered_packages or [],
-                            map_file=route_db.map_file
-                        )
-                        routes.append(route)
-                    
-                    return DailySession(
-                        session_id=session_db.session_id,
-                        session_name=session_db.session_name or '',
-                        date=session_db.date,
-                        period=session_db.period or '',
-                        created_at=session_db.created_at,
-                        base_address=session_db.base_address,
-                        base_lat=session_db.base_lat,
-                        base_lng=session_db.base_lng,
-                        romaneios=romaneios,
-                        routes=routes,
-                        is_finalized=session_db.is_finalized,
-                        finalized_at=session_db.finalized_at
-                    )
-            except Exception as e:
-                print(f"⚠️ Erro ao carregar sessão do PostgreSQL: {e}, tentando JSON")
-        
-        # Fallback: JSON
-        file_path = self._session_file(session_id)
-        
-        if not file_path.exists():
+            session.mark_dirty()
             return None
-        
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # Reconstrói objetos
-        romaneios = []
-        for r_data in data.get('romaneios', []):
-            points = [
-                DeliveryPoint(
-                    package_id=p['package_id'],
-                    romaneio_id=p['romaneio_id'],
-                    address=p['address'],
-                    lat=p['lat'],
-                    lng=p['lng'],
-                    priority=p.get('priority', 'normal')
-                ) for p in r_data['points']
-            ]
-            romaneios.append(Romaneio(
+    
+    # ==================== LEITURA ====================
+    
+    @staticmethod
+    def _point_from_dict(p: Dict) -> DeliveryPoint:
+        return DeliveryPoint(
+            package_id=p['package_id'],
+            romaneio_id=p['romaneio_id'],
+            address=p['address'],
+            lat=p['lat'],
+            lng=p['lng'],
+            priority=p.get('priority', 'normal')
+        )
+    
+    @staticmethod
+    def _romaneios_from_data(romaneios_data: List[Dict]) -> List[Romaneio]:
+        return [
+            Romaneio(
                 id=r_data['id'],
                 uploaded_at=datetime.fromisoformat(r_data['uploaded_at']),
-                points=points
-            ))
+                points=(PointTable.from_base64(r_data['points_blob']) if 'points_blob' in r_data
+                        else PointTable.from_dicts(r_data.get('points', [])))  # Formato antigo
+            ) for r_data in romaneios_data
+        ]
+    
+    @staticmethod
+    def _order_from_data(order, romaneios: List[Romaneio]) -> List:
+        """Ordem da rota: pares (romaneio, linha) ou, no formato antigo, dicts por ponto"""
+        if isinstance(order, dict):
+            return decode_order(order['rows'], [r.points for r in romaneios])
+        return [SessionStore._point_from_dict(p) for p in (order or [])]
+    
+    @staticmethod
+    def _parts_from_stops(romaneios_data: List[Dict], stops) -> tuple:
+        """
+        Romaneios e rotas a partir das linhas de route_stops.
+        Retorna (romaneios, {route_id: (ordem otimizada, package_ids entregues, {package_id: motivo da falha})}).
+        """
+        by_point = sorted((s for s in stops if s.point_seq is not None), key=lambda s: s.point_seq)
+        romaneios: List[Romaneio] = []
+        located: Dict[int, PointView] = {}
+        start = 0
+        for meta in romaneios_data:
+            rows = by_point[start:start + _romaneio_count(meta)]
+            start += len(rows)
+            table = PointTable.from_points(rows)
+            romaneios.append(Romaneio(id=meta['id'], uploaded_at=datetime.fromisoformat(meta['uploaded_at']),
+                                      points=table))
+            for i, row in enumerate(rows):
+                located[row.point_seq] = PointView(table, i)
         
-        routes = []
-        for r_data in data.get('routes', []):
-            optimized = [
-                DeliveryPoint(
-                    package_id=p['package_id'],
-                    romaneio_id=p['romaneio_id'],
-                    address=p['address'],
-                    lat=p['lat'],
-                    lng=p['lng'],
-                    priority=p.get('priority', 'normal')
-                ) for p in r_data['optimized_order']
+        per_route: Dict[str, List] = {}
+        for stop in stops:
+            if stop.route_id is not None:
+                per_route.setdefault(stop.route_id, []).append(stop)
+        
+        routes = {}
+        for route_id, route_stops in per_route.items():
+            ordered = sorted((s for s in route_stops if s.seq is not None), key=lambda s: s.seq)
+            order = [
+                located.get(s.point_seq) or DeliveryPoint(address=s.address or '', lat=s.lat, lng=s.lng,
+                                                          romaneio_id=s.romaneio_id or '', package_id=s.package_id,
+                                                          priority=s.priority or 'normal')
+                for s in ordered
             ]
+            done = sorted((s for s in route_stops if s.status == 'delivered'),
+                          key=lambda s: (s.delivery_seq is None, s.delivery_seq or 0, s.seq or 0))
+            failed = {s.package_id: s.failure_reason or '' for s in route_stops if s.status == 'failed'}
+            routes[route_id] = (order, list(dict.fromkeys(s.package_id for s in done)), failed)
+        return romaneios, routes
+    
+    # ==================== ESCRITA (formato compacto) ====================
+    
+    @staticmethod
+    def _romaneios_meta(session: DailySession) -> List[Dict]:
+        """Banco: só o cabeçalho dos romaneios (os pacotes vão para route_stops)"""
+        return [
+            {'id': r.id, 'uploaded_at': r.uploaded_at.isoformat(), 'count': len(r.points)}
+            for r in session.romaneios
+        ]
+    
+    @staticmethod
+    def _stop_rows(session: DailySession, delivered_at: Optional[Dict] = None) -> List[Dict]:
+        """
+        Linhas de route_stops: uma por pacote dos romaneios (point_seq) com a rota/posição
+        de quem o recebeu; pacotes de rota fora dos romaneios e entregas avulsas viram linhas extras.
+        delivered_at: {(route_id, package_id): datetime} já gravado (preserva o horário da entrega).
+        """
+        delivered_at = delivered_at or {}
+        now = datetime.now()
+        
+        def stop(**fields) -> Dict:
+            row = {'session_id': session.session_id, 'route_id': None, 'seq': None, 'point_seq': None,
+                   'romaneio_id': None, 'address': None, 'lat': None, 'lng': None, 'priority': 'normal',
+                   'status': 'pending', 'failure_reason': None, 'delivered_at': None, 'delivery_seq': None}
+            row.update(fields)
+            return row
+        
+        rows: List[Dict] = []
+        by_view: Dict[tuple, Dict] = {}
+        by_package: Dict[str, List[Dict]] = {}
+        for romaneio in session.romaneios:
+            table = romaneio.points
+            values = table.strings.values
+            lat, lng = table.lat.tolist(), table.lng.tolist()
+            address, package = table.address_idx.tolist(), table.package_idx.tolist()
+            rom, priority = table.romaneio_idx.tolist(), table.priority_idx.tolist()
+            for i in range(len(table)):
+                row = stop(point_seq=len(rows), package_id=values[package[i]], romaneio_id=values[rom[i]],
+                           address=values[address[i]], lat=lat[i], lng=lng[i], priority=values[priority[i]])
+                by_view[(id(table), i)] = row
+                by_package.setdefault(row['package_id'], []).append(row)
+                rows.append(row)
+        
+        for route in session.routes:
+            delivery_seq: Dict[str, int] = {}
+            for n, package_id in enumerate(route.delivered_packages):
+                delivery_seq.setdefault(package_id, n)
+            
+            in_order = set()
+            for seq, p in enumerate(route.optimized_order):
+                if isinstance(p, PointView):
+                    row = by_view.get((id(p.table), p.row))
+                else:
+                    # Ponto solto (formato antigo): mesma linha do romaneio, pelo package_id
+                    row = next((r for r in by_package.get(p.package_id, ()) if r['route_id'] is None), None)
+                if row is None or row['route_id'] is not None:
+                    # Ponto montado à mão (ou já usado por outra rota): linha própria
+                    row = stop(package_id=p.package_id, romaneio_id=p.romaneio_id, address=p.address,
+                               lat=p.lat, lng=p.lng, priority=p.priority)
+                    rows.append(row)
+                row['route_id'], row['seq'] = route.id, seq
+                in_order.add(p.package_id)
+                n = delivery_seq.get(p.package_id)
+                if n is not None:
+                    row.update(status='delivered', delivery_seq=n,
+                               delivered_at=delivered_at.get((route.id, p.package_id), now))
+                elif p.package_id in route.failed_packages:
+                    row.update(status='failed', failure_reason=route.failed_packages[p.package_id][:200])
             
-            route = Route(
+            for package_id, n in delivery_seq.items():
+                if package_id not in in_order:
+                    rows.append(stop(route_id=route.id, package_id=package_id, status='delivered', delivery_seq=n,
+                                     delivered_at=delivered_at.get((route.id, package_id), now)))
+        return rows
+    
+    @staticmethod
+    def _romaneios_payload(session: DailySession) -> List[Dict]:
+        return [
+            {
+                'id': r.id,
+                'uploaded_at': r.uploaded_at.isoformat(),
+                'count': len(r.points),
+                'points_blob': r.points.to_base64()
+            } for r in session.romaneios
+        ]
+    
+    @staticmethod
+    def _order_payload(points: List, tables: List[PointTable]):
+        """Rota como índices nos romaneios; pontos avulsos caem no formato de dicts"""
+        rows = encode_order(points, tables)
+        if rows is not None:
+            return {'rows': rows, 'count': len(points)}
+        return [
+            {
+                'package_id': p.package_id,
+                'romaneio_id': p.romaneio_id,
+                'address': p.address,
+                'lat': p.lat,
+                'lng': p.lng,
+                'priority': p.priority
+            } for p in points
+        ]
+    
+    def _session_from_row(self, session_db, routes_db, stops=None) -> DailySession:
+        """
+        Reconstrói a sessão a partir da linha do banco, das rotas e das paradas (já carregadas).
+        Sessão sem paradas e com pontos em romaneios_data = formato antigo (JSON inteiro).
+        """
+        romaneios_data = session_db.romaneios_data or []
+        if stops:
+            romaneios, parts = self._parts_from_stops(romaneios_data, stops)
+        else:
+            romaneios, parts = self._romaneios_from_data(romaneios_data), {}
+        
+        routes = []
+        for route_db in routes_db:
+            if route_db.id in parts or route_db.optimized_order is None:
+                order, delivered, failed = parts.get(route_db.id, ([], [], {}))
+            else:
+                order = self._order_from_data(route_db.optimized_order, romaneios)
+                delivered, failed = route_db.delivered_packages or [], {}
+            routes.append(Route(
+                id=route_db.id,
+                cluster=None,
+                assigned_to_telegram_id=route_db.assigned_to_telegram_id,
+                assigned_to_name=route_db.assigned_to_name,
+                color=route_db.color,
+                optimized_order=order,
+                delivered_packages=delivered,
+                failed_packages=failed,
+                map_file=route_db.map_file
+            ))
+        
+        session = DailySession(
+            session_id=session_db.session_id,
+            session_name=session_db.session_name or '',
+            date=session_db.date,
+            period=session_db.period or '',
+            created_at=session_db.created_at,
+            base_address=session_db.base_address,
+            base_lat=session_db.base_lat,
+            base_lng=session_db.base_lng,
+            romaneios=romaneios,
+            routes=routes,
+            is_finalized=session_db.is_finalized,
+            finalized_at=session_db.finalized_at,
+            journal_seq=session_db.journal_seq or 0
+        )
+        session.mark_clean()
+        return session
+    
+    def _session_from_data(self, data: Dict) -> DailySession:
+        """Reconstrói a sessão a partir do JSON já lido (+ entregas do sidecar)"""
+        romaneios = self._romaneios_from_data(data.get('romaneios', []))
+        routes = [
+            Route(
                 id=r_data['id'],
                 cluster=None,  # Cluster não precisa ser reconstruído
                 assigned_to_telegram_id=r_data.get('assigned_to_telegram_id'),
                 assigned_to_name=r_data.get('assigned_to_name'),
                 color=r_data.get('color', '#667eea'),
-                optimized_order=optimized,
+                optimized_order=self._order_from_data(r_data['optimized_order'], romaneios),
                 delivered_packages=r_data.get('delivered_packages', []),
+                failed_packages=r_data.get('failed_packages', {}),
                 map_file=r_data.get('map_file')
-            )
-            routes.append(route)
+            ) for r_data in data.get('routes', [])
+        ]
         
         session = DailySession(
             session_id=data['session_id'],
@@ -319,113 +680,301 @@ class SessionStore:
             romaneios=romaneios,
             routes=routes,
             is_finalized=data.get('is_finalized', False),
-            finalized_at=datetime.fromisoformat(data['finalized_at']) if data.get('finalized_at') else None
+            finalized_at=datetime.fromisoformat(data['finalized_at']) if data.get('finalized_at') else None,
+            journal_seq=data.get('journal_seq', 0)
         )
         
+        self._replay_deliveries(session)
+        session.mark_clean()
         return session
     
-    def list_sessions(self, limit: int = 20) -> List[Dict]:
-        """Lista todas as sessões (mais recentes primeiro)"""
+    def _load_json(self, session_id: str) -> Optional[DailySession]:
+        file_path = self._session_file(session_id)
+        if not file_path.exists():
+            return None
+        return self._session_from_data(load_file(file_path, 'session'))
+    
+    def load_session(self, session_id: str) -> Optional[DailySession]:
+        """Carrega sessão do PostgreSQL ou disco"""
+        if self.using_database:
+            # Carrega do PostgreSQL
+            try:
+                with db_manager.get_session() as db_session:
+                    session_db = db_session.query(SessionDB).filter_by(session_id=session_id).first()
+                    
+                    if not session_db:
+                        return None
+                    
+                    return self._session_from_row(session_db, session_db.routes, session_db.stops)
+            except Exception as e:
+                print(f"⚠️ Erro ao carregar sessão do PostgreSQL: {e}, tentando JSON")
+        
+        # Fallback: JSON
+        return self._load_json(session_id)
+    
+    def load_sessions(self, session_ids: Optional[List[str]] = None, limit: int = 50) -> List[DailySession]:
+        """
+        Carregamento em lote (dashboard, histórico, listagens completas).
+
+        Banco: 3 consultas no total - sessões + rotas + paradas de todas elas (selectinload/IN).
+        JSON: cada arquivo é lido e parseado uma única vez.
+        Sem session_ids: as `limit` mais recentes. Com ids: na ordem pedida.
+        """
+        if session_ids is not None and not session_ids:
+            return []
+        
+        if self.using_database:
+            try:
+                with db_manager.get_session() as db_session:
+                    query = db_session.query(SessionDB).options(selectinload(SessionDB.routes),
+                                                                selectinload(SessionDB.stops))
+                    if session_ids is not None:
+                        rows = query.filter(SessionDB.session_id.in_(session_ids)).all()
+                        by_id = {row.session_id: row for row in rows}
+                        rows = [by_id[sid] for sid in session_ids if sid in by_id]
+                    else:
+                        rows = query.order_by(SessionDB.created_at.desc()).limit(limit).all()
+                    
+                    sessions = []
+                    for row in rows:
+                        try:
+                            sessions.append(self._session_from_row(row, row.routes, row.stops))
+                        except Exception as e:
+                            print(f"⚠️ Erro ao montar sessão {row.session_id}: {e}")
+                    if sessions or session_ids is not None:
+                        return sessions
+            except Exception as e:
+                print(f"⚠️ Erro ao carregar sessões do PostgreSQL: {e}, tentando JSON")
+        
+        # Fallback: JSON (ordem pelo índice, sem abrir arquivo para ordenar)
+        if session_ids is None:
+            session_ids = [s['session_id'] for s in self.list_sessions(limit=limit)]
+        
         sessions = []
+        for session_id in session_ids:
+            try:
+                session = self._load_json(session_id)
+                if session:
+                    sessions.append(session)
+            except Exception as e:
+                print(f"⚠️ Erro ao carregar sessão {session_id}: {e}")
+        return sessions
+    
+    def _replay_deliveries(self, session: DailySession):
+        """Aplica entregas/falhas do sidecar .jsonl gravadas depois do último save completo"""
+        sidecar = self._deliveries_file(session.session_id)
+        if not sidecar.exists():
+            return
         
+        routes = {r.id: r for r in session.routes}
+        with open(sidecar, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Linha truncada (queda no meio do append)
+                route = routes.get(entry.get('route_id'))
+                if route and 'failed' in entry:
+                    route.mark_as_failed(entry['package_id'], entry['failed'])
+                elif route:
+                    route.mark_as_delivered(entry['package_id'])
+                session.journal_seq = max(session.journal_seq, entry.get('journal_seq', 0))
+    
+    def list_sessions(self, limit: int = 20) -> List[Dict]:
+        """
+        Lista todas as sessões (mais recentes primeiro).
+        Banco: uma consulta só nas colunas de resumo. JSON: uma leitura do índice.
+        Nenhum dos dois abre romaneios/pontos.
+        """
         # Tenta carregar do PostgreSQL primeiro
         if self.using_database:
             try:
                 with db_manager.get_session() as db_session:
-                    sessions_db = db_session.query(SessionDB).order_by(SessionDB.created_at.desc()).limit(limit).all()
+                    rows = db_session.query(
+                        SessionDB.session_id, SessionDB.session_name, SessionDB.date, SessionDB.period,
+                        SessionDB.created_at, SessionDB.is_finalized, SessionDB.base_address,
+                        SessionDB.total_packages, SessionDB.num_routes, SessionDB.delivered_count
+                    ).order_by(SessionDB.created_at.desc()).limit(limit).all()
                     
-                    for s in sessions_db:
-                        sessions.append({
-                            'session_id': s.session_id,
-                            'session_name': s.session_name or '',
-                            'date': s.date,
-                            'period': s.period or '',
-                            'created_at': s.created_at,
-                            'is_finalized': s.is_finalized,
-                            'base_address': s.base_address,
-                            'total_packages': sum(len(r['points']) for r in (s.romaneios_data or [])),
-                            'num_routes': db_session.query(RouteDB).filter_by(session_id=s.session_id).count()
-                        })
+                    sessions = [{
+                        'session_id': r.session_id,
+                        'session_name': r.session_name or '',
+                        'date': r.date,
+                        'period': r.period or '',
+                        'created_at': r.created_at,
+                        'is_finalized': r.is_finalized,
+                        'base_address': r.base_address,
+                        'total_packages': r.total_packages,
+                        'num_routes': r.num_routes,
+                        'delivered_count': r.delivered_count
+                    } for r in rows]
+                    
+                    legacy = [s for s in sessions if s['total_packages'] is None]
+                    if legacy:
+                        self._backfill_summaries(db_session, legacy)
                     
                     if sessions:
                         return sessions
             except Exception as e:
                 print(f"⚠️ Erro ao listar sessões do PostgreSQL: {e}")
         
-        # Fallback: JSON
+        # Fallback: JSON (índice de resumos)
         try:
-            if not self.sessions_dir.exists():
-                return []
-            
-            for file_path in self.sessions_dir.glob("*.json"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        
-                    sessions.append({
-                        'session_id': data['session_id'],
-                        'session_name': data.get('session_name', ''),
-                        'date': data['date'],
-                        'period': data.get('period', ''),
-                        'created_at': datetime.fromisoformat(data['created_at']),
-                        'is_finalized': data.get('is_finalized', False),
-                        'base_address': data.get('base_address'),
-                        'total_packages': sum(len(r['points']) for r in data.get('romaneios', [])),
-                        'num_routes': len(data.get('routes', []))
-                    })
-                except Exception as e:
-                    print(f"⚠️ Erro ao carregar {file_path}: {e}")
-                    continue
-            
+            sessions = [dict(entry) for entry in self._load_index().values()]
+            for entry in sessions:
+                entry.pop('sidecar_bytes', None)
+                entry['created_at'] = datetime.fromisoformat(entry['created_at'])
             sessions.sort(key=lambda x: x['created_at'], reverse=True)
-            
             return sessions[:limit]
         except Exception as e:
             print(f"⚠️ Erro ao listar sessões: {e}")
             return []
     
-    def load_all_sessions(self) -> List['DailySession']:
-        """Carrega TODAS as sessões completas do PostgreSQL ou JSON"""
-        sessions = []
+    def _backfill_summaries(self, db_session, summaries: List[Dict]):
+        """Sessões gravadas antes das colunas de resumo: calcula uma vez e grava"""
+        ids = [s['session_id'] for s in summaries]
+        romaneios = dict(db_session.query(SessionDB.session_id, SessionDB.romaneios_data)
+                         .filter(SessionDB.session_id.in_(ids)).all())
+        routes: Dict[str, List] = {}
+        for session_id, delivered in db_session.query(RouteDB.session_id, RouteDB.delivered_packages) \
+                .filter(RouteDB.session_id.in_(ids)).all():
+            routes.setdefault(session_id, []).append(delivered or [])
         
-        # Tenta carregar do PostgreSQL
+        for summary in summaries:
+            session_id = summary['session_id']
+            summary['total_packages'] = sum(_romaneio_count(r) for r in (romaneios.get(session_id) or []))
+            summary['num_routes'] = len(routes.get(session_id, []))
+            summary['delivered_count'] = sum(len(d) for d in routes.get(session_id, []))
+            db_session.query(SessionDB).filter_by(session_id=session_id).update({
+                'total_packages': summary['total_packages'],
+                'num_routes': summary['num_routes'],
+                'delivered_count': summary['delivered_count']
+            }, synchronize_session=False)
+    
+    # ==================== CONSULTAS POR PARADA ====================
+    
+    def route_progress(self, session_ids: List[str]) -> Dict[str, List[Dict]]:
+        """
+        Progresso por rota de várias sessões → {session_id: [{route_id, total_packages, delivered, ...}]}.
+        Banco: um GROUP BY sobre route_stops (índice sessão/rota/status), sem abrir a rota.
+        Sessões antigas (ainda sem paradas) e JSON: carregadas em lote e contadas em memória.
+        """
+        if not session_ids:
+            return {}
+        
+        result: Dict[str, List[Dict]] = {}
         if self.using_database:
             try:
                 with db_manager.get_session() as db_session:
-                    sessions_db = db_session.query(SessionDB).order_by(SessionDB.created_at.desc()).limit(50).all()
-                    
-                    for s_db in sessions_db:
-                        session = self.load_session(s_db.session_id)
-                        if session:
-                            sessions.append(session)
+                    counts = {
+                        (row.session_id, row.route_id): row
+                        for row in db_session.query(
+                            RouteStopDB.session_id, RouteStopDB.route_id,
+                            func.count(RouteStopDB.seq).label('total'),
+                            func.sum(case((RouteStopDB.status == 'delivered', 1), else_=0)).label('delivered'),
+                            func.sum(case((RouteStopDB.status == 'failed', 1), else_=0)).label('failed')
+                        ).filter(RouteStopDB.session_id.in_(session_ids), RouteStopDB.route_id.isnot(None))
+                        .group_by(RouteStopDB.session_id, RouteStopDB.route_id).all()
+                    }
+                    converted = {session_id for session_id, _ in counts}
+                    routes = db_session.query(
+                        RouteDB.session_id, RouteDB.id, RouteDB.assigned_to_telegram_id,
+                        RouteDB.assigned_to_name, RouteDB.color, RouteDB.optimized_order.is_(None).label('normalized')
+                    ).filter(RouteDB.session_id.in_(session_ids)).order_by(RouteDB.session_id, RouteDB.id).all()
                     
-                    if sessions:
-                        print(f"✅ {len(sessions)} sessões carregadas do PostgreSQL")
-                        return sessions
+                    legacy = set()
+                    for r in routes:
+                        if r.session_id not in converted and not r.normalized:
+                            legacy.add(r.session_id)
+                            continue
+                        row = counts.get((r.session_id, r.id))
+                        result.setdefault(r.session_id, []).append({
+                            'route_id': r.id,
+                            'assigned_to_telegram_id': r.assigned_to_telegram_id,
+                            'assigned_to_name': r.assigned_to_name,
+                            'color': r.color,
+                            'total_packages': row.total if row else 0,
+                            'delivered': int(row.delivered or 0) if row else 0,
+                            'failed': int(row.failed or 0) if row else 0
+                        })
+                    for session_id in legacy:
+                        result.pop(session_id, None)
+                    missing = [sid for sid in session_ids if sid in legacy]
+                    if not missing:
+                        return result
+                    session_ids = missing
             except Exception as e:
-                print(f"⚠️ Erro ao carregar sessões do PostgreSQL: {e}")
+                print(f"⚠️ Erro ao consultar progresso no PostgreSQL: {e}")
         
-        # Fallback: JSON
+        for session in self.load_sessions(session_ids):
+            result[session.session_id] = session.route_progress()
+        return result
+    
+    @staticmethod
+    def _stop_dict(stop) -> Dict:
+        return {
+            'session_id': stop.session_id,
+            'route_id': stop.route_id,
+            'seq': stop.seq,
+            'package_id': stop.package_id,
+            'address': stop.address,
+            'lat': stop.lat,
+            'lng': stop.lng,
+            'status': stop.status,
+            'delivered_at': stop.delivered_at
+        }
+    
+    def next_stops(self, session_id: str, route_id: str, limit: int = 1) -> Optional[List[Dict]]:
+        """
+        Próximas paradas pendentes da rota (ordem otimizada), via índice (sessão, rota, status, seq).
+        None quando não há banco ou a rota ainda está no formato antigo (use a sessão em memória).
+        """
+        if not self.using_database:
+            return None
         try:
-            if not self.sessions_dir.exists():
-                return []
-            
-            for file_path in self.sessions_dir.glob("*.json"):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    session = self.load_session(data['session_id'])
-                    if session:
-                        sessions.append(session)
-                except Exception as e:
-                    print(f"⚠️ Erro ao carregar {file_path}: {e}")
-                    continue
-            
-            print(f"✅ {len(sessions)} sessões carregadas do JSON")
-            return sessions
+            with db_manager.get_session() as db_session:
+                base = db_session.query(RouteStopDB).filter(
+                    RouteStopDB.session_id == session_id, RouteStopDB.route_id == route_id
+                )
+                stops = base.filter(RouteStopDB.status == 'pending', RouteStopDB.seq.isnot(None)) \
+                    .order_by(RouteStopDB.seq).limit(limit).all()
+                if not stops and base.first() is None:
+                    return None
+                return [self._stop_dict(s) for s in stops]
         except Exception as e:
-            print(f"⚠️ Erro ao carregar sessões: {e}")
-            return []
+            print(f"⚠️ Erro ao consultar próximas paradas: {e}")
+            return None
+    
+    def deliverer_stops(self, telegram_id: int, session_id: Optional[str] = None,
+                        pending_only: bool = True, limit: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Paradas das rotas atribuídas a um entregador (índice em routes.assigned_to_telegram_id).
+        None sem banco (use a sessão em memória).
+        """
+        if not self.using_database:
+            return None
+        try:
+            with db_manager.get_session() as db_session:
+                query = db_session.query(RouteStopDB).join(
+                    RouteDB, (RouteDB.id == RouteStopDB.route_id) & (RouteDB.session_id == RouteStopDB.session_id)
+                ).filter(RouteDB.assigned_to_telegram_id == telegram_id, RouteStopDB.seq.isnot(None))
+                if session_id:
+                    query = query.filter(RouteStopDB.session_id == session_id)
+                if pending_only:
+                    query = query.filter(RouteStopDB.status == 'pending')
+                query = query.order_by(RouteStopDB.session_id, RouteStopDB.route_id, RouteStopDB.seq)
+                stops = (query.limit(limit) if limit else query).all()
+                return [self._stop_dict(s) for s in stops]
+        except Exception as e:
+            print(f"⚠️ Erro ao consultar paradas do entregador: {e}")
+            return None
+    
+    def load_all_sessions(self) -> List['DailySession']:
+        """Carrega as 50 sessões completas mais recentes (em lote)"""
+        sessions = self.load_sessions(limit=50)
+        origem = "PostgreSQL" if self.using_database else "JSON"
+        print(f"✅ {len(sessions)} sessões carregadas do {origem}")
+        return sessions
     
     def delete_session(self, session_id: str) -> bool:
         """Deleta sessão do PostgreSQL e/ou disco"""
@@ -435,7 +984,8 @@ class SessionStore:
         if self.using_database:
             try:
                 with db_manager.get_session() as db_session:
-                    # Deleta rotas primeiro (foreign key)
+                    # Deleta paradas e rotas primeiro (foreign key)
+                    db_session.query(RouteStopDB).filter_by(session_id=session_id).delete()
                     db_session.query(RouteDB).filter_by(session_id=session_id).delete()
                     # Deleta sessão
                     result = db_session.query(SessionDB).filter_by(session_id=session_id).delete()
@@ -446,17 +996,140 @@ class SessionStore:
                 print(f"⚠️ Erro ao deletar sessão do PostgreSQL: {e}")
         
         # Deleta do JSON também (se existir)
+        self._deliveries_file(session_id).unlink(missing_ok=True)
         file_path = self._session_file(session_id)
         if file_path.exists():
             file_path.unlink()
             deleted = True
             print(f"✅ Sessão {session_id} deletada do JSON")
+        self._update_index(session_id, None)
         
         return deleted
 
 
+class WriteBehindSaver:
+    """
+    ⏱️ Gravação write-behind das sessões.
+
+    Cada mutação só marca a sessão como pendente; um worker em background
+    espera a janela (SESSION_SAVE_WINDOW_MS) e grava tudo de uma vez. Várias
+    entregas na mesma janela viram uma única gravação (o estado "sujo" fica
+    na própria DailySession). flush() no shutdown via atexit.
+    """
+    
+    def __init__(self, store: SessionStore, window_ms: float = SAVE_WINDOW_MS):
+        self.store = store
+        self.window = window_ms / 1000.0
+        self._pending: Dict[str, DailySession] = {}
+        self._first_pending_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._save_lock = threading.Lock()  # Uma gravação por vez (worker x flush)
+        self._worker: Optional[threading.Thread] = None
+        self._stopped = False
+        atexit.register(self.shutdown)
+    
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+    
+    def schedule(self, session: DailySession):
+        """Marca a sessão para gravação na próxima janela"""
+        with self._cond:
+            if self._stopped:
+                stopped = True
+            else:
+                stopped = False
+                self._pending[session.session_id] = session
+                if self._first_pending_at is None:
+                    self._first_pending_at = time.monotonic()
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="session-writer", daemon=True)
+                    self._worker.start()
+                self._cond.notify()
+        
+        if stopped:
+            # Depois do shutdown não há worker: grava direto
+            self._write([session])
+    
+    def load(self, session_id: str, store: Optional[SessionStore] = None) -> Optional[DailySession]:
+        """
+        Leitura que enxerga as próprias escritas: devolve a instância ainda
+        pendente de gravação, ou lê do store sem cruzar com uma gravação em curso.
+        """
+        with self._cond:
+            pending = self._pending.get(session_id)
+        if pending is not None:
+            return pending
+        with self._save_lock:
+            return (store or self.store).load_session(session_id)
+    
+    def load_many(self, session_ids: List[str], store: Optional[SessionStore] = None) -> List[DailySession]:
+        """Como load(), em lote: pendentes vêm da memória, o resto numa leitura só do store"""
+        with self._cond:
+            pending = {sid: self._pending[sid] for sid in session_ids if sid in self._pending}
+        missing = [sid for sid in session_ids if sid not in pending]
+        loaded = {}
+        if missing:
+            with self._save_lock:
+                loaded = {s.session_id: s for s in (store or self.store).load_sessions(missing)}
+        found = {**loaded, **pending}
+        return [found[sid] for sid in session_ids if sid in found]
+    
+    def discard(self, session_id: str):
+        """Esquece gravação pendente (sessão deletada) e espera a que estiver em curso"""
+        with self._cond:
+            self._pending.pop(session_id, None)
+        with self._save_lock:
+            pass
+    
+    def flush(self):
+        """Grava imediatamente tudo que estiver pendente"""
+        with self._cond:
+            batch = self._take()
+        self._write(batch)
+        self.store.flush_index()
+    
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self.flush()
+    
+    def _take(self) -> List[DailySession]:
+        batch = list(self._pending.values())
+        self._pending.clear()
+        self._first_pending_at = None
+        return batch
+    
+    def _write(self, batch: List[DailySession]):
+        if not batch:
+            return
+        with self._save_lock:
+            for session in batch:
+                try:
+                    self.store.save_session(session)
+                except Exception as e:
+                    print(f"⚠️ Erro ao gravar sessão {session.session_id} (write-behind): {e}")
+                    session.mark_dirty()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # parado e nada pendente
+                delay = self._first_pending_at + self.window - time.monotonic()
+                if delay > 0 and not self._stopped:
+                    self._cond.wait(delay)
+                    continue
+                batch = self._take()
+            self._write(batch)
+
+
 # Instância global
 session_store = SessionStore()
+session_writer = WriteBehindSaver(session_store)
 
 
 # ========================================================================
@@ -702,7 +1375,10 @@ class SessionManager:
         session = self.get_session(session_id)
         if not session:
             return {}
-        
+        return self._summary_of(session)
+    
+    @staticmethod
+    def _summary_of(session: AdvancedSessionModel) -> Dict:
         return {
             "id": session.id,
             "status": session.status.value,
@@ -724,4 +1400,5 @@ class SessionManager:
             status=SessionStatus.READ_ONLY,
             limit=limit
         )
-        return [self.get_session_summary(s.id) for s in sessions]
+        # Resume as linhas já carregadas (sem reconsultar sessão por sessão)
+        return [self._summary_of(s) for s in sessions]
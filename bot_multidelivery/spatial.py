@@ -0,0 +1,285 @@
+"""
+📍 ÍNDICE ESPACIAL - Grade uniforme sobre coordenadas projetadas (metros)
+Vizinho mais próximo, k-vizinhos e busca por raio sem varrer todas as paradas
+"""
+import math
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+METERS_PER_DEG_LAT = 110574.0
+METERS_PER_DEG_LNG_EQUATOR = 111320.0
+
+
+class LocalProjection:
+    """
+    Projeção equiretangular em torno de uma latitude de referência.
+    Erro desprezível na escala de uma cidade; distância vira hypot(dx, dy).
+    """
+
+    def __init__(self, ref_lat: float):
+        self.ref_lat = ref_lat
+        self.kx = METERS_PER_DEG_LNG_EQUATOR * math.cos(math.radians(ref_lat))
+        self.ky = METERS_PER_DEG_LAT
+
+    def project(self, lat: float, lng: float) -> Tuple[float, float]:
+        return lng * self.kx, lat * self.ky
+
+
+class GridIndex:
+    """
+    Índice de grade: cada célula (cell_m × cell_m) guarda as chaves que caem nela.
+
+    Consultas percorrem anéis de células a partir do ponto e param assim que
+    nenhuma célula ainda não visitada pode conter algo mais perto.
+    Inserção/remoção O(1); k-vizinhos ~O(k) em densidade uniforme.
+    """
+
+    def __init__(self, cell_m: float = 100.0, ref_lat: float = -22.9068):
+        self.cell_m = cell_m
+        self.projection = LocalProjection(ref_lat)
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+        self._coords: Dict[Hashable, Tuple[float, float]] = {}
+        self._bounds: Optional[List[int]] = None  # [cx_min, cy_min, cx_max, cy_max]
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[Hashable, float, float]],
+              cell_m: Optional[float] = None, ref_lat: Optional[float] = None,
+              per_cell: float = 2.0) -> 'GridIndex':
+        """
+        Cria o índice a partir de (chave, lat, lng).
+        Sem cell_m, escolhe o tamanho para ~`per_cell` itens por célula ocupada.
+        """
+        items = list(items)
+        if ref_lat is None:
+            ref_lat = sum(lat for _, lat, _ in items) / len(items) if items else -22.9068
+
+        if cell_m is None:
+            cell_m = 100.0
+            if len(items) > 1:
+                proj = LocalProjection(ref_lat)
+                xs, ys = zip(*(proj.project(lat, lng) for _, lat, lng in items))
+                area = max(1.0, (max(xs) - min(xs)) * (max(ys) - min(ys)))
+                cell_m = min(2000.0, max(20.0, math.sqrt(area * per_cell / len(items))))
+
+        index = cls(cell_m=cell_m, ref_lat=ref_lat)
+        for key, lat, lng in items:
+            index.insert(key, lat, lng)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def _cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m))
+
+    def insert(self, key: Hashable, lat: float, lng: float):
+        """Insere (ou move) uma chave"""
+        if key in self._where:
+            self.remove(key)
+        x, y = self.projection.project(lat, lng)
+        cell = self._cell_of(x, y)
+        self._cells.setdefault(cell, {})[key] = (x, y)
+        self._where[key] = cell
+        self._coords[key] = (lat, lng)
+
+        if self._bounds is None:
+            self._bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            b = self._bounds
+            b[0], b[1] = min(b[0], cell[0]), min(b[1], cell[1])
+            b[2], b[3] = max(b[2], cell[0]), max(b[3], cell[1])
+
+    def remove(self, key: Hashable) -> bool:
+        cell = self._where.pop(key, None)
+        if cell is None:
+            return False
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+        del self._coords[key]
+        return True
+
+    def position(self, key: Hashable) -> Optional[Tuple[float, float]]:
+        """(lat, lng) original da chave"""
+        return self._coords.get(key)
+
+    def _ring(self, cx: int, cy: int, r: int):
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def _max_ring(self, cx: int, cy: int) -> int:
+        b = self._bounds
+        if b is None:
+            return -1
+        return max(cx - b[0], b[2] - cx, cy - b[1], b[3] - cy, 0)
+
+    def nearest(self, lat: float, lng: float, k: int = 1,
+                max_radius_m: Optional[float] = None,
+                predicate: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[Hashable, float]]:
+        """k chaves mais próximas → [(chave, metros)] em ordem crescente"""
+        if not self._where or k <= 0:
+            return []
+
+        x, y = self.projection.project(lat, lng)
+        cx, cy = self._cell_of(x, y)
+        last_ring = self._max_ring(cx, cy)
+        if max_radius_m is not None:
+            last_ring = min(last_ring, int(math.ceil(max_radius_m / self.cell_m)) + 1)
+
+        found: List[Tuple[float, Hashable]] = []
+        for r in range(last_ring + 1):
+            if r > 1 and (2 * r + 1) ** 2 > 4 * len(self._cells):
+                # Índice esparso (ex: quase tudo removido): varrer as células ocupadas sai mais barato
+                found = [
+                    (math.hypot(px - x, py - y), key)
+                    for bucket in self._cells.values()
+                    for key, (px, py) in bucket.items()
+                    if predicate is None or predicate(key)
+                ]
+                break
+            for cell in self._ring(cx, cy, r):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                for key, (px, py) in bucket.items():
+                    if predicate is not None and not predicate(key):
+                        continue
+                    found.append((math.hypot(px - x, py - y), key))
+
+            # Tudo fora do anel r está a pelo menos r * cell_m do ponto
+            if len(found) >= k:
+                found.sort(key=lambda t: t[0])
+                del found[k:]
+                if found[-1][0] <= r * self.cell_m:
+                    break
+
+        found.sort(key=lambda t: t[0])
+        if max_radius_m is not None:
+            found = [f for f in found if f[0] <= max_radius_m]
+        return [(key, d) for d, key in found[:k]]
+
+    def within(self, lat: float, lng: float, radius_m: float,
+               predicate: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[Hashable, float]]:
+        """Todas as chaves a até radius_m metros → [(chave, metros)] em ordem crescente"""
+        if not self._where:
+            return []
+
+        x, y = self.projection.project(lat, lng)
+        cx, cy = self._cell_of(x, y)
+        reach = int(math.ceil(radius_m / self.cell_m))
+        if (2 * reach + 1) ** 2 > len(self._cells):
+            # Raio maior que a área ocupada: mais barato olhar só as células existentes
+            cells = [c for c in self._cells if abs(c[0] - cx) <= reach and abs(c[1] - cy) <= reach]
+        else:
+            cells = [(gx, gy) for gx in range(cx - reach, cx + reach + 1)
+                     for gy in range(cy - reach, cy + reach + 1)]
+
+        result = []
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if not bucket:
+                continue
+            for key, (px, py) in bucket.items():
+                d = math.hypot(px - x, py - y)
+                if d <= radius_m and (predicate is None or predicate(key)):
+                    result.append((key, d))
+
+        result.sort(key=lambda t: t[1])
+        return result
+
+
+# Raio (metros) da cerca virtual de chegada numa parada
+GEOFENCE_RADIUS_M = 40.0
+
+
+class SessionSpatialIndex:
+    """
+    Índice espacial dos pacotes de uma sessão (todas as rotas).
+
+    - `pending`: só pacotes não entregues (vizinhos mais próximos, chegada)
+    - `all`: todos os pacotes (o que há perto de um bipe, inclusive entregues)
+
+    Chaves são (route_id, package_id). Entregas feitas direto em
+    `route.delivered_packages` são absorvidas na próxima consulta (a lista
+    só cresce, então basta ler o final dela).
+    """
+
+    def __init__(self, routes, ref_lat: Optional[float] = None):
+        self.routes = {r.id: r for r in routes}
+        self.points = {}
+        items = []
+        for route in routes:
+            for p in route.optimized_order:
+                key = (route.id, p.package_id)
+                self.points[key] = p
+                items.append((key, p.lat, p.lng))
+
+        self.all = GridIndex.build(items, ref_lat=ref_lat)
+        self.pending = GridIndex(cell_m=self.all.cell_m, ref_lat=self.all.projection.ref_lat)
+        for key, lat, lng in items:
+            self.pending.insert(key, lat, lng)
+
+        self._synced: Dict[str, int] = {}
+        self._inside: Dict[str, set] = {}  # route_id -> chaves já dentro da cerca
+        self._sync()
+
+    def _sync(self):
+        for route_id, route in self.routes.items():
+            done = len(route.delivered_packages)
+            start = self._synced.get(route_id, 0)
+            if done > start:
+                for package_id in route.delivered_packages[start:]:
+                    self.pending.remove((route_id, package_id))
+                self._synced[route_id] = done
+
+    def mark_delivered(self, route_id: str, package_id: str):
+        """Tira o pacote dos pendentes (chamado pelo SessionManager ao entregar)"""
+        self.pending.remove((route_id, package_id))
+        inside = self._inside.get(route_id)
+        if inside:
+            inside.discard((route_id, package_id))
+
+    def _route_filter(self, route_id: Optional[str]):
+        if route_id is None:
+            return None
+        return lambda key: key[0] == route_id
+
+    def nearest_pending(self, lat: float, lng: float, k: int = 5,
+                        route_id: Optional[str] = None,
+                        max_radius_m: Optional[float] = None) -> List[Tuple[Hashable, object, float]]:
+        """k pacotes pendentes mais próximos → [((route_id, package_id), DeliveryPoint, metros)]"""
+        self._sync()
+        hits = self.pending.nearest(lat, lng, k=k, max_radius_m=max_radius_m,
+                                    predicate=self._route_filter(route_id))
+        return [(key, self.points[key], d) for key, d in hits]
+
+    def within(self, lat: float, lng: float, radius_m: float,
+               route_id: Optional[str] = None,
+               include_delivered: bool = False) -> List[Tuple[Hashable, object, float]]:
+        """Pacotes a até radius_m metros → [((route_id, package_id), DeliveryPoint, metros)]"""
+        self._sync()
+        index = self.all if include_delivered else self.pending
+        hits = index.within(lat, lng, radius_m, predicate=self._route_filter(route_id))
+        return [(key, self.points[key], d) for key, d in hits]
+
+    def detect_arrival(self, route_id: str, lat: float, lng: float,
+                       radius_m: float = GEOFENCE_RADIUS_M) -> List[Tuple[Hashable, object, float]]:
+        """
+        Cerca virtual: pacotes pendentes da rota em que o entregador ACABOU de entrar.
+        Só reporta cada parada uma vez enquanto ele continuar dentro do raio.
+        """
+        current = self.within(lat, lng, radius_m, route_id=route_id)
+        previous = self._inside.get(route_id, set())
+        self._inside[route_id] = {key for key, _, _ in current}
+        return [hit for hit in current if hit[0] not in previous]
@@ -0,0 +1,419 @@
+"""
+🔀 ESTADO COMPARTILHADO - Backend plugável para rodar a API em vários workers
+Sessão em foco, versão de cada sessão, separação por cor e progresso dos bipes
+ficam atrás da mesma interface:
+
+    MemoryStateBackend    um processo só (padrão; mesmo comportamento de antes)
+    PostgresStateBackend  vários workers/réplicas: tabelas shared_state*,
+                          pg_advisory_lock para exclusão mútua e
+                          LISTEN/NOTIFY para avisos entre processos
+
+Escolha: STATE_BACKEND=memory|postgres (auto = postgres quando WEB_CONCURRENCY > 1
+e o banco está conectado).
+"""
+import json
+import os
+import re
+import select
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Set
+
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'auto').lower()
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Canais de aviso
+SESSION_EVENTS = 'session_events'  # Eventos do diário de sessões (dashboard ao vivo)
+SEPARATOR_EVENTS = 'separator_events'  # Bipes e início/fim da separação
+
+_CHANNEL_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+class StateBackend:
+    """Interface: chave/valor JSON, contadores, conjuntos, locks nomeados e pub/sub"""
+
+    shared = False  # True = outros processos enxergam o mesmo estado
+
+    def __init__(self):
+        self._held = threading.local()  # Locks já obtidos por esta thread (reentrância)
+        self._subscribers: Dict[str, List[Callable[[Dict], None]]] = defaultdict(list)
+
+    # Chave/valor
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    # Contadores
+    def counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        raise NotImplementedError
+
+    # Conjuntos
+    def set_add(self, key: str, *members: str) -> int:
+        """Acrescenta membros; retorna quantos eram novos"""
+        raise NotImplementedError
+
+    def set_members(self, key: str) -> Set[str]:
+        raise NotImplementedError
+
+    def set_count(self, key: str) -> int:
+        raise NotImplementedError
+
+    def set_contains(self, key: str, member: str) -> bool:
+        raise NotImplementedError
+
+    def set_clear(self, key: str):
+        raise NotImplementedError
+
+    # Locks
+    def _acquire(self, name: str):
+        raise NotImplementedError
+
+    def _release(self, name: str):
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, name: str):
+        """Exclusão mútua por nome (reentrante na mesma thread)"""
+        held = getattr(self._held, 'names', None)
+        if held is None:
+            held = self._held.names = {}
+        if held.get(name):
+            held[name] += 1
+            try:
+                yield
+            finally:
+                held[name] -= 1
+            return
+
+        self._acquire(name)
+        held[name] = 1
+        try:
+            yield
+        finally:
+            held.pop(name, None)
+            self._release(name)
+
+    # Pub/sub
+    def publish(self, channel: str, message: Dict):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback: Callable[[Dict], None]):
+        if not _CHANNEL_RE.match(channel):
+            raise ValueError(f"Canal inválido: {channel}")
+        if callback not in self._subscribers[channel]:
+            self._subscribers[channel].append(callback)
+
+    def unsubscribe(self, channel: str, callback: Callable[[Dict], None]):
+        if callback in self._subscribers.get(channel, []):
+            self._subscribers[channel].remove(callback)
+
+    def _dispatch(self, channel: str, message: Dict):
+        for callback in list(self._subscribers.get(channel, [])):
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"⚠️ Assinante do canal {channel} falhou: {e}")
+
+    def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Estado no próprio processo (um worker)"""
+
+    def __init__(self):
+        super().__init__()
+        self._data: Dict[str, Any] = {}
+        self._counters: Dict[str, int] = {}
+        self._sets: Dict[str, Set[str]] = defaultdict(set)
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        self._data[key] = value
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+        self._counters.pop(key, None)
+
+    def counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._guard:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            return self._counters[key]
+
+    def set_add(self, key: str, *members: str) -> int:
+        with self._guard:
+            target = self._sets[key]
+            before = len(target)
+            target.update(members)
+            return len(target) - before
+
+    def set_members(self, key: str) -> Set[str]:
+        return set(self._sets.get(key, ()))
+
+    def set_count(self, key: str) -> int:
+        return len(self._sets.get(key, ()))
+
+    def set_contains(self, key: str, member: str) -> bool:
+        return member in self._sets.get(key, ())
+
+    def set_clear(self, key: str):
+        self._sets.pop(key, None)
+
+    def _acquire(self, name: str):
+        with self._guard:
+            lock = self._locks[name]
+        lock.acquire()
+
+    def _release(self, name: str):
+        self._locks[name].release()
+
+    def publish(self, channel: str, message: Dict):
+        self._dispatch(channel, message)
+
+
+class PostgresStateBackend(StateBackend):
+    """
+    Estado no banco, visto por todos os workers.
+    Locks: pg_advisory_lock numa conexão reservada enquanto o lock dura.
+    Avisos: NOTIFY (payload JSON até 8000 bytes) + uma thread com LISTEN por processo.
+
+    Em outro dialeto (SQLite nos testes) as tabelas funcionam igual; locks e avisos
+    ficam restritos ao processo.
+    """
+
+    shared = True
+
+    def __init__(self, engine=None):
+        super().__init__()
+        from sqlalchemy.orm import sessionmaker
+        from .database import SharedStateDB, SharedStateMemberDB, db_manager
+
+        self.engine = engine or db_manager.engine
+        self.is_postgres = self.engine.dialect.name == 'postgresql'
+        self.state = SharedStateDB.__table__
+        self.members = SharedStateMemberDB.__table__
+        self.state.create(self.engine, checkfirst=True)
+        self.members.create(self.engine, checkfirst=True)
+        self.Session = sessionmaker(bind=self.engine)
+
+        self._local = MemoryStateBackend()  # Locks/avisos fora do PostgreSQL
+        self._lock_connections: Dict[str, Any] = {}
+        self._listener: Optional[threading.Thread] = None
+        self._listen_connection = None
+        self._listening: Set[str] = set()
+        self._stopped = threading.Event()
+
+    def _insert(self, table):
+        if self.is_postgres:
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(table)
+
+    @contextmanager
+    def _connection(self):
+        with self.engine.begin() as conn:
+            yield conn
+
+    # Chave/valor
+    def get(self, key: str, default: Any = None) -> Any:
+        from sqlalchemy import select as sql_select
+        with self._connection() as conn:
+            row = conn.execute(sql_select(self.state.c.value).where(self.state.c.key == key)).first()
+        return default if row is None or row.value is None else row.value
+
+    def set(self, key: str, value: Any):
+        from datetime import datetime
+        stmt = self._insert(self.state).values(key=key, value=value, counter=0, updated_at=datetime.now())
+        stmt = stmt.on_conflict_do_update(index_elements=['key'],
+                                          set_={'value': value, 'updated_at': datetime.now()})
+        with self._connection() as conn:
+            conn.execute(stmt)
+
+    def delete(self, key: str):
+        with self._connection() as conn:
+            conn.execute(self.state.delete().where(self.state.c.key == key))
+
+    # Contadores (mesma linha, coluna counter)
+    def counter(self, key: str) -> int:
+        from sqlalchemy import select as sql_select
+        with self._connection() as conn:
+            row = conn.execute(sql_select(self.state.c.counter).where(self.state.c.key == key)).first()
+        return row.counter if row else 0
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        from datetime import datetime
+        stmt = self._insert(self.state).values(key=key, counter=amount, updated_at=datetime.now())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'counter': self.state.c.counter + amount, 'updated_at': datetime.now()}
+        ).returning(self.state.c.counter)
+        with self._connection() as conn:
+            return conn.execute(stmt).scalar_one()
+
+    # Conjuntos
+    def set_add(self, key: str, *members: str) -> int:
+        if not members:
+            return 0
+        stmt = self._insert(self.members).values([{'key': key, 'member': m} for m in members])
+        with self._connection() as conn:
+            return conn.execute(stmt.on_conflict_do_nothing()).rowcount
+
+    def set_members(self, key: str) -> Set[str]:
+        from sqlalchemy import select as sql_select
+        with self._connection() as conn:
+            return set(conn.execute(sql_select(self.members.c.member).where(self.members.c.key == key)).scalars())
+
+    def set_count(self, key: str) -> int:
+        from sqlalchemy import func, select as sql_select
+        with self._connection() as conn:
+            return conn.execute(sql_select(func.count()).select_from(self.members)
+                                .where(self.members.c.key == key)).scalar_one()
+
+    def set_contains(self, key: str, member: str) -> bool:
+        from sqlalchemy import select as sql_select
+        with self._connection() as conn:
+            return conn.execute(sql_select(self.members.c.member).where(
+                self.members.c.key == key, self.members.c.member == member)).first() is not None
+
+    def set_clear(self, key: str):
+        with self._connection() as conn:
+            conn.execute(self.members.delete().where(self.members.c.key == key))
+
+    # Locks
+    def _acquire(self, name: str):
+        if not self.is_postgres:
+            self._local._acquire(name)
+            return
+        from sqlalchemy import text
+        conn = self.engine.connect()
+        try:
+            conn.execute(text("SELECT pg_advisory_lock(hashtext(:name))"), {'name': name})
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        self._lock_connections[(name, threading.get_ident())] = conn
+
+    def _release(self, name: str):
+        if not self.is_postgres:
+            self._local._release(name)
+            return
+        from sqlalchemy import text
+        conn = self._lock_connections.pop((name, threading.get_ident()))
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {'name': name})
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Pub/sub
+    def publish(self, channel: str, message: Dict):
+        if not self.is_postgres:
+            self._local.publish(channel, message)
+            return
+        from sqlalchemy import text
+        payload = json.dumps(message, ensure_ascii=False, default=str)
+        with self._connection() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': channel, 'payload': payload})
+
+    def subscribe(self, channel: str, callback: Callable[[Dict], None]):
+        super().subscribe(channel, callback)
+        if not self.is_postgres:
+            self._local.subscribe(channel, callback)
+            return
+        self._listen(channel)
+
+    def unsubscribe(self, channel: str, callback: Callable[[Dict], None]):
+        super().unsubscribe(channel, callback)
+        self._local.unsubscribe(channel, callback)
+
+    def _listen(self, channel: str):
+        """LISTEN numa conexão própria (psycopg2 em autocommit) lida por uma thread"""
+        if channel in self._listening:
+            return
+        if self._listen_connection is None:
+            self._listen_connection = self.engine.raw_connection()
+            self._listen_connection.driver_connection.autocommit = True
+        with self._listen_connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{channel}"')  # Nome validado em subscribe()
+        self._listening.add(channel)
+
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen_loop, daemon=True, name="state-listener")
+            self._listener.start()
+
+    def _listen_loop(self):
+        conn = self._listen_connection.driver_connection
+        while not self._stopped.is_set():
+            try:
+                if select.select([conn], [], [], 5)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            message = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        self._dispatch(notify.channel, message)
+            except Exception as e:
+                print(f"⚠️ Escuta do estado compartilhado falhou: {e}")
+                self._stopped.wait(5)
+
+    def close(self):
+        self._stopped.set()
+        if self._listen_connection is not None:
+            try:
+                self._listen_connection.close()
+            except Exception:
+                pass
+            self._listen_connection = None
+
+
+def _want_shared() -> bool:
+    if STATE_BACKEND == 'postgres':
+        return True
+    return STATE_BACKEND == 'auto' and WEB_CONCURRENCY > 1
+
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """Backend do processo (criado no primeiro uso)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _create_backend()
+        return _backend
+
+
+def _create_backend() -> StateBackend:
+    if _want_shared():
+        try:
+            from .database import db_manager
+            if db_manager.is_connected and db_manager.engine.dialect.name == 'postgresql':
+                backend = PostgresStateBackend(db_manager.engine)
+                print("🔀 Estado compartilhado no PostgreSQL (vários workers)")
+                return backend
+            print("⚠️ STATE_BACKEND compartilhado pede PostgreSQL; usando memória (um worker)")
+        except Exception as e:
+            print(f"⚠️ Estado compartilhado indisponível ({e}); usando memória")
+    return MemoryStateBackend()
@@ -14,11 +14,19 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from bot_multidelivery.bot import run_bot
 from bot_multidelivery.services.web_scanner import scanner_app
 from bot_multidelivery.health import router as health_router
+from bot_multidelivery.session import session_manager
+from bot_multidelivery.services.distance_matrix import warm_road_networks
 from fastapi.staticfiles import StaticFiles
 
 # Injeta Health Check (Observabilidade)
 scanner_app.include_router(health_router)
 
+# Grava sessões pendentes do write-behind ao desligar o servidor
+scanner_app.add_event_handler("shutdown", session_manager.flush)
+
+# Malha viária: grafo gerado offline (scripts/build_road_network.py), carregado antes da 1ª requisição
+scanner_app.add_event_handler("startup", warm_road_networks)
+
 # --- 🚀 LOAD MODULAR API ROUTERS ---
 from fastapi import APIRouter
 from bot_multidelivery.routers import admin, auth, financial, session, logistic
@@ -44,10 +52,31 @@ if frontend_path.exists():
 def start_web_server():
     """Inicia servidor FastAPI com scanner em /scanner"""
     port = int(os.environ.get("PORT", 8080))
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
     
     print(f"🌐 Web server iniciando na porta {port}")
     print(f"📱 Acesse o scanner em: http://localhost:{port}/scanner")
     
+    if workers > 1:
+        from bot_multidelivery.state_backend import get_state_backend
+        if not get_state_backend().shared:
+            # Estado em memória não é visto pelos outros processos: cada worker teria sua sessão
+            print(f"❌ WEB_CONCURRENCY={workers} sem estado compartilhado (PostgreSQL); subindo 1 worker")
+            workers = 1
+
+    if workers > 1:
+        # Vários processos da API: estado das sessões/separação no PostgreSQL (state_backend);
+        # o uvicorn com workers precisa da thread principal, então roda num processo próprio
+        import subprocess
+        print(f"🔀 {workers} workers (STATE_BACKEND compartilhado)")
+        subprocess.run(
+            [sys.executable, "-m", "uvicorn", "main_multidelivery:scanner_app",
+             "--host", "0.0.0.0", "--port", str(port), "--workers", str(workers),
+             "--log-level", "info", "--no-access-log"],
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return
+    
     try:
         # Configura uvicorn
         config = uvicorn.Config(
@@ -77,3 +106,5 @@ if __name__ == "__main__":
         print(f"\n❌ Erro fatal: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        session_manager.flush()
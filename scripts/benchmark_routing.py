@@ -0,0 +1,337 @@
+"""
+📊 BENCHMARK DE ROTEAMENTO - Tempo × qualidade dos otimizadores
+Instâncias sintéticas reproduzíveis em volta do centro de fallback (Rio)
+
+Execute:
+    python scripts/benchmark_routing.py                       # tamanhos padrão
+    python scripts/benchmark_routing.py --sizes 50 200 --output antes.json
+    python scripts/benchmark_routing.py --compare antes.json depois.json
+
+O relatório JSON é estável (ordenado, sem timestamps nos resultados) para
+ser comparado entre commits. --compare sai com código 1 se algum algoritmo
+piorar a distância total acima da tolerância.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import DeliveryPoint, TerritoryDivider
+from bot_multidelivery.parsers.shopee_parser import ShopeeDelivery
+from bot_multidelivery.services.genetic_optimizer import GeneticRouteOptimizer
+from bot_multidelivery.services.roteo_divider import RoteoDivider
+from bot_multidelivery.services.scooter_optimizer import ScooterRouteOptimizer
+
+# Mesmo centro/raio de fallback do GeocodingService
+CENTER = (float(os.getenv("FALLBACK_LAT", "-22.9068")), float(os.getenv("FALLBACK_LNG", "-43.1729")))
+RADIUS_KM = float(os.getenv("FALLBACK_RADIUS_KM", "8"))
+
+DEFAULT_SIZES = [50, 200, 1000, 5000]
+KINDS = ["uniform", "clustered", "corridor"]
+NUM_DELIVERERS = 4
+
+# Limite de paradas por algoritmo (acima disso o caso é registrado como "skipped")
+DEFAULT_CAPS = {
+    "territory": 200,    # 2-opt com recálculo completo (1000 paradas passa de 6 min)
+    "genetic": 200,      # população × gerações × crossover O(n²)
+    "scooter": 5000,
+    "roteo": 5000,
+}
+
+KM_PER_DEG_LAT = 111.32
+
+
+# ==================== INSTÂNCIAS ====================
+
+def _offset(lat: float, lng: float, north_km: float, east_km: float) -> Tuple[float, float]:
+    return (lat + north_km / KM_PER_DEG_LAT,
+            lng + east_km / (KM_PER_DEG_LAT * math.cos(math.radians(lat))))
+
+
+def generate_instance(kind: str, size: int, seed: int) -> List[Tuple[float, float]]:
+    """
+    Gera `size` paradas (lat, lng) determinísticas.
+
+    uniform   - espalhadas num disco de RADIUS_KM
+    clustered - 8 bairros densos (σ ≈ 400 m)
+    corridor  - faixa estreita ao longo de uma avenida (~12 km × 600 m)
+    """
+    rng = random.Random(f"{kind}:{size}:{seed}")
+    lat0, lng0 = CENTER
+    points = []
+
+    if kind == "uniform":
+        for _ in range(size):
+            r = RADIUS_KM * math.sqrt(rng.random())
+            theta = rng.uniform(0, 2 * math.pi)
+            points.append(_offset(lat0, lng0, r * math.cos(theta), r * math.sin(theta)))
+
+    elif kind == "clustered":
+        centers = []
+        for _ in range(8):
+            r = RADIUS_KM * 0.8 * math.sqrt(rng.random())
+            theta = rng.uniform(0, 2 * math.pi)
+            centers.append((r * math.cos(theta), r * math.sin(theta)))
+        for _ in range(size):
+            cn, ce = rng.choice(centers)
+            points.append(_offset(lat0, lng0, rng.gauss(cn, 0.4), rng.gauss(ce, 0.4)))
+
+    elif kind == "corridor":
+        # Eixo sudoeste → nordeste, como a orla
+        angle = math.radians(35)
+        for _ in range(size):
+            along = rng.uniform(-6.0, 6.0)
+            across = rng.gauss(0, 0.3)
+            north = along * math.sin(angle) + across * math.cos(angle)
+            east = along * math.cos(angle) - across * math.sin(angle)
+            points.append(_offset(lat0, lng0, north, east))
+
+    else:
+        raise ValueError(f"Tipo de instância desconhecido: {kind}")
+
+    return [(round(lat, 6), round(lng, 6)) for lat, lng in points]
+
+
+# ==================== MÉTRICA ====================
+
+def _haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 6371 * 2 * math.asin(math.sqrt(min(1.0, h)))
+
+
+def tour_km(base: Tuple[float, float], ordered: List[Tuple[float, float]]) -> float:
+    """Distância em linha reta base → paradas na ordem → base (mesma régua p/ todos)"""
+    if not ordered:
+        return 0.0
+    total = _haversine_km(base, ordered[0]) + _haversine_km(ordered[-1], base)
+    for a, b in zip(ordered, ordered[1:]):
+        total += _haversine_km(a, b)
+    return total
+
+
+# ==================== ALGORITMOS ====================
+# Cada runner recebe (base, paradas) e devolve lista de rotas (coords ordenadas)
+
+def run_territory(base, stops) -> List[List[Tuple[float, float]]]:
+    divider = TerritoryDivider(*base)
+    points = [
+        DeliveryPoint(address=f"Parada {i}", lat=lat, lng=lng, romaneio_id="BENCH", package_id=f"P{i}")
+        for i, (lat, lng) in enumerate(stops)
+    ]
+    clusters = divider.divide_into_clusters(points, k=NUM_DELIVERERS)
+    return [[(p.lat, p.lng) for p in divider.optimize_cluster_route(c)] for c in clusters]
+
+
+def run_genetic(base, stops) -> List[List[Tuple[float, float]]]:
+    order = GeneticRouteOptimizer().optimize(stops, base)
+    return [[stops[i] for i in order]]
+
+
+def run_scooter(base, stops) -> List[List[Tuple[float, float]]]:
+    route = ScooterRouteOptimizer().optimize(stops, base)
+    return [[stops[i] for i in route.points_order]]
+
+
+def run_roteo(base, stops) -> List[List[Tuple[float, float]]]:
+    deliveries = [
+        ShopeeDelivery(tracking=f"BR{i:09d}", address=f"Parada {i}", bairro="", city="Rio de Janeiro",
+                       latitude=lat, longitude=lng, stop=i)
+        for i, (lat, lng) in enumerate(stops)
+    ]
+    info = {f"E{i + 1}": f"Entregador {i + 1}" for i in range(NUM_DELIVERERS)}
+    routes = RoteoDivider().divide_romaneio(deliveries, NUM_DELIVERERS, info)
+    return [[(lat, lng) for lat, lng, _ in r.stops] for r in routes]
+
+
+ALGORITHMS: Dict[str, Callable] = {
+    "territory": run_territory,
+    "genetic": run_genetic,
+    "scooter": run_scooter,
+    "roteo": run_roteo,
+}
+
+
+def measure(runner: Callable, base, stops, seed: int, memory: bool = True) -> dict:
+    """Executa um algoritmo: tempo (sem tracemalloc) e pico de memória (rodada separada)"""
+    random.seed(seed)
+    start = time.perf_counter()
+    routes = runner(base, stops)
+    wall = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        random.seed(seed)
+        tracemalloc.start()
+        runner(base, stops)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_mb = round(peak / (1024 * 1024), 3)
+
+    visited = sorted(p for route in routes for p in route)
+    return {
+        "status": "ok",
+        "wall_s": round(wall, 4),
+        "peak_mb": peak_mb,
+        "total_km": round(sum(tour_km(base, r) for r in routes), 3),
+        "routes": len(routes),
+        "valid": visited == sorted(stops),
+    }
+
+
+def run_benchmark(sizes: List[int], kinds: List[str], algorithms: List[str], seed: int,
+                  caps: Optional[Dict[str, int]] = None, memory: bool = True) -> dict:
+    caps = DEFAULT_CAPS if caps is None else caps
+    results = []
+
+    for kind in kinds:
+        for size in sizes:
+            stops = generate_instance(kind, size, seed)
+            for name in algorithms:
+                key = f"{kind}/{size}/{name}"
+                entry = {"instance": f"{kind}/{size}", "kind": kind, "size": size, "algorithm": name}
+
+                cap = caps.get(name)
+                if cap is not None and size > cap:
+                    entry.update(status="skipped", reason=f"acima do limite ({cap} paradas)")
+                    print(f"⏭️  {key}: pulado (limite {cap})")
+                    results.append(entry)
+                    continue
+
+                try:
+                    entry.update(measure(ALGORITHMS[name], CENTER, stops, seed, memory))
+                    print(f"✅ {key}: {entry['wall_s']:.3f}s | {entry['total_km']:.1f} km"
+                          + (f" | {entry['peak_mb']:.1f} MB" if entry['peak_mb'] is not None else ""))
+                except Exception as e:
+                    entry.update(status="error", reason=f"{type(e).__name__}: {e}")
+                    print(f"❌ {key}: {e}")
+                results.append(entry)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "seed": seed,
+            "center": list(CENTER),
+            "num_deliverers": NUM_DELIVERERS,
+        },
+        "results": results,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# ==================== COMPARAÇÃO ====================
+
+def compare_reports(old: dict, new: dict, km_tolerance: float = 0.02) -> Tuple[List[dict], List[str]]:
+    """
+    Compara dois relatórios caso a caso.
+    Retorna (linhas, regressões) - regressão = distância piorou mais que a tolerância
+    ou caso que rodava passou a falhar.
+    """
+    index = {(r["instance"], r["algorithm"]): r for r in old.get("results", [])}
+    rows, regressions = [], []
+
+    for r in new.get("results", []):
+        key = (r["instance"], r["algorithm"])
+        before = index.get(key)
+        if not before or before.get("status") != "ok":
+            continue
+        label = f"{r['instance']}/{r['algorithm']}"
+        if r.get("status") != "ok":
+            regressions.append(f"{label}: {r.get('status')} ({r.get('reason', '')})")
+            continue
+
+        km_delta = (r["total_km"] - before["total_km"]) / before["total_km"] if before["total_km"] else 0.0
+        time_delta = (r["wall_s"] - before["wall_s"]) / before["wall_s"] if before["wall_s"] else 0.0
+        rows.append({
+            "case": label,
+            "km_before": before["total_km"], "km_after": r["total_km"], "km_delta": km_delta,
+            "time_before": before["wall_s"], "time_after": r["wall_s"], "time_delta": time_delta,
+        })
+        if km_delta > km_tolerance:
+            regressions.append(f"{label}: distância +{km_delta:.1%}")
+        if before.get("valid", True) and not r.get("valid", True):
+            regressions.append(f"{label}: rota não cobre todas as paradas")
+
+    return rows, regressions
+
+
+def print_comparison(rows: List[dict], regressions: List[str]):
+    print("=" * 78)
+    print(f"{'CASO':<32} {'KM':>18} {'TEMPO (s)':>24}")
+    print("=" * 78)
+    for row in rows:
+        print(f"{row['case']:<32} "
+              f"{row['km_after']:>9.1f} ({row['km_delta']:+6.1%}) "
+              f"{row['time_after']:>11.3f} ({row['time_delta']:+7.1%})")
+    print()
+    if regressions:
+        print("🚨 REGRESSÕES:")
+        for line in regressions:
+            print(f"   - {line}")
+    else:
+        print("✅ Nenhuma regressão de qualidade")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark dos otimizadores de rota")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--kinds", nargs="+", default=KINDS, choices=KINDS)
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="arquivo JSON do relatório")
+    parser.add_argument("--no-limits", action="store_true", help="ignora limites de tamanho por algoritmo")
+    parser.add_argument("--no-memory", action="store_true", help="pula a rodada com tracemalloc")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DEPOIS"))
+    parser.add_argument("--tolerance", type=float, default=0.02, help="piora de km aceita (0.02 = 2%%)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+        rows, regressions = compare_reports(old, new, args.tolerance)
+        print_comparison(rows, regressions)
+        return 1 if regressions else 0
+
+    report = run_benchmark(
+        args.sizes, args.kinds, args.algorithms, args.seed,
+        caps={} if args.no_limits else DEFAULT_CAPS,
+        memory=not args.no_memory
+    )
+
+    output = args.output or os.path.join(
+        "data", "benchmarks", f"routing_{report['meta']['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    print(f"\n💾 Relatório salvo em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+📊 BENCHMARK DE SERIALIZAÇÃO - Gravar/carregar uma sessão grande
+Compara o formato antigo (JSON indentado, um dict por pacote) com o atual
+(colunas binárias + codec compacto) para cada codec instalado.
+
+encode/decode medem só a conversão em memória; gravar/carregar incluem o
+disco (arquivo temporário + rename, índice de sessões).
+
+Execute:
+    python scripts/benchmark_serialization.py                  # 2000 pacotes
+    python scripts/benchmark_serialization.py --packages 5000 --output serial.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint
+from bot_multidelivery.serialization import _CODECS, decode, encode, get_codec
+from bot_multidelivery.session import DailySession, Romaneio, Route
+from bot_multidelivery.session_persistence import SessionStore
+
+CENTER = (-22.9068, -43.1729)
+
+
+def build_session(packages: int, routes: int, seed: int) -> DailySession:
+    """Sessão sintética: 4 romaneios, `routes` rotas, ~10% entregue"""
+    rng = random.Random(seed)
+    session = DailySession(session_id="bench", date="2026-01-01", period="manhã",
+                           created_at=datetime(2026, 1, 1), base_address="Base",
+                           base_lat=CENTER[0], base_lng=CENTER[1])
+    per_romaneio = -(-packages // 4)
+    all_points = []
+    for r in range(4):
+        points = [
+            DeliveryPoint(
+                address=f"Rua {rng.randint(1, 400)}, {rng.randint(1, 2000)} - Bairro {rng.randint(1, 30)}",
+                lat=CENTER[0] + rng.uniform(-0.08, 0.08),
+                lng=CENTER[1] + rng.uniform(-0.08, 0.08),
+                romaneio_id=f"ROM{r}",
+                package_id=f"BR{r}{i:06d}",
+                priority="normal" if rng.random() > 0.1 else "high",
+            )
+            for i in range(min(per_romaneio, packages - len(all_points)))
+        ]
+        session.romaneios.append(Romaneio(id=f"ROM{r}", uploaded_at=datetime(2026, 1, 1), points=points))
+        all_points.extend(session.romaneios[-1].points)
+
+    for k in range(routes):
+        order = all_points[k::routes]
+        route = Route(id=f"ROTA_{k + 1}", cluster=Cluster(id=k, center_lat=CENTER[0], center_lng=CENTER[1], points=order),
+                      optimized_order=order, assigned_to_telegram_id=1000 + k, assigned_to_name=f"Entregador {k + 1}")
+        for p in order[:len(order) // 10]:
+            route.mark_as_delivered(p.package_id)
+        session.routes.append(route)
+    return session
+
+
+def legacy_payload(session: DailySession) -> Dict:
+    """Formato anterior: cada pacote como dict, nas rotas e nos romaneios"""
+    def point(p) -> Dict:
+        return {'address': p.address, 'lat': p.lat, 'lng': p.lng, 'romaneio_id': p.romaneio_id,
+                'package_id': p.package_id, 'priority': p.priority}
+
+    return {
+        'session_id': session.session_id, 'session_name': session.session_name,
+        'date': session.date, 'period': session.period, 'created_at': session.created_at.isoformat(),
+        'base_address': session.base_address, 'base_lat': session.base_lat, 'base_lng': session.base_lng,
+        'is_finalized': session.is_finalized, 'finalized_at': None,
+        'romaneios': [{'id': r.id, 'uploaded_at': r.uploaded_at.isoformat(),
+                       'points': [point(p) for p in r.points]} for r in session.romaneios],
+        'routes': [{'id': r.id, 'assigned_to_telegram_id': r.assigned_to_telegram_id,
+                    'assigned_to_name': r.assigned_to_name, 'color': r.color,
+                    'optimized_order': [point(p) for p in r.optimized_order],
+                    'delivered_packages': r.delivered_packages, 'map_file': r.map_file}
+                   for r in session.routes],
+    }
+
+
+def best_of(fn: Callable, repeat: int) -> float:
+    """Menor tempo (ms) entre `repeat` execuções"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return round(best, 2)
+
+
+def run_benchmark(packages: int, routes: int, seed: int, repeat: int) -> Dict:
+    session = build_session(packages, routes, seed)
+    results: List[Dict] = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(data_dir=tmp)
+        store.using_database = False
+
+        # Antes: JSON indentado da stdlib, mesma troca atômica e índice do SessionStore
+        legacy_file = Path(tmp) / "legacy.json"
+
+        def save_legacy():
+            tmp_file = legacy_file.with_name(legacy_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(legacy_payload(session), f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, legacy_file)
+            store._update_index(session.session_id, store._summary(session))
+
+        def load_legacy():
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                return store._session_from_data(json.load(f))
+
+        save_legacy()
+        assert load_legacy().total_packages == session.total_packages
+        legacy_raw = json.dumps(legacy_payload(session), indent=2, ensure_ascii=False).encode('utf-8')
+        results.append({
+            'format': 'antes (json indentado)',
+            'encode_ms': best_of(lambda: json.dumps(legacy_payload(session), indent=2, ensure_ascii=False).encode('utf-8'), repeat),
+            'decode_ms': best_of(lambda: store._session_from_data(json.loads(legacy_raw)), repeat),
+            'save_ms': best_of(save_legacy, repeat),
+            'load_ms': best_of(load_legacy, repeat),
+            'bytes': legacy_file.stat().st_size,
+        })
+
+        # Depois: SessionStore atual com cada codec disponível
+        previous = os.environ.get('DATA_CODEC')
+        try:
+            for name in _CODECS:
+                os.environ['DATA_CODEC'] = name
+                store.save_session(session)
+                loaded = store._load_json(session.session_id)
+                assert loaded.total_packages == session.total_packages
+                assert loaded.total_delivered == session.total_delivered
+                raw = encode(store._json_payload(session), 'session')
+                results.append({
+                    'format': f'depois ({get_codec().name})',
+                    'encode_ms': best_of(lambda: encode(store._json_payload(session), 'session'), repeat),
+                    'decode_ms': best_of(lambda: store._session_from_data(decode(raw, 'session')), repeat),
+                    'save_ms': best_of(lambda: store._save_full(session, json_only=True), repeat),
+                    'load_ms': best_of(lambda: store._load_json(session.session_id), repeat),
+                    'bytes': store._session_file(session.session_id).stat().st_size,
+                })
+        finally:
+            if previous is None:
+                os.environ.pop('DATA_CODEC', None)
+            else:
+                os.environ['DATA_CODEC'] = previous
+
+    return {'packages': packages, 'routes': routes, 'seed': seed, 'repeat': repeat, 'results': results}
+
+
+def print_report(report: Dict):
+    print(f"\n📦 Sessão com {report['packages']} pacotes em {report['routes']} rotas "
+          f"(melhor de {report['repeat']})\n")
+    print(f"{'formato':<26}{'encode':>9}{'decode':>9}{'gravar':>9}{'carregar':>10}{'KB':>9}")
+    baseline = report['results'][0]
+    for row in report['results']:
+        print(f"{row['format']:<26}{row['encode_ms']:>9.2f}{row['decode_ms']:>9.2f}"
+              f"{row['save_ms']:>9.2f}{row['load_ms']:>10.2f}{row['bytes'] / 1024:>9.1f}")
+    print("   (tempos em ms)")
+    for row in report['results'][1:]:
+        ratios = ", ".join(
+            f"{label} {baseline[key] / max(row[key], 1e-9):.1f}x"
+            for label, key in (("encode", "encode_ms"), ("decode", "decode_ms"),
+                               ("gravar", "save_ms"), ("carregar", "load_ms"))
+        )
+        print(f"   {row['format']}: {ratios}, arquivo {baseline['bytes'] / max(row['bytes'], 1):.1f}x menor")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de serialização de sessões")
+    parser.add_argument("--packages", type=int, default=2000)
+    parser.add_argument("--routes", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="arquivo JSON do relatório")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.packages, args.routes, args.seed, args.repeat)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+        print(f"\n💾 Relatório salvo em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
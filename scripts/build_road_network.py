@@ -0,0 +1,43 @@
+"""
+🗺️ PRÉ-PROCESSAMENTO DA MALHA VIÁRIA - Passo offline (deploy/cron)
+Lê o extrato OSM (.pbf), contrai a malha (Contraction Hierarchies) e grava o
+grafo de cada perfil no cache que o servidor só carrega
+
+Execute:
+    python scripts/build_road_network.py                          # ROAD_NETWORK_PBF, todos os perfis
+    python scripts/build_road_network.py --pbf rio.osm.pbf --profiles scooter
+
+Rode de novo quando o .pbf mudar: o servidor ignora cache desatualizado
+(cai para haversine até o grafo novo ser gerado e o processo reiniciar).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.services.distance_matrix import ROAD_PROFILES
+from bot_multidelivery.services.road_network import RoadNetworkEngine
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Gera o cache da malha viária offline")
+    parser.add_argument("--pbf", default=os.getenv("ROAD_NETWORK_PBF"), help="extrato OSM (.pbf)")
+    parser.add_argument("--cache-dir", default=os.getenv("ROAD_NETWORK_CACHE_DIR", "data/road_network"))
+    parser.add_argument("--profiles", nargs="+", default=list(ROAD_PROFILES), choices=list(ROAD_PROFILES))
+    args = parser.parse_args(argv)
+
+    if not args.pbf:
+        print("❌ Informe --pbf ou configure ROAD_NETWORK_PBF")
+        return 1
+
+    for profile in args.profiles:
+        started = time.perf_counter()
+        engine = RoadNetworkEngine.from_pbf(args.pbf, profile=profile, cache_dir=args.cache_dir)
+        print(f"✅ {profile}: {engine.num_nodes} nós em {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
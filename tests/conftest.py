@@ -0,0 +1,138 @@
+"""
+🧪 Fixtures compartilhadas dos testes
+Motor de sessões (SessionEngine) em SQLite na memória, com as queries gravadas;
+SessionStore/DataStore em JSON num diretório temporário e sessões de exemplo
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, Integer, Table, create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint
+from bot_multidelivery.persistence import DataStore
+from bot_multidelivery.schemas.sessions_schema import Base, SessionPackage
+from bot_multidelivery.services.session_engine import SessionEngine
+from bot_multidelivery.session import DailySession, Romaneio, Route
+from bot_multidelivery.session_persistence import SessionStore
+from bot_multidelivery.state_backend import MemoryStateBackend
+
+if "users" not in Base.metadata.tables:  # FKs de entregador apontam para users (tabela externa)
+    Table("users", Base.metadata, Column("id", Integer, primary_key=True))
+
+
+@pytest.fixture
+def factory():
+    """sessionmaker num SQLite em memória (uma conexão só); factory.statements = SQL executado"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine)
+    factory.statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *a: factory.statements.append(sql))
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def active_session():
+    """
+    Monta uma sessão ACTIVE: pacotes BR0..BRn (valor = value(n)) e entregadores 11 e 22.
+    Retorna (engine, session_id, package_ids na ordem dos barcodes).
+    """
+    def start(db, packages=8, value=lambda n: 20.0):
+        engine = SessionEngine(db)
+        session_id = engine.create_session(1)
+        engine.add_packages_to_session(session_id, [
+            {"barcode": f"BR{n}", "address": f"Rua {n}", "value": value(n)} for n in range(packages)
+        ])
+        engine.start_session(session_id, [11, 22])
+        ids = [p.package_id for p in db.query(SessionPackage).order_by(SessionPackage.barcode)]
+        return engine, session_id, ids
+    return start
+
+
+# ==================== ARQUIVOS LOCAIS (JSON) ====================
+
+class CountingStore(SessionStore):
+    """SessionStore que conta as gravações e as leituras completas"""
+
+    def __init__(self, data_dir: str):
+        super().__init__(data_dir=data_dir)
+        self.saves = 0
+        self.loads = 0
+
+    def save_session(self, session):
+        self.saves += 1
+        return super().save_session(session)
+
+    def load_session(self, session_id):
+        self.loads += 1
+        return super().load_session(session_id)
+
+
+@pytest.fixture
+def data_dir():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield tmp
+
+
+@pytest.fixture
+def json_store(data_dir):
+    """Abre um SessionStore em JSON no data_dir (cada chamada = processo novo lendo o mesmo disco)"""
+    def open_store(store_cls=SessionStore):
+        store = store_cls(data_dir=data_dir)
+        store.using_database = False
+        return store
+    return open_store
+
+
+@pytest.fixture
+def counting_store(json_store):
+    """SessionStore em JSON que conta gravações (saves) e leituras completas (loads)"""
+    return json_store(CountingStore)
+
+
+@pytest.fixture
+def data_store(data_dir):
+    """Abre um DataStore em JSON no data_dir (estado próprio em memória ou o informado)"""
+    def open_store(state=None):
+        store = DataStore(data_dir=data_dir, state=state or MemoryStateBackend())
+        store.using_database = False
+        return store
+    return open_store
+
+
+def _build_session(i: int = 0, packages: int = 3, finalized: bool = False) -> DailySession:
+    start = datetime(2026, 1, 1, 8)
+    points = [DeliveryPoint(address=f"Rua {j}", lat=-22.9 + j * 0.001, lng=-43.17, romaneio_id="R1",
+                            package_id=f"S{i}P{j}") for j in range(packages)]
+    session = DailySession(session_id=f"s{i:02d}", date="2026-01-01", period="manhã",
+                           created_at=start + timedelta(hours=i), is_finalized=finalized)
+    session.romaneios.append(Romaneio(id="R1", uploaded_at=start, points=points))
+    session.routes.append(Route(id=f"ROTA_{i}", cluster=Cluster(id=0, center_lat=-22.9, center_lng=-43.17, points=points),
+                                optimized_order=points))
+    return session
+
+
+@pytest.fixture
+def make_session():
+    """
+    Sessão s{i:02d} (criada i horas após 01/01 08h) com o romaneio R1 de pacotes S{i}P0..
+    e a rota ROTA_{i} com todos eles
+    """
+    return _build_session
+
+
+@pytest.fixture
+def fill_sessions():
+    """Grava `count` sessões s00.. no store (as de `finalized` já finalizadas)"""
+    def fill(store, count: int, packages: int = 3, finalized=()):
+        for i in range(count):
+            store.save_session(_build_session(i, packages, finalized=i in finalized))
+    return fill
@@ -0,0 +1,127 @@
+"""
+🧪 Testes do caminho async dos endpoints de sessão
+AsyncSession (aiosqlite no lugar do asyncpg) com o mesmo SessionEngine e
+fallback sem driver async: sessão sync numa thread, event loop livre
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from bot_multidelivery import api_sessions, database
+from bot_multidelivery.database import async_database_url
+from bot_multidelivery.schemas.sessions_schema import Base
+from bot_multidelivery.security import API_KEY_NAME, SERVER_API_KEY
+from bot_multidelivery.services.session_engine import AsyncSessionEngine, SessionEngine
+
+HEADERS = {API_KEY_NAME: SERVER_API_KEY}
+
+
+@pytest.fixture
+def db_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        Base.metadata.create_all(create_engine(f"sqlite:///{path}"))
+        yield path
+
+
+def _client():
+    app = FastAPI()
+    app.include_router(api_sessions.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", headers=HEADERS)
+
+
+def test_async_database_url_picks_installed_driver():
+    assert async_database_url("sqlite:///data/x.db") == ("sqlite+aiosqlite:///data/x.db", {})
+    assert async_database_url("mysql://h/db") is None
+    found = async_database_url("postgresql://u:p@h/db?sslmode=require")
+    assert found is None or found[0].startswith(("postgresql+asyncpg://u:p@h/db?ssl=require",
+                                                 "postgresql+psycopg://"))
+
+
+def test_endpoints_run_on_async_session(db_file, monkeypatch):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}")
+        monkeypatch.setattr(database.db_manager, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+        try:
+            async with _client() as client:
+                session_id = (await client.post("/api/sessions/create", params={"user_id": 7})).json()["session_id"]
+                added = await client.post(f"/api/sessions/{session_id}/packages", json=[
+                    {"barcode": f"BR{n}", "address": f"Rua {n}", "value": 10.0} for n in range(4)
+                ])
+                assert added.json()["added"] == 4
+                assert (await client.post(f"/api/sessions/{session_id}/start", json=[11])).json()["success"]
+
+                packages = (await client.get(f"/api/sessions/{session_id}")).json()["data"]["packages"]
+                by_barcode = {p["barcode"]: p["id"] for p in packages}
+
+                # Scanner e entrega ao mesmo tempo, cada um com sua AsyncSession
+                async with database.db_manager.get_async_session() as session:
+                    scan = AsyncSessionEngine(session).flag_ocr_scan(session_id, "BR3")
+                    delivery = client.post(f"/api/sessions/{session_id}/delivery/complete",
+                                           params={"package_id": by_barcode["BR0"], "deliverer_id": 11})
+                    scanned, delivered = await asyncio.gather(scan, delivery)
+                assert scanned == by_barcode["BR3"] and delivered.json()["success"]
+
+                dashboard = (await client.get(f"/api/sessions/{session_id}/dashboard")).json()
+                assert dashboard["progress"]["delivered"] == 1 and dashboard["progress"]["pending"] == 3
+                assert dashboard["financial"]["revenue"] == 10.0
+
+                listed = (await client.get("/api/sessions/user/7", params={"status": "active"})).json()
+                assert listed["total"] == 1 and listed["sessions"][0]["id"] == session_id
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_without_async_driver_sync_session_runs_off_the_loop(db_file, monkeypatch):
+    monkeypatch.setattr(database.db_manager, "AsyncSessionLocal", None)
+    monkeypatch.setattr(database.db_manager, "SessionLocal", sessionmaker(bind=create_engine(f"sqlite:///{db_file}")))
+    session_id = AsyncSessionEngine._call_sync("create_session", 7)
+
+    real = SessionEngine.get_session_dashboard
+
+    def slow_dashboard(self, sid):
+        time.sleep(0.2)  # Banco lento
+        return real(self, sid)
+
+    monkeypatch.setattr(SessionEngine, "get_session_dashboard", slow_dashboard)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        tick_task = asyncio.create_task(ticker())
+        async with _client() as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*[client.get(f"/api/sessions/{session_id}/dashboard") for _ in range(3)])
+            elapsed = time.perf_counter() - started
+        tick_task.cancel()
+        return responses, elapsed, ticks
+
+    responses, elapsed, ticks = asyncio.run(scenario())
+    assert all(r.json()["status"] == "open" for r in responses)
+    assert elapsed < 0.5 and ticks >= 10  # Em paralelo, sem travar o loop (em série seria 0.6 s)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Endpoints async de sessão OK")
@@ -0,0 +1,57 @@
+"""
+🧪 Testes do harness de benchmark de roteamento (instâncias pequenas)
+"""
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_spec = importlib.util.spec_from_file_location(
+    "benchmark_routing", os.path.join(ROOT, "scripts", "benchmark_routing.py")
+)
+bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench)
+
+
+def test_instances_are_seeded():
+    for kind in bench.KINDS:
+        a = bench.generate_instance(kind, 60, seed=7)
+        assert len(a) == 60
+        assert a == bench.generate_instance(kind, 60, seed=7)
+        assert a != bench.generate_instance(kind, 60, seed=8)
+
+
+def test_report_records_runs_and_skips():
+    caps = {"genetic": 10}
+    report = bench.run_benchmark([20], ["clustered"], ["scooter", "genetic", "roteo"], seed=1, caps=caps)
+    by_alg = {r["algorithm"]: r for r in report["results"]}
+
+    assert by_alg["genetic"]["status"] == "skipped"
+    for name in ("scooter", "roteo"):
+        assert by_alg[name]["status"] == "ok"
+        assert by_alg[name]["valid"]
+        assert by_alg[name]["total_km"] > 0
+        assert by_alg[name]["peak_mb"] is not None
+
+
+def test_compare_flags_distance_regression():
+    old = {"results": [{"instance": "uniform/50", "algorithm": "scooter", "status": "ok",
+                        "total_km": 100.0, "wall_s": 1.0, "valid": True}]}
+    new = {"results": [{"instance": "uniform/50", "algorithm": "scooter", "status": "ok",
+                        "total_km": 105.0, "wall_s": 0.5, "valid": True}]}
+
+    rows, regressions = bench.compare_reports(old, new, km_tolerance=0.02)
+    assert rows[0]["time_delta"] == -0.5
+    assert len(regressions) == 1
+
+    _, regressions = bench.compare_reports(old, old)
+    assert regressions == []
+
+
+if __name__ == "__main__":
+    test_instances_are_seeded()
+    test_report_records_runs_and_skips()
+    test_compare_flags_distance_regression()
+    print("✅ Benchmark de roteamento OK")
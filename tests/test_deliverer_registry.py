@@ -0,0 +1,156 @@
+"""
+🧪 Testes do registro de entregadores
+Carga única, consultas sem reler o JSON, write-through, versão entre workers e
+gravações de uma linha só (upsert/incremento no banco, log de alterações no JSON)
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery import persistence
+from bot_multidelivery.database import DelivererDB
+from bot_multidelivery.models import Deliverer
+from bot_multidelivery.services.deliverer_service import DelivererService
+from bot_multidelivery.persistence import DataStore
+from bot_multidelivery.state_backend import MemoryStateBackend
+
+
+class SharedMemoryState(MemoryStateBackend):
+    """Mesmo backend em memória, mas tratado como compartilhado entre dois DataStores"""
+    shared = True
+
+
+def test_lookups_hit_registry_and_writes_go_through(data_store, monkeypatch):
+    store = data_store()
+    store.add_deliverer(Deliverer(telegram_id=1, name="Ana"))
+    store.add_deliverer(Deliverer(telegram_id=2, name="Bia", is_partner=True))
+
+    reads = []
+    real_read = DataStore._read_deliverers
+    monkeypatch.setattr(DataStore, "_read_deliverers", lambda self: reads.append(self) or real_read(self))
+
+    fresh = data_store()
+    for _ in range(50):
+        assert fresh.get_deliverer(1).name == "Ana"
+        assert fresh.get_deliverer(99) is None
+    assert len(fresh.load_deliverers()) == 2
+    assert len(reads) == 1  # Só a carga inicial
+
+    # Cópias: mexer no objeto devolvido não altera o registro sem gravar
+    fresh.get_deliverer(1).name = "Outra"
+    assert fresh.get_deliverer(1).name == "Ana"
+
+    version = fresh.registry_version
+    fresh.update_deliverer_stats(1, total_deliveries=7)
+    fresh.delete_deliverer(2)
+    assert fresh.registry_version == version + 2
+    assert fresh.get_deliverer(1).total_deliveries == 7 and fresh.get_deliverer(2) is None
+    assert len(reads) == 1
+
+    # Gravado no disco de verdade
+    reloaded = data_store()
+    assert [(d.telegram_id, d.total_deliveries) for d in reloaded.load_deliverers()] == [(1, 7)]
+
+
+def test_other_worker_write_invalidates_registry(data_store):
+    state = SharedMemoryState()
+    a, b = data_store(state), data_store(state)
+    a.add_deliverer(Deliverer(telegram_id=1, name="Ana"))
+    assert b.get_deliverer(1).name == "Ana"
+
+    a.update_deliverer_stats(1, name="Ana Paula")
+    assert b.get_deliverer(1).name == "Ana Paula"
+
+    b.add_deliverer(Deliverer(telegram_id=2, name="Bia"))
+    assert {d.name for d in a.load_deliverers()} == {"Ana Paula", "Bia"}
+
+
+class SQLiteManager:
+    """Stand-in do db_manager com SQLite em memória (mesma interface get_session)"""
+
+    def __init__(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        DelivererDB.__table__.create(self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *a: self.statements.append(statement.split()[0]))
+
+    @contextmanager
+    def get_session(self):
+        session = self.SessionLocal()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+
+def test_json_writes_append_one_line_and_compact(data_store, monkeypatch):
+    monkeypatch.setattr(persistence, "DELIVERERS_COMPACT_EVERY", 10)
+    store = data_store()
+    store.save_deliverers([Deliverer(telegram_id=n, name=f"E{n}") for n in range(50)])
+    snapshot_mtime = os.stat(store.deliverers_file).st_mtime_ns
+
+    store.increment_stats(7, delivered=1, earnings=1.5, time=20)
+    store.increment_stats(7, failed=1, time=40)
+    store.upsert_deliverer(Deliverer(telegram_id=99, name="Nova"))
+    assert os.stat(store.deliverers_file).st_mtime_ns == snapshot_mtime  # Snapshot intocado
+    with open(store.deliverers_log, encoding="utf-8") as f:
+        assert len(f.readlines()) == 3
+
+    expected = store.get_deliverer(7)
+    assert (expected.total_deliveries, expected.total_earnings, expected.success_rate) == (1, 1.5, 50.0)
+    assert expected.average_delivery_time == 40  # (20 * 0 + 40) / 1, mesma conta de antes
+    reloaded = data_store().get_deliverer(7)
+    assert reloaded == expected
+
+    for _ in range(7):  # 10ª linha consolida o log no snapshot
+        store.increment_stats(7, delivered=1, time=10)
+    assert not store.deliverers_log.exists()
+    assert data_store().get_deliverer(7).total_deliveries == 8
+    assert len(data_store().load_deliverers()) == 51
+
+
+def test_database_upsert_and_atomic_increment(data_store, monkeypatch):
+    db = SQLiteManager()
+    monkeypatch.setattr(persistence, "db_manager", db)
+    store = data_store()
+    store.using_database = True
+    store.save_deliverers([Deliverer(telegram_id=n, name=f"E{n}") for n in range(30)])
+    store.get_deliverer(0)  # Registro carregado
+
+    db.statements.clear()
+    store.add_deliverer(Deliverer(telegram_id=3, name="Renomeado", cost_per_package=2.0))
+    assert db.statements == ["INSERT"]  # ON CONFLICT DO UPDATE, sem SELECT por entregador
+
+    db.statements.clear()
+    monkeypatch.setitem(DelivererService.update_stats_after_delivery.__globals__, "data_store", store)
+    DelivererService.update_stats_after_delivery(3, True, 30)
+    DelivererService.update_stats_after_delivery(3, False, 10)
+    assert db.statements == ["UPDATE", "UPDATE"]
+
+    # Outro processo somou direto no banco: o incremento parte do valor da linha, não do cache
+    with db.get_session() as session:
+        session.query(DelivererDB).filter_by(telegram_id=3).update({"total_deliveries": 5})
+    updated = store.increment_stats(3, delivered=1, earnings=2.0, time=30)
+    assert updated.total_deliveries == 6 and updated.total_earnings == 4.0
+    assert store.get_deliverer(3) == updated
+    with db.get_session() as session:
+        row = session.get(DelivererDB, 3)
+        assert (row.name, row.total_deliveries, row.success_rate) == ("Renomeado", 6, 100.0)
+
+    assert store.update_deliverer_stats(3, is_active=False, unknown=1).is_active is False
+    assert store.increment_stats(12345, delivered=1) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Registro de entregadores OK")
@@ -0,0 +1,123 @@
+"""
+🧪 Testes dos relatórios financeiros indexados por data
+Log local (substituição, compactação, índice refeito, importação dos .json
+antigos) e tabela no banco (SQLite no lugar do PostgreSQL) com intervalos e
+totais por mês numa consulta só
+"""
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery import database
+from bot_multidelivery.database import DailyFinancialReportDB
+from bot_multidelivery.financial_store import FinancialReportStore, ReportLog
+from bot_multidelivery.serialization import dump_file
+from bot_multidelivery.services.financial_service import FinancialService
+
+
+def _report(day, revenue=100.0, costs=30.0):
+    return {"date": day, "revenue": revenue, "delivery_costs": costs, "other_costs": 5.0,
+            "net_profit": revenue - costs - 5.0, "total_packages": 10, "total_deliveries": 9,
+            "deliverer_breakdown": {"Ana": costs}, "expenses": []}
+
+
+def test_report_log_range_replace_and_compaction(data_dir):
+    log = ReportLog(data_dir, "daily")
+    start = datetime(2025, 1, 1)
+    for n in range(365):
+        log.put(_report((start + timedelta(days=n)).strftime("%Y-%m-%d"), revenue=n))
+    log.put(_report("2025-03-10", revenue=999))  # Substitui o dia
+
+    march = log.range("2025-03-01", datetime(2025, 3, 31))
+    assert [r["date"] for r in march] == [f"2025-03-{d:02d}" for d in range(1, 32)]
+    assert log.get("2025-03-10")["revenue"] == 999 and log.get("2024-12-31") is None
+
+    for _ in range(500):  # Muitas substituições: log é compactado
+        log.put(_report("2025-06-01", revenue=1))
+    with open(log.log_file, encoding="utf-8") as f:
+        assert sum(1 for _ in f) < 2 * 365 + 60
+
+    os.remove(log.index_file)  # Índice perdido: refeito do log
+    reopened = ReportLog(data_dir, "daily")
+    assert len(reopened.dates()) == 365 and reopened.get("2025-03-10")["revenue"] == 999
+
+
+class SQLiteManager:
+    """Stand-in do db_manager com SQLite em memória (mesma interface get_session)"""
+
+    def __init__(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        DailyFinancialReportDB.__table__.create(self.engine)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.selects = 0
+        event.listen(self.engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, *args):
+        self.selects += statement.lstrip().upper().startswith("SELECT")
+
+    @contextmanager
+    def get_session(self):
+        session = self.SessionLocal()
+        try:
+            yield session
+            session.commit()
+        finally:
+            session.close()
+
+
+def test_database_store_imports_legacy_and_answers_in_one_query(data_dir, monkeypatch):
+    db = SQLiteManager()
+    monkeypatch.setattr(database, "db_manager", db)
+    daily_dir = os.path.join(data_dir, "daily")
+    os.makedirs(daily_dir)
+    for day in ("2025-01-05", "2025-01-06"):
+        dump_file(os.path.join(daily_dir, f"daily_{day}.json"), _report(day), "financial_daily")
+
+    store = FinancialReportStore(data_dir, using_database=True)
+    assert [r["date"] for r in store.range()] == ["2025-01-05", "2025-01-06"]  # Importados para o banco
+
+    start = datetime(2025, 1, 1)
+    for n in range(365):
+        store.put(_report((start + timedelta(days=n)).strftime("%Y-%m-%d"), revenue=10))
+    db.selects = 0
+    months = store.monthly_totals("2025-01-01", "2025-12-31")
+    assert db.selects == 1
+    assert len(months) == 12 and months[0]["days_with_data"] == 31 and months[0]["revenue"] == 310
+    assert months[1]["month"] == "2025-02" and months[1]["net_profit"] == 28 * (10 - 35)
+
+    db.selects = 0
+    assert len(store.range(datetime(2025, 2, 1), datetime(2025, 2, 28))) == 28 and db.selects == 1
+    assert store.get("2025-01-05")["expenses"] == []
+
+    # Cópia local acompanha o banco (e bate com a soma feita no banco)
+    local = FinancialReportStore(data_dir, using_database=False)
+    assert local.monthly_totals("2025-01-01", "2025-12-31") == months
+
+
+def test_financial_service_reads_through_store(data_dir):
+    service = FinancialService(data_dir=data_dir)
+    service.store.using_database = False
+    monday = datetime(2025, 3, 3)
+    for n in range(7):
+        service.close_day(monday + timedelta(days=n), revenue=200.0, deliverer_costs={"Ana": 50.0},
+                          expenses=[{"type": "gas", "value": 10.0, "desc": ""}])
+
+    assert service.get_daily_report(monday).other_costs == 10.0
+    assert len(service.get_daily_reports_range(monday, monday + timedelta(days=30))) == 7
+    report, _ = service.close_week(monday)
+    assert report.total_revenue == 1400.0 and len(report.daily_reports) == 7
+    summary = service.get_month_summary(2025, 3)
+    assert summary["days_with_data"] == 7 and summary["total_profit"] == 7 * 140.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Relatórios financeiros indexados OK")
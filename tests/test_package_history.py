@@ -0,0 +1,118 @@
+"""
+🧪 Testes do histórico de pacotes particionado por dia
+Migração do packages.jsonl antigo, consulta de um dia, filtros pelo índice e
+reconstrução do .idx quando ele fica para trás
+"""
+import builtins
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.models import Package, PackageStatus
+from bot_multidelivery.package_history import PackageHistory
+from bot_multidelivery.persistence import DataStore
+
+
+def _record(n, day, deliverer, status="delivered"):
+    return {"id": f"P{n}", "address": f"Rua {n}", "lat": -22.9, "lng": -43.17, "priority": "normal",
+            "status": status, "assigned_to": deliverer, "delivered_at": f"{day}T10:00:00",
+            "delivery_time_minutes": 12, "notes": "", "timestamp": f"{day}T10:00:00"}
+
+
+@pytest.fixture
+def data_dir():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield tmp
+
+
+def test_legacy_file_is_split_by_day(data_dir):
+    legacy = os.path.join(data_dir, "packages.jsonl")
+    with open(legacy, "w", encoding="utf-8") as f:
+        for n in range(6):
+            f.write(json.dumps(_record(n, f"2026-01-0{1 + n % 3}", 11 + n % 2, PackageStatus.DELIVERED.value)) + "\n")
+        f.write('{"id": "cortado"\n')
+
+    store = DataStore(data_dir=data_dir)
+    assert store.package_history.days() == ["2026-01-01", "2026-01-02", "2026-01-03"]
+    assert not os.path.exists(legacy) and os.path.exists(legacy + ".migrated")
+    assert [p["id"] for p in store.iter_packages()] == ["P0", "P3", "P1", "P4", "P2", "P5"]
+
+    packages = store.get_packages_by_date(datetime(2026, 1, 2))
+    assert [p.id for p in packages] == ["P1", "P4"] and packages[0].status == PackageStatus.DELIVERED
+
+
+def test_single_day_and_filters_use_partition_and_index(data_dir, monkeypatch):
+    history = PackageHistory(os.path.join(data_dir, "packages"))
+    for n in range(30):
+        history.append(_record(n, f"2026-02-{1 + n % 10:02d}", n % 3, "delivered" if n % 2 else "in_transit"))
+    history.append(_record(99, "2026-02-05", "7"))  # assigned_to como texto
+
+    opened = []
+    real_open = builtins.open
+    monkeypatch.setattr(builtins, "open", lambda file, *a, **k: opened.append(os.path.basename(file)) or real_open(file, *a, **k))
+    assert [p["id"] for p in history.iter_packages("2026-02-03", "2026-02-03")] == ["P2", "P12", "P22"]
+    assert opened == ["2026-02-03.jsonl"]
+    monkeypatch.setattr(builtins, "open", real_open)
+
+    assert history.count() == 31 and history.count(status="delivered") == 16
+    assert history.count(deliverer_id=7) == 1
+    by_deliverer = list(history.iter_packages(deliverer_id=1, status="delivered"))
+    assert [p["id"] for p in by_deliverer] == ["P1", "P13", "P25", "P7", "P19"]
+    assert all(p["assigned_to"] == 1 and p["status"] == "delivered" for p in by_deliverer)
+
+
+def test_index_rebuilt_when_behind_data(data_dir):
+    history = PackageHistory(os.path.join(data_dir, "packages"))
+    for n in range(3):
+        history.append(_record(n, "2026-03-01", 5))
+    os.remove(os.path.join(data_dir, "packages", "2026-03-01.idx"))  # Queda antes do índice
+
+    reopened = PackageHistory(os.path.join(data_dir, "packages"))
+    assert reopened.count(deliverer_id=5) == 3
+    reopened.append(_record(3, "2026-03-01", 5))
+    assert [p["id"] for p in reopened.iter_packages(deliverer_id=5)] == ["P0", "P1", "P2", "P3"]
+
+
+def test_save_package_appends_to_todays_file(data_dir):
+    store = DataStore(data_dir=data_dir)
+    store.save_package(Package(id="X1", address="Rua X", lat=-22.9, lng=-43.17, assigned_to="11",
+                               status=PackageStatus.DELIVERED))
+    today = datetime.now().strftime("%Y-%m-%d")
+    assert store.package_history.days() == [today]
+    assert [p.id for p in store.get_packages_by_date(datetime.now())] == ["X1"]
+    assert store.get_all_packages()[0]["assigned_to"] == "11"
+
+
+def test_status_filters_match_saved_package_status(data_dir):
+    store = DataStore(data_dir=data_dir)
+    store.save_package(Package(id="E1", address="Rua E", lat=-22.9, lng=-43.17, assigned_to="11",
+                               status=PackageStatus.DELIVERED))
+    store.save_package(Package(id="T1", address="Rua T", lat=-22.9, lng=-43.17, assigned_to="11",
+                               status=PackageStatus.IN_TRANSIT))
+
+    history = store.package_history
+    assert history.count(status="delivered") == 1 == store.package_stats.count(status="delivered")
+    assert [p["id"] for p in store.iter_packages(status="delivered")] == ["E1"]
+    assert [p["id"] for p in store.iter_packages(deliverer_id=11, status="in_transit")] == ["T1"]
+    assert history.count(status=PackageStatus.DELIVERED.value) == 1  # Valor em português também serve
+
+    # .idx gravado antes da normalização (status cru) continua batendo
+    today = datetime.now().strftime("%Y-%m-%d")
+    reopened = PackageHistory(os.path.join(data_dir, "packages"))
+    index_file = os.path.join(data_dir, "packages", f"{today}.idx")
+    with open(index_file, encoding="utf-8") as f:
+        raw = f.read().replace(",delivered\n", ",entregue\n")
+    with open(index_file, "w", encoding="utf-8") as f:
+        f.write(raw)
+    assert reopened.count(status="delivered") == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Histórico de pacotes OK")
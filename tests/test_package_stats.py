@@ -0,0 +1,90 @@
+"""
+🧪 Testes dos contadores do histórico de pacotes
+Atualização a cada pacote salvo, retomada após queda, escrita de outro
+processo e recontagem numa passada só
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.package_history import PackageHistory
+from bot_multidelivery.package_stats import PackageStats
+
+
+def _record(n, day, deliverer, status="entregue", minutes=12):
+    return {"id": f"P{n}", "status": status, "assigned_to": deliverer, "delivered_at": f"{day}T10:00:00",
+            "delivery_time_minutes": minutes, "timestamp": f"{day}T10:00:00"}
+
+
+@pytest.fixture
+def history_dir():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield os.path.join(tmp, "packages")
+
+
+def _counters(stats: PackageStats):
+    return (stats.by_status, stats.by_day, stats.by_deliverer, stats.delivered_dates,
+            stats.timed_deliveries, sorted(p["id"] for p in stats.recent_deliveries))
+
+
+def test_counters_follow_appends_and_match_recompute(history_dir):
+    history = PackageHistory(history_dir)
+    stats = PackageStats(history, save_every=1000)
+    today = date.today()
+    for n in range(60):
+        day = (today - timedelta(days=n % 4)).isoformat()
+        history.append(_record(n, day, 11 + n % 2, "entregue" if n % 3 else "em_transito"))
+
+    assert stats.count() == 60
+    assert stats.count(status="delivered") == 40 and stats.count(status="entregue") == 40
+    assert stats.count(status="in_transit") == 20
+    assert stats.count(deliverer_id=11, status="delivered") == 20
+    assert stats.count(day=today) == 15
+    assert stats.streak(11) == 1 and stats.streak(12) == 0  # 11 entrega hoje e anteontem; 12 só em dias ímpares
+    assert stats.timed_deliveries == 40 and len(stats.last_deliveries()) == 40
+
+    for n, back in enumerate((0, 1, 2, 4)):
+        history.append(_record(100 + n, (today - timedelta(days=back)).isoformat(), 13))
+    assert stats.streak(13) == 3
+
+    incremental = _counters(stats)
+    stats.recompute()
+    assert _counters(stats) == incremental
+
+
+def test_restart_catches_up_unsaved_tail(history_dir):
+    history = PackageHistory(history_dir)
+    stats = PackageStats(history, save_every=5)
+    for n in range(12):  # Gravou stats.json no 5º e 10º; os 2 últimos só no histórico
+        history.append(_record(n, "2026-01-01", 7))
+    expected = _counters(stats)
+
+    reopened = PackageStats(PackageHistory(history_dir), save_every=5)
+    assert _counters(reopened) == expected and reopened.count() == 12
+
+
+def test_other_process_appends_are_counted(history_dir):
+    history = PackageHistory(history_dir)
+    stats = PackageStats(history)
+    today = date.today().isoformat()
+    history.append(_record(0, today, 1))
+
+    other = PackageHistory(history_dir)  # Outro worker, mesmo diretório
+    other.append(_record(1, today, 2, minutes=None))
+    assert stats.count() == 2 and stats.count(deliverer_id=2) == 1
+
+    history.append(_record(2, today, 1))  # Offset pula o pacote do outro: recontado sem duplicar
+    assert stats.count() == 3 and stats.timed_deliveries == 2
+
+    other.append(_record(3, today, 2))  # Entrega com tempo vinda do outro worker
+    assert stats.timed_count() == 3  # Consulta da IA também pega o que o outro gravou
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Contadores do histórico OK")
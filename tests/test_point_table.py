@@ -0,0 +1,100 @@
+"""
+🧪 Testes da tabela colunar de pontos
+Visões leves, blob binário e persistência compacta de romaneios/rotas
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint
+from bot_multidelivery.serialization import load_file
+from bot_multidelivery.point_table import PointTable, PointView, coords_array
+from bot_multidelivery.session import DailySession, Romaneio, Route
+from bot_multidelivery.session_persistence import SessionStore
+
+
+def _points(n: int = 6):
+    return [DeliveryPoint(address=f"Rua {i % 3}", lat=-22.9 + i * 0.001, lng=-43.17 - i * 0.001,
+                          romaneio_id="R1", package_id=f"PKG{i}", priority="high" if i == 2 else "normal")
+            for i in range(n)]
+
+
+def test_table_views_match_points_and_intern_strings():
+    points = _points()
+    table = PointTable.from_points(points)
+
+    assert len(table) == 6
+    assert isinstance(table[2], PointView)
+    assert table[2] == points[2] and table[2].priority == "high"
+    assert table[-1].package_id == "PKG5"
+    assert list(table) == points
+    # 3 endereços + 6 ids + romaneio + 2 prioridades
+    assert len(table.strings) == 12
+    assert coords_array(table[1:4]).tolist() == [[p.lat, p.lng] for p in points[1:4]]
+
+
+def test_binary_blob_roundtrip():
+    table = PointTable.from_points(_points())
+    restored = PointTable.from_bytes(table.to_bytes())
+
+    assert restored == table
+    assert restored.lat.dtype == np.float64
+    assert PointTable.from_base64(table.to_base64())[4].address == "Rua 1"
+
+
+def test_romaneio_stores_columns_and_session_roundtrips():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(data_dir=tmp)
+        store.using_database = False
+
+        romaneio = Romaneio(id="R1", uploaded_at=datetime(2026, 1, 5, 8), points=_points())
+        assert isinstance(romaneio.points, PointTable)
+
+        order = [romaneio.points[i] for i in (4, 0, 2)]
+        session = DailySession(session_id="cols01", date="2026-01-05", period="manhã")
+        session.romaneios.append(romaneio)
+        session.routes.append(Route(id="ROTA_1", cluster=Cluster(id=0, center_lat=-22.9, center_lng=-43.17, points=order),
+                                    optimized_order=order))
+        store.save_session(session)
+
+        raw = load_file(store._session_file("cols01"), "session")
+        assert 'points_blob' in raw['romaneios'][0]
+        assert raw['routes'][0]['optimized_order']['count'] == 3
+
+        loaded = store.load_session("cols01")
+        assert [p.package_id for p in loaded.routes[0].optimized_order] == ["PKG4", "PKG0", "PKG2"]
+        assert loaded.routes[0].optimized_order[0].table is loaded.romaneios[0].points
+        assert loaded.total_packages == 6
+
+
+def test_reads_legacy_point_dicts():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(data_dir=tmp)
+        store.using_database = False
+        point = {'package_id': 'OLD1', 'romaneio_id': 'R0', 'address': 'Rua Velha', 'lat': -22.9, 'lng': -43.1}
+        legacy = {
+            'session_id': 'old01', 'date': '2025-12-01', 'created_at': '2025-12-01T08:00:00',
+            'base_address': '', 'base_lat': 0.0, 'base_lng': 0.0,
+            'romaneios': [{'id': 'R0', 'uploaded_at': '2025-12-01T08:00:00', 'points': [point]}],
+            'routes': [{'id': 'ROTA_1', 'optimized_order': [point], 'delivered_packages': ['OLD1']}]
+        }
+        store._session_file("old01").write_text(json.dumps(legacy))
+
+        loaded = store.load_session("old01")
+        assert loaded.romaneios[0].points[0].priority == "normal"
+        assert loaded.routes[0].optimized_order[0].address == "Rua Velha"
+        assert store.list_sessions()[0]['total_packages'] == 1
+
+
+if __name__ == "__main__":
+    test_table_views_match_points_and_intern_strings()
+    test_binary_blob_roundtrip()
+    test_romaneio_stores_columns_and_session_roundtrips()
+    test_reads_legacy_point_dicts()
+    print("✅ Tabela de pontos OK")
@@ -0,0 +1,194 @@
+"""
+🧪 Testes do motor de malha viária offline (Contraction Hierarchies)
+Grafo sintético em grade - não depende de osmium nem de extrato .pbf
+"""
+import heapq
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint, TerritoryDivider
+from bot_multidelivery.services import distance_matrix
+from bot_multidelivery.services.distance_matrix import (
+    HaversineMatrixProvider, get_distance_provider, get_road_network_provider, haversine_provider
+)
+from bot_multidelivery.services.genetic_optimizer import GeneticRouteOptimizer
+from bot_multidelivery.services.road_network import RoadNetworkEngine
+from bot_multidelivery.services.scooter_optimizer import ScooterRouteOptimizer
+
+BASE = (-22.9068, -43.1729)
+
+
+def _grid_graph(size: int, seed: int = 7):
+    """Grade size×size (~110 m entre nós) com velocidades variadas e mãos únicas"""
+    rng = random.Random(seed)
+    coords = [(BASE[0] + r * 0.001, BASE[1] + c * 0.001) for r in range(size) for c in range(size)]
+    edges = []
+    for r in range(size):
+        for c in range(size):
+            u = r * size + c
+            neighbors = ([u + 1] if c < size - 1 else []) + ([u + size] if r < size - 1 else [])
+            for v in neighbors:
+                meters = 100 + rng.random() * 20
+                seconds = meters / rng.choice([5.0, 8.0, 12.0])
+                kind = rng.random()
+                if kind < 0.15:
+                    edges.append((u, v, seconds, meters))
+                elif kind < 0.3:
+                    edges.append((v, u, seconds, meters))
+                else:
+                    edges.append((u, v, seconds, meters))
+                    edges.append((v, u, seconds, meters))
+    return coords, edges
+
+
+def _dijkstra(num_nodes, edges, source):
+    adjacency = [[] for _ in range(num_nodes)]
+    for u, v, w, _ in edges:
+        adjacency[u].append((v, w))
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if d > dist[u]:
+            continue
+        for v, w in adjacency[u]:
+            if d + w < dist.get(v, float('inf')):
+                dist[v] = d + w
+                heapq.heappush(heap, (d + w, v))
+    return dist
+
+
+def test_ch_matches_dijkstra():
+    coords, edges = _grid_graph(20)
+    engine = RoadNetworkEngine.from_edges(coords, edges)
+    rng = random.Random(1)
+    sample = rng.sample(range(len(coords)), 25)
+    seconds, _ = engine.table([coords[i] for i in sample])
+
+    for a, i in enumerate(sample):
+        expected = _dijkstra(len(coords), edges, i)
+        for b, j in enumerate(sample):
+            if i != j:
+                assert abs(seconds[a][b] - expected[j]) < 1e-6
+
+
+def test_oneway_makes_matrix_asymmetric():
+    coords = [(BASE[0], BASE[1]), (BASE[0], BASE[1] + 0.001), (BASE[0] + 0.001, BASE[1])]
+    # 0→1 direto; volta 1→0 só contornando por 2
+    edges = [(0, 1, 10.0, 100.0), (1, 2, 30.0, 150.0), (2, 0, 30.0, 110.0)]
+    engine = RoadNetworkEngine.from_edges(coords, edges)
+    seconds, meters = engine.table(coords[:2])
+
+    assert seconds[0][1] == 10.0
+    assert seconds[1][0] == 60.0
+    assert meters[1][0] == 260.0
+
+
+def test_snap_adds_access_leg():
+    coords, edges = _grid_graph(10)
+    engine = RoadNetworkEngine.from_edges(coords, edges)
+    node, meters = engine.snap(coords[12][0] + 0.0001, coords[12][1])
+
+    assert node == 12
+    assert 5 < meters < 20
+
+
+def test_cache_roundtrip():
+    coords, edges = _grid_graph(12)
+    engine = RoadNetworkEngine.from_edges(coords, edges, profile='scooter')
+    points = coords[::17]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'grid.scooter.ch.npz')
+        engine.save(path)
+        loaded = RoadNetworkEngine.load(path)
+
+    assert loaded.profile.name == 'scooter'
+    assert loaded.matrix(points) == engine.matrix(points)
+
+
+def test_default_provider_is_haversine():
+    os.environ.pop('ROAD_NETWORK_PBF', None)
+    provider = get_distance_provider('car')
+
+    assert provider is haversine_provider
+    matrix = provider.matrix([BASE, (BASE[0] + 0.01, BASE[1])])
+    assert abs(matrix[0][1] - 1.112) < 0.01
+
+
+def test_request_path_only_loads_cache_once():
+    coords, edges = _grid_graph(6)
+    engine = RoadNetworkEngine.from_edges(coords, edges)
+    calls = []
+
+    def from_pbf(pbf_path, profile='car', cache_dir=None, bbox=None, build=True):
+        calls.append((profile, build))
+        time.sleep(0.05)  # Carga lenta: outras requisições chegam no meio
+        return engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pbf = os.path.join(tmp, 'rio.osm.pbf')
+        open(pbf, 'wb').close()
+        original = RoadNetworkEngine.from_pbf
+        os.environ['ROAD_NETWORK_PBF'] = pbf
+        distance_matrix._road_providers.clear()
+        try:
+            # Sem cache gerado: não contrai a malha na requisição, cai para haversine
+            os.environ['ROAD_NETWORK_CACHE_DIR'] = tmp
+            assert get_road_network_provider('car') is None
+            assert get_distance_provider('car') is haversine_provider
+            distance_matrix._road_providers.clear()
+
+            RoadNetworkEngine.from_pbf = staticmethod(from_pbf)
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(get_road_network_provider('scooter')))
+                       for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            RoadNetworkEngine.from_pbf = original
+            distance_matrix._road_providers.clear()
+            os.environ.pop('ROAD_NETWORK_PBF', None)
+            os.environ.pop('ROAD_NETWORK_CACHE_DIR', None)
+
+    assert calls == [('scooter', False)]
+    assert len(results) == 8 and all(r is engine for r in results)
+
+
+def test_optimizers_accept_provider():
+    coords, edges = _grid_graph(15)
+    engine = RoadNetworkEngine.from_edges(coords, edges)
+    rng = random.Random(5)
+    points = [coords[i] for i in rng.sample(range(1, len(coords)), 8)]
+
+    order = GeneticRouteOptimizer(distance_provider=engine).optimize(points, coords[0])
+    assert sorted(order) == list(range(len(points)))
+
+    route = ScooterRouteOptimizer(distance_provider=HaversineMatrixProvider()).optimize(points, coords[0])
+    assert route.points_order == ScooterRouteOptimizer().optimize(points, coords[0]).points_order
+
+    divider = TerritoryDivider(*coords[0], distance_provider=engine)
+    cluster = Cluster(id=0, center_lat=coords[0][0], center_lng=coords[0][1], points=[
+        DeliveryPoint(address=f"Rua {i}", lat=lat, lng=lng, romaneio_id="R1", package_id=f"P{i}")
+        for i, (lat, lng) in enumerate(points)
+    ])
+    assert len(divider.optimize_cluster_route(cluster)) == len(points)
+
+
+if __name__ == "__main__":
+    test_ch_matches_dijkstra()
+    test_oneway_makes_matrix_asymmetric()
+    test_snap_adds_access_leg()
+    test_cache_roundtrip()
+    test_default_provider_is_haversine()
+    test_request_path_only_loads_cache_once()
+    test_optimizers_accept_provider()
+    print("✅ Malha viária OK")
@@ -0,0 +1,87 @@
+"""
+🧪 Testes do índice de grade e do ressequenciamento por GPS
+"""
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint
+from bot_multidelivery.session import Route
+from bot_multidelivery.spatial import GridIndex, LocalProjection
+from bot_multidelivery.services.route_resequencer import RouteResequencer
+
+BASE = (-22.9068, -43.1729)
+
+
+def _route(n: int, seed: int = 3) -> Route:
+    rng = random.Random(seed)
+    points = [
+        DeliveryPoint(address=f"Rua {i}", lat=BASE[0] + rng.uniform(-0.03, 0.03),
+                      lng=BASE[1] + rng.uniform(-0.03, 0.03), romaneio_id="R1", package_id=f"PKG{i:04d}")
+        for i in range(n)
+    ]
+    return Route(id="ROTA_1", cluster=Cluster(id=0, center_lat=BASE[0], center_lng=BASE[1], points=points),
+                 optimized_order=points)
+
+
+def test_grid_nearest_matches_brute_force():
+    rng = random.Random(11)
+    items = [(i, BASE[0] + rng.uniform(-0.05, 0.05), BASE[1] + rng.uniform(-0.05, 0.05)) for i in range(800)]
+    index = GridIndex.build(items)
+    proj = LocalProjection(index.projection.ref_lat)
+
+    for _ in range(30):
+        lat, lng = BASE[0] + rng.uniform(-0.06, 0.06), BASE[1] + rng.uniform(-0.06, 0.06)
+        x, y = proj.project(lat, lng)
+        brute = sorted(items, key=lambda it: math.hypot(proj.project(it[1], it[2])[0] - x,
+                                                         proj.project(it[1], it[2])[1] - y))
+        assert [k for k, _ in index.nearest(lat, lng, k=5)] == [it[0] for it in brute[:5]]
+
+    # Raio e remoção
+    key, _ = index.nearest(BASE[0], BASE[1])[0]
+    assert index.remove(key)
+    assert key not in [k for k, _ in index.within(BASE[0], BASE[1], 10_000)]
+
+
+def test_resequence_only_pending_packages():
+    route = _route(120)
+    route.delivered_packages = [p.package_id for p in route.optimized_order[:30]]
+    extra = [route.optimized_order[40].package_id]
+
+    result = RouteResequencer().resequence(route, BASE[0], BASE[1], delivered=extra)
+    expected = {p.package_id for p in route.optimized_order[30:]} - set(extra)
+
+    assert {p.package_id for p in result.pending} == expected
+    assert len(result.pending) == len(expected)
+    assert result.distance_m <= result.previous_distance_m
+
+
+def test_resequence_picks_stop_near_current_position():
+    route = _route(200)
+    target = route.optimized_order[150]
+
+    result = RouteResequencer().resequence(route, target.lat, target.lng)
+
+    assert result.next_stop.package_id == target.package_id
+    assert result.changed
+
+
+def test_resequence_is_fast_for_large_routes():
+    route = _route(2000)
+    resequencer = RouteResequencer(time_budget_ms=20)
+    # Melhor de 3 para não depender de pausa do GC / máquina carregada
+    results = [resequencer.resequence(route, BASE[0], BASE[1]) for _ in range(3)]
+
+    assert len(results[0].pending) == 2000
+    assert min(r.elapsed_ms for r in results) < 50
+
+
+if __name__ == "__main__":
+    test_grid_nearest_matches_brute_force()
+    test_resequence_only_pending_packages()
+    test_resequence_picks_stop_near_current_position()
+    test_resequence_is_fast_for_large_routes()
+    print("✅ Ressequenciamento OK")
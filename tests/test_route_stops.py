@@ -0,0 +1,142 @@
+"""
+🧪 Testes das paradas normalizadas (route_stops)
+Banco em SQLite na memória: ida e volta, entrega incremental, consultas indexadas e formato antigo
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import DeliveryPoint
+from bot_multidelivery.database import Base, DelivererDB, RouteDB, RouteStopDB, SessionDB, db_manager
+from bot_multidelivery.session import DailySession, Romaneio, Route, SessionManager
+from bot_multidelivery.session_persistence import SessionStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(db_manager, "engine", engine)
+    monkeypatch.setattr(db_manager, "SessionLocal", sessionmaker(bind=engine))
+    with db_manager.get_session() as db:
+        db.add_all([DelivererDB(telegram_id=11, name="Ana"), DelivererDB(telegram_id=22, name="Bia")])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(data_dir=tmp)
+        store.using_database = True
+        yield store
+
+
+def _session() -> DailySession:
+    points = [DeliveryPoint(address=f"Rua {j}", lat=-22.9 + j / 1000, lng=-43.17, romaneio_id="R1", package_id=f"P{j}")
+              for j in range(8)]
+    session = DailySession(session_id="s1", date="2026-01-01", period="manhã")
+    session.romaneios.append(Romaneio(id="R1", uploaded_at=datetime(2026, 1, 1), points=points))
+    views = list(session.romaneios[0].points)
+    extra = DeliveryPoint(address="Avulso", lat=-22.8, lng=-43.1, romaneio_id="X", package_id="EXTRA")
+    session.routes = [
+        Route(id="s1_R1", cluster=None, optimized_order=views[:4][::-1], assigned_to_telegram_id=11),
+        Route(id="s1_R2", cluster=None, optimized_order=views[4:] + [extra], assigned_to_telegram_id=22),
+    ]
+    session.routes[0].mark_as_delivered("P3")
+    session.routes[0].mark_as_delivered("FORA-DA-ROTA")
+    return session
+
+
+def test_full_save_writes_rows_and_loads_back(store):
+    session = _session()
+    store.save_session(session)
+
+    with db_manager.get_session() as db:
+        assert db.query(RouteStopDB).filter_by(session_id="s1").count() == 10  # 8 + ponto avulso + entrega avulsa
+        assert db.query(RouteDB.optimized_order).filter(RouteDB.optimized_order.isnot(None)).count() == 0
+
+    loaded = store.load_session("s1")
+    assert loaded.total_packages == 8
+    for original, route in zip(session.routes, loaded.routes):
+        assert [p.package_id for p in route.optimized_order] == [p.package_id for p in original.optimized_order]
+        assert route.delivered_packages == original.delivered_packages
+    # Pontos dos romaneios voltam como visões da tabela (sem cópia)
+    assert loaded.routes[1].optimized_order[0].table is loaded.romaneios[0].points
+
+
+def test_delivery_updates_single_rows_and_indexed_queries(store):
+    store.save_session(_session())
+    session = store.load_session("s1")
+
+    session.routes[1].mark_as_delivered("P4")
+    session.record_delivery("s1_R2", "P4")
+    store.save_session(session)
+
+    with db_manager.get_session() as db:
+        row = db.query(RouteStopDB).filter_by(session_id="s1", package_id="P4").one()
+        assert row.status == "delivered" and row.delivered_at is not None
+
+    progress = {r['route_id']: r for r in store.route_progress(["s1"])["s1"]}
+    assert (progress["s1_R1"]["total_packages"], progress["s1_R1"]["delivered"]) == (4, 2)
+    assert (progress["s1_R2"]["total_packages"], progress["s1_R2"]["delivered"]) == (5, 1)
+
+    assert [s['package_id'] for s in store.next_stops("s1", "s1_R2", limit=2)] == ["P5", "P6"]
+    assert [s['package_id'] for s in store.deliverer_stops(11)] == ["P2", "P1", "P0"]
+
+    # Manager sem a sessão em memória usa a consulta do banco
+    manager = SessionManager(store=store)
+    assert manager.get_pending_stops(22, session_id="s1", limit=1)[0]['package_id'] == "P5"
+    assert manager.route_progress(["s1"]) == store.route_progress(["s1"])
+
+
+def test_failure_updates_one_stop_without_full_save(store, monkeypatch):
+    store.save_session(_session())
+    manager = SessionManager(store=store)
+    manager.get_session("s1")
+
+    def full_save(*args, **kwargs):
+        raise AssertionError("falha não deve reescrever a sessão")
+
+    monkeypatch.setattr(store, "_save_full", full_save)
+    assert manager.mark_package_failed(22, "P5", "cliente ausente", session_id="s1")
+    assert not manager.mark_package_failed(11, "P3", "já entregue", session_id="s1")
+
+    with db_manager.get_session() as db:
+        failed = db.query(RouteStopDB).filter_by(session_id="s1", status="failed").all()
+        assert [(s.package_id, s.failure_reason) for s in failed] == [("P5", "cliente ausente")]
+
+    manager.mark_package_delivered(22, "P5", session_id="s1")  # Nova tentativa deu certo
+    with db_manager.get_session() as db:
+        row = db.query(RouteStopDB).filter_by(session_id="s1", package_id="P5").one()
+        assert (row.status, row.failure_reason) == ("delivered", None)
+
+
+def test_legacy_json_routes_are_read_and_converted(store):
+    point = {'address': 'a', 'lat': 1.0, 'lng': 2.0, 'romaneio_id': 'R1', 'package_id': 'L1'}
+    with db_manager.get_session() as db:
+        db.add(SessionDB(session_id="old", session_name="x", date="2025-01-01", created_at=datetime(2025, 1, 1),
+                         romaneios_data=[{'id': 'R1', 'uploaded_at': '2025-01-01T00:00:00',
+                                          'points': [point, dict(point, package_id='L2')]}]))
+        db.flush()
+        db.add(RouteDB(id="old_R1", session_id="old", optimized_order=[point], delivered_packages=[]))
+
+    assert store.route_progress(["old"])["old"][0]["total_packages"] == 1
+    session = store.load_session("old")
+    assert session.total_packages == 2
+
+    # Primeira entrega numa sessão antiga reescreve tudo no formato novo
+    session.routes[0].mark_as_delivered("L1")
+    session.record_delivery("old_R1", "L1")
+    store.save_session(session)
+    with db_manager.get_session() as db:
+        assert db.query(RouteStopDB).filter_by(session_id="old").count() == 2
+    assert store.load_session("old").routes[0].delivered_packages == ["L1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Paradas normalizadas OK")
@@ -0,0 +1,82 @@
+"""
+🧪 Testes da serialização dos arquivos locais
+Codecs, leitura de JSON legado, versão de schema e gravação atômica
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery import serialization
+from bot_multidelivery.serialization import (
+    SCHEMA_VERSIONS, _CODECS, decode, dump_file, encode, get_codec, load_file, register_upgrade
+)
+
+SAMPLE = {'id': 'S1', 'total': 3, 'ratio': 0.25, 'ok': True, 'vazio': None,
+          'nome': 'Entregador São João', 'itens': [1, 2, {'a': 'b'}]}
+
+
+@pytest.mark.parametrize("name", sorted(_CODECS))
+def test_roundtrip_every_codec(name):
+    raw = encode(SAMPLE, 'session', get_codec(name))
+    assert raw[:3] == b'MAL'
+    assert decode(raw, 'session') == SAMPLE
+
+
+def test_codec_from_env_falls_back_to_installed(monkeypatch):
+    monkeypatch.setenv('DATA_CODEC', 'inexistente')
+    assert get_codec().name in _CODECS
+    monkeypatch.setenv('DATA_CODEC', 'json')
+    assert get_codec().name == 'json'
+
+
+def test_legacy_json_is_read_transparently():
+    raw = json.dumps(SAMPLE, indent=2, ensure_ascii=False).encode('utf-8')
+    assert decode(raw, 'deliverers') == SAMPLE
+
+
+def test_newer_schema_is_rejected():
+    raw = encode(SAMPLE, 'session')
+    future = raw[:4] + (SCHEMA_VERSIONS['session'] + 1).to_bytes(2, 'big') + raw[6:]
+    with pytest.raises(ValueError):
+        decode(future, 'session')
+
+
+def test_upgrade_hook_runs_for_legacy_files(monkeypatch):
+    monkeypatch.setitem(SCHEMA_VERSIONS, 'teste', 2)
+    monkeypatch.setattr(serialization, '_UPGRADES', {})
+    register_upgrade('teste', 0)(lambda data: {**data, 'v1': True})
+    register_upgrade('teste', 1)(lambda data: {**data, 'v2': True})
+
+    legacy = json.dumps({'x': 1}).encode('utf-8')
+    assert decode(legacy, 'teste') == {'x': 1, 'v1': True, 'v2': True}
+
+    # Já na versão atual: nada a migrar
+    assert decode(encode({'x': 1}, 'teste'), 'teste') == {'x': 1}
+
+
+def test_dump_file_is_atomic():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "dados.json"
+        dump_file(path, SAMPLE, 'deliverers')
+        assert load_file(path, 'deliverers') == SAMPLE
+        assert not path.with_name(path.name + '.tmp').exists()
+
+        # Falha no meio da gravação mantém o arquivo anterior intacto
+        with pytest.raises(TypeError):
+            dump_file(path, {'ruim': object()}, 'deliverers', codec=get_codec('json'))
+        assert load_file(path, 'deliverers') == SAMPLE
+
+
+if __name__ == "__main__":
+    for name in sorted(_CODECS):
+        test_roundtrip_every_codec(name)
+    test_legacy_json_is_read_transparently()
+    test_newer_schema_is_rejected()
+    test_dump_file_is_atomic()
+    print("✅ Serialização OK")
@@ -0,0 +1,57 @@
+"""
+🧪 Testes do carregamento em lote de sessões (JSON local)
+Cada arquivo é parseado uma única vez; ordem e sidecar preservados
+"""
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.session import SessionManager
+from bot_multidelivery.session_persistence import load_file
+
+
+def test_bulk_load_parses_each_file_once(json_store, fill_sessions):
+    store = json_store()
+    fill_sessions(store, 5)
+    store.list_sessions()  # Índice já em memória
+
+    with mock.patch("bot_multidelivery.session_persistence.load_file", wraps=load_file) as loads:
+        sessions = store.load_all_sessions()
+    assert [s.session_id for s in sessions] == ["s04", "s03", "s02", "s01", "s00"]
+    assert loads.call_count == 5
+
+
+def test_bulk_load_by_ids_keeps_order_and_sidecar(json_store, fill_sessions):
+    store = json_store()
+    fill_sessions(store, 3)
+    session = store.load_session("s01")
+    session.routes[0].mark_as_delivered("S1P2")
+    session.record_delivery("ROTA_1", "S1P2")
+    store.save_session(session)
+
+    sessions = store.load_sessions(["s01", "nope", "s00"])
+    assert [s.session_id for s in sessions] == ["s01", "s00"]
+    assert sessions[0].routes[0].delivered_packages == ["S1P2"]
+    assert not sessions[0].is_dirty
+
+
+def test_manager_listing_loads_missing_sessions_in_one_batch(json_store, fill_sessions):
+    store = json_store()
+    fill_sessions(store, 4)
+    manager = SessionManager(store=store, max_sessions=2)
+    cached = manager.get_session("s02")
+
+    with mock.patch.object(store, "load_sessions", wraps=store.load_sessions) as bulk:
+        sessions = manager.list_sessions()
+    assert [s.session_id for s in sessions] == ["s03", "s02", "s01", "s00"]
+    assert sessions[1] is cached
+    bulk.assert_called_once_with(["s03", "s01", "s00"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Carregamento em lote OK")
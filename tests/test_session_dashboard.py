@@ -0,0 +1,117 @@
+"""
+🧪 Testes dos contadores do dashboard de sessão
+Progresso mantido na transação da entrega/falha (sem ler os pacotes), recontagem
+de sessões antigas com um GROUP BY e ETag/If-None-Match no endpoint
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery import api_sessions, database
+from bot_multidelivery.schemas.sessions_schema import DeliverySession, SessionDeliverer
+from bot_multidelivery.security import API_KEY_NAME, SERVER_API_KEY
+
+
+def test_counters_follow_deliveries_without_reading_packages(factory, active_session):
+    db = factory()
+    engine, session_id, ids = active_session(db)
+    engine.mark_deliveries_complete(session_id, ids[:3], 11)
+    engine.mark_delivery_complete(session_id, ids[3], 22)
+    engine.mark_deliveries_complete(session_id, ids[:3], 11)  # Replay: nada muda
+
+    factory.statements.clear()
+    dashboard = engine.get_session_dashboard(session_id)
+    assert not any("session_packages" in sql for sql in factory.statements)
+    assert dashboard["progress"] == {"delivered": 4, "failed": 0, "pending": 4, "total": 8}
+    assert dashboard["financial"]["revenue"] == 80.0 and dashboard["financial"]["deliverers_paid"] == 6020.0
+    assert {d["id"]: d["delivered"] for d in dashboard["deliverers"]} == {11: 3, 22: 1}
+
+
+def test_failures_are_counted_and_recovered_failures_leave_the_count(factory, active_session):
+    db = factory()
+    engine, session_id, ids = active_session(db)
+    engine.mark_deliveries_complete(session_id, ids[:2], 11)
+    assert engine.mark_delivery_failed(session_id, ids[2], 22, "cliente ausente")["status"] == "failed"
+    engine.mark_delivery_failed(session_id, ids[3], 22)
+    engine.mark_delivery_failed(session_id, ids[3], 22)  # Repetida: não conta de novo
+    assert engine.mark_delivery_failed(session_id, ids[0], 22)["status"] == "delivered"
+    assert engine.mark_delivery_failed(session_id, "nao-existe", 22) == {"error": "Pacote não encontrado"}
+
+    factory.statements.clear()
+    dashboard = engine.get_session_dashboard(session_id)
+    assert not any("session_packages" in sql for sql in factory.statements)
+    assert dashboard["progress"] == {"delivered": 2, "failed": 2, "pending": 4, "total": 8}
+    assert {d["id"]: d["failed"] for d in dashboard["deliverers"]} == {11: 0, 22: 2}
+    version = dashboard["stats_version"]
+
+    engine.mark_deliveries_complete(session_id, [ids[2]], 11)  # Reentrega de um pacote que falhou
+    db.expire_all()
+    dashboard = engine.get_session_dashboard(session_id)
+    assert dashboard["progress"] == {"delivered": 3, "failed": 1, "pending": 4, "total": 8}
+    assert db.query(SessionDeliverer).filter_by(deliverer_id=22).one().packages_failed == 1
+    assert dashboard["stats_version"] == version + 1
+
+
+def test_old_session_is_recounted_once(factory, active_session):
+    db = factory()
+    engine, session_id, ids = active_session(db)
+    engine.mark_deliveries_complete(session_id, ids[:2], 11)
+    engine.mark_delivery_failed(session_id, ids[2], 22)
+    expected = engine.get_session_dashboard(session_id)
+    # Sessão de antes dos contadores
+    db.execute(update(DeliverySession).values(delivered_count=None, failed_count=None))
+    db.execute(update(SessionDeliverer).values(packages_failed=0))
+    db.commit()
+    assert engine.get_stats_version(session_id) is None
+
+    dashboard = engine.get_session_dashboard(session_id)
+    assert dashboard["progress"] == expected["progress"] == {"delivered": 2, "failed": 1, "pending": 5, "total": 8}
+    assert dashboard["deliverers"] == expected["deliverers"]
+
+    factory.statements.clear()
+    engine.get_session_dashboard(session_id)  # Recontada uma vez só
+    assert not any("session_packages" in sql for sql in factory.statements)
+
+
+def test_dashboard_etag(factory, active_session, monkeypatch):
+    db = factory()
+    engine, session_id, ids = active_session(db, packages=4)
+    monkeypatch.setattr(database.db_manager, "AsyncSessionLocal", None)  # Sessão sync numa thread
+    monkeypatch.setattr(database.db_manager, "SessionLocal", factory)
+
+    app = FastAPI()
+    app.include_router(api_sessions.router)
+    url = f"/api/sessions/{session_id}/dashboard"
+
+    async def poll():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test",
+                                     headers={API_KEY_NAME: SERVER_API_KEY}) as client:
+            first = await client.get(url)
+            etag = first.headers["etag"]
+            factory.statements.clear()
+            unchanged = await client.get(url, headers={"If-None-Match": etag})
+            statements = len(factory.statements)
+            engine.mark_deliveries_complete(session_id, ids[:1], 11)
+            changed = await client.get(url, headers={"If-None-Match": etag})
+            missing = await client.get("/api/sessions/nao-existe/dashboard", headers={"If-None-Match": etag})
+        return first, unchanged, statements, changed, missing
+
+    first, unchanged, statements, changed, missing = asyncio.run(poll())
+    assert first.status_code == 200 and first.json()["progress"]["pending"] == 4
+    assert unchanged.status_code == 304 and unchanged.content == b"" and statements == 1
+    assert changed.status_code == 200 and changed.headers["etag"] != first.headers["etag"]
+    assert changed.json()["progress"] == {"delivered": 1, "failed": 0, "pending": 3, "total": 4, "percentage": 25.0}
+    assert missing.status_code == 404
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Dashboard de sessão OK")
@@ -0,0 +1,86 @@
+"""
+🧪 Testes da baixa de entregas em lote
+Uma transação com UPDATEs set-based, totais agregados e auditoria num insert;
+sync repetido (cliente offline) não conta nada duas vezes
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery import api_sessions, database
+from bot_multidelivery.schemas.sessions_schema import (
+    DeliverySession, SessionAudit, SessionDeliverer, SessionPackage
+)
+from bot_multidelivery.security import API_KEY_NAME, SERVER_API_KEY
+
+
+def _totals(db, session_id):
+    db.expire_all()
+    deliverer = db.query(SessionDeliverer).filter_by(session_id=session_id, deliverer_id=11).one()
+    session = db.get(DeliverySession, session_id)
+    audits = db.query(SessionAudit).filter_by(action="package_delivered").count()
+    return deliverer.packages_delivered, deliverer.total_earned, session.total_revenue, session.total_profit, audits
+
+
+def test_batch_is_one_transaction_and_replay_is_a_no_op(factory, active_session):
+    db = factory()
+    engine, session_id, ids = active_session(db, packages=10, value=lambda n: 10.0 + n)
+    batch = ids[:6] + [ids[0], "nao-existe"]
+
+    factory.statements.clear()
+    result = engine.mark_deliveries_complete(session_id, batch, 11, "portaria")
+    verbs = [sql.split()[0] for sql in factory.statements]
+    assert verbs.count("UPDATE") == 3 and verbs.count("INSERT") == 1
+    assert len(verbs) <= 8, verbs
+    assert result["delivered"] == ids[:6] and result["not_found"] == ["nao-existe"]
+    assert result["revenue_added"] == sum(10.0 + n for n in range(6)) == 75.0
+    assert result["deliverer_earning"] == 3000.0 + 6 * 5.0
+
+    expected = (6, 3030.0, 75.0, 75.0, 6)
+    assert _totals(db, session_id) == expected
+    assert {p.delivery_notes for p in db.query(SessionPackage).filter(SessionPackage.package_id.in_(ids[:6]))} == {"portaria"}
+
+    replay = engine.mark_deliveries_complete(session_id, batch, 11, "portaria")
+    assert replay["delivered"] == [] and replay["already_delivered"] == ids[:6]
+    assert replay["deliverer_earning"] == 3030.0
+    assert engine.mark_delivery_complete(session_id, ids[2], 11)["deliverer_earning"] == 3030.0
+    assert _totals(db, session_id) == expected
+
+    assert engine.mark_delivery_complete(session_id, ids[6], 11)["status"] == "delivered"
+    assert _totals(db, session_id) == (7, 3035.0, 91.0, 91.0, 7)
+    assert engine.mark_delivery_complete(session_id, "nao-existe", 11) == {"error": "Pacote não encontrado"}
+
+
+def test_complete_batch_endpoint(factory, active_session, monkeypatch):
+    db = factory()
+    _, session_id, ids = active_session(db, packages=4, value=lambda n: 10.0 + n)
+    monkeypatch.setattr(database.db_manager, "AsyncSessionLocal", None)  # Sessão sync numa thread
+    monkeypatch.setattr(database.db_manager, "SessionLocal", factory)
+
+    app = FastAPI()
+    app.include_router(api_sessions.router)
+
+    async def sync_twice():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test",
+                                     headers={API_KEY_NAME: SERVER_API_KEY}) as client:
+            url = f"/api/sessions/{session_id}/delivery/complete-batch"
+            first = await client.post(url, params={"deliverer_id": 22}, json=ids)
+            second = await client.post(url, params={"deliverer_id": 22}, json=ids)
+        return first.json(), second.json()
+
+    first, second = asyncio.run(sync_twice())
+    assert first["success"] and first["result"]["delivered"] == ids
+    assert second["result"]["delivered"] == [] and second["result"]["already_delivered"] == ids
+    assert first["result"]["deliverer_earning"] == second["result"]["deliverer_earning"] == 3020.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Entregas em lote OK")
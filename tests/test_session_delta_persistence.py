@@ -0,0 +1,89 @@
+"""
+🧪 Testes da persistência incremental de sessões (JSON local)
+Entrega (ou falha) = append no sidecar; reescrita completa só em mudança estrutural
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_delivery_appends_without_rewriting_session(json_store, make_session):
+    store = json_store()
+    session = make_session(1, packages=6)
+    store.save_session(session)
+    main_file = store._session_file(session.session_id)
+    before = main_file.read_bytes()
+
+    for pkg in ("S1P0", "S1P3"):
+        session.routes[0].mark_as_delivered(pkg)
+        session.record_delivery("ROTA_1", pkg)
+        store.save_session(session)
+
+    assert main_file.read_bytes() == before
+    assert len(store._deliveries_file(session.session_id).read_text().splitlines()) == 2
+
+    loaded = store.load_session(session.session_id)
+    assert loaded.routes[0].delivered_packages == ["S1P0", "S1P3"]
+    assert not loaded.is_dirty
+
+
+def test_failure_appends_without_rewriting_session(json_store, make_session):
+    store = json_store()
+    session = make_session(1, packages=6)
+    store.save_session(session)
+    main_file = store._session_file(session.session_id)
+    before = main_file.read_bytes()
+
+    session.routes[0].mark_as_failed("S1P2", "cliente ausente")
+    session.record_failure("ROTA_1", "S1P2", "cliente ausente")
+    store.save_session(session)
+    session.routes[0].mark_as_delivered("S1P4")
+    session.record_delivery("ROTA_1", "S1P4")
+    store.save_session(session)
+
+    assert main_file.read_bytes() == before
+    assert len(store._deliveries_file(session.session_id).read_text().splitlines()) == 2
+
+    loaded = json_store().load_session(session.session_id)
+    assert loaded.routes[0].failed_packages == {"S1P2": "cliente ausente"}
+    assert loaded.routes[0].delivered_packages == ["S1P4"]
+    store.index_file.unlink()
+    assert json_store().list_sessions()[0]["delivered_count"] == 1  # Falha não conta como entrega
+
+
+def test_structural_change_compacts_sidecar(json_store, make_session):
+    store = json_store()
+    session = make_session(1, packages=6)
+    store.save_session(session)
+
+    session.routes[0].mark_as_delivered("S1P1")
+    session.record_delivery("ROTA_1", "S1P1")
+    store.save_session(session)
+
+    session.is_finalized = True
+    session.mark_dirty()
+    store.save_session(session)
+
+    assert not store._deliveries_file(session.session_id).exists()
+    loaded = store.load_session(session.session_id)
+    assert loaded.is_finalized
+    assert loaded.routes[0].delivered_packages == ["S1P1"]
+
+
+def test_clean_session_is_not_written(json_store, make_session):
+    store = json_store()
+    session = make_session(1, packages=6)
+    store.save_session(session)
+    main_file = store._session_file(session.session_id)
+    mtime = main_file.stat().st_mtime_ns
+
+    store.save_session(session)
+    assert main_file.stat().st_mtime_ns == mtime
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Persistência incremental OK")
@@ -0,0 +1,80 @@
+"""
+🧪 Testes dos índices O(1) da sessão
+Pacote -> (rota, posição), entregador -> rota, conjunto de entregues
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint
+from bot_multidelivery.session import DailySession, Route
+from bot_multidelivery.services.barcode_separator import BarcodeSeparator
+
+
+def _route(route_id: str, telegram_id: int, prefix: str, n: int = 4) -> Route:
+    points = [
+        DeliveryPoint(address=f"Rua {prefix}{i}", lat=-22.9 + i * 0.001, lng=-43.17, romaneio_id="R1",
+                      package_id=f"{prefix}{i}")
+        for i in range(n)
+    ]
+    return Route(id=route_id, cluster=Cluster(id=0, center_lat=-22.9, center_lng=-43.17, points=points),
+                 assigned_to_telegram_id=telegram_id, assigned_to_name=f"Entregador {telegram_id}",
+                 optimized_order=points)
+
+
+def _session() -> DailySession:
+    return DailySession(session_id="idx01", routes=[_route("ROTA_1", 11, "A"), _route("ROTA_2", 22, "B")])
+
+
+def test_lookups_by_package_and_deliverer():
+    session = _session()
+    route, position = session.locate_package(" b2 ")
+    assert route.id == "ROTA_2" and position == 3
+    assert session.route_for_deliverer(11).id == "ROTA_1"
+    assert session.route_for_deliverer(99) is None
+    assert session.get_route("ROTA_2") is session.routes[1]
+
+
+def test_indexes_follow_route_changes():
+    session = _session()
+    assert session.locate_package("C0") is None
+
+    session.routes = [_route("ROTA_3", 33, "C")]
+    assert session.locate_package("C0")[0].id == "ROTA_3"
+    assert session.route_for_deliverer(11) is None
+
+    session.routes[0].assigned_to_telegram_id = 44
+    session.invalidate_indexes()
+    assert session.route_for_deliverer(44).id == "ROTA_3"
+
+
+def test_delivered_set_keeps_delivery_order():
+    route = _route("ROTA_1", 11, "A")
+    assert route.mark_as_delivered("A3")
+    assert route.mark_as_delivered("A0")
+    assert not route.mark_as_delivered("A3")
+    assert route.delivered_packages == ["A3", "A0"]
+    assert route.is_delivered("A0") and not route.is_delivered("A1")
+
+    route.delivered_packages = ["A1"]  # Lista trocada por fora
+    assert route.is_delivered("A1") and not route.is_delivered("A0")
+
+
+def test_separator_reads_session_index():
+    separator = BarcodeSeparator()
+    separator.start_separation_mode(_session())
+    assert len(separator.assignments) == 8
+
+    assignment = separator.assignments.get("A1")
+    assert assignment.route_id == "ROTA_1" and assignment.position == 2 and assignment.total_in_route == 4
+    assert separator.assignments.get("ZZZ") is None
+    assert "B0" in separator.scan_package(" b0 ")
+
+
+if __name__ == "__main__":
+    test_lookups_by_package_and_deliverer()
+    test_indexes_follow_route_changes()
+    test_delivered_set_keeps_delivery_order()
+    test_separator_reads_session_index()
+    print("✅ Índices da sessão OK")
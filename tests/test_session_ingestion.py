@@ -0,0 +1,67 @@
+"""
+🧪 Testes da importação em lote de pacotes na sessão
+Romaneio de 500 pacotes em poucas queries, duplicatas (no banco e no próprio
+lote) e endereços repetidos num SessionAddress só
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.schemas.sessions_schema import DeliverySession, SessionAddress, SessionPackage
+from bot_multidelivery.services.session_engine import SessionEngine
+
+
+@pytest.fixture
+def db(factory):
+    session = factory()
+    yield session
+    session.close()
+
+
+def _romaneio(start, count, streets=100):
+    return [{"barcode": f"BR{n:05d}", "recipient_name": f"Cliente {n}", "address": f"Rua {n % streets}, 10",
+             "value": 2.5} for n in range(start, start + count)]
+
+
+def test_500_packages_in_a_handful_of_statements(db, factory):
+    engine = SessionEngine(db)
+    session_id = engine.create_session(1, "import_file", "romaneio.xlsx")
+    factory.statements.clear()
+
+    result = engine.add_packages_to_session(session_id, _romaneio(0, 500))
+    assert result == {"added": 500, "duplicates": 0, "total_in_session": 500}
+    verbs = [sql.split()[0] for sql in factory.statements]
+    assert len(verbs) <= 6, verbs  # SELECT barcodes, SELECT endereços, 2 INSERT, UPDATE sessão
+
+    assert db.query(SessionPackage).count() == 500
+    addresses = db.query(SessionAddress).all()
+    assert len(addresses) == 100 and {a.package_count for a in addresses} == {5}
+    package = db.query(SessionPackage).filter_by(barcode="BR00042").one()
+    assert package.delivery_status == "pending" and package.address_full == "Rua 42, 10"
+    assert db.get(SessionAddress, package.address_id).address == "Rua 42, 10"
+
+
+def test_reimport_skips_duplicates_and_reuses_addresses(db):
+    engine = SessionEngine(db)
+    session_id = engine.create_session(1)
+    engine.add_packages_to_session(session_id, _romaneio(0, 50, streets=10))
+
+    batch = _romaneio(40, 20, streets=10) + [{"barcode": "NOVO", "address": "  rua 3,   10 "},
+                                             {"barcode": "NOVO", "address": "Rua 3, 10"}]
+    result = engine.add_packages_to_session(session_id, batch)
+    assert result == {"added": 11, "duplicates": 11, "total_in_session": 61}
+
+    counts = {a.address: a.package_count for a in db.query(SessionAddress)}
+    assert len(counts) == 10 and sum(counts.values()) == 61 and counts["Rua 3, 10"] == 7
+    assert db.query(DeliverySession).one().total_packages == 61
+
+    other = engine.create_session(2)  # Mesmo barcode em outra sessão não é duplicata
+    assert engine.add_packages_to_session(other, _romaneio(0, 3))["added"] == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Importação em lote OK")
@@ -0,0 +1,140 @@
+"""
+🧪 Testes do diário de sessões
+Eventos append-only, recuperação após queda (snapshot + cauda), compactação e assinantes
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import DeliveryPoint
+from bot_multidelivery.session import Romaneio, Route, SessionManager
+from bot_multidelivery.session_journal import SessionJournal
+
+
+def _populate(manager: SessionManager):
+    session = manager.create_new_session("2026-01-01", "manhã")
+    points = [DeliveryPoint(address=f"Rua {j}", lat=-22.9 + j / 1000, lng=-43.17, romaneio_id="R1", package_id=f"P{j}")
+              for j in range(6)]
+    manager.add_romaneio(Romaneio(id="R1", uploaded_at=datetime(2026, 1, 1), points=points))
+    manager.set_base_location("Base", -22.9, -43.17)
+    views = list(session.romaneios[0].points)
+    manager.set_routes([
+        Route(id="A", cluster=None, optimized_order=views[:3]),
+        Route(id="B", cluster=None, optimized_order=views[3:]),
+    ])
+    manager.assign_route("A", 11, "Ana")
+    manager.assign_route("B", 22, "Bia")
+    return session
+
+
+def _state(session):
+    return [(r.id, r.assigned_to_telegram_id, [p.package_id for p in r.optimized_order],
+             r.delivered_packages, r.failed_packages) for r in session.routes]
+
+
+def test_crash_recovery_replays_tail_on_snapshot(json_store):
+    manager = SessionManager(store=json_store())
+    session = _populate(manager)
+
+    # Simula queda: mutações chegam ao diário, mas o snapshot não é mais gravado
+    manager._auto_save = lambda s: None
+    manager.mark_package_delivered(11, "P0")
+    manager.mark_package_failed(11, "P1", "cliente ausente")
+    assert manager.transfer_packages(["P2"], 22) == 1
+    manager.update_route_order("B", list(reversed(session.get_route("B").optimized_order)))
+    expected = _state(session)
+
+    assert _state(json_store().load_session(session.session_id)) != expected  # Snapshot ficou para trás
+    restarted = SessionManager(store=json_store())
+    assert _state(restarted.get_session(session.session_id)) == expected
+
+    # Recuperado vira snapshot novo: outro restart não tem nada a refazer
+    assert restarted.journal.pending_sessions() == []
+    assert _state(json_store().load_session(session.session_id)) == expected
+
+
+def test_session_created_only_in_journal_is_rebuilt(json_store):
+    manager = SessionManager(store=json_store())
+    manager._auto_save = lambda s: None
+    session = _populate(manager)
+
+    restarted = SessionManager(store=json_store())
+    loaded = restarted.get_session(session.session_id)
+    assert loaded.session_name == session.session_name
+    assert loaded.total_packages == 6
+    assert _state(loaded) == _state(session)
+
+
+def test_compaction_archives_covered_events(data_dir):
+    journal = SessionJournal(data_dir, compact_every=5)
+    for n in range(4):
+        journal.append("s1", "package_delivered", route_id="A", package_id=f"P{n}")
+    journal.checkpoint("s1", 3)  # 5ª linha: compacta
+    assert [e['seq'] for e in journal.read("s1")] == [4]
+    assert [e['seq'] for e in journal.history("s1")] == [1, 2, 3, 4]
+
+    # Seq continua de onde parou, mesmo com outro processo abrindo o diário
+    reopened = SessionJournal(data_dir, compact_every=5)
+    assert reopened.append("s1", "session_finalized", finalized_at="2026-01-01T18:00:00")['seq'] == 5
+    assert reopened.pending_sessions() == ["s1"]
+
+
+def test_subscribers_and_audit_trail(json_store):
+    manager = SessionManager(store=json_store())
+    received = []
+    manager.journal.subscribe(received.append)
+    session = _populate(manager)
+    manager.mark_package_delivered(22, "P3")
+
+    assert received[-1]['type'] == 'package_delivered' and received[-1]['package_id'] == "P3"
+    events = manager.session_events(session.session_id)
+    assert [e['type'] for e in events][:2] == ['session_created', 'romaneio_added']
+    assert [e['seq'] for e in events] == list(range(1, len(events) + 1))
+
+    manager.delete_session(session.session_id)
+    assert manager.session_events(session.session_id) == []
+
+
+class _RecordingClient:
+    """Cliente WebSocket falso: guarda o que o dashboard enviaria"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_json(self, message):
+        self.messages.append(message)
+
+
+def test_dashboard_broadcast_shape(json_store, monkeypatch):
+    dashboard_service = pytest.importorskip("bot_multidelivery.services.dashboard_service")
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(dashboard_service.asyncio, "run_coroutine_threadsafe",
+                        lambda coro, target: target.run_until_complete(coro))
+    ws = dashboard_service.DashboardWebSocket()
+    client = _RecordingClient()
+    ws.clients.add(client)
+    ws._loop = loop
+
+    manager = SessionManager(store=json_store())
+    manager.journal.subscribe(ws.on_session_event)
+    session = _populate(manager)
+    manager.mark_package_delivered(11, "P0")
+    loop.close()
+
+    labels = [m['type'] for m in client.messages]
+    assert set(labels) == {'session_event', 'delivery_update'}
+    assert [m['event']['type'] for m in client.messages if m['type'] == 'session_event'][:2] == \
+        ['session_created', 'romaneio_added']
+    assert client.messages[0]['event']['session_id'] == session.session_id
+    assert client.messages[-1] == {'type': 'delivery_update', 'package_id': "P0", 'status': 'delivered',
+                                   'timestamp': client.messages[-1]['timestamp']}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Diário de sessões OK")
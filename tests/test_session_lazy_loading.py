@@ -0,0 +1,60 @@
+"""
+🧪 Testes da hidratação sob demanda das sessões
+Startup só lê resumos; sessões completas entram num LRU limitado
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.session import SessionManager
+
+
+def test_startup_reads_only_summaries(counting_store, fill_sessions):
+    store = counting_store
+    fill_sessions(store, 12)
+    manager = SessionManager(store=store, max_sessions=4)
+
+    assert store.loads == 0
+    assert len(manager.list_summaries()) == 12
+    assert manager.list_summaries()[0]['session_id'] == "s11"
+    assert manager.list_summaries()[0]['total_packages'] == 3
+
+    session = manager.get_session("s05")
+    assert session.total_packages == 3 and store.loads == 1
+    assert manager.get_session("s05") is session and store.loads == 1
+    assert manager.get_session("nope") is None
+
+
+def test_lru_evicts_finalized_first_and_keeps_current(counting_store, fill_sessions):
+    store = counting_store
+    fill_sessions(store, 6, finalized={1})
+    manager = SessionManager(store=store, max_sessions=3)
+
+    manager.set_current_session("s00")
+    for session_id in ("s00", "s01", "s02", "s03"):
+        manager.get_session(session_id)
+
+    # s01 é finalizada: sai antes das abertas, mesmo sendo mais recente que s00
+    assert list(manager.active_sessions) == ["s00", "s02", "s03"]
+
+    manager.get_session("s04")
+    assert "s00" in manager.active_sessions  # Sessão em foco nunca sai
+    assert len(manager.active_sessions) == 3
+
+
+def test_package_cap_limits_resident_sessions(counting_store, fill_sessions):
+    store = counting_store
+    fill_sessions(store, 5)
+    manager = SessionManager(store=store, max_sessions=10, max_packages=6)
+
+    for session_id in ("s00", "s01", "s02"):
+        manager.get_session(session_id)
+    assert list(manager.active_sessions) == ["s01", "s02"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Hidratação sob demanda OK")
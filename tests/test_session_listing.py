@@ -0,0 +1,91 @@
+"""
+🧪 Testes da listagem de sessões pelo índice de resumos (JSON local)
+Listar não pode abrir os arquivos das sessões
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_listing_reads_index_not_session_files(json_store, make_session):
+    store = json_store()
+    for i in range(3):
+        store.save_session(make_session(i, packages=4))
+    session = make_session(2, packages=4)
+    session.routes[0].mark_as_delivered("S2P1")
+    session.mark_clean()
+    session.record_delivery("ROTA_2", "S2P1")
+    store.save_session(session)
+
+    # Arquivos corrompidos não afetam a listagem: só o índice é lido
+    for i in range(3):
+        store._session_file(f"s{i:02d}").write_text("{corrompido")
+
+    listed = json_store().list_sessions()
+    assert [s['session_id'] for s in listed] == ["s02", "s01", "s00"]
+    assert listed[0]['total_packages'] == 4 and listed[0]['num_routes'] == 1
+    assert listed[0]['delivered_count'] == 1
+
+
+def test_missing_index_is_rebuilt_once(json_store, make_session):
+    store = json_store()
+    store.save_session(make_session(0, packages=4))
+    store.save_session(make_session(1, packages=4))
+    store.index_file.unlink()
+
+    fresh = json_store()
+    assert len(fresh.list_sessions()) == 2
+    assert fresh.index_file.exists()
+
+    fresh.delete_session("s00")
+    assert [s['session_id'] for s in json_store().list_sessions()] == ["s01"]
+
+
+def test_deliveries_do_not_rewrite_index(json_store, make_session):
+    store = json_store()
+    for i in range(3):
+        store.save_session(make_session(i, packages=4))
+    session = store.load_session("s01")
+    index_before = store.index_file.read_bytes()
+
+    for pkg in ("S1P0", "S1P2"):
+        session.routes[0].mark_as_delivered(pkg)
+        session.record_delivery("ROTA_1", pkg)
+        store.save_session(session)
+
+    assert store.index_file.read_bytes() == index_before  # Entrega = só o append no sidecar
+    assert store.list_sessions()[1]['delivered_count'] == 2  # Memória já atualizada
+
+    # Queda antes de gravar o índice: a cauda do sidecar é somada na abertura
+    assert json_store().list_sessions()[1]['delivered_count'] == 2
+
+    store.flush_index()
+    assert store.index_file.read_bytes() != index_before
+    assert json_store().list_sessions()[1]['delivered_count'] == 2
+
+
+def test_listing_thousand_sessions_is_fast(json_store, make_session):
+    store = json_store()
+    store._index = {}
+    for i in range(1000):
+        store._index[f"s{i:02d}"] = store._summary(make_session(i, packages=4))
+    store._write_index()
+    for i in range(1000):
+        store._session_file(f"s{i:02d}").touch()
+
+    fresh = json_store()
+    started = time.perf_counter()
+    listed = fresh.list_sessions(limit=1000)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    assert len(listed) == 1000
+    assert elapsed_ms < 200, f"listagem levou {elapsed_ms:.1f} ms"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Listagem de sessões OK")
@@ -0,0 +1,94 @@
+"""
+🧪 Testes do índice espacial por sessão (pendentes, raio e cerca de chegada)
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import Cluster, DeliveryPoint
+from bot_multidelivery.session import Route
+from bot_multidelivery.spatial import SessionSpatialIndex
+
+BASE = (-22.9068, -43.1729)
+
+
+def _routes(num_routes: int, per_route: int, seed: int = 9):
+    rng = random.Random(seed)
+    routes = []
+    for r in range(num_routes):
+        points = [
+            DeliveryPoint(address=f"Rua {r}-{i}", lat=BASE[0] + rng.uniform(-0.04, 0.04),
+                          lng=BASE[1] + rng.uniform(-0.04, 0.04), romaneio_id="R1",
+                          package_id=f"R{r}P{i:04d}")
+            for i in range(per_route)
+        ]
+        routes.append(Route(id=f"ROTA_{r + 1}", cluster=Cluster(id=r, center_lat=BASE[0], center_lng=BASE[1],
+                                                               points=points), optimized_order=points))
+    return routes
+
+
+def test_nearest_skips_delivered_packages():
+    routes = _routes(2, 50)
+    index = SessionSpatialIndex(routes)
+    target = routes[0].optimized_order[10]
+
+    (key, point, meters), = index.nearest_pending(target.lat, target.lng, k=1)
+    assert point is target and meters < 1
+
+    # Entrega marcada direto na rota também é percebida
+    routes[0].mark_as_delivered(target.package_id)
+    hits = index.nearest_pending(target.lat, target.lng, k=3)
+    assert target.package_id not in [k[1] for k, _, _ in hits]
+
+    within = index.within(target.lat, target.lng, 5, include_delivered=True)
+    assert within[0][1] is target
+
+
+def test_route_filter_and_radius():
+    routes = _routes(3, 40)
+    index = SessionSpatialIndex(routes)
+
+    hits = index.nearest_pending(BASE[0], BASE[1], k=10, route_id="ROTA_2")
+    assert len(hits) == 10
+    assert all(key[0] == "ROTA_2" for key, _, _ in hits)
+
+    radius = index.within(BASE[0], BASE[1], 1500)
+    assert all(d <= 1500 for _, _, d in radius)
+
+
+def test_geofence_reports_arrival_once():
+    routes = _routes(1, 30)
+    index = SessionSpatialIndex(routes)
+    stop = routes[0].optimized_order[5]
+
+    first = index.detect_arrival("ROTA_1", stop.lat, stop.lng)
+    assert stop.package_id in [k[1] for k, _, _ in first]
+    assert index.detect_arrival("ROTA_1", stop.lat, stop.lng) == []
+
+    # Sai da cerca e volta: nova chegada
+    index.detect_arrival("ROTA_1", stop.lat + 0.01, stop.lng)
+    assert index.detect_arrival("ROTA_1", stop.lat, stop.lng)
+
+
+def test_lookups_are_sub_millisecond():
+    routes = _routes(5, 1000)
+    index = SessionSpatialIndex(routes)
+    rng = random.Random(1)
+
+    start = time.perf_counter()
+    for _ in range(200):
+        index.nearest_pending(BASE[0] + rng.uniform(-0.03, 0.03), BASE[1] + rng.uniform(-0.03, 0.03), k=5)
+    per_query_ms = (time.perf_counter() - start) * 1000 / 200
+
+    assert per_query_ms < 1.0
+
+
+if __name__ == "__main__":
+    test_nearest_skips_delivered_packages()
+    test_route_filter_and_radius()
+    test_geofence_reports_arrival_once()
+    test_lookups_are_sub_millisecond()
+    print("✅ Índice espacial da sessão OK")
@@ -0,0 +1,82 @@
+"""
+🧪 Testes do write-behind das sessões
+Várias mutações na mesma janela = uma gravação; flush/shutdown gravam na hora
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.session_persistence import WriteBehindSaver
+
+
+def _deliver(saver, session, package_id):
+    session.routes[0].mark_as_delivered(package_id)
+    session.record_delivery("ROTA_1", package_id)
+    saver.schedule(session)
+
+
+def test_mutations_in_window_coalesce_into_one_write(counting_store, make_session):
+    store = counting_store
+    saver = WriteBehindSaver(store, window_ms=50)
+    session = make_session(1, packages=5)
+
+    for pkg in ("S1P0", "S1P1", "S1P2"):
+        _deliver(saver, session, pkg)
+    assert store.saves == 0
+
+    deadline = time.monotonic() + 2
+    while store.saves == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    assert store.saves == 1
+    assert not session.is_dirty
+    assert store.load_session("s01").routes[0].delivered_packages == ["S1P0", "S1P1", "S1P2"]
+    saver.shutdown()
+
+
+def test_flush_writes_immediately(counting_store, make_session):
+    store = counting_store
+    saver = WriteBehindSaver(store, window_ms=10_000)
+    session = make_session(1, packages=5)
+
+    _deliver(saver, session, "S1P3")
+    assert saver.pending_count == 1
+    saver.flush()
+
+    assert store.saves == 1
+    assert saver.pending_count == 0
+    assert store.load_session("s01").routes[0].delivered_packages == ["S1P3"]
+    saver.shutdown()
+
+
+def test_discard_drops_pending_write(counting_store, make_session):
+    store = counting_store
+    saver = WriteBehindSaver(store, window_ms=10_000)
+    saver.schedule(make_session(1, packages=5))
+    saver.discard("s01")
+    saver.flush()
+
+    assert store.saves == 0
+    assert store.load_session("s01") is None
+    saver.shutdown()
+
+
+def test_after_shutdown_saves_synchronously(counting_store, make_session):
+    store = counting_store
+    store.fsync = True  # modo durável: fsync antes de retornar
+    saver = WriteBehindSaver(store, window_ms=10_000)
+    saver.shutdown()
+
+    saver.schedule(make_session(1, packages=5))
+    assert store.saves == 1
+    assert store.load_session("s01") is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Write-behind OK")
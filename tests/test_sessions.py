@@ -23,6 +23,9 @@ database_url = os.getenv('DATABASE_URL')
 if not database_url:
     print("❌ DATABASE_URL não configurada!")
     print("Configure com: $env:DATABASE_URL='postgresql://...' ou export DATABASE_URL='...'")
+    if __name__ != "__main__":
+        import pytest
+        pytest.skip("DATABASE_URL não configurada", allow_module_level=True)
     exit(1)
 
 if database_url.startswith('postgres://'):
@@ -0,0 +1,108 @@
+"""
+🧪 Testes do estado compartilhado
+Mesma interface em memória e em tabela (SQLite no lugar do PostgreSQL) e dois
+SessionManagers/separadores simulando workers diferentes da API
+"""
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import DeliveryPoint
+from bot_multidelivery.services.barcode_separator import BarcodeSeparator
+from bot_multidelivery.session import Romaneio, Route, SessionManager
+from bot_multidelivery.session_persistence import SessionStore
+from bot_multidelivery.state_backend import MemoryStateBackend, PostgresStateBackend
+
+
+def _sql_backend() -> PostgresStateBackend:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    return PostgresStateBackend(engine)
+
+
+@pytest.mark.parametrize("make", [MemoryStateBackend, _sql_backend], ids=["memory", "sql"])
+def test_backend_interface(make):
+    state = make()
+    assert state.get("x") is None
+    state.set("x", {"a": 1})
+    state.set("x", {"a": 2})
+    assert state.get("x") == {"a": 2}
+
+    assert state.incr("c") == 1 and state.incr("c", 5) == 6 and state.counter("c") == 6
+    assert state.set_add("s", "A", "B") == 2 and state.set_add("s", "B", "C") == 1
+    assert state.set_members("s") == {"A", "B", "C"} and state.set_count("s") == 3
+    assert state.set_contains("s", "A") and not state.set_contains("s", "Z")
+    state.set_clear("s")
+    state.delete("x")
+    assert state.set_count("s") == 0 and state.get("x") is None
+
+    received = []
+    state.subscribe("canal", received.append)
+    state.publish("canal", {"n": 1})
+    assert received == [{"n": 1}]
+
+    # Lock reentrante na mesma thread, exclusivo entre threads
+    order = []
+    with state.lock("sessao"):
+        with state.lock("sessao"):
+            worker = threading.Thread(target=lambda: state.lock("sessao").__enter__() or order.append("outra"))
+            worker.start()
+            worker.join(0.2)
+            order.append("dona")
+    worker.join(1)
+    assert order == ["dona", "outra"]
+
+
+def _points(n=6):
+    return [DeliveryPoint(address=f"Rua {j}", lat=-22.9 + j / 1000, lng=-43.17, romaneio_id="R1", package_id=f"P{j}")
+            for j in range(n)]
+
+
+def test_two_workers_share_sessions_and_separation():
+    state = _sql_backend()
+    with tempfile.TemporaryDirectory() as tmp:
+        def worker():
+            store = SessionStore(data_dir=tmp)
+            store.using_database = False
+            return SessionManager(store=store, state=state)
+
+        a, b = worker(), worker()
+        session = a.create_new_session("2026-01-01", "manhã")
+        assert b.current_session_id == session.session_id
+
+        a.add_romaneio(Romaneio(id="R1", uploaded_at=datetime(2026, 1, 1), points=_points()))
+        views = list(a.get_current_session().romaneios[0].points)
+        a.set_routes([Route(id="A", cluster=None, optimized_order=views[:3], assigned_to_telegram_id=11,
+                            assigned_to_name="Ana"),
+                      Route(id="B", cluster=None, optimized_order=views[3:], assigned_to_telegram_id=22,
+                            assigned_to_name="Bia")])
+
+        # B vê o que A gravou; entrega feita em B aparece em A
+        assert [r.id for r in b.get_current_session().routes] == ["A", "B"]
+        assert b.mark_package_delivered(22, "P4")
+        assert a.get_session(session.session_id).get_route("B").delivered_packages == ["P4"]
+        assert a.mark_package_delivered(11, "P0")
+        assert b.get_session(session.session_id).total_delivered == 2
+        assert [s['session_id'] for s in b.list_summaries()] == [session.session_id]
+
+        # Separação iniciada num worker, bipes em outro
+        sep_a = BarcodeSeparator(state=state, sessions=a)
+        sep_b = BarcodeSeparator(state=state, sessions=b)
+        sep_a.start_separation_mode(a.get_current_session())
+        assert sep_b.active and len(sep_b.assignments) == 6
+        assert "1/6" in sep_b.scan_package("p1")
+        assert sep_a.record_scan("P2") == 2
+        assert "2/6" in sep_b.end_separation()
+        assert not sep_a.active
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
+    print("✅ Estado compartilhado OK")
@@ -0,0 +1,85 @@
+"""
+🧪 Testes da agregação de paradas (pacotes do mesmo prédio) no TerritoryDivider
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_multidelivery.clustering import (
+    DeliveryPoint, TerritoryDivider, Cluster, aggregate_stops, expand_stops
+)
+
+BASE = (-22.9068, -43.1729)
+
+
+def _building_points(buildings: int, per_building: int, seed: int = 42):
+    """Gera romaneio residencial: vários pacotes por prédio com jitter de GPS (~3m)"""
+    rng = random.Random(seed)
+    points = []
+    for b in range(buildings):
+        lat = BASE[0] + rng.uniform(-0.02, 0.02)
+        lng = BASE[1] + rng.uniform(-0.02, 0.02)
+        for n in range(per_building):
+            points.append(DeliveryPoint(
+                address=f"Rua {b}, {n}",
+                lat=lat + rng.uniform(-0.00002, 0.00002),
+                lng=lng + rng.uniform(-0.00002, 0.00002),
+                romaneio_id="R1",
+                package_id=f"PKG{b:03d}{n:02d}"
+            ))
+    rng.shuffle(points)
+    return points
+
+
+def test_aggregate_collapses_same_building():
+    points = _building_points(buildings=40, per_building=3)
+    stops = aggregate_stops(points)
+
+    assert len(stops) == 40
+    assert sum(s.weight for s in stops) == len(points)
+    for stop in stops:
+        # Todos os pacotes da parada são do mesmo prédio
+        assert len({p.address.split(',')[0] for p in stop.points}) == 1
+
+
+def test_expand_preserves_every_package():
+    points = _building_points(buildings=10, per_building=4)
+    expanded = expand_stops(aggregate_stops(points))
+
+    assert sorted(p.package_id for p in expanded) == sorted(p.package_id for p in points)
+
+
+def test_clusters_never_split_a_building():
+    points = _building_points(buildings=60, per_building=3)
+    divider = TerritoryDivider(*BASE)
+    clusters = divider.divide_into_clusters(points, k=3)
+
+    assert sum(c.total_packages for c in clusters) == len(points)
+    owner = {}
+    for cluster in clusters:
+        for p in cluster.points:
+            building = p.address.split(',')[0]
+            assert owner.setdefault(building, cluster.id) == cluster.id
+
+
+def test_route_keeps_building_packages_together():
+    points = _building_points(buildings=25, per_building=4)
+    divider = TerritoryDivider(*BASE)
+    cluster = Cluster(id=0, center_lat=BASE[0], center_lng=BASE[1], points=points)
+    route = divider.optimize_cluster_route(cluster)
+
+    assert len(route) == len(points)
+    buildings = [p.address.split(',')[0] for p in route]
+    # Cada prédio aparece num único bloco contíguo
+    blocks = [b for i, b in enumerate(buildings) if i == 0 or buildings[i - 1] != b]
+    assert len(blocks) == 25
+
+
+if __name__ == "__main__":
+    test_aggregate_collapses_same_building()
+    test_expand_preserves_every_package()
+    test_clusters_never_split_a_building()
+    test_route_keeps_building_packages_together()
+    print("✅ Agregação de paradas OK")